@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# Codegen units benchmark
+# Compiles a large generated ImpLang program with an increasing number of --codegen-units and reports the compile time,
+# then the runtime of the runtime kernels built with the same unit counts (functions in different units are not
+# inlined into each other). All builds of a program have to give the same exit code.
+
+import glob
+import os
+import statistics
+import sys
+import tempfile
+
+import harness
+
+sys.path.insert(0, os.path.join(harness.HERE, "runtime"))
+
+from generators import mixed_functions
+from bench_runtime import get_kernel_argument, get_kernel_sources
+
+MAIN_TEMPLATE = """func main(args: str) -> i8 {{
+    var acc: u64 = 0
+    var i: u64 = 0
+    while i < 100000 {{
+        acc += f{last}(i)
+        i += 1
+    }}
+    return acc % 256
+}}
+"""
+
+def main():
+    arg_parser = harness.ArgumentParser("ImpLang compiler codegen units benchmark", flags=["-O2"])
+    arg_parser.add_argument("-l", "--lines", help="Size of the generated program in lines (default: 50000)", type=int, default=50_000)
+    arg_parser.add_argument("-u", "--units", help="Unit counts to compare (default: 1 2 4 8)", type=int, nargs="+", default=[1, 2, 4, 8])
+    arg_parser.add_argument("--no-kernels", help="Only measure the compile time", action="store_true")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = mixed_functions(args.lines)
+        path = harness.write_program(tmp_dir, "bench", source + MAIN_TEMPLATE.format(last=source.count("func ") - 1))
+
+        print(f"lines: {args.lines}, cores: {os.cpu_count()}")
+        harness.print_row(["units", "compile s", "speedup"], [6, 10, 8])
+
+        exit_codes = {}
+        baseline = None
+
+        for units in args.units:
+            binary = os.path.join(tmp_dir, f"bench-{units}")
+            elapsed = harness.compile_program(path, binary, ["--codegen-units", str(units)] + args.flags)
+            baseline = baseline or elapsed
+
+            exit_codes[f"{units} units"] = harness.run_program([binary, ""], 1)[2]
+            harness.print_row([units, f"{elapsed:.3f}", harness.speedup(baseline, elapsed)], [6, 10, 8])
+
+        harness.check_same(exit_codes, "The generated program")
+
+        if args.no_kernels:
+            return
+
+        kernels = sorted(glob.glob(os.path.join(harness.HERE, "runtime", "kernels", "*.impl")) + glob.glob(os.path.join(harness.HERE, "runtime", "kernels", "*", "")))
+        widths = [16] + [14] * len(args.units)
+
+        print()
+        harness.print_row(["kernel"] + [f"{units} units ms" for units in args.units], widths)
+
+        for kernel in [os.path.normpath(k) for k in kernels]:
+            name = os.path.splitext(os.path.basename(kernel))[0]
+            medians = []
+            exit_codes = {}
+
+            for units in args.units:
+                binary = os.path.join(tmp_dir, f"{name}-{units}")
+                harness.compile_program(get_kernel_sources(kernel), binary, ["--codegen-units", str(units)] + args.flags)
+
+                wall_times, _, exit_codes[f"{units} units"], _ = harness.run_program([binary, get_kernel_argument(kernel)], args.repeat)
+                medians.append(statistics.median(wall_times))
+
+            harness.check_same(exit_codes, f"Kernel '{name}'")
+            harness.print_row([name] + [harness.milliseconds(median) for median in medians], widths)
+
+if __name__ == "__main__":
+    main()
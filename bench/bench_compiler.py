@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+# Compiler benchmark suite
+# Times lexer.lex_file, parser.parse, semantic.analyze, comptime.evaluate and codegen.codegen separately on synthetic programs of
+# growing size, and stores throughput, peak memory and scaling exponents as JSON.
+#
+#   bench/bench_compiler.py run -o results.json        run the suite
+#   bench/bench_compiler.py compare old.json new.json  report regressions between two runs
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import codegen
+import comptime
+import lexer
+import parser
+import semantic
+
+from generators import GENERATORS
+
+RESULTS_FORMAT_VERSION = 1
+PHASES = ["lex", "parse", "semantic", "comptime", "codegen"]
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_phases(path: str, object_file: str, options: codegen.CodegenOptions) -> dict:
+    # run the whole pipeline once, returns the duration of each phase and its output
+    start = time.perf_counter()
+    tokens = lexer.lex_file(path)
+    lexed = time.perf_counter()
+    program = parser.parse(path, tokens)
+    parsed = time.perf_counter()
+    semantic.analyze(path, program)
+    analyzed = time.perf_counter()
+    comptime.evaluate(path, program, options.opt_level > 0)
+    evaluated = time.perf_counter()
+    codegen.codegen([path], [program], object_file, options=options)
+    generated = time.perf_counter()
+
+    return {
+        "tokens": tokens,
+        "seconds": {"lex": lexed - start, "parse": parsed - lexed, "semantic": analyzed - parsed, "comptime": evaluated - analyzed, "codegen": generated - evaluated}
+    }
+
+def measure_peak_memory(path: str, object_file: str, options: codegen.CodegenOptions) -> dict:
+    # NOTE: tracemalloc only sees Python allocations, memory allocated inside LLVM is not included
+    peaks = {}
+    tracemalloc.start()
+
+    tracemalloc.reset_peak()
+    tokens = lexer.lex_file(path)
+    peaks["lex"] = tracemalloc.get_traced_memory()[1]
+
+    tracemalloc.reset_peak()
+    program = parser.parse(path, tokens)
+    peaks["parse"] = tracemalloc.get_traced_memory()[1]
+
+    tracemalloc.reset_peak()
+    semantic.analyze(path, program)
+    peaks["semantic"] = tracemalloc.get_traced_memory()[1]
+
+    tracemalloc.reset_peak()
+    comptime.evaluate(path, program, options.opt_level > 0)
+    peaks["comptime"] = tracemalloc.get_traced_memory()[1]
+
+    tracemalloc.reset_peak()
+    codegen.codegen([path], [program], object_file, options=options)
+    peaks["codegen"] = tracemalloc.get_traced_memory()[1]
+
+    tracemalloc.stop()
+    return peaks
+
+def scaling_exponent(sizes: list, seconds: list) -> float:
+    # least squares slope of log(time) over log(size): 1.0 is linear, 2.0 quadratic
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in seconds]
+
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+
+    variance = sum((x - mean_x) ** 2 for x in xs)
+
+    if variance == 0:
+        return None
+
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+def run_generator(name: str, sizes: list, repeat: int, options: codegen.CodegenOptions, tmp_dir: str) -> dict:
+    generator = GENERATORS[name][0]
+    path = os.path.join(tmp_dir, f"{name}.impl")
+    object_file = os.path.join(tmp_dir, f"{name}.o")
+
+    series = {phase: [] for phase in PHASES}
+
+    for size in sizes:
+        source = generator(size)
+
+        with open(path, "w") as f:
+            f.write(source)
+
+        lines = source.count("\n")
+        best = {phase: None for phase in PHASES}
+
+        for _ in range(repeat):
+            result = run_phases(path, object_file, options)
+
+            for phase in PHASES:
+                if best[phase] is None or result["seconds"][phase] < best[phase]:
+                    best[phase] = result["seconds"][phase]
+
+        token_count = len(result["tokens"])
+        peaks = measure_peak_memory(path, object_file, options)
+
+        for phase in PHASES:
+            series[phase].append({
+                "size": size,
+                "lines": lines,
+                "tokens": token_count,
+                "seconds": best[phase],
+                "lines_per_second": lines / best[phase] if best[phase] > 0 else None,
+                "tokens_per_second": token_count / best[phase] if best[phase] > 0 else None,
+                "peak_memory_bytes": peaks[phase]
+            })
+
+        print(f"  {name} size={size}: " + ", ".join(f"{phase} {best[phase]:.3f} s" for phase in PHASES), file=sys.stderr)
+
+    exponents = {
+        phase: scaling_exponent([entry["size"] for entry in series[phase]], [entry["seconds"] for entry in series[phase]])
+        for phase in PHASES
+    }
+
+    return {"phases": series, "scaling_exponents": exponents}
+
+def run(args):
+    names = args.generators or list(GENERATORS)
+
+    for name in names:
+        if name not in GENERATORS:
+            print(f"Unknown generator '{name}', available: {', '.join(GENERATORS)}", file=sys.stderr)
+            raise SystemExit(1)
+
+    options = codegen.CodegenOptions(opt_level=args.optimize, compile_only=True, mir=args.mir)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in names:
+            sizes = GENERATORS[name][1]
+
+            if args.quick:
+                sizes = sizes[:2]
+
+            results[name] = run_generator(name, sizes, args.repeat, options, tmp_dir)
+
+    report = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "commit": get_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "opt_level": args.optimize,
+        "mir": args.mir,
+        "results": results
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_summary(report)
+    print(f"Results written to '{args.output}'", file=sys.stderr)
+
+def print_summary(report: dict):
+    print(f"{'generator':<18} {'phase':<8} {'largest size':>12} {'time':>10} {'lines/s':>12} {'tokens/s':>12} {'peak MB':>9} {'exponent':>9}")
+
+    for name, result in report["results"].items():
+        for phase in PHASES:
+            entry = result["phases"][phase][-1]
+            exponent = result["scaling_exponents"][phase]
+
+            print(
+                f"{name:<18} {phase:<8} {entry['size']:>12} {entry['seconds']:>9.3f}s "
+                f"{entry['lines_per_second'] or 0:>12,.0f} {entry['tokens_per_second'] or 0:>12,.0f} "
+                f"{entry['peak_memory_bytes'] / 2**20:>9.1f} {exponent if exponent is not None else float('nan'):>9.2f}"
+            )
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)
+
+    with open(args.new) as f:
+        new = json.load(f)
+
+    for report in [old, new]:
+        if report.get("format_version") != RESULTS_FORMAT_VERSION:
+            print(f"Unsupported results format version {report.get('format_version')}", file=sys.stderr)
+            raise SystemExit(1)
+
+    regressions = 0
+
+    print(f"old: {old['commit']} ({old['timestamp']})")
+    print(f"new: {new['commit']} ({new['timestamp']})")
+    print(f"{'generator':<18} {'phase':<8} {'size':>8} {'old':>10} {'new':>10} {'change':>8}")
+
+    for name, new_result in new["results"].items():
+        if name not in old["results"]:
+            continue
+
+        for phase in PHASES:
+            if phase not in old["results"][name]["phases"]:
+                continue # phase added after the old run
+
+            old_entries = {entry["size"]: entry for entry in old["results"][name]["phases"][phase]}
+
+            for entry in new_result["phases"][phase]:
+                old_entry = old_entries.get(entry["size"])
+
+                if old_entry is None or old_entry["seconds"] <= 0:
+                    continue
+
+                change = entry["seconds"] / old_entry["seconds"] - 1
+                marker = ""
+
+                if change > args.threshold:
+                    marker = "  REGRESSION"
+                    regressions += 1
+
+                print(f"{name:<18} {phase:<8} {entry['size']:>8} {old_entry['seconds']:>9.3f}s {entry['seconds']:>9.3f}s {change:>+7.1%}{marker}")
+
+    if regressions > 0:
+        print(f"{regressions} regression(s) above {args.threshold:.0%}")
+        raise SystemExit(1)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ImpLang compiler benchmark suite")
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmark suite")
+    run_parser.add_argument("generators", help="Generators to run (default: all)", nargs="*")
+    run_parser.add_argument("-o", "--output", help="JSON file to write the results to", default="bench_results.json")
+    run_parser.add_argument("-r", "--repeat", help="Number of timed runs per size (the best one is reported)", type=int, default=3)
+    run_parser.add_argument("-O", "--optimize", help="Optimization level passed to codegen", type=int, choices=[0, 1, 2, 3], default=0)
+    run_parser.add_argument("-q", "--quick", help="Only run the two smallest sizes of every generator", action="store_true")
+    run_parser.add_argument("--mir", help="Generate LLVM IR through the mid-level IR, like impc -fmir", action="store_true")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("old", help="Baseline results")
+    compare_parser.add_argument("new", help="New results")
+    compare_parser.add_argument("-t", "--threshold", help="Relative slowdown reported as regression (default: 0.1)", type=float, default=0.1)
+
+    args = arg_parser.parse_args()
+
+    sys.setrecursionlimit(10000) # deep_nesting and long_expressions recurse in the parser
+
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+# Parallel lexer scaling benchmark
+# Generates a large ImpLang program and measures lexer.lex_file with an increasing number of worker
+# processes, the tokens have to be identical to the ones of the serial lexer.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+import lexer
+
+from generators import commented_functions, mixed_functions
+
+def get_key(token) -> tuple:
+    if isinstance(token, lexer.LexerError):
+        return (None, token.char, token.position, token.line, token.column)
+
+    return (token.kind, token.value, token.position, token.line, token.column)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ImpLang parallel lexer scaling benchmark")
+    arg_parser.add_argument("-l", "--lines", help="Size of the generated program in lines (default: 1000000)", type=int, default=1_000_000)
+    arg_parser.add_argument("-j", "--jobs", help="Worker counts to measure (default: 1, 2, 4, ... up to the number of cores)", type=int, action="append")
+    arg_parser.add_argument("-r", "--repeat", help="Number of timed runs (the best one is reported)", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    jobs_list = args.jobs or sorted({1, cores} | {2 ** k for k in range(1, cores.bit_length()) if 2 ** k <= cores})
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bench.impl")
+
+        with open(path, "w") as f:
+            # half of the lines in block comments and strings with comment markers, which the chunks must not split
+            f.write(mixed_functions(args.lines // 2))
+            f.write(commented_functions(args.lines // 2))
+
+        print(f"lines: {args.lines}, size: {os.path.getsize(path) / 1024 / 1024:.1f} MiB, cores: {cores}")
+
+        expected = None
+        serial = None
+
+        for jobs in jobs_list:
+            best = None
+
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                tokens = lexer.lex_file(path, jobs)
+                elapsed = time.perf_counter() - start
+
+                if best is None or elapsed < best:
+                    best = elapsed
+
+            keys = [get_key(token) for token in tokens]
+
+            if expected is None:
+                expected = [get_key(token) for token in lexer.lex_file(path)] if jobs != 1 else keys
+                serial = best if jobs == 1 else None
+
+            if keys != expected:
+                print(f"-j{jobs}: tokens differ from the serial lexer!")
+                raise SystemExit(1)
+
+            speedup = f"{serial / best:.2f}x" if serial is not None else "n/a"
+            print(f"-j{jobs:<4} {best:8.3f} s   {len(tokens) / best:>12,.0f} tokens/s   speedup {speedup}")
+
+if __name__ == "__main__":
+    main()
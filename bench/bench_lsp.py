@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Language server latency benchmark
+# Opens a large synthetic document and measures how long the server takes to handle edits
+# (re-lexing, re-parsing and collecting diagnostics), hovers and go-to-definition requests.
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import lexer
+import lsp
+
+from generators import mixed_functions
+
+def measure(function, count: int) -> list:
+    times = []
+
+    for i in range(count):
+        start = time.perf_counter()
+        function(i)
+        times.append(time.perf_counter() - start)
+
+    return times
+
+def report(name: str, times: list):
+    ordered = sorted(times)
+    p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+
+    print(f"{name:<24} median {statistics.median(times) * 1000:>8.3f} ms   p95 {p95 * 1000:>8.3f} ms   max {max(times) * 1000:>8.3f} ms")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ImpLang language server latency benchmark")
+    arg_parser.add_argument("-l", "--lines", help="Size of the document in lines (default: 100000)", type=int, default=100000)
+    arg_parser.add_argument("-n", "--count", help="Number of operations of each kind (default: 200)", type=int, default=200)
+    arg_parser.add_argument("--check", help="Compare the incremental state with a fresh document after the edits", action="store_true")
+    args = arg_parser.parse_args()
+
+    random.seed(0)
+    text = mixed_functions(args.lines)
+
+    start = time.perf_counter()
+    document = lsp.Document("file:///bench.impl", text)
+    print(f"open: {len(document.lines)} lines, {len(document.chunks)} chunks in {time.perf_counter() - start:.3f} s")
+
+    # lines of the form '    return acc * 3 + n % 7' in the middle of the document
+    middle = len(document.lines) // 2
+    targets = [i for i in range(middle, middle + 2000) if document.lines[i].startswith("    return acc")]
+
+    def type_character(i):
+        line = targets[i % len(targets)]
+        column = len(document.lines[line])
+        document.apply_change((line, column), (line, column), " + 1")
+        document.get_diagnostics()
+
+    def insert_line(i):
+        line = targets[i % len(targets)]
+        document.apply_change((line, 0), (line, 0), "    acc += 1\n")
+        document.get_diagnostics()
+
+    def break_and_fix(i):
+        line = targets[i % len(targets)]
+        document.apply_change((line, 4), (line, 4), "}")
+        document.apply_change((line, 4), (line, 5), "")
+        document.get_diagnostics()
+
+    def hover(i):
+        line = targets[i % len(targets)]
+        document.resolve(line + 1, len("    return a") + 1)
+
+    def definition(i):
+        line = targets[i % len(targets)] - 2 # 'return f<prev>(acc + 1)'
+        document.resolve(line + 1, len("        return f") + 1)
+
+    report("type ' + 1'", measure(type_character, args.count))
+    report("insert a line", measure(insert_line, args.count))
+    report("break and fix a block", measure(break_and_fix, args.count))
+    report("hover", measure(hover, args.count))
+    report("definition", measure(definition, args.count))
+
+    start = time.perf_counter()
+    lsp.Document("file:///bench.impl", "\n".join(document.lines))
+    print(f"full re-analysis for comparison: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    if args.check:
+        fresh = lsp.Document("file:///bench.impl", "\n".join(document.lines))
+
+        incremental = [(t.kind, t.value, c.start_line + t.line - 1, t.column) for c in document.chunks for t in c.tokens]
+        expected = [(t.kind, t.value, t.line, t.column) for t in lexer.lex("\n".join(document.lines))]
+
+        if incremental != expected or sorted(document.get_diagnostics()) != sorted(fresh.get_diagnostics()):
+            print("incremental state differs from a fresh document!")
+            raise SystemExit(1)
+
+        print("incremental state matches a fresh document")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+# Memoization benchmark
+# Compiles ImpLang programs with '@memoize' functions and their plain versions (the attributes removed) and reports
+# the runtime of both. Small integer domains are cached in a table indexed by the arguments ('digits'), the others in
+# a hash cache ('replace' by default, 'lru' for 'partitions'). Both builds of a program have to give the same exit
+# code and output.
+
+import os
+import re
+import statistics
+import tempfile
+
+import harness
+
+HEADER = """@import_symbol atoi(str) -> i32
+@import_symbol strlen(str) -> u64
+"""
+
+PROGRAMS = {
+    # the recursion of every call repeats the previous ones, -O2 turns the plain one into a closed form
+    "sum_to": """
+@memoize
+func sum_to(n: u64) -> u64 {
+    if n == 0 {
+        return 0
+    }
+    return n + sum_to(n - 1)
+}
+
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < count {
+        total += sum_to(i % 1000)
+        i += 1
+    }
+    print_u64(total)
+    print("\\n")
+    return 0
+}
+""",
+    # exponential without the cache
+    "fib": """
+@memoize
+func fib(n: u64) -> u64 {
+    if n < 2 {
+        return n
+    }
+    return fib(n - 1) + fib(n - 2)
+}
+
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args) / 1000
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < count {
+        total += fib(20 + i % 8)
+        i += 1
+    }
+    print_u64(total)
+    print("\\n")
+    return 0
+}
+""",
+    # two arguments, more states than hash slots
+    "partitions": """
+@memoize "lru"
+func partitions(n: u64, k: u64) -> u64 {
+    if n == 0 {
+        return 1
+    }
+    if k == 0 {
+        return 0
+    }
+    if k > n {
+        return partitions(n, n)
+    }
+    return partitions(n, k - 1) + partitions(n - k, k)
+}
+
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args) / 10000
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < count {
+        total += partitions(50 + i % 10, 50 + i % 10)
+        i += 1
+    }
+    print_u64(total)
+    print("\\n")
+    return 0
+}
+""",
+    # a dispatcher that is cheap already (the plain build folds it into the loop), cached in a table of 256 entries
+    "digits": """
+@memoize
+func match_number_to_str(n: u8) -> str {
+    if n == 0 {
+        return "0"
+    } else if n == 1 {
+        return "1"
+    } else if n == 2 {
+        return "2"
+    } else if n == 3 {
+        return "3"
+    } else if n == 4 {
+        return "4"
+    } else if n == 5 {
+        return "5"
+    } else if n == 6 {
+        return "6"
+    } else if n == 7 {
+        return "7"
+    } else if n == 8 {
+        return "8"
+    }
+    return "9"
+}
+
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args) * 10
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < count {
+        total += strlen(match_number_to_str(i % 10))
+        i += 1
+    }
+    print_u64(total)
+    print("\\n")
+    return 0
+}
+"""
+}
+
+def remove_memoize(source: str) -> str:
+    return re.sub(r"^@memoize.*\n", "", source, flags=re.MULTILINE)
+
+def main():
+    arg_parser = harness.ArgumentParser("ImpLang memoization benchmark", flags=["-O2"])
+    arg_parser.add_argument("programs", help="Programs to run (default: all)", nargs="*")
+    arg_parser.add_argument("-n", "--count", help="Iterations of every program (default: 200000)", type=int, default=200_000)
+    args = arg_parser.parse_args()
+
+    widths = [12, 10, 12, 8]
+    harness.print_row(["program", "plain ms", "memoized ms", "speedup"], widths)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in args.programs or list(PROGRAMS):
+            results = {}
+            medians = []
+
+            for variant, source in [("plain", remove_memoize(PROGRAMS[name])), ("memoized", PROGRAMS[name])]:
+                binary = os.path.join(tmp_dir, f"{name}_{variant}")
+                harness.compile_program(harness.write_program(tmp_dir, f"{name}_{variant}", HEADER + source), binary, args.flags)
+
+                wall_times, _, exit_code, (output, _) = harness.run_program([binary, str(args.count)], args.repeat, output=True)
+                results[variant] = (exit_code, output)
+                medians.append(statistics.median(wall_times))
+
+            harness.check_same(results, f"'{name}'")
+            harness.print_row([name] + [harness.milliseconds(median) for median in medians] + [harness.speedup(*medians)], widths)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+# Peak memory benchmark
+# Compiles a large generated ImpLang program with and without -fstream and reports the peak RSS of the
+# compiler process, the object files have to be identical.
+
+import os
+import tempfile
+
+import harness
+from generators import mixed_functions
+
+def main():
+    arg_parser = harness.ArgumentParser("ImpLang compiler peak memory benchmark", repeat=None)
+    arg_parser.add_argument("-l", "--lines", help="Size of the generated program in lines (default: 100000)", type=int, default=100_000)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = harness.write_program(tmp_dir, "bench", mixed_functions(args.lines))
+
+        print(f"lines: {args.lines}")
+
+        objects = {}
+
+        for mode, flags in [("whole program", []), ("-fstream", ["-fstream"])]:
+            objects[mode] = os.path.join(tmp_dir, f"{len(objects)}.o")
+            elapsed, peak = harness.compile_program_peak_memory(path, objects[mode], ["-c"] + args.flags + flags)
+
+            print(f"{mode:<14} {elapsed:8.3f} s   peak RSS {peak / 1024 / 1024:8.1f} MiB")
+
+        with open(objects["whole program"], "rb") as a, open(objects["-fstream"], "rb") as b:
+            if a.read() != b.read():
+                print("-fstream: object file differs!")
+                raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
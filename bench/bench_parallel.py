@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+# Parallel loop and task benchmark
+# Compiles ImpLang programs with '@parallel' loops and 'spawn'/'join' and their sequential versions (the attribute
+# and 'join' removed, spawned calls made directly), runs the parallel builds with 1 to N threads ($IMPL_THREADS)
+# and reports the runtime and the speedup over the sequential build. All runs of a program have to give the same
+# exit code and output. The speedup is bounded by the number of CPUs, which is printed first.
+
+import os
+import re
+import statistics
+import tempfile
+
+import harness
+
+HEADER = """@import_symbol atoi(str) -> i32
+"""
+
+PROGRAMS = {
+    # independent iterations of uneven length, the first results are stored per element
+    "collatz": """
+var steps: [u64; 4096]
+
+func collatz_steps(start: u64) -> u64 {
+    var n: u64 = start
+    var count: u64 = 0
+    while n != 1 {
+        if n % 2 == 0 {
+            n /= 2
+        } else {
+            n = 3 * n + 1
+        }
+        count += 1
+    }
+    return count
+}
+
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var total: u64 = 0
+    var i: u64 = 1
+    @parallel
+    while i < count {
+        var length: u64 = collatz_steps(i)
+        if i < 4096 {
+            steps[i] = length
+        }
+        total += length
+        i += 1
+    }
+    print_u64(total)
+    print(" ")
+    print_u64(steps[27])
+    print("\\n")
+    return 0
+}
+""",
+    # float and integer reductions
+    "reduce": """
+func main(args: str) -> i8 {
+    var count: i64 = atoi(args) * 100
+    var total: f64 = 0.0
+    var checksum: i64 = 0
+    var all_below: bool = true
+    var i: i64 = 0
+    @parallel
+    while i < count {
+        var x: f64 = 0.0 + i % 1000
+        total += x * 0.5 + 1.0
+        checksum += i * i % 7
+        all_below &&= x < 1000.0
+        i += 1
+    }
+    print_f64(total, 1)
+    print(" ")
+    print_i64(checksum)
+    print("\\n")
+    if all_below {
+        return 1
+    }
+    return 0
+}
+""",
+    # recursive tasks, the small calls run directly
+    "fib": """
+func fib(n: u64) -> u64 {
+    if n < 2 {
+        return n
+    }
+    return fib(n - 1) + fib(n - 2)
+}
+
+func fib_tasks(n: u64) -> u64 {
+    if n < 25 {
+        return fib(n)
+    }
+    var a: u64 = 0
+    var b: u64 = 0
+    a = spawn fib_tasks(n - 1)
+    b = spawn fib_tasks(n - 2)
+    join
+    return a + b
+}
+
+func main(args: str) -> i8 {
+    var n: u64 = atoi(args)
+    print_u64(fib_tasks(n / 10000 + 15))
+    print("\\n")
+    return 0
+}
+"""
+}
+
+def make_sequential(source: str) -> str:
+    source = re.sub(r"^\s*@parallel\n", "", source, flags=re.MULTILINE)
+    source = re.sub(r"^\s*join\n", "", source, flags=re.MULTILINE)
+    return re.sub(r"\bspawn ", "", source)
+
+def main():
+    arg_parser = harness.ArgumentParser("ImpLang parallel loop and task benchmark", flags=["-O2"])
+    arg_parser.add_argument("programs", help="Programs to run (default: all)", nargs="*")
+    arg_parser.add_argument("-n", "--count", help="Iterations of every program (default: 200000)", type=int, default=200_000)
+    arg_parser.add_argument("-t", "--threads", help="Thread count to run with (can be repeated, default: 1 2 4 8)", type=int, action="append", default=None)
+    args = arg_parser.parse_args()
+
+    thread_counts = args.threads or [1, 2, 4, 8]
+    widths = [10, 14] + [10, 8] * len(thread_counts)
+
+    print(f"CPUs: {os.cpu_count()}")
+    harness.print_row(["program", "sequential ms"] + [cell for threads in thread_counts for cell in [f"{threads} thr ms", "speedup"]], widths)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in args.programs or list(PROGRAMS):
+            binaries = {}
+
+            for variant, source in [("sequential", make_sequential(PROGRAMS[name])), ("parallel", PROGRAMS[name])]:
+                binaries[variant] = os.path.join(tmp_dir, f"{name}_{variant}")
+                harness.compile_program(harness.write_program(tmp_dir, f"{name}_{variant}", HEADER + source), binaries[variant], args.flags)
+
+            wall_times, _, exit_code, (output, _) = harness.run_program([binaries["sequential"], str(args.count)], args.repeat, output=True)
+            sequential_seconds = statistics.median(wall_times)
+            results = {"sequential": (exit_code, output)}
+            cells = [name, harness.milliseconds(sequential_seconds)]
+
+            for threads in thread_counts:
+                wall_times, _, exit_code, (output, _) = harness.run_program([binaries["parallel"], str(args.count)], args.repeat, output=True, env={"IMPL_THREADS": str(threads)})
+                results[f"{threads} thread(s)"] = (exit_code, output)
+                cells += [harness.milliseconds(statistics.median(wall_times)), harness.speedup(sequential_seconds, statistics.median(wall_times))]
+
+            harness.check_same(results, f"'{name}'")
+            harness.print_row(cells, widths)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# Parser throughput benchmark
+# Generates a large ImpLang program and measures how long parser.parse takes on it
+# With -j, the function bodies are also parsed by worker processes, the AST has to be identical to the serial one.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+import lexer
+import parser
+
+from generators import mixed_functions
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ImpLang parser throughput benchmark")
+    arg_parser.add_argument("-l", "--lines", help="Size of the generated program in lines", type=int, default=100_000)
+    arg_parser.add_argument("-r", "--repeat", help="Number of timed runs (the best one is reported)", type=int, default=3)
+    arg_parser.add_argument("-j", "--jobs", help="Number of worker processes to compare the serial parser with (default: 1)", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bench.impl")
+
+        with open(path, "w") as f:
+            f.write(mixed_functions(args.lines))
+
+        tokens = lexer.lex_file(path)
+
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            program = parser.parse(path, tokens)
+            elapsed = time.perf_counter() - start
+
+            if best is None or elapsed < best:
+                best = elapsed
+
+        serialized = parser.dumps(program)
+
+        best_parallel = None
+        for _ in range(args.repeat if args.jobs > 1 else 0):
+            start = time.perf_counter()
+            program = parser.parse(path, tokens, jobs=args.jobs)
+            elapsed = time.perf_counter() - start
+
+            if best_parallel is None or elapsed < best_parallel:
+                best_parallel = elapsed
+
+            if parser.dumps(program) != serialized:
+                print(f"-j{args.jobs}: AST differs from the serial parser!")
+                raise SystemExit(1)
+
+        best_load = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            parser.loads(serialized)
+            elapsed = time.perf_counter() - start
+
+            if best_load is None or elapsed < best_load:
+                best_load = elapsed
+
+    print(f"lines: {args.lines}")
+    print(f"tokens: {len(tokens)}")
+    print(f"parse time: {best:.3f} s")
+    print(f"throughput: {args.lines / best:,.0f} lines/s, {len(tokens) / best:,.0f} tokens/s")
+
+    if best_parallel is not None:
+        print(f"parse time with -j{args.jobs}: {best_parallel:.3f} s, speedup {best / best_parallel:.2f}x (cores: {os.cpu_count()})")
+    print(f"serialized AST: {len(serialized):,} bytes, load time: {best_load:.3f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+# Standard runtime benchmark
+# Compiles pairs of ImpLang programs doing the same work, hand-rolled under '@no_std' (per-digit string concatenation,
+# a write(2) call per printed fragment) and with the standard runtime (formatting into buffers, buffered output),
+# and reports their runtime. Both programs of a pair have to give the same exit code and output.
+
+import os
+import statistics
+import tempfile
+
+import harness
+
+HAND_ROLLED_HEADER = """@no_std
+@import_symbol atoi(str) -> i32
+@import_symbol strlen(str) -> u64
+@import_symbol write(i32, str, u64) -> i64
+
+func print(text: str) {
+    write(1, text, strlen(text))
+}
+
+func digit_to_str(n: u64) -> str {
+    if n == 0 {
+        return "0"
+    } else if n == 1 {
+        return "1"
+    } else if n == 2 {
+        return "2"
+    } else if n == 3 {
+        return "3"
+    } else if n == 4 {
+        return "4"
+    } else if n == 5 {
+        return "5"
+    } else if n == 6 {
+        return "6"
+    } else if n == 7 {
+        return "7"
+    } else if n == 8 {
+        return "8"
+    } else {
+        return "9"
+    }
+}
+
+func u64_to_str(n: u64) -> str {
+    if n == 0 {
+        return "0"
+    }
+    var result: str = ""
+    var tmp: u64 = n
+    while tmp > 0 {
+        result = digit_to_str(tmp % 10) + result
+        tmp /= 10
+    }
+    return result
+}
+"""
+
+STD_HEADER = """@import_symbol atoi(str) -> i32
+"""
+
+PROGRAMS = {
+    # name: (hand-rolled main, standard runtime main), both get the count as argument
+    "format": ("""
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < count {
+        total += strlen(u64_to_str(i * 7919 + 1000000))
+        i += 1
+    }
+    return total % 256
+}
+""", """
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var buffer: [u8; 32]
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < count {
+        total += format_u64(buffer, i * 7919 + 1000000)
+        i += 1
+    }
+    return total % 256
+}
+"""),
+    "print_numbers": ("""
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var i: u64 = 0
+    while i < count {
+        print(u64_to_str(i * 7919))
+        print("\\n")
+        i += 1
+    }
+    return 0
+}
+""", """
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var i: u64 = 0
+    while i < count {
+        print_u64(i * 7919)
+        print("\\n")
+        i += 1
+    }
+    return 0
+}
+"""),
+    "print_strings": ("""
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var i: u64 = 0
+    while i < count {
+        print("key")
+        print(" = ")
+        print("value;")
+        i += 1
+    }
+    return 0
+}
+""", """
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var i: u64 = 0
+    while i < count {
+        print("key")
+        print(" = ")
+        print("value;")
+        i += 1
+    }
+    return 0
+}
+""")
+}
+
+def main():
+    arg_parser = harness.ArgumentParser("ImpLang standard runtime benchmark", flags=["-O2"])
+    arg_parser.add_argument("programs", help="Programs to run (default: all)", nargs="*")
+    arg_parser.add_argument("-n", "--count", help="Iterations of every program (default: 200000)", type=int, default=200_000)
+    args = arg_parser.parse_args()
+
+    widths = [16, 15, 10, 8]
+    harness.print_row(["program", "hand-rolled ms", "std ms", "speedup"], widths)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in args.programs or list(PROGRAMS):
+            results = {}
+            medians = []
+
+            for variant, source in [("hand", HAND_ROLLED_HEADER + PROGRAMS[name][0]), ("std", STD_HEADER + PROGRAMS[name][1])]:
+                binary = os.path.join(tmp_dir, f"{name}_{variant}")
+                harness.compile_program(harness.write_program(tmp_dir, f"{name}_{variant}", source), binary, args.flags)
+
+                # the output goes through a pipe, as it would to another program
+                wall_times, _, exit_code, output = harness.run_program([binary, str(args.count)], args.repeat, output=True)
+                results[variant] = (exit_code, output)
+                medians.append(statistics.median(wall_times))
+
+            harness.check_same(results, f"'{name}'")
+            harness.print_row([name, harness.milliseconds(medians[0]), harness.milliseconds(medians[1]), harness.speedup(*medians)], widths)
+
+if __name__ == "__main__":
+    main()
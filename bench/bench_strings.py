@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+# String allocation benchmark
+# Compiles string-building ImpLang programs with and without -fno-string-arena and reports the number of malloc
+# calls (counted by a malloc linked into the program) and the runtime. Concatenations that don't escape their
+# function are allocated in its arena (see src/escape.py), the escaping ones on the heap in both builds.
+# Both builds of a program have to give the same exit code and output. The arguments of the measured calls vary,
+# calls with constant arguments are evaluated at compile time (see src/comptime.py).
+
+import os
+import statistics
+import subprocess
+import tempfile
+
+import harness
+
+# counts the calls to malloc, reported on stderr at exit
+MALLOC_COUNTER = """#include <stddef.h>
+#include <stdio.h>
+
+extern void *__libc_malloc(size_t size);
+
+static unsigned long long malloc_calls;
+
+void *malloc(size_t size) {
+    malloc_calls++;
+    return __libc_malloc(size);
+}
+
+__attribute__((destructor)) static void report(void) {
+    fprintf(stderr, "malloc calls: %llu\\n", malloc_calls);
+}
+"""
+
+HEADER = """@import_symbol atoi(str) -> i32
+@import_symbol strlen(str) -> u64
+@import_symbol strcmp(str, str) -> i32
+
+func digit(n: u64) -> str {
+    if n == 0 {
+        return "0"
+    } else if n == 1 {
+        return "1"
+    } else if n == 2 {
+        return "2"
+    } else if n == 3 {
+        return "3"
+    } else if n == 4 {
+        return "4"
+    } else if n == 5 {
+        return "5"
+    } else if n == 6 {
+        return "6"
+    } else if n == 7 {
+        return "7"
+    } else if n == 8 {
+        return "8"
+    }
+    return "9"
+}
+"""
+
+PROGRAMS = {
+    # temporaries of a message, only measured and printed
+    "message": """
+func log_line(i: u64, name: str) -> u64 {
+    var line: str = "[" + digit(i % 10) + "] " + name + ": item " + digit(i / 10 % 10) + digit(i % 10) + "\\n"
+    if i % 10000 == 0 {
+        print(line)
+    }
+    return strlen(line)
+}
+
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < count {
+        total += log_line(i, "worker")
+        i += 1
+    }
+    return total % 256
+}
+""",
+    # keys built in a loop and compared, the key variable is reassigned every iteration
+    "compare": """
+func count_matches(n: u64, wanted: str) -> u64 {
+    var matches: u64 = 0
+    var i: u64 = 0
+    while i < n {
+        var key: str = "user." + digit(i % 7) + "." + digit(i % 3)
+        if key == wanted {
+            matches += 1
+        }
+        i += 1
+    }
+    return matches
+}
+
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < count / 100 {
+        total += count_matches(100 + i % 2, "user.3.1")
+        i += 1
+    }
+    return total % 256
+}
+""",
+    # the result is returned, so the analysis has to keep it on the heap
+    "build": """
+func build(count: u64) -> str {
+    var result: str = ""
+    var i: u64 = 0
+    while i < count {
+        result = result + digit(i % 10)
+        i += 1
+    }
+    return result
+}
+
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < count / 100 {
+        total += strlen(build(100 + i % 2))
+        i += 1
+    }
+    return total % 256
+}
+"""
+}
+
+def main():
+    arg_parser = harness.ArgumentParser("ImpLang string allocation benchmark", flags=["-O2"])
+    arg_parser.add_argument("programs", help="Programs to run (default: all)", nargs="*")
+    arg_parser.add_argument("-n", "--count", help="Iterations of every program (default: 200000)", type=int, default=200_000)
+    args = arg_parser.parse_args()
+
+    widths = [10, 13, 14, 9, 9, 8]
+    harness.print_row(["program", "heap mallocs", "arena mallocs", "heap ms", "arena ms", "speedup"], widths)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        counter = os.path.join(tmp_dir, "malloc_counter.o")
+        subprocess.run(["cc", "-O2", "-x", "c", "-c", "-", "-o", counter], input=MALLOC_COUNTER, text=True, check=True)
+
+        for name in args.programs or list(PROGRAMS):
+            path = harness.write_program(tmp_dir, name, HEADER + PROGRAMS[name])
+            results = {}
+            medians = []
+            mallocs = []
+
+            for variant, variant_flags in [("heap", ["-fno-string-arena"]), ("arena", [])]:
+                binary = os.path.join(tmp_dir, f"{name}_{variant}")
+                harness.compile_program([path, counter], binary, args.flags + variant_flags)
+
+                wall_times, _, exit_code, (stdout, stderr) = harness.run_program([binary, str(args.count)], args.repeat, output=True)
+                results[variant] = (exit_code, stdout)
+                medians.append(statistics.median(wall_times))
+                mallocs.append(int(stderr.rsplit(b"malloc calls:", 1)[1]))
+
+            harness.check_same(results, f"'{name}'")
+            harness.print_row([name] + mallocs + [harness.milliseconds(median) for median in medians] + [harness.speedup(*medians)], widths)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+# Dispatch runtime benchmark
+# Compiles 'else if' dispatch chains with and without switch/lookup table lowering and times the binaries, both builds have
+# to give the same exit code
+
+import os
+import tempfile
+
+import harness
+
+def generate_program(arms: int, iterations: int) -> str:
+    lines = []
+
+    # every arm returns a constant: lowered to a lookup table
+    lines.append("func lookup(n: u64) -> u64 {")
+    lines.append("    if n == 0 {")
+    lines.append("        return 17")
+    for i in range(1, arms):
+        lines.append(f"    }} else if n == {i} {{")
+        lines.append(f"        return {(i * 7919) % 1009}")
+    lines.append("    } else {")
+    lines.append("        return 1")
+    lines.append("    }")
+    lines.append("}")
+    lines.append("")
+
+    # arms with side effects: lowered to a switch
+    lines.append("func dispatch(n: u64, acc: u64) -> u64 {")
+    lines.append("    var r: u64 = acc")
+    lines.append("    if n == 0 {")
+    lines.append("        r += 1")
+    for i in range(1, arms):
+        lines.append(f"    }} else if n == {i} {{")
+        lines.append(f"        r += {i} * r % 13")
+    lines.append("    } else {")
+    lines.append("        r += 2")
+    lines.append("    }")
+    lines.append("    return r % 1000003")
+    lines.append("}")
+    lines.append("")
+
+    lines.append("func main() -> i8 {")
+    lines.append("    var i: u64 = 0")
+    lines.append("    var acc: u64 = 1")
+    lines.append(f"    while i < {iterations} {{")
+    lines.append(f"        acc = dispatch(lookup(i % {arms + 1}) % {arms + 1}, acc)")
+    lines.append("        i += 1")
+    lines.append("    }")
+    lines.append("    return acc % 100")
+    lines.append("}")
+
+    return "\n".join(lines) + "\n"
+
+def main():
+    arg_parser = harness.ArgumentParser("ImpLang dispatch runtime benchmark")
+    arg_parser.add_argument("-a", "--arms", help="Number of arms in each dispatch chain", type=int, default=64)
+    arg_parser.add_argument("-n", "--iterations", help="Number of dispatches performed by the program", type=int, default=5_000_000)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = harness.write_program(tmp_dir, "dispatch", generate_program(args.arms, args.iterations))
+
+        print(f"arms: {args.arms}, iterations: {args.iterations}")
+
+        for opt_level in [0, 2]:
+            best = {}
+            results = {}
+
+            for name, flags in [("compare chain", ["-fno-switch-tables"]), ("switch/table", [])]:
+                binary = os.path.join(tmp_dir, f"dispatch-O{opt_level}-{len(best)}")
+                harness.compile_program(source, binary, ["-O", str(opt_level)] + flags + args.flags)
+
+                wall_times, _, results[name], _ = harness.run_program([binary], args.repeat)
+                best[name] = min(wall_times)
+
+            harness.check_same(results, f"The dispatch program at -O{opt_level}")
+            print(f"-O{opt_level}: compare chain {best['compare chain']:.3f} s, switch/table {best['switch/table']:.3f} s, speedup {harness.speedup(best['compare chain'], best['switch/table'])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# Synthetic ImpLang program generators used by the benchmarks
+# Every generator takes a single size parameter and returns the program source
+
+MIXED_FUNCTION_TEMPLATE = """func f{i}(n: u64) -> u64 {{
+    var acc: u64 = n
+    while acc > 100 {{
+        acc /= 2
+    }}
+    if acc == 0 {{
+        return 1
+    }} else if acc == 1 {{
+        return f{prev}(acc + 1)
+    }}
+    return acc * 3 + n % 7
+}}
+
+"""
+
+def mixed_functions(lines: int) -> str:
+    """Functions with loops, branches and calls to the previous function, about 'lines' lines in total"""
+    chunks = ["@no_std\n\n"]
+    line_count = 2
+    i = 0
+
+    while line_count < lines:
+        chunks.append(MIXED_FUNCTION_TEMPLATE.format(i=i, prev=max(i - 1, 0)))
+        line_count += MIXED_FUNCTION_TEMPLATE.count("\n")
+        i += 1
+
+    return "".join(chunks)
+
+def many_functions(count: int) -> str:
+    """'count' small independent functions"""
+    chunks = []
+
+    for i in range(count):
+        chunks.append(f"func f{i}(a: u64, b: u64) -> u64 {{\n    return a * {i} + b\n}}\n\n")
+
+    return "".join(chunks)
+
+def deep_nesting(depth: int) -> str:
+    """A single function with 'depth' nested while loops"""
+    lines = ["func nested(n: u64) -> u64 {", "    var acc: u64 = 0"]
+
+    for level in range(depth):
+        indent = "    " * (level + 1)
+        lines.append(f"{indent}var i{level}: u64 = 0")
+        lines.append(f"{indent}while i{level} < n {{")
+
+    indent = "    " * (depth + 1)
+    lines.append(f"{indent}acc += 1")
+
+    for level in range(depth - 1, -1, -1):
+        indent = "    " * (level + 2)
+        lines.append(f"{indent}i{level} += 1")
+        lines.append("    " * (level + 1) + "}")
+
+    lines.append("    return acc")
+    lines.append("}")
+
+    return "\n".join(lines) + "\n"
+
+def long_expressions(terms: int) -> str:
+    """Functions returning arithmetic expressions with 'terms' operands"""
+    operators = ["+", "*", "-", "%", "/"]
+    chunks = []
+
+    for i in range(10):
+        operands = ["a" if k % 2 == 0 else str(k + 1) for k in range(terms - 1)] + ["b"]
+        expression = operands[0] + "".join(f" {operators[k % len(operators)]} {operand}" for k, operand in enumerate(operands[1:]))
+        chunks.append(f"func e{i}(a: u64, b: u64) -> u64 {{\n    return {expression}\n}}\n\n")
+
+    return "".join(chunks)
+
+def forward_calls(count: int) -> str:
+    """'count' functions, each calling the one defined after it"""
+    chunks = []
+
+    for i in range(count):
+        chunks.append(f"func c{i}(n: u64) -> u64 {{\n    if n == 0 {{\n        return 0\n    }}\n    return c{i + 1}(n - 1) + 1\n}}\n\n")
+
+    chunks.append(f"func c{count}(n: u64) -> u64 {{\n    return n\n}}\n")
+
+    return "".join(chunks)
+
+def big_strings(size: int) -> str:
+    """Functions returning string literals of 'size' characters"""
+    chunks = []
+
+    for i in range(10):
+        text = ("lorem ipsum dolor sit amet " * (size // 27 + 1))[:size]
+        chunks.append(f"func s{i}() -> str {{\n    return \"{text}\"\n}}\n\n")
+
+    return "".join(chunks)
+
+def many_globals(count: int) -> str:
+    """'count' global variables and a function reading some of them"""
+    chunks = [f"var g{i}: u64 = {i}\n" for i in range(count)]
+
+    chunks.append("\nfunc sum_globals() -> u64 {\n    var total: u64 = 0\n")
+
+    for i in range(0, count, max(count // 100, 1)):
+        chunks.append(f"    total += g{i}\n")
+
+    chunks.append("    return total\n}\n")
+
+    return "".join(chunks)
+
+COMMENTED_FUNCTION_TEMPLATE = """/* f{i}: a block comment over several lines,
+   with "quotes" and // slashes
+*/
+func f{i}(n: u64) -> str {{
+    // returns a string that looks like a comment
+    if n > {i} {{
+        return "/* not a comment {i} */"
+    }}
+    return "x"
+}}
+
+"""
+
+def commented_functions(lines: int) -> str:
+    """Functions with block comments spanning lines and strings containing comment markers, about 'lines' lines in total"""
+    chunks = []
+    line_count = 0
+    i = 0
+
+    while line_count < lines:
+        chunks.append(COMMENTED_FUNCTION_TEMPLATE.format(i=i))
+        line_count += COMMENTED_FUNCTION_TEMPLATE.count("\n")
+        i += 1
+
+    return "".join(chunks)
+
+GENERATORS = {
+    # name: (generator, sizes for the scaling series)
+    "mixed_functions": (mixed_functions, [1000, 2000, 4000, 8000]),
+    "many_functions": (many_functions, [250, 500, 1000, 2000]),
+    "deep_nesting": (deep_nesting, [10, 20, 40, 80]),
+    "long_expressions": (long_expressions, [50, 100, 200, 400]),
+    "forward_calls": (forward_calls, [100, 200, 400, 800]),
+    "big_strings": (big_strings, [1000, 4000, 16000, 64000]),
+    "many_globals": (many_globals, [250, 500, 1000, 2000])
+}
@@ -0,0 +1,128 @@
+# Shared code of the benchmarks compiling and running ImpLang programs
+# A benchmark generates its programs and picks the builds to compare, this module compiles them with impc, runs and
+# times the binaries and prints the report tables.
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.join(HERE, "..")
+IMPC = os.path.join(ROOT, "src", "main.py")
+
+class ArgumentParser(argparse.ArgumentParser):
+    """Argument parser with the options every benchmark has, -r/--repeat (unless 'repeat' is None) and -f/--flags,
+    the extra compiler flags ('flags' when none are given)"""
+    def __init__(self, description: str, repeat: int = 5, flags: list = None):
+        super().__init__(description=description)
+        self.default_flags = flags or []
+
+        if repeat is not None:
+            self.add_argument("-r", "--repeat", help=f"Timed runs per build (default: {repeat})", type=int, default=repeat)
+
+        self.add_argument("-f", "--flags", help=f"Extra compiler flag (can be repeated, default: {' '.join(self.default_flags) or 'none'})", action="append", default=None)
+
+    def parse_args(self, *args, **kwargs) -> argparse.Namespace:
+        arguments = super().parse_args(*args, **kwargs)
+
+        if arguments.flags is None:
+            arguments.flags = list(self.default_flags)
+
+        return arguments
+
+def write_program(directory: str, name: str, source: str) -> str:
+    """Writes 'source' to '<name>.impl' in 'directory', returns its path"""
+    path = os.path.join(directory, f"{name}.impl")
+
+    with open(path, "w") as f:
+        f.write(source)
+
+    return path
+
+def compile_program(sources, output: str, flags: list = None) -> float:
+    """Compiles the source file or files to 'output' (an object file with '-c' in the flags), returns the compile time
+    in seconds. The compiler's errors are printed and the benchmark exits when it fails"""
+    start = time.perf_counter()
+    run_compiler([], sources, output, flags)
+
+    return time.perf_counter() - start
+
+def compile_program_peak_memory(sources, output: str, flags: list = None) -> tuple:
+    """Same as compile_program, returns (seconds, peak RSS of the compiler in bytes)"""
+    # the compiler runs in a child process of its own, the peak RSS of the children is over all of them
+    code = (
+        "import resource, subprocess, sys\n"
+        "result = subprocess.run(sys.argv[1:])\n"
+        "print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)\n"
+        "sys.exit(result.returncode)\n"
+    )
+
+    start = time.perf_counter()
+    result = run_compiler([sys.executable, "-c", code], sources, output, flags)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    return elapsed, int(result.stdout.strip()) * 1024
+
+def run_compiler(prefix: list, sources, output: str, flags: list) -> subprocess.CompletedProcess:
+    if isinstance(sources, str):
+        sources = [sources]
+
+    result = subprocess.run(prefix + [sys.executable, IMPC] + sources + ["-o", output] + (flags or []), capture_output=True, text=True)
+
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        raise SystemExit(f"Failed to compile {' '.join(sources)} with flags {flags or []}")
+
+    return result
+
+def run_once(command: list, output: bool = False, env: dict = None) -> tuple:
+    """Returns (wall seconds, cpu seconds, exit code, output), with 'output' the output is (stdout, stderr) through
+    pipes, otherwise stdout is discarded and the output is None. 'env' is added to the environment"""
+    env = dict(os.environ, **(env or {}))
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+
+    if output:
+        result = subprocess.run(command, capture_output=True, env=env)
+    else:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, env=env)
+
+    wall = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return wall, cpu, result.returncode, (result.stdout, result.stderr) if output else None
+
+def run_program(command: list, repeat: int, warmup: int = 0, output: bool = False, env: dict = None) -> tuple:
+    """Runs 'command' 'warmup' times untimed, then 'repeat' times, returns (wall seconds per run, cpu seconds per run,
+    exit code, output). The benchmark exits when the runs do not all give the same exit code and output"""
+    for _ in range(warmup):
+        run_once(command, output, env)
+
+    runs = [run_once(command, output, env) for _ in range(repeat)]
+    results = {(exit_code, streams) for _, _, exit_code, streams in runs}
+
+    if len(results) != 1:
+        raise SystemExit(f"'{os.path.basename(command[0])}' is not deterministic (exit codes {sorted({exit_code for exit_code, _ in results})})")
+
+    exit_code, streams = results.pop()
+    return [wall for wall, _, _, _ in runs], [cpu for _, cpu, _, _ in runs], exit_code, streams
+
+def check_same(results: dict, description: str):
+    """Exits when the builds (the keys of 'results') do not all give the same result, 'description' names what is compared"""
+    if len(set(results.values())) > 1:
+        raise SystemExit(f"{description} gives different results with different builds ({', '.join(map(str, results))})")
+
+def print_row(cells: list, widths: list):
+    """Prints a row of a report table, the first cell left aligned and the others right aligned"""
+    print(" ".join(f"{cell:<{width}}" if i == 0 else f"{cell:>{width}}" for i, (cell, width) in enumerate(zip(cells, widths))))
+
+def milliseconds(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}"
+
+def speedup(before: float, after: float) -> str:
+    return f"{before / after:.2f}x"
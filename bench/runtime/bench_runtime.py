@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+# Runtime benchmark harness
+# Compiles every kernel in bench/runtime/kernels at each optimization level, runs the binaries
+# with warmup and reports median/p95 runtime (and retired instructions when 'perf' is available).
+#
+#   bench/runtime/bench_runtime.py run -o runtime.json          run all kernels
+#   bench/runtime/bench_runtime.py compare old.json new.json    report regressions between two runs
+#   bench/runtime/bench_runtime.py run -f=-flto -o lto.json     pass extra flags to the compiler
+#   bench/runtime/bench_runtime.py run --pgo -o pgo.json        profile-guided builds, compare with a plain run
+#   bench/runtime/bench_runtime.py run -f=-march=native        use the vector extensions of the host CPU
+#   bench/runtime/bench_runtime.py run -f=--codegen-units=4   split the kernels into parallel codegen units
+#
+# The first line of every kernel is '// args: <argument>', the argument passed to the binary.
+# Kernels report their result through the exit code, which must not depend on the optimization level.
+# A kernel can also be a directory of modules compiled together, main.impl (with the arguments) last.
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+ROOT = os.path.join(HERE, "..", "..")
+
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+import defs
+import harness
+
+RESULTS_FORMAT_VERSION = 1
+OPT_LEVELS = [0, 1, 2, 3]
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def get_kernel_sources(path: str) -> list:
+    if not os.path.isdir(path):
+        return [path]
+
+    # modules have to be given before the ones importing them
+    sources = sorted(glob.glob(os.path.join(path, "*.impl")))
+    main = os.path.join(path, "main.impl")
+
+    if main not in sources:
+        raise SystemExit(f"Kernel directory '{path}' has no main.impl")
+
+    sources.remove(main)
+    return sources + [main]
+
+def get_kernel_argument(path: str) -> str:
+    with open(get_kernel_sources(path)[-1]) as f:
+        first_line = f.readline().strip()
+
+    if not first_line.startswith("// args:"):
+        raise SystemExit(f"Kernel '{path}' does not start with '// args: <argument>'")
+
+    return first_line[len("// args:"):].strip()
+
+def compile_kernel(path: str, binary: str, opt_level: int, extra_flags: list, pgo: bool) -> float:
+    # returns the compile time of the final binary
+    flags = ["-O", str(opt_level)] + extra_flags
+
+    if not pgo:
+        return harness.compile_program(get_kernel_sources(path), binary, flags)
+
+    # train an instrumented build on the kernel's own argument
+    profile_file = binary + ".impprof"
+
+    if os.path.exists(profile_file):
+        os.remove(profile_file) # profiles are appended to
+
+    harness.compile_program(get_kernel_sources(path), binary + "-instr", flags + ["-fprofile-instr"])
+    subprocess.run([binary + "-instr", get_kernel_argument(path)], stdout=subprocess.DEVNULL, env=dict(os.environ, IMPL_PROFILE_FILE=profile_file))
+
+    return harness.compile_program(get_kernel_sources(path), binary, flags + [f"-fprofile-use={profile_file}"])
+
+def count_instructions(command: list) -> int:
+    if shutil.which("perf") is None:
+        return None
+
+    result = subprocess.run(["perf", "stat", "-x", ",", "-e", "instructions:u"] + command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+    for line in result.stderr.splitlines():
+        fields = line.split(",")
+
+        if len(fields) > 2 and fields[2].startswith("instructions") and fields[0].isdigit():
+            return int(fields[0])
+
+    return None
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+
+    return ordered[index]
+
+def benchmark_kernel(path: str, opt_level: int, args, tmp_dir: str) -> dict:
+    name = os.path.splitext(os.path.basename(path))[0]
+    binary = os.path.join(tmp_dir, f"{name}-O{opt_level}")
+    command = [binary, get_kernel_argument(path)]
+
+    compile_seconds = compile_kernel(path, binary, opt_level, args.flags, args.pgo)
+    wall_times, cpu_times, exit_code, _ = harness.run_program(command, args.repeat, args.warmup)
+
+    return {
+        "median_seconds": statistics.median(wall_times),
+        "p95_seconds": percentile(wall_times, 0.95),
+        "min_seconds": min(wall_times),
+        "cpu_median_seconds": statistics.median(cpu_times),
+        "instructions": count_instructions(command),
+        "exit_code": exit_code,
+        "binary_size": os.path.getsize(binary),
+        "compile_seconds": compile_seconds
+    }
+
+def run(args):
+    kernels = sorted(glob.glob(os.path.join(HERE, "kernels", "*.impl")) + glob.glob(os.path.join(HERE, "kernels", "*", "")))
+    kernels = [os.path.normpath(k) for k in kernels]
+
+    if args.kernels:
+        kernels = [k for k in kernels if os.path.splitext(os.path.basename(k))[0] in args.kernels]
+
+    opt_levels = args.opt_levels or OPT_LEVELS
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for path in kernels:
+            name = os.path.splitext(os.path.basename(path))[0]
+            results[name] = {}
+
+            for opt_level in opt_levels:
+                entry = benchmark_kernel(path, opt_level, args, tmp_dir)
+                results[name][f"O{opt_level}"] = entry
+
+                print(f"  {name} -O{opt_level}: median {entry['median_seconds'] * 1000:.1f} ms, p95 {entry['p95_seconds'] * 1000:.1f} ms", file=sys.stderr)
+
+            if len({entry["exit_code"] for entry in results[name].values()}) != 1:
+                raise SystemExit(f"Kernel '{name}' gives different results at different optimization levels")
+
+    report = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "compiler_version": defs.COMPILER_VERSION,
+        "commit": get_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "machine": platform.machine(),
+        "flags": args.flags,
+        "pgo": args.pgo,
+        "warmup": args.warmup,
+        "repeat": args.repeat,
+        "results": results
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_summary(report)
+    print(f"Results written to '{args.output}'", file=sys.stderr)
+
+def print_summary(report: dict):
+    print(f"{'kernel':<16} {'level':<6} {'median ms':>10} {'p95 ms':>10} {'instructions':>14} {'size':>8}")
+
+    for name, levels in report["results"].items():
+        for level, entry in levels.items():
+            instructions = f"{entry['instructions']:,}" if entry["instructions"] is not None else "n/a"
+            print(f"{name:<16} {level:<6} {entry['median_seconds'] * 1000:>10.1f} {entry['p95_seconds'] * 1000:>10.1f} {instructions:>14} {entry['binary_size']:>8}")
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)
+
+    with open(args.new) as f:
+        new = json.load(f)
+
+    for report in [old, new]:
+        if report.get("format_version") != RESULTS_FORMAT_VERSION:
+            raise SystemExit(f"Unsupported results format version {report.get('format_version')}")
+
+    regressions = 0
+
+    print(f"old: {old['compiler_version']} {old['commit']} ({old['timestamp']})")
+    print(f"new: {new['compiler_version']} {new['commit']} ({new['timestamp']})")
+    print(f"{'kernel':<16} {'level':<6} {'old ms':>10} {'new ms':>10} {'change':>8}")
+
+    for name, levels in new["results"].items():
+        for level, entry in levels.items():
+            old_entry = old["results"].get(name, {}).get(level)
+
+            if old_entry is None:
+                continue
+
+            if old_entry["exit_code"] != entry["exit_code"]:
+                print(f"{name:<16} {level:<6} result changed ({old_entry['exit_code']} -> {entry['exit_code']})  REGRESSION")
+                regressions += 1
+                continue
+
+            change = entry["median_seconds"] / old_entry["median_seconds"] - 1
+            marker = ""
+
+            if change > args.threshold:
+                marker = "  REGRESSION"
+                regressions += 1
+
+            print(f"{name:<16} {level:<6} {old_entry['median_seconds'] * 1000:>10.1f} {entry['median_seconds'] * 1000:>10.1f} {change:>+7.1%}{marker}")
+
+    if regressions > 0:
+        print(f"{regressions} regression(s) above {args.threshold:.0%}")
+        raise SystemExit(1)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ImpLang runtime benchmark harness")
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Compile and run the kernels")
+    run_parser.add_argument("kernels", help="Kernels to run (default: all)", nargs="*")
+    run_parser.add_argument("-o", "--output", help="JSON file to write the results to", default="runtime_results.json")
+    run_parser.add_argument("-O", "--opt-levels", help="Optimization levels to benchmark (default: all)", type=int, choices=OPT_LEVELS, action="append")
+    run_parser.add_argument("-w", "--warmup", help="Untimed runs before measuring", type=int, default=2)
+    run_parser.add_argument("-r", "--repeat", help="Timed runs per kernel and level", type=int, default=10)
+    run_parser.add_argument("-f", "--flags", help="Extra compiler flag (can be repeated)", action="append", default=[])
+    run_parser.add_argument("--pgo", help="Build with -fprofile-use, after a training run of an -fprofile-instr build", action="store_true")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("old", help="Baseline results")
+    compare_parser.add_argument("new", help="New results")
+    compare_parser.add_argument("-t", "--threshold", help="Relative slowdown reported as regression (default: 0.05)", type=float, default=0.05)
+
+    args = arg_parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,2647 @@
+import itertools
+import multiprocessing
+import os
+import re
+import subprocess
+import tempfile
+
 from llvmlite import ir
+from llvmlite import binding as llvm
 
+import defs
+import escape
+import implang_types
+import lexer
 import logger
+import mir
 import parser
+import profiling
+import runtime
+import semantic
 
-def codegen(input_files: list[str], ast: list[parser.Program], output_file: str, verbose: bool = False):
-    if verbose:
-        logger.compiler_debug("Codegen started")
+INT = ir.IntType(64)
+FLOAT = ir.DoubleType()
+BOOL = ir.IntType(1)
+CHAR = ir.IntType(8)
+STR = ir.IntType(8).as_pointer()
+VOID = ir.VoidType()
+
+C_INT = ir.IntType(32)
+
+IR_TYPES = {
+    # signedness is not part of LLVM integer types, it selects the instructions (see semantic.py)
+    "u8": ir.IntType(8),
+    "u16": ir.IntType(16),
+    "u32": ir.IntType(32),
+    "u64": INT,
+    "i8": ir.IntType(8),
+    "i16": ir.IntType(16),
+    "i32": ir.IntType(32),
+    "i64": INT,
+    "f32": ir.FloatType(),
+    "f64": FLOAT,
+    "bool": BOOL,
+    "char": CHAR,
+    "str": STR
+}
+
+SWITCH_MIN_CASES = 3 # shorter chains are cheaper as plain compare-and-branch
+LOOKUP_TABLE_MAX_SIZE = 4096 # maximum number of entries in a constant lookup table
+LOOKUP_TABLE_MIN_DENSITY = 0.4 # minimum ratio of cases to table entries
+PROFILE_MIN_BRANCH_BIAS = 2 / 3 # share of the more frequent side needed to give a branch weights
+ARENA_CHUNK_SIZE = 64 << 10 # bytes malloc'ed at once for the string arena, see get_arena_alloc_helper
+ARENA_HEADER_SIZE = 16 # previous chunk and its end, at the start of every arena chunk
+MEMOIZE_CACHE_BITS = 10 # a '@memoize' hash cache has 2^bits slots, see define_memoized
+MEMOIZE_TABLE_MAX_SIZE = 4096 # maximum number of entries of a '@memoize' table indexed by the arguments
+MEMOIZE_HASH_MULTIPLIER = 0x9E3779B97F4A7C15 # 2^64 / golden ratio, spreads the arguments over the top bits
+
+DWARF_VERSION = 5
+DEBUG_METADATA_VERSION = 3
+
+DWARF_ENCODINGS = {
+    "FLOAT": "DW_ATE_float",
+    "BOOLEAN": "DW_ATE_boolean",
+    "CHAR": "DW_ATE_unsigned_char"
+}
+
+INT_BINARY_OPERATIONS = {
+    # signed integers, the unsigned ones use UNSIGNED_BINARY_OPERATIONS where they differ
+    "PLUS": "add",
+    "MINUS": "sub",
+    "MULTIPLY": "mul",
+    "DIVIDE": "sdiv",
+    "MODULO": "srem",
+    "BITWISE_AND": "and_",
+    "BITWISE_OR": "or_",
+    "BITWISE_XOR": "xor",
+    "BITWISE_LEFT_SHIFT": "shl",
+    "BITWISE_RIGHT_SHIFT": "ashr"
+}
+
+UNSIGNED_BINARY_OPERATIONS = {
+    "DIVIDE": "udiv",
+    "MODULO": "urem",
+    "BITWISE_RIGHT_SHIFT": "lshr"
+}
+
+FLOAT_BINARY_OPERATIONS = {
+    "PLUS": "fadd",
+    "MINUS": "fsub",
+    "MULTIPLY": "fmul",
+    "DIVIDE": "fdiv",
+    "MODULO": "frem"
+}
+
+COMPARISON_OPERATIONS = {
+    "EQUALS": "==",
+    "NOT_EQUALS": "!=",
+    "GREATER_THAN": ">",
+    "LESS_THAN": "<",
+    "GREATER_THAN_OR_EQUAL": ">=",
+    "LESS_THAN_OR_EQUAL": "<="
+}
+
+MIR_OPERATIONS = {opcode: operation for operation, opcode in mir.OPERATIONS.items()} # opcode -> operation of gen_arithmetic
+
+class CodegenError(Exception):
+    """An error that occured during code generation"""
+    def __init__(self, token, message: str):
+        self.token = token
+        self.message = message
+
+class CodegenOptions:
+    def __init__(self, opt_level: int = 0, compile_only: bool = False, assembly: bool = False, switch_tables: bool = True, lto: bool = False, debug_info: bool = False, profile_instr: bool = False, profile: dict = None, cpu: str = None, units: int = 1, string_arena: bool = True, mir: bool = False, emit_mir: bool = False):
+        self.opt_level = opt_level
+        self.compile_only = compile_only # emit object file, do not link
+        self.assembly = assembly # emit assembly, do not link
+        self.switch_tables = switch_tables # lower 'else if' equality chains to switches and lookup tables
+        self.lto = lto # link the modules of all inputs before optimizing, see link_modules
+        self.debug_info = debug_info # emit DWARF line tables, see DebugInfo
+        self.profile_instr = profile_instr # count executions of the profiling sites, see profiling.collect_sites
+        self.profile = profile # profiling.read_profile of a previous run, guides the optimizations (-fprofile-use)
+        self.cpu = cpu # target CPU (-march), "native" for the host, None for the generic CPU of the target, see create_target_machine
+        self.units = units # codegen units per input, optimized and emitted in parallel, see split_module
+        self.string_arena = string_arena # allocate the strings that don't escape their function in its arena, see escape.py
+        self.mir = mir # lower the functions through their SSA form with the passes of mir.py (-fmir)
+        self.emit_mir = emit_mir # write the MIR of the inputs instead of compiling them
+
+def get_ir_type(type_name: str, token = None) -> ir.Type:
+    if type_name is None:
+        return VOID
+
+    if implang_types.is_array(type_name):
+        return ir.ArrayType(get_ir_type(implang_types.get_element_type(type_name), token), implang_types.get_array_length(type_name))
+
+    if implang_types.is_vector(type_name):
+        return ir.VectorType(get_ir_type(implang_types.get_element_type(type_name), token), implang_types.get_array_length(type_name))
+
+    if implang_types.is_slice(type_name):
+        # pointer to the first element and the length
+        return ir.LiteralStructType([get_ir_type(implang_types.get_element_type(type_name), token).as_pointer(), INT])
+
+    if type_name not in IR_TYPES:
+        raise CodegenError(token, f"Unknown type '{type_name}'")
+
+    return IR_TYPES[type_name]
+
+def is_float_type(ir_type: ir.Type) -> bool:
+    if isinstance(ir_type, ir.VectorType):
+        ir_type = ir_type.element
+
+    return isinstance(ir_type, (ir.FloatType, ir.DoubleType))
+
+def get_size(type_name: str) -> int:
+    # size of a value in memory, in bytes
+    if implang_types.is_array(type_name) or implang_types.is_vector(type_name):
+        return implang_types.get_array_length(type_name) * get_size(implang_types.get_element_type(type_name))
+
+    if implang_types.is_slice(type_name):
+        return 16
+
+    if type_name == "str":
+        return 8
+
+    return max(implang_types.get_width(type_name), 8) // 8
+
+def get_constant_string(node):
+    # text of a string literal or of a concatenation of literals, None for other values
+    if isinstance(node, parser.ValueNode) and node.value_type == "STRING":
+        return lexer.unescape(node.value[1:-1])
+
+    if isinstance(node, parser.ExprNode) and node.operation == "PLUS" and node.operand_type == "str":
+        left = get_constant_string(node.left)
+        right = get_constant_string(node.right)
+
+        if left is not None and right is not None:
+            return left + right
+
+    return None
+
+def has_exclusive_arms(if_node: parser.IfNode) -> bool:
+    # 'x == C' conditions with distinct constants: at most one arm matches and testing one has no side effects,
+    # so the arms can be tested in any order
+    switch = semantic.get_switch_cases(if_node, 1)
+    return switch is not None and len(switch[1]) == len(if_node.else_ifs) + 1
+
+def get_switch_min_cases(options: CodegenOptions) -> int:
+    # shortest 'else if' chain the MIR builder turns into a switch, like gen_if, None to keep them
+    return SWITCH_MIN_CASES if options.switch_tables else None
+
+def get_mir_returned_constant(function: mir.Function, index: int) -> int:
+    # the constant returned by a MIR block consisting of a single 'ret <constant>', None otherwise
+    instructions = function.blocks[index].instructions
+
+    if len(instructions) != 1 or function.opcodes[instructions[0]] != "ret" or not function.operands[instructions[0]]:
+        return None
+
+    result = function.operands[instructions[0]][0]
+    return result if function.is_constant(result) else None
+
+def get_argument_domains(node: parser.FuncNode) -> list:
+    # (minimum, number of values) of every parameter, None when one of them is not an integer, bool or char
+    domains = []
+
+    for parameter in node.parameters:
+        if parameter.parameter_type == "bool":
+            domains.append((0, 2))
+        elif parameter.parameter_type == "char":
+            domains.append((0, 256))
+        elif implang_types.is_integer(parameter.parameter_type):
+            minimum, maximum = defs.INT_TYPES[parameter.parameter_type]
+            domains.append((minimum, maximum - minimum + 1))
+        else:
+            return None
+
+    return domains
+
+def get_returned_constant(block: parser.BlockNode):
+    # the literal returned by a block consisting of a single 'return <literal>', None otherwise
+    if block is None or len(block.statements) != 1:
+        return None
+
+    statement = block.statements[0]
+
+    if not isinstance(statement, parser.ReturnNode) or not isinstance(statement.value, parser.ValueNode):
+        return None
+
+    if statement.value.value_type == "NULL":
+        return None
+
+    return statement.value
+
+def add_profile_summary(module: ir.Module, summary: dict):
+    # lets LLVM tell hot and cold functions and call sites apart (inlining thresholds, .text.hot/.text.unlikely)
+    fields = [module.add_metadata(["ProfileFormat", "InstrProf"])]
+
+    for name in ["TotalCount", "MaxCount", "MaxInternalCount", "MaxFunctionCount", "NumCounts", "NumFunctions"]:
+        fields.append(module.add_metadata([name, ir.Constant(ir.IntType(64), summary[name])]))
+
+    detailed = [
+        module.add_metadata([ir.Constant(C_INT, cutoff), ir.Constant(ir.IntType(64), min_count), ir.Constant(C_INT, count)])
+        for cutoff, min_count, count in summary["DetailedSummary"]
+    ]
+    fields.append(module.add_metadata(["DetailedSummary", module.add_metadata(detailed)]))
+
+    module.add_named_metadata("llvm.module.flags", module.add_metadata([ir.Constant(C_INT, 1), "ProfileSummary", module.add_metadata(fields)]))
+
+class DebugInfo:
+    """DWARF metadata of a module: a compile unit, a subprogram per function and statement locations"""
+    def __init__(self, module: ir.Module, file: str, optimized: bool):
+        self.module = module
+        self.optimized = optimized
+        self.types = {} # ImpLang type name -> DIType
+
+        self.file = module.add_debug_info("DIFile", {
+            "filename": os.path.basename(file),
+            "directory": os.path.dirname(os.path.abspath(file))
+        })
+
+        self.unit = module.add_debug_info("DICompileUnit", {
+            "language": ir.DIToken("DW_LANG_C"), # there is no DWARF language code for ImpLang
+            "file": self.file,
+            "producer": f"impc {defs.COMPILER_VERSION}",
+            "isOptimized": optimized,
+            "runtimeVersion": 0,
+            "emissionKind": ir.DIToken("FullDebug")
+        }, is_distinct=True)
+
+        module.add_named_metadata("llvm.dbg.cu", self.unit)
+        module.add_named_metadata("llvm.module.flags", module.add_metadata([ir.Constant(C_INT, 7), "Dwarf Version", ir.Constant(C_INT, DWARF_VERSION)]))
+        module.add_named_metadata("llvm.module.flags", module.add_metadata([ir.Constant(C_INT, 2), "Debug Info Version", ir.Constant(C_INT, DEBUG_METADATA_VERSION)]))
+
+    def get_type(self, type_name: str, ir_type: ir.Type):
+        if type_name is None:
+            return None
+
+        if type_name not in self.types:
+            base_type = implang_types.get_base_type(type_name)
+
+            if base_type == "STRING":
+                self.types[type_name] = self.module.add_debug_info("DIDerivedType", {
+                    "tag": ir.DIToken("DW_TAG_pointer_type"),
+                    "name": type_name,
+                    "baseType": self.get_type("char", CHAR),
+                    "size": 64
+                })
+            elif implang_types.is_array(type_name) or implang_types.is_vector(type_name):
+                element_type = implang_types.get_element_type(type_name)
+                fields = {
+                    "tag": ir.DIToken("DW_TAG_array_type"),
+                    "baseType": self.get_type(element_type, get_ir_type(element_type)),
+                    "size": get_size(type_name) * 8,
+                    "elements": self.module.add_metadata([
+                        self.module.add_debug_info("DISubrange", {"count": implang_types.get_array_length(type_name)})
+                    ])
+                }
+
+                if implang_types.is_vector(type_name):
+                    fields["name"] = type_name
+                    fields["flags"] = ir.DIToken("DIFlagVector")
+
+                self.types[type_name] = self.module.add_debug_info("DICompositeType", fields)
+            elif implang_types.is_slice(type_name):
+                element_type = implang_types.get_element_type(type_name)
+
+                data = self.module.add_debug_info("DIDerivedType", {
+                    "tag": ir.DIToken("DW_TAG_pointer_type"),
+                    "baseType": self.get_type(element_type, get_ir_type(element_type)),
+                    "size": 64
+                })
+                members = [
+                    self.module.add_debug_info("DIDerivedType", {
+                        "tag": ir.DIToken("DW_TAG_member"),
+                        "name": name,
+                        "baseType": member_type,
+                        "size": 64,
+                        "offset": offset
+                    })
+                    for name, member_type, offset in [("data", data, 0), ("length", self.get_type("u64", INT), 64)]
+                ]
+
+                self.types[type_name] = self.module.add_debug_info("DICompositeType", {
+                    "tag": ir.DIToken("DW_TAG_structure_type"),
+                    "name": type_name,
+                    "size": 128,
+                    "elements": self.module.add_metadata(members)
+                })
+            else:
+                encoding = DWARF_ENCODINGS.get(base_type, "DW_ATE_unsigned" if type_name.startswith("u") else "DW_ATE_signed")
+
+                self.types[type_name] = self.module.add_debug_info("DIBasicType", {
+                    "name": type_name,
+                    "size": max(implang_types.get_width(type_name), 8),
+                    "encoding": ir.DIToken(encoding)
+                })
+
+        return self.types[type_name]
+
+    def add_subprogram(self, function: ir.Function, name: str, line: int, types: list):
+        # 'types' is [(ImpLang type name, ir.Type)] of the return value followed by the parameters
+        subroutine_type = self.module.add_debug_info("DISubroutineType", {
+            "types": self.module.add_metadata([self.get_type(type_name, ir_type) for type_name, ir_type in types])
+        })
+
+        flags = "DISPFlagDefinition | DISPFlagOptimized" if self.optimized else "DISPFlagDefinition"
+
+        subprogram = self.module.add_debug_info("DISubprogram", {
+            "name": name,
+            "linkageName": function.name,
+            "scope": self.file,
+            "file": self.file,
+            "line": line,
+            "scopeLine": line,
+            "type": subroutine_type,
+            "spFlags": ir.DIToken(flags),
+            "unit": self.unit
+        }, is_distinct=True)
+
+        function.set_metadata("dbg", subprogram)
+        return subprogram
+
+    def get_location(self, scope, token):
+        return self.module.add_debug_info("DILocation", {"line": token.line, "column": token.column, "scope": scope})
+
+class LoweredFunction:
+    """Takes the place of a defined ir.Function in the module globals, with its IR already rendered (see ModuleCodegen.release_function)"""
+    def __init__(self, function: ir.Function):
+        self.name = function.name
+        self.linkage = function.linkage
+        self.function = function # without its blocks, calls still reference it
+        self.text = str(function)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"LoweredFunction({self.name})"
+
+class ModuleCodegen:
+    def __init__(self, file: str, program: parser.Program, options: CodegenOptions, atomic_counters: bool = False):
+        self.file = file
+        self.program = program
+        self.options = options
+        self.atomic_counters = atomic_counters # the tasks runtime may be linked, other threads update the profile counters too
+
+        self.module = ir.Module(name=os.path.basename(file))
+        self.module.triple = llvm.get_process_triple()
+
+        self.debug_info = DebugInfo(self.module, file, options.opt_level > 0) if options.debug_info else None
+        self.subprogram = None # DISubprogram of the function being generated
+
+        self.counters = None # profile counters, one per site of profiling.collect_sites
+        self.profile_sites = []
+        self.profile_indices = {} # id(node) -> index of its first counter
+        self.profile_locals = {} # counter index -> alloca, the counts of the current call (see gen_counter)
+        self.profile_record = None # profiling.ProfileRecord with the counts of the sites, for -fprofile-use
+
+        if options.profile_instr or options.profile is not None:
+            self.profile_sites, self.profile_indices = profiling.collect_sites(program)
+
+        if options.profile is not None:
+            self.profile_record = profiling.match_record(options.profile, file, self.profile_sites)
+            add_profile_summary(self.module, profiling.get_summary(options.profile))
+
+        if options.profile_instr:
+            # updated atomically in parallel loop bodies and, with 'atomic_counters', everywhere (see gen_counter)
+            counters_type = ir.ArrayType(INT, len(self.profile_sites))
+            self.counters = ir.GlobalVariable(self.module, counters_type, name="__impl_profile_counters")
+            self.counters.initializer = ir.Constant(counters_type, None)
+            self.counters.linkage = "internal"
+
+            self.profile_counts = {} # function name -> number of sites (numbered consecutively from its entry site)
+
+            for site in self.profile_sites:
+                self.profile_counts[site.function] = self.profile_counts.get(site.function, 0) + 1
+
+        self.functions = {} # name -> ir.Function
+        self.signatures = {} # name -> parser.FuncNode, the ImpLang types of the parameters
+        self.global_variables = {} # name -> ir.GlobalVariable
+        self.strings = {} # literal -> ir.GlobalVariable
+        self.helpers = {} # name -> ir.Function, runtime helpers generated on demand
+        self.std = {} # name -> parser.FuncNode, standard runtime functions, declared when called
+        self.nocapture = set() # names of the functions that don't keep their string arguments, see escape.get_local_strings
+        self.arena = None # (chunk, top, end) variables of the string arena, see get_arena
+        self.computations = {} # name -> ir.Function with the body of a '@memoize' function, see define_memoized
+        self.mir = None # mir.Module of the program, see get_mir_function
+
+        self.builder = None
+        self.alloca_builder = None
+        self.func = None
+        self.return_type = None # ImpLang return type of the function being generated
+        self.locals = None # name -> alloca
+        self.loops = [] # (continue_block, break_block)
+        self.local_strings = set() # id(node) of the concatenations allocated in the arena of the call
+        self.arena_mark = None # top of the arena when the function was called, restored when it returns
+        self.task_group = None # number of running tasks spawned by the call, joined when it returns
+        self.mir_values = {} # MIR value number -> LLVM value of the function being lowered, see gen_mir_function
+        self.mir_blocks = {} # MIR block index -> ir.Block of the function being lowered
+        self.in_parallel = False # generating the body of a parallel loop, see gen_parallel_body
+
+        self.statement_generators = {
+            parser.VarNode: self.gen_var,
+            parser.AssignmentNode: self.gen_assignment,
+            parser.IndexAssignmentNode: self.gen_index_assignment,
+            parser.IfNode: self.gen_if,
+            parser.WhileNode: self.gen_while,
+            parser.BreakNode: self.gen_break,
+            parser.ContinueNode: self.gen_continue,
+            parser.ReturnNode: self.gen_return,
+            parser.SpawnNode: self.gen_spawn,
+            parser.JoinNode: self.gen_task_join
+        }
+
+        self.expression_generators = {
+            parser.ValueNode: self.gen_value,
+            parser.VariableNode: self.gen_variable,
+            parser.CallNode: self.gen_call,
+            parser.ExprNode: self.gen_binary,
+            parser.UnaryExprNode: self.gen_unary,
+            parser.IndexNode: self.gen_index,
+            parser.ArrayNode: self.gen_vector,
+            parser.LenNode: self.gen_len,
+            parser.ReduceNode: self.gen_reduce
+        }
+
+    ###################
+
+    def generate(self) -> ir.Module:
+        self.nocapture = escape.get_nocapture_functions(self.program)
+
+        for attribute in self.program.attributes:
+            if attribute.name == "@import_symbol" and isinstance(attribute.value, parser.FuncNode):
+                self.declare_function(attribute.value)
+            elif attribute.name == "@import" and isinstance(attribute.value, parser.ImportNode) and attribute.value.module == parser.STD_MODULE:
+                self.std = {function.name: function for function in attribute.value.functions}
+            elif attribute.name == "@import" and isinstance(attribute.value, parser.ImportNode):
+                for function in attribute.value.functions:
+                    self.declare_function(function)
+
+        for statement in self.program.statements:
+            if isinstance(statement, parser.VarNode):
+                self.define_global(statement)
+            elif not isinstance(statement, parser.FuncNode):
+                raise CodegenError(semantic.get_token(statement), "Only functions and variables are allowed at the top level")
+
+        functions = [statement for statement in self.program.statements if isinstance(statement, parser.FuncNode)]
+
+        if self.profile_record is not None:
+            # functions are emitted in declaration order: most called first, so the hot code is packed together
+            functions.sort(key=lambda function: -self.get_count(function))
+
+        for function in functions:
+            self.declare_function(function, defined=True)
+
+        # the MIR has no source locations and profiling sites, those builds are generated from the AST (impc rejects -fmir with them)
+        if self.options.mir and self.debug_info is None and self.counters is None and self.profile_record is None:
+            if isinstance(self.program, parser.ProgramStream):
+                self.mir = mir.Module(self.program, self.nocapture, self.options.string_arena, get_switch_min_cases(self.options))
+            else:
+                self.mir = mir.build_module(self.program, self.nocapture, self.options.string_arena, get_switch_min_cases(self.options))
+
+        if isinstance(self.program, parser.ProgramStream):
+            # the statements only have the signatures, the bodies are parsed (and released) one at a time
+            for function in self.program.functions:
+                self.define_function(function)
+                self.release_function(self.functions[function.name])
+
+                if function.name in self.computations:
+                    self.release_function(self.computations[function.name])
+        else:
+            for function in functions:
+                self.define_function(function)
+
+        if "main" in self.functions and self.functions["main"].name != "main":
+            self.define_entry_point()
+
+        if self.counters is not None:
+            self.define_profile_writer()
+
+        return self.module
+
+    def release_function(self, function: ir.Function):
+        # calls keep referencing the function, only the module prints its body
+        self.module.globals[function.name] = LoweredFunction(function)
+
+        function.blocks = []
+        function.scope = None
+
+    def declare_function(self, node: parser.FuncNode, defined: bool = False):
+        return_type = get_ir_type(node.return_type, node.return_type_token)
+        parameter_types = [get_ir_type(p.parameter_type, p.parameter_type_token) for p in node.parameters]
+
+        # ImpLang 'main' is wrapped by the C entry point, see define_entry_point
+        symbol = "__impl_main" if node.name == "main" and defined else node.name
+
+        self.functions[node.name] = ir.Function(self.module, ir.FunctionType(return_type, parameter_types), name=symbol)
+        self.signatures[node.name] = node
+
+    def define_global(self, node: parser.VarNode):
+        value_type = get_ir_type(node.value_type, node.value_type_token)
+
+        variable = ir.GlobalVariable(self.module, value_type, name=node.name)
+
+        if node.value is None:
+            variable.initializer = ir.Constant(value_type, None)
+        else:
+            variable.initializer = self.get_initializer(node.value, node.value_type, node.name_token)
+
+        self.global_variables[node.name] = variable
+
+    def define_function(self, node: parser.FuncNode):
+        self.func = self.functions[node.name]
+
+        if node.memoize is not None:
+            # the body computes the result on a cache miss of the function, see define_memoized
+            self.func = ir.Function(self.module, self.func.function_type, name=f"{self.func.name}.compute")
+            self.func.linkage = "internal"
+            self.computations[node.name] = self.func
+
+        self.return_type = node.return_type
+        self.locals = {}
+        self.loops = []
+        mir_function = self.get_mir_function(node)
+
+        if mir_function is not None:
+            self.local_strings = mir_function.local_strings
+        else:
+            self.local_strings = escape.get_local_strings(node, self.nocapture) if self.options.string_arena else set()
+
+        self.arena_mark = None
+        self.task_group = None
+
+        # the entry block only holds the allocas, so they are all promoted to registers
+        entry_block = self.func.append_basic_block("entry")
+        body_block = self.func.append_basic_block("body")
+
+        self.alloca_builder = ir.IRBuilder(entry_block)
+        self.builder = ir.IRBuilder(body_block)
+
+        if mir_function is None and parser.contains(node.body, parser.SpawnNode):
+            self.task_group = self.alloca_builder.alloca(INT, name="tasks")
+            self.alloca_builder.store(ir.Constant(INT, 0), self.task_group)
+
+        if self.debug_info is not None:
+            types = [(node.return_type, self.func.function_type.return_type)]
+            types += [(p.parameter_type, arg.type) for p, arg in zip(node.parameters, self.func.args)]
+
+            self.subprogram = self.debug_info.add_subprogram(self.func, node.name, node.name_token.line, types)
+            self.alloca_builder.debug_metadata = self.debug_info.get_location(self.subprogram, node.name_token)
+            self.builder.debug_metadata = self.alloca_builder.debug_metadata
+
+        if self.profile_record is not None:
+            entry_count = self.get_count(node)
+            self.func.set_metadata("prof", self.module.add_metadata(["function_entry_count", ir.Constant(ir.IntType(64), entry_count)]))
+
+            if entry_count == 0:
+                self.func.attributes.add("cold")
+
+        if self.counters is not None:
+            self.gen_counter(node)
+            self.profile_locals = {}
+
+            first = self.profile_indices[id(node)]
+
+            for index in range(first + 1, first + self.profile_counts[node.name]):
+                if not self.profile_sites[index].in_loop:
+                    continue
+
+                slot = self.alloca_builder.alloca(INT, name=f"profile.{index}")
+                self.alloca_builder.store(ir.Constant(INT, 0), slot)
+
+                self.profile_locals[index] = slot
+
+        for parameter, arg in zip(node.parameters, self.func.args):
+            arg.name = parameter.name
+
+            if mir_function is None:
+                slot = self.alloca(arg.type, parameter.name)
+                self.alloca_builder.store(arg, slot)
+
+        if self.local_strings:
+            self.arena_mark = self.builder.load(self.get_arena()[1], name="arena.mark")
+
+        if mir_function is not None:
+            self.gen_mir_function(mir_function)
+        else:
+            self.gen_block(node.body)
+
+            if not self.builder.block.is_terminated:
+                self.gen_default_return()
+
+        self.alloca_builder.branch(body_block)
+
+        if node.memoize is not None:
+            self.define_memoized(node)
+
+    def get_mir_function(self, node: parser.FuncNode) -> mir.Function:
+        # the SSA form of the body, None when it is generated from the AST
+        if self.mir is None:
+            return None
+
+        if isinstance(self.program, parser.ProgramStream):
+            # the other bodies are not parsed yet (or released), nothing is inlined
+            function = self.mir.build_function(node)
+
+            if function is not None:
+                self.mir.optimize_function(function)
+
+            return function
+
+        return self.mir.functions.get(node.name)
+
+    def define_memoized(self, node: parser.FuncNode):
+        # the function looks its arguments up in its cache and calls the body on a miss. Every thread has its own
+        # cache: a table with an entry per argument value for small integer domains, otherwise a hash cache of
+        # 2^MEMOIZE_CACHE_BITS slots, whose entries are replaced according to the policy of the function
+        function = self.functions[node.name]
+        compute = self.computations[node.name]
+        return_type = function.function_type.return_type
+
+        builder = ir.IRBuilder(function.append_basic_block("entry"))
+
+        if self.debug_info is not None:
+            types = [(node.return_type, return_type)] + [(p.parameter_type, arg.type) for p, arg in zip(node.parameters, function.args)]
+            subprogram = self.debug_info.add_subprogram(function, node.name, node.name_token.line, types)
+            builder.debug_metadata = self.debug_info.get_location(subprogram, node.name_token)
+
+        for parameter, arg in zip(node.parameters, function.args):
+            arg.name = parameter.name
+
+        keys = [self.get_memo_key(builder, arg, parameter.parameter_type) for parameter, arg in zip(node.parameters, function.args)]
+        domains = get_argument_domains(node)
+        size = 1
+
+        for _, count in domains or []:
+            size *= count
+
+        if domains is not None and size <= MEMOIZE_TABLE_MAX_SIZE:
+            # the arguments are the index of the entry, whose value is valid once computed
+            entry_type = ir.LiteralStructType([CHAR, return_type])
+            table = self.get_memo_cache(node, ir.ArrayType(entry_type, size))
+
+            index = ir.Constant(INT, 0)
+            stride = 1
+
+            for key, (minimum, count) in zip(keys, domains):
+                index = builder.add(index, builder.mul(builder.sub(key, ir.Constant(INT, minimum)), ir.Constant(INT, stride)))
+                stride *= count
+
+            entry = builder.gep(table, [ir.Constant(C_INT, 0), index], inbounds=True)
+            valid = builder.gep(entry, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 0)], inbounds=True)
+            value = builder.gep(entry, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 1)], inbounds=True)
+
+            with builder.if_then(builder.icmp_unsigned("!=", builder.load(valid), ir.Constant(CHAR, 0)), likely=True):
+                builder.ret(builder.load(value))
+
+            result = builder.call(compute, function.args)
+            builder.store(result, value)
+            builder.store(ir.Constant(CHAR, 1), valid)
+            builder.ret(result)
+            return
+
+        # a slot holds a valid flag, the arguments (as i64, see get_memo_key) and the result
+        slot_type = ir.LiteralStructType([CHAR, ir.ArrayType(INT, len(keys)), return_type])
+        lru = node.memoize == "lru"
+
+        # 'lru' sets have two slots and the index of the one used last
+        set_type = ir.LiteralStructType([CHAR, ir.ArrayType(slot_type, 2)]) if lru else slot_type
+        cache = self.get_memo_cache(node, ir.ArrayType(set_type, 1 << MEMOIZE_CACHE_BITS))
+
+        hash_value = ir.Constant(INT, 0)
+
+        for key in keys:
+            hash_value = builder.mul(builder.xor(hash_value, key), ir.Constant(INT, MEMOIZE_HASH_MULTIPLIER))
+
+        index = builder.lshr(hash_value, ir.Constant(INT, 64 - MEMOIZE_CACHE_BITS))
+        cache_set = builder.gep(cache, [ir.Constant(C_INT, 0), index], inbounds=True)
+        slots = [builder.gep(cache_set, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 1), ir.Constant(C_INT, way)], inbounds=True) for way in range(2)] if lru else [cache_set]
+
+        for way, slot in enumerate(slots):
+            with builder.if_then(self.gen_memo_match(builder, slot, keys)):
+                if lru:
+                    builder.store(ir.Constant(CHAR, way), builder.gep(cache_set, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 0)], inbounds=True))
+
+                builder.ret(builder.load(builder.gep(slot, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 2)], inbounds=True)))
+
+        result = builder.call(compute, function.args)
+
+        # the recursive calls of the body may have filled the slots since the lookup
+        if lru:
+            last_used = builder.gep(cache_set, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 0)], inbounds=True)
+            free = [builder.icmp_unsigned("==", builder.load(builder.gep(slot, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 0)], inbounds=True)), ir.Constant(CHAR, 0)) for slot in slots]
+            other = builder.xor(builder.load(last_used), ir.Constant(CHAR, 1))
+            victim = builder.select(free[0], ir.Constant(CHAR, 0), builder.select(free[1], ir.Constant(CHAR, 1), other))
+
+            builder.store(victim, last_used)
+            slot = builder.gep(cache_set, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 1), builder.zext(victim, C_INT)], inbounds=True)
+            self.gen_memo_store(builder, slot, keys, result)
+        elif node.memoize == "keep":
+            valid = builder.load(builder.gep(cache_set, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 0)], inbounds=True))
+
+            with builder.if_then(builder.icmp_unsigned("==", valid, ir.Constant(CHAR, 0))):
+                self.gen_memo_store(builder, cache_set, keys, result)
+        else:
+            self.gen_memo_store(builder, cache_set, keys, result)
+
+        builder.ret(result)
+
+    def get_memo_cache(self, node: parser.FuncNode, cache_type: ir.Type) -> ir.GlobalVariable:
+        # initial-exec like the string arena, see get_arena
+        cache = ir.GlobalVariable(self.module, cache_type, name=f"__impl_memo.{self.functions[node.name].name}")
+        cache.initializer = ir.Constant(cache_type, None)
+        cache.linkage = "internal"
+        cache.storage_class = "thread_local(initialexec)"
+
+        return cache
+
+    def get_memo_key(self, builder: ir.IRBuilder, value, type_name: str):
+        # the argument as an i64 that is equal for equal arguments only (floats by their bits, so NaN finds itself)
+        if implang_types.is_float(type_name):
+            value = builder.bitcast(value, ir.IntType(implang_types.get_width(type_name)))
+            type_name = "u64"
+
+        if value.type == INT:
+            return value
+
+        return builder.sext(value, INT) if implang_types.is_signed(type_name) else builder.zext(value, INT)
+
+    def gen_memo_match(self, builder: ir.IRBuilder, slot, keys: list):
+        # whether the cache slot is valid and holds the result for 'keys'
+        match = builder.icmp_unsigned("!=", builder.load(builder.gep(slot, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 0)], inbounds=True)), ir.Constant(CHAR, 0))
+
+        for i, key in enumerate(keys):
+            cached = builder.load(builder.gep(slot, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 1), ir.Constant(C_INT, i)], inbounds=True))
+            match = builder.and_(match, builder.icmp_unsigned("==", cached, key))
+
+        return match
+
+    def gen_memo_store(self, builder: ir.IRBuilder, slot, keys: list, result):
+        builder.store(ir.Constant(CHAR, 1), builder.gep(slot, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 0)], inbounds=True))
+
+        for i, key in enumerate(keys):
+            builder.store(key, builder.gep(slot, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 1), ir.Constant(C_INT, i)], inbounds=True))
+
+        builder.store(result, builder.gep(slot, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 2)], inbounds=True))
+
+    def define_entry_point(self):
+        impl_main = self.functions["main"]
+        impl_main_type = impl_main.function_type
+
+        entry_point = ir.Function(self.module, ir.FunctionType(C_INT, [C_INT, STR.as_pointer()]), name="main")
+        argc, argv = entry_point.args
+
+        builder = ir.IRBuilder(entry_point.append_basic_block("entry"))
+        arguments = []
+
+        if self.debug_info is not None:
+            # the call to ImpLang 'main' needs a location, it can be inlined into the entry point
+            main_node = next(s for s in self.program.statements if isinstance(s, parser.FuncNode) and s.name == "main")
+            subprogram = self.debug_info.add_subprogram(entry_point, "main", main_node.name_token.line, [("i32", C_INT)])
+            builder.debug_metadata = self.debug_info.get_location(subprogram, main_node.name_token)
+
+        if len(impl_main_type.args) == 1 and impl_main_type.args[0] == STR:
+            # 'args' is the first command line argument, or empty string
+            has_argument = builder.icmp_signed(">", argc, ir.Constant(C_INT, 1))
+            first_argument = builder.load(builder.gep(argv, [ir.Constant(C_INT, 1)]))
+            arguments.append(builder.select(has_argument, first_argument, self.get_string("")))
+        elif len(impl_main_type.args) != 0:
+            raise CodegenError(None, "Function 'main' must take no parameters or a single 'str' parameter")
+
+        result = builder.call(impl_main, arguments)
+
+        if impl_main_type.return_type == VOID:
+            builder.ret(ir.Constant(C_INT, 0))
+        else:
+            builder.ret(self.convert(result, self.signatures["main"].return_type, "i32", builder))
+
+    def define_profile_writer(self):
+        # appends this module's record to the profile file when the program exits, see profiling.py
+        header = profiling.encode_header(self.file, profiling.get_checksum(self.file), self.profile_sites)
+        header_type = ir.ArrayType(CHAR, len(header))
+
+        header_variable = ir.GlobalVariable(self.module, header_type, name="__impl_profile_header")
+        header_variable.initializer = ir.Constant(header_type, bytearray(header))
+        header_variable.global_constant = True
+        header_variable.linkage = "private"
+
+        getenv = self.get_libc_function("getenv", STR, [STR])
+        fopen = self.get_libc_function("fopen", STR, [STR, STR])
+        fwrite = self.get_libc_function("fwrite", INT, [STR, INT, INT, STR])
+        fclose = self.get_libc_function("fclose", C_INT, [STR])
+
+        writer = ir.Function(self.module, ir.FunctionType(VOID, []), name="__impl_profile_write")
+        writer.linkage = "internal"
+
+        builder = ir.IRBuilder(writer.append_basic_block("entry"))
+        write_block = writer.append_basic_block("write")
+        end_block = writer.append_basic_block("end")
+
+        path = builder.call(getenv, [self.get_string(profiling.PROFILE_FILE_ENV)])
+        has_path = builder.icmp_unsigned("!=", path, ir.Constant(STR, None))
+        path = builder.select(has_path, path, self.get_string(profiling.DEFAULT_PROFILE_FILE))
+
+        file = builder.call(fopen, [path, self.get_string("ab")])
+        builder.cbranch(builder.icmp_unsigned("!=", file, ir.Constant(STR, None)), write_block, end_block)
+
+        builder.position_at_end(write_block)
+        builder.call(fwrite, [builder.bitcast(header_variable, STR), ir.Constant(INT, 1), ir.Constant(INT, len(header)), file])
+        builder.call(fwrite, [builder.bitcast(self.counters, STR), ir.Constant(INT, 8), ir.Constant(INT, len(self.profile_sites)), file])
+        builder.call(fclose, [file])
+        builder.branch(end_block)
+
+        builder.position_at_end(end_block)
+        builder.ret_void()
+
+        # run at exit, after 'main' returns or 'exit' is called
+        entry_type = ir.LiteralStructType([C_INT, writer.type, STR])
+        destructors_type = ir.ArrayType(entry_type, 1)
+
+        destructors = ir.GlobalVariable(self.module, destructors_type, name="llvm.global_dtors")
+        destructors.initializer = ir.Constant(destructors_type, [ir.Constant(entry_type, [ir.Constant(C_INT, 65535), writer, ir.Constant(STR, None)])])
+        destructors.linkage = "appending"
+
+    ###################
+
+    def alloca(self, value_type: ir.Type, name: str):
+        slot = self.alloca_builder.alloca(value_type, name=name)
+        self.locals[name] = slot
+
+        return slot
+
+    def get_slot(self, name: str, token = None):
+        if name in self.locals:
+            return self.locals[name]
+
+        if name in self.global_variables:
+            return self.global_variables[name]
+
+        raise CodegenError(token, f"'{name}' is not a variable")
+
+    def get_string(self, text: str):
+        if text not in self.strings:
+            data = bytearray(text.encode("utf-8") + b"\0")
+            string_type = ir.ArrayType(CHAR, len(data))
+
+            variable = ir.GlobalVariable(self.module, string_type, name=f".str.{len(self.strings)}")
+            variable.initializer = ir.Constant(string_type, data)
+            variable.global_constant = True
+            variable.linkage = "private"
+            variable.unnamed_addr = True
+
+            self.strings[text] = variable
+
+        return self.strings[text].gep([ir.Constant(C_INT, 0), ir.Constant(C_INT, 0)])
+
+    def get_constant(self, node: parser.ValueNode, type_name: str):
+        value_type = get_ir_type(type_name, node.token)
+
+        if node.value_type == "STRING" and value_type == STR:
+            return self.get_string(lexer.unescape(node.value[1:-1]))
+
+        if node.value_type == "FLOAT":
+            value = float(node.value)
+        elif node.value_type == "BOOLEAN":
+            value = int(node.value == "true")
+        elif node.value_type in ["INTEGER", "CHAR"]:
+            value = semantic.get_constant_int(node)
+        else:
+            return ir.Constant(value_type, None)
+
+        if isinstance(value_type, ir.IntType) and isinstance(value, int):
+            return ir.Constant(value_type, value & ((1 << value_type.width) - 1))
+
+        if is_float_type(value_type):
+            return ir.Constant(value_type, float(value))
+
+        raise CodegenError(node.token, f"Cannot use {node.value_type.lower()} constant as '{type_name}'")
+
+    def get_initializer(self, node, type_name: str, token):
+        if isinstance(node, parser.ValueNode) and implang_types.is_vector(type_name):
+            return ir.Constant(get_ir_type(type_name), [self.get_constant(node, implang_types.get_element_type(type_name))] * implang_types.get_array_length(type_name))
+
+        if isinstance(node, parser.ValueNode):
+            return self.get_constant(node, type_name)
+
+        if isinstance(node, parser.ArrayNode):
+            element_type = implang_types.get_element_type(type_name)
+            return ir.Constant(get_ir_type(type_name), [self.get_initializer(element, element_type, token) for element in node.elements])
+
+        raise CodegenError(token, "Global variable initializer must be a constant value")
+
+    def get_libc_function(self, name: str, return_type: ir.Type, parameter_types: list, var_arg: bool = False):
+        if name in self.functions:
+            return self.functions[name]
+
+        function = self.module.globals.get(name)
+
+        if function is None:
+            function = ir.Function(self.module, ir.FunctionType(return_type, parameter_types, var_arg=var_arg), name=name)
+
+        return function
+
+    def convert(self, value, from_type: str, to_type: str, builder: ir.IRBuilder = None):
+        # convert 'value' of ImpLang type 'from_type' to 'to_type', the signedness of the source
+        # decides between sign and zero extension (of the target between fptosi and fptoui)
+        builder = builder or self.builder
+        target_type = get_ir_type(to_type)
+
+        if implang_types.is_array(from_type) and implang_types.is_slice(to_type):
+            # 'value' points to the array, see gen_variable
+            data = builder.gep(value, [ir.Constant(INT, 0), ir.Constant(INT, 0)], inbounds=True)
+            length = ir.Constant(INT, implang_types.get_array_length(from_type))
+
+            return builder.insert_value(builder.insert_value(ir.Constant(target_type, ir.Undefined), data, 0), length, 1)
+
+        if implang_types.is_vector(to_type) and not implang_types.is_vector(from_type):
+            # the scalar is copied to all lanes
+            lane = self.convert(value, from_type, implang_types.get_element_type(to_type), builder)
+            vector = builder.insert_element(ir.Constant(target_type, ir.Undefined), lane, ir.Constant(C_INT, 0))
+
+            return builder.shuffle_vector(vector, ir.Constant(target_type, ir.Undefined), ir.Constant(ir.VectorType(C_INT, target_type.count), None))
+
+        if value.type == target_type:
+            return value
+
+        if to_type == "bool":
+            return self.to_bool(value, builder)
+
+        if isinstance(target_type, ir.IntType) and isinstance(value.type, ir.IntType):
+            if value.type.width > target_type.width:
+                return builder.trunc(value, target_type)
+
+            if implang_types.is_signed(from_type):
+                return builder.sext(value, target_type)
+
+            return builder.zext(value, target_type)
+
+        if is_float_type(target_type) and isinstance(value.type, ir.IntType):
+            if implang_types.is_signed(from_type):
+                return builder.sitofp(value, target_type)
+
+            return builder.uitofp(value, target_type)
+
+        if isinstance(target_type, ir.IntType) and is_float_type(value.type):
+            if implang_types.is_signed(to_type):
+                return builder.fptosi(value, target_type)
+
+            return builder.fptoui(value, target_type)
+
+        if is_float_type(target_type) and is_float_type(value.type):
+            if target_type == FLOAT:
+                return builder.fpext(value, target_type)
+
+            return builder.fptrunc(value, target_type)
+
+        raise CodegenError(None, f"Cannot convert '{from_type}' to '{to_type}'")
+
+    def to_bool(self, value, builder: ir.IRBuilder = None):
+        builder = builder or self.builder
+
+        if value.type == BOOL:
+            return value
+
+        if is_float_type(value.type):
+            return builder.fcmp_ordered("!=", value, ir.Constant(value.type, 0.0))
+
+        return builder.icmp_unsigned("!=", value, ir.Constant(value.type, None))
+
+    def gen_counter(self, node, offset: int = 0, increment = None):
+        # count an execution of the profiling site 'offset' of 'node' ('increment' is an i1 value to add instead of 1)
+        if self.counters is None:
+            return
+
+        # sites inside loops count into locals (registers after mem2reg) added to the counters on return,
+        # conditional stores to the global array would stay inside the loop
+        index = self.profile_indices[id(node)] + offset
+        counter = self.profile_locals.get(index)
+        increment = ir.Constant(INT, 1) if increment is None else self.builder.zext(increment, INT)
+
+        if counter is None:
+            self.add_to_counter(index, increment)
+        else:
+            self.builder.store(self.builder.add(self.builder.load(counter), increment), counter)
+
+    def add_to_counter(self, index: int, increment):
+        # adds to the global counter 'index', loops running at the same time in other threads may add to it too
+        counter = self.counters.gep([ir.Constant(C_INT, 0), ir.Constant(C_INT, index)])
+
+        if self.in_parallel or self.atomic_counters:
+            self.builder.atomic_rmw("add", counter, increment, "monotonic")
+        else:
+            self.builder.store(self.builder.add(self.builder.load(counter), increment), counter)
+
+    def get_count(self, node, offset: int = 0) -> int:
+        # how often the profiling site 'offset' of 'node' ran in the profile, None without a profile
+        if self.profile_record is None:
+            return None
+
+        return self.profile_record.counts[self.profile_indices[id(node)] + offset]
+
+    def set_weights(self, instruction, counts: list):
+        # evenly split branches are left to LLVM's heuristics: the counts are per source branch, which after
+        # tail recursion elimination or unrolling may not describe the branch it turns into (e.g. 'fib' got slower)
+        if len(counts) == 2 and max(counts) < PROFILE_MIN_BRANCH_BIAS * sum(counts):
+            return
+
+        instruction.set_weights(profiling.scale_weights(counts))
+
+    def flush_counters(self):
+        # NOTE: the counts of functions still running when the program calls 'exit' are lost
+        for index, slot in self.profile_locals.items():
+            self.add_to_counter(index, self.builder.load(slot))
+
+    def release_arena(self):
+        # frees the strings allocated in the arena by this call, the returned value is never one of them
+        if self.arena_mark is not None:
+            self.builder.call(self.get_arena_release_helper(), [self.arena_mark])
+
+    def join_tasks(self):
+        # waits for the tasks spawned by this call
+        if self.task_group is not None:
+            self.builder.call(self.get_task_function("__impl_join"), [self.task_group])
+
+    def gen_default_return(self):
+        return_type = self.func.function_type.return_type
+        self.join_tasks()
+        self.flush_counters()
+        self.release_arena()
+
+        if return_type == VOID:
+            self.builder.ret_void()
+        else:
+            self.builder.ret(ir.Constant(return_type, None))
+
+    ###################
+
+    def gen_block(self, block: parser.BlockNode):
+        for statement in block.statements:
+            if self.builder.block.is_terminated:
+                break # the rest of the block is unreachable
+
+            self.gen_statement(statement)
+
+    def set_location(self, token):
+        # instructions generated from now on are attributed to the line of 'token'
+        if self.debug_info is not None and token is not None:
+            self.builder.debug_metadata = self.debug_info.get_location(self.subprogram, token)
+
+    def gen_statement(self, node):
+        self.set_location(semantic.get_token(node))
+
+        generator = self.statement_generators.get(type(node))
+
+        if generator is None:
+            self.gen_expr(node)
+        else:
+            generator(node)
+
+    def gen_var(self, node: parser.VarNode):
+        value_type = get_ir_type(node.value_type, node.value_type_token)
+        slot = self.alloca(value_type, node.name)
+
+        if node.value is None:
+            self.gen_zero(slot, node.value_type)
+        elif isinstance(node.value, parser.SpawnNode):
+            self.gen_zero(slot, node.value_type) # until the task finishes
+            self.gen_spawn(node.value, slot, node.value_type)
+        else:
+            self.gen_store(node.value, node.value_type, slot)
+
+    def gen_assignment(self, node: parser.AssignmentNode):
+        slot = self.get_slot(node.name, semantic.get_token(node.value))
+
+        if isinstance(node.value, parser.SpawnNode):
+            self.gen_spawn(node.value, slot, node.concrete_type)
+        else:
+            self.gen_store(node.value, node.concrete_type, slot)
 
-    llvm_module = ir.Module(name="main")
+    def gen_index_assignment(self, node: parser.IndexAssignmentNode):
+        if implang_types.is_vector(node.target.target.concrete_type):
+            # vectors are not addressable by lane, the lane is inserted into the stored vector
+            pointer = self.gen_address(node.target.target)
+            index = self.gen_index_value(node.target, self.get_lane_count(node.target))
+            value = self.convert(self.gen_expr(node.value), node.value.concrete_type, node.target.concrete_type)
 
-    # TODO: codegen
+            self.builder.store(self.builder.insert_element(self.builder.load(pointer), value, index), pointer)
+            return
+
+        pointer = self.gen_element_pointer(node.target)
+        self.gen_store(node.value, node.target.concrete_type, pointer)
+
+    def gen_zero(self, pointer, type_name: str):
+        if not implang_types.is_array(type_name):
+            self.builder.store(ir.Constant(pointer.type.pointee, None), pointer)
+            return
+
+        memset = self.module.declare_intrinsic("llvm.memset", [STR, INT])
+        self.builder.call(memset, [self.builder.bitcast(pointer, STR), ir.Constant(CHAR, 0), ir.Constant(INT, get_size(type_name)), ir.Constant(BOOL, False)])
+
+    def gen_store(self, node, type_name: str, pointer):
+        # store the value of 'node' converted to 'type_name'
+        if isinstance(node, parser.ArrayNode) and implang_types.is_array(type_name):
+            element_type = implang_types.get_element_type(type_name)
+
+            for i, element in enumerate(node.elements):
+                self.gen_store(element, element_type, self.builder.gep(pointer, [ir.Constant(INT, 0), ir.Constant(INT, i)], inbounds=True))
+
+            return
+
+        value = self.gen_expr(node)
+
+        if implang_types.is_array(type_name):
+            # arrays are copied, 'value' points to the source (see gen_variable)
+            memcpy = self.module.declare_intrinsic("llvm.memcpy", [STR, STR, INT])
+            self.builder.call(memcpy, [self.builder.bitcast(pointer, STR), self.builder.bitcast(value, STR), ir.Constant(INT, get_size(type_name)), ir.Constant(BOOL, False)])
+            return
+
+        self.builder.store(self.convert(value, node.concrete_type, type_name), pointer)
+
+    def gen_if(self, node: parser.IfNode):
+        if self.options.switch_tables:
+            switch = semantic.get_switch_cases(node, SWITCH_MIN_CASES)
+
+            if switch is not None:
+                self.gen_switch(node, *switch)
+                return
+
+        open_blocks = [] # blocks that fall through to the end of the if statement
+        arms = [node] + node.else_ifs
+        order = list(range(len(arms)))
+
+        if self.profile_record is not None:
+            counts = [self.get_count(node, i) for i in range(len(arms) + 1)] # arms and else
+
+            if has_exclusive_arms(node):
+                order.sort(key=lambda i: -counts[i]) # test the most frequent arms first
+
+        for position, i in enumerate(order):
+            arm = arms[i]
+            then_block = self.func.append_basic_block("if.then")
+            else_block = self.func.append_basic_block("if.else")
+
+            self.set_location(arm.token)
+            condition = self.to_bool(self.gen_expr(arm.condition))
+
+            # counting the condition instead of the branch taken keeps both branches free of stores,
+            # so they can still be turned into selects
+            self.gen_counter(node, i, condition)
+
+            if position == len(arms) - 1:
+                self.gen_counter(node, len(arms), self.builder.not_(condition))
+
+            branch = self.builder.cbranch(condition, then_block, else_block)
+
+            if self.profile_record is not None:
+                self.set_weights(branch, [counts[i], sum(counts[j] for j in order[position + 1:]) + counts[-1]])
+
+            self.builder.position_at_end(then_block)
+            self.gen_block(arm.body)
+
+            if not self.builder.block.is_terminated:
+                open_blocks.append(self.builder.block)
+
+            self.builder.position_at_end(else_block)
+
+        if node.else_statement is not None:
+            self.gen_block(node.else_statement)
+
+        if not self.builder.block.is_terminated:
+            open_blocks.append(self.builder.block)
+
+        self.gen_join(open_blocks, "if.end")
+
+    def gen_join(self, open_blocks: list, name: str):
+        # continue in a new block reached from all the open blocks
+        end_block = self.func.append_basic_block(name)
+
+        for block in open_blocks:
+            self.builder.position_at_end(block)
+            self.builder.branch(end_block)
+
+        self.builder.position_at_end(end_block)
+
+    def gen_switch(self, node: parser.IfNode, subject: parser.VariableNode, cases: list):
+        value = self.gen_expr(subject)
+
+        # a lookup table has no branches to count
+        if self.counters is None and self.gen_lookup_table(value, subject.concrete_type, cases, node.else_statement):
+            return
+
+        arms = [node] + node.else_ifs
+        arm_indices = {id(arm.body): i for i, arm in enumerate(arms)}
+
+        open_blocks = []
+        default_block = self.func.append_basic_block("switch.default")
+
+        switch = self.builder.switch(value, default_block)
+
+        if self.profile_record is not None:
+            self.set_weights(switch, [self.get_count(node, len(arms))] + [self.get_count(node, arm_indices[id(body)]) for _, body in cases])
+
+        for constant, body in cases:
+            case_block = self.func.append_basic_block("switch.case")
+            switch.add_case(ir.Constant(value.type, constant & ((1 << value.type.width) - 1)), case_block)
+
+            self.builder.position_at_end(case_block)
+            self.gen_counter(node, arm_indices[id(body)])
+            self.gen_block(body)
+
+            if not self.builder.block.is_terminated:
+                open_blocks.append(self.builder.block)
+
+        self.builder.position_at_end(default_block)
+        self.gen_counter(node, len(arms))
+
+        if node.else_statement is not None:
+            self.gen_block(node.else_statement)
+
+        if not self.builder.block.is_terminated:
+            open_blocks.append(self.builder.block)
+
+        self.gen_join(open_blocks, "switch.end")
+
+    def gen_lookup_table(self, value, value_type: str, cases: list, else_statement: parser.BlockNode) -> bool:
+        # every arm (including the else) is 'return <constant>': index a constant table instead of branching
+        if self.func.function_type.return_type == VOID:
+            return False
+
+        default = get_returned_constant(else_statement)
+        returned = [get_returned_constant(body) for _, body in cases]
+
+        if default is None or None in returned:
+            return False
+
+        entries = [(constant, self.get_constant(returned_value, self.return_type)) for (constant, _), returned_value in zip(cases, returned)]
+
+        return self.gen_table_lookup(value, value_type, entries, self.get_constant(default, self.return_type))
+
+    def gen_table_lookup(self, value, value_type: str, entries: list, default) -> bool:
+        # returns the constant of 'entries' [(case, ir.Constant), ...] matching 'value', 'default' for the others,
+        # False (nothing generated) when the cases are too sparse for a table
+        minimum = min(constant for constant, _ in entries)
+        size = max(constant for constant, _ in entries) - minimum + 1
+
+        if size > LOOKUP_TABLE_MAX_SIZE or len(entries) / size < LOOKUP_TABLE_MIN_DENSITY:
+            return False
+
+        table_entries = [default] * size
+
+        for constant, returned_value in entries:
+            table_entries[constant - minimum] = returned_value
+
+        table_type = ir.ArrayType(self.func.function_type.return_type, size)
+
+        table = ir.GlobalVariable(self.module, table_type, name=f"{self.func.name}.table")
+        table.initializer = ir.Constant(table_type, table_entries)
+        table.global_constant = True
+        table.linkage = "private"
+        table.unnamed_addr = True
+
+        hit_block = self.func.append_basic_block("table.hit")
+        miss_block = self.func.append_basic_block("table.miss")
+
+        index = self.convert(value, value_type, "i64")
+
+        if minimum != 0:
+            index = self.builder.sub(index, ir.Constant(INT, minimum))
+        in_range = self.builder.icmp_unsigned("<", index, ir.Constant(INT, size))
+        self.builder.cbranch(in_range, hit_block, miss_block)
+
+        self.builder.position_at_end(hit_block)
+        result = self.builder.load(self.builder.gep(table, [ir.Constant(INT, 0), index]))
+        self.join_tasks()
+        self.release_arena()
+        self.builder.ret(result)
+
+        self.builder.position_at_end(miss_block)
+        self.join_tasks()
+        self.release_arena()
+        self.builder.ret(default)
+
+        return True
+
+    def gen_while(self, node: parser.WhileNode):
+        if node.parallel:
+            self.gen_parallel_while(node)
+            return
+
+        condition_block = self.func.append_basic_block("while.cond")
+        body_block = self.func.append_basic_block("while.body")
+        end_block = self.func.append_basic_block("while.end")
+
+        # 'continue' and the end of the body go through the latch, which counts the back edge when profiling
+        latch_block = condition_block
+
+        if self.counters is not None:
+            latch_block = self.func.append_basic_block("while.latch")
+
+        self.gen_counter(node)
+        self.builder.branch(condition_block)
+
+        self.builder.position_at_end(condition_block)
+        self.set_location(node.token)
+        condition = self.to_bool(self.gen_expr(node.condition))
+        branch = self.builder.cbranch(condition, body_block, end_block)
+
+        if self.profile_record is not None:
+            # iterations (ignoring 'break') and exits
+            self.set_weights(branch, [self.get_count(node, 1), self.get_count(node)])
+
+        self.builder.position_at_end(body_block)
+
+        self.loops.append((latch_block, end_block))
+        self.gen_block(node.body)
+        self.loops.pop()
+
+        if not self.builder.block.is_terminated:
+            self.builder.branch(latch_block)
+
+        if latch_block is not condition_block:
+            self.builder.position_at_end(latch_block)
+            self.set_location(node.token)
+            self.gen_counter(node, 1)
+            self.builder.branch(condition_block)
+
+        self.builder.position_at_end(end_block)
+
+    def gen_break(self, node: parser.BreakNode):
+        if len(self.loops) == 0:
+            raise CodegenError(None, "'break' outside of loop")
+
+        self.builder.branch(self.loops[-1][1])
+
+    def gen_continue(self, node: parser.ContinueNode):
+        if len(self.loops) == 0:
+            raise CodegenError(None, "'continue' outside of loop")
+
+        self.builder.branch(self.loops[-1][0])
+
+    def gen_return(self, node: parser.ReturnNode):
+        return_type = self.func.function_type.return_type
+
+        if isinstance(node.value, parser.ValueNode) and node.value.value_type == "NULL":
+            self.gen_default_return()
+            return
+
+        if return_type == VOID:
+            raise CodegenError(semantic.get_token(node.value), "Cannot return a value from function without return type")
+
+        # the returned value may be the result of a task
+        self.join_tasks()
+        value = self.convert(self.gen_expr(node.value), node.value.concrete_type, self.return_type)
+        self.flush_counters()
+        self.release_arena()
+
+        self.builder.ret(value)
+
+    def gen_parallel_while(self, node: parser.WhileNode):
+        # the body runs in a function called by the task runtime for chunks of the iterations (see gen_parallel_body),
+        # the outer locals it reads are copied into a context and the partial results of the reductions are
+        # stored per chunk, then combined in order
+        index = node.condition.left
+        operand_type = node.condition.operand_type
+        signed = implang_types.is_signed(operand_type)
+
+        self.gen_counter(node)
+        begin = self.convert(self.gen_expr(index), index.concrete_type, operand_type)
+        end = self.convert(self.gen_expr(node.condition.right), node.condition.right.concrete_type, operand_type)
+
+        # arrays are shared through their address, the other values are copied
+        fields = []
+
+        for name in node.shared:
+            slot = self.get_slot(name)
+            fields.append(slot if isinstance(slot.type.pointee, ir.ArrayType) else self.builder.load(slot))
+
+        reductions = []
+
+        for name, operation in node.reductions.items():
+            slot = self.get_slot(name)
+            partials = self.alloca_builder.alloca(ir.ArrayType(slot.type.pointee, runtime.PARALLEL_CHUNKS), name=f"{name}.partials")
+            reductions.append((slot, operation, partials))
+            fields.append(partials)
+
+        context_type = ir.LiteralStructType([field.type for field in fields])
+        context = self.alloca_builder.alloca(context_type, name="parallel.context")
+
+        for i, field in enumerate(fields):
+            self.builder.store(field, self.builder.gep(context, [ir.Constant(C_INT, 0), ir.Constant(C_INT, i)], inbounds=True))
+
+        body = self.gen_parallel_body(node, context_type)
+
+        run_block = self.func.append_basic_block("parallel.run")
+        end_block = self.func.append_basic_block("parallel.end")
+        compare = self.builder.icmp_signed if signed else self.builder.icmp_unsigned
+        self.builder.cbranch(compare("<", begin, end), run_block, end_block)
+
+        self.builder.position_at_end(run_block)
+        extend = self.builder.sext if signed else self.builder.zext
+        bounds = [value if value.type.width == 64 else extend(value, INT) for value in [begin, end]]
+        count = self.builder.call(self.get_task_function("__impl_parallel_for"), [body, self.builder.bitcast(context, STR)] + bounds)
+
+        if reductions:
+            combine_block = self.func.append_basic_block("parallel.combine")
+            combined_block = self.func.append_basic_block("parallel.combined")
+            previous_block = self.builder.block
+            self.builder.branch(combine_block)
+
+            self.builder.position_at_end(combine_block)
+            chunk = self.builder.phi(INT)
+            chunk.add_incoming(ir.Constant(INT, 0), previous_block)
+
+            for slot, operation, partials in reductions:
+                partial = self.builder.load(self.builder.gep(partials, [ir.Constant(INT, 0), chunk], inbounds=True))
+                self.builder.store(self.gen_reduction_step(operation, self.builder.load(slot), partial), slot)
+
+            next_chunk = self.builder.add(chunk, ir.Constant(INT, 1))
+            chunk.add_incoming(next_chunk, combine_block)
+            self.builder.cbranch(self.builder.icmp_unsigned("<", next_chunk, count), combine_block, combined_block)
+            self.builder.position_at_end(combined_block)
+
+        self.builder.store(self.convert(end, operand_type, index.concrete_type), self.get_slot(index.name))
+        self.builder.branch(end_block)
+
+        self.builder.position_at_end(end_block)
+
+    def gen_parallel_body(self, node: parser.WhileNode, context_type: ir.LiteralStructType) -> ir.Function:
+        # void body(context, chunk, low, high), runs the iterations low..high-1 and stores the partial results at 'chunk'
+        saved_state = (self.func, self.builder, self.alloca_builder, self.locals, self.loops, self.arena_mark, self.subprogram, self.profile_locals, self.task_group, self.in_parallel)
+
+        self.func = ir.Function(self.module, runtime.TASK_TYPE, name=self.module.get_unique_name(f"{self.func.name}.parallel"))
+        self.func.linkage = "internal"
+        self.locals = {}
+        self.loops = []
+        self.profile_locals = {} # counted atomically, see gen_counter
+        self.task_group = None
+        self.in_parallel = True
+
+        context, chunk, low, high = self.func.args
+        entry_block = self.func.append_basic_block("entry")
+        body_block = self.func.append_basic_block("body")
+
+        self.alloca_builder = ir.IRBuilder(entry_block)
+        self.builder = ir.IRBuilder(body_block)
+
+        if self.debug_info is not None:
+            self.subprogram = self.debug_info.add_subprogram(self.func, self.func.name, node.token.line, [(None, VOID)])
+            self.alloca_builder.debug_metadata = self.debug_info.get_location(self.subprogram, node.token)
+            self.builder.debug_metadata = self.alloca_builder.debug_metadata
+
+        context = self.builder.bitcast(context, context_type.as_pointer())
+        fields = [self.builder.load(self.builder.gep(context, [ir.Constant(C_INT, 0), ir.Constant(C_INT, i)], inbounds=True)) for i in range(len(context_type.elements))]
+
+        for name, field in zip(node.shared, fields):
+            if isinstance(field.type, ir.PointerType) and isinstance(field.type.pointee, ir.ArrayType):
+                self.locals[name] = field
+            else:
+                self.builder.store(field, self.alloca(field.type, name))
+
+        accumulators = []
+
+        for (name, operation), partials in zip(node.reductions.items(), fields[len(node.shared):]):
+            value_type = partials.type.pointee.element
+            identity = {"PLUS": 0, "MULTIPLY": 1, "AND": 1, "OR": 0}[operation]
+            accumulator = self.alloca(value_type, name)
+            self.builder.store(ir.Constant(value_type, float(identity) if is_float_type(value_type) else identity), accumulator)
+            accumulators.append((accumulator, partials))
+
+        index = node.condition.left
+        operand_type = node.condition.operand_type
+        index_slot = self.alloca(get_ir_type(index.concrete_type), index.name)
+
+        if self.local_strings:
+            self.arena_mark = self.builder.load(self.get_arena()[1], name="arena.mark")
+
+        condition_block = self.func.append_basic_block("parallel.cond")
+        loop_body_block = self.func.append_basic_block("parallel.body")
+        latch_block = self.func.append_basic_block("parallel.latch")
+        end_block = self.func.append_basic_block("parallel.end")
+
+        start_block = self.builder.block
+        self.builder.branch(condition_block)
+
+        self.builder.position_at_end(condition_block)
+        iteration = self.builder.phi(INT, name="iteration")
+        iteration.add_incoming(low, start_block)
+        compare = self.builder.icmp_signed if implang_types.is_signed(operand_type) else self.builder.icmp_unsigned
+        self.builder.cbranch(compare("<", iteration, high), loop_body_block, end_block)
+
+        self.builder.position_at_end(loop_body_block)
+        operand_ir_type = get_ir_type(operand_type)
+        value = iteration if operand_ir_type.width == 64 else self.builder.trunc(iteration, operand_ir_type)
+        self.builder.store(self.convert(value, operand_type, index.concrete_type), index_slot)
+
+        # the last statement is the increment of the index
+        self.loops.append((latch_block, end_block))
+
+        for statement in node.body.statements[:-1]:
+            if self.builder.block.is_terminated:
+                break
+
+            self.gen_statement(statement)
+
+        self.loops.pop()
+
+        if not self.builder.block.is_terminated:
+            self.builder.branch(latch_block)
+
+        self.builder.position_at_end(latch_block)
+        self.set_location(node.token)
+        self.gen_counter(node, 1)
+        iteration.add_incoming(self.builder.add(iteration, ir.Constant(INT, 1)), latch_block)
+        self.builder.branch(condition_block)
+
+        self.builder.position_at_end(end_block)
+
+        for accumulator, partials in accumulators:
+            self.builder.store(self.builder.load(accumulator), self.builder.gep(partials, [ir.Constant(INT, 0), chunk], inbounds=True))
+
+        self.release_arena()
+        self.builder.ret_void()
+        self.alloca_builder.branch(body_block)
+
+        function = self.func
+        self.func, self.builder, self.alloca_builder, self.locals, self.loops, self.arena_mark, self.subprogram, self.profile_locals, self.task_group, self.in_parallel = saved_state
+
+        return function
+
+    def gen_reduction_step(self, operation: str, left, right):
+        if operation in ["AND", "OR"]:
+            # integer variables hold 0 or 1 after the first '&&=' or '||=', but may start with any value
+            combine = self.builder.and_ if operation == "AND" else self.builder.or_
+            value = combine(self.to_bool(left), self.to_bool(right))
+            return value if left.type == BOOL else self.builder.zext(value, left.type)
+        elif operation == "MULTIPLY":
+            return self.builder.fmul(left, right) if is_float_type(left.type) else self.builder.mul(left, right)
+
+        return self.builder.fadd(left, right) if is_float_type(left.type) else self.builder.add(left, right)
+
+    def gen_spawn(self, node: parser.SpawnNode, slot = None, type_name: str = None):
+        # the arguments (and the variable receiving the result) are copied into a block freed by the task
+        function, arguments = self.gen_arguments(node.call)
+        values = arguments + [slot if slot is not None else ir.Constant(STR, None)]
+
+        block_type = ir.LiteralStructType([value.type for value in values])
+        size = ir.Constant(block_type.as_pointer(), None).gep([ir.Constant(C_INT, 1)]).ptrtoint(INT)
+        data = self.builder.call(self.get_libc_function("malloc", STR, [INT]), [size])
+        block = self.builder.bitcast(data, block_type.as_pointer())
+
+        for i, value in enumerate(values):
+            self.builder.store(value, self.builder.gep(block, [ir.Constant(C_INT, 0), ir.Constant(C_INT, i)], inbounds=True))
+
+        task = self.get_task_wrapper(node.call.name, function, block_type, type_name if slot is not None else None)
+        self.builder.call(self.get_task_function("__impl_spawn"), [task, data, self.task_group])
+
+    def gen_task_join(self, node: parser.JoinNode):
+        self.join_tasks()
+
+    ###################
+
+    def gen_expr(self, node):
+        generator = self.expression_generators.get(type(node))
+
+        if generator is None:
+            raise CodegenError(semantic.get_token(node), f"Unexpected {type(node).__name__}")
+
+        return generator(node)
+
+    def gen_value(self, node: parser.ValueNode):
+        if node.value_type == "NULL":
+            return ir.Constant(INT, 0)
+
+        return self.get_constant(node, node.concrete_type)
+
+    def gen_variable(self, node: parser.VariableNode):
+        slot = self.get_slot(node.name, node.token)
+
+        if implang_types.is_array(node.concrete_type):
+            return slot # arrays are used through pointers, they are only indexed, copied or passed as slices
+
+        return self.builder.load(slot, name=node.name)
+
+    def gen_index(self, node: parser.IndexNode):
+        if implang_types.is_vector(node.target.concrete_type):
+            vector = self.gen_expr(node.target)
+            return self.builder.extract_element(vector, self.gen_index_value(node, self.get_lane_count(node)))
+
+        pointer = self.gen_element_pointer(node)
+
+        if implang_types.is_array(node.concrete_type):
+            return pointer # nested array, see gen_variable
+
+        return self.builder.load(pointer)
+
+    def gen_element_pointer(self, node: parser.IndexNode):
+        array_type = node.target.concrete_type
+        target = self.gen_expr(node.target)
+
+        if implang_types.is_slice(array_type):
+            data = self.builder.extract_value(target, 0)
+            length = self.builder.extract_value(target, 1)
+        else:
+            data = None
+            length = ir.Constant(INT, implang_types.get_array_length(array_type))
+
+        index = self.gen_index_value(node, length)
+
+        if data is None:
+            return self.builder.gep(target, [ir.Constant(INT, 0), index], inbounds=True)
+
+        return self.builder.gep(data, [index], inbounds=True)
+
+    def gen_index_value(self, node: parser.IndexNode, length):
+        index = self.convert(self.gen_expr(node.index), node.index.concrete_type, "i64")
+
+        # unchecked indexes are known to be in bounds, see semantic.get_bounds
+        if node.checked:
+            self.gen_bounds_check(index, length, node.token)
+
+        return index
+
+    def get_lane_count(self, node: parser.IndexNode):
+        return ir.Constant(INT, implang_types.get_array_length(node.target.concrete_type))
+
+    def gen_address(self, node):
+        # pointer to the storage of a variable or an array element
+        if isinstance(node, parser.VariableNode):
+            return self.get_slot(node.name, node.token)
+
+        if isinstance(node, parser.IndexNode) and not implang_types.is_vector(node.target.concrete_type):
+            return self.gen_element_pointer(node)
+
+        raise CodegenError(semantic.get_token(node), "Expression cannot be assigned to")
+
+    def gen_vector(self, node: parser.ArrayNode):
+        # array literals are stored in place by gen_store, only vector literals are values
+        if not implang_types.is_vector(node.concrete_type):
+            raise CodegenError(node.token, "Array literals can only initialize arrays")
+
+        element_type = implang_types.get_element_type(node.concrete_type)
+        vector = ir.Constant(get_ir_type(node.concrete_type), ir.Undefined)
+
+        for i, element in enumerate(node.elements):
+            value = self.convert(self.gen_expr(element), element.concrete_type, element_type)
+            vector = self.builder.insert_element(vector, value, ir.Constant(C_INT, i))
+
+        return vector
+
+    def gen_reduce(self, node: parser.ReduceNode):
+        vector = self.gen_expr(node.value)
+        element_type = node.concrete_type
+        lane_count = implang_types.get_array_length(node.value.concrete_type)
+        mangled_type = f"v{lane_count}{'f' if implang_types.is_float(element_type) else 'i'}{implang_types.get_width(element_type)}"
+
+        if implang_types.is_float(element_type):
+            operation = {"add": "fadd", "mul": "fmul", "min": "fmin", "max": "fmax"}[node.operation]
+        elif node.operation in ["min", "max"]:
+            operation = ("s" if implang_types.is_signed(element_type) else "u") + node.operation
+        else:
+            operation = node.operation
+
+        name = f"llvm.vector.reduce.{operation}.{mangled_type}"
+        function = self.module.globals.get(name)
+
+        if operation in ["fadd", "fmul"]:
+            # the start value is the identity, 'reassoc' allows a tree instead of a sequential reduction
+            if function is None:
+                function = ir.Function(self.module, ir.FunctionType(vector.type.element, [vector.type.element, vector.type]), name=name)
+
+            start = ir.Constant(vector.type.element, -0.0 if operation == "fadd" else 1.0)
+            return self.builder.call(function, [start, vector], fastmath=["reassoc"])
+
+        if function is None:
+            function = ir.Function(self.module, ir.FunctionType(vector.type.element, [vector.type]), name=name)
+
+        return self.builder.call(function, [vector])
+
+    def gen_bounds_check(self, index, length, token):
+        ok_block = self.func.append_basic_block("index.ok")
+        error_block = self.func.append_basic_block("index.error")
+
+        # an unsigned comparison also catches negative indexes
+        self.builder.cbranch(self.builder.icmp_unsigned("<", index, length), ok_block, error_block)
+
+        self.builder.position_at_end(error_block)
+        self.builder.call(self.get_index_error_helper(), [index, length, ir.Constant(C_INT, token.line)])
+        self.builder.unreachable()
+
+        self.builder.position_at_end(ok_block)
+
+    def gen_len(self, node: parser.LenNode):
+        value_type = node.value.concrete_type
+
+        if implang_types.is_array(value_type):
+            return ir.Constant(INT, implang_types.get_array_length(value_type))
+
+        return self.builder.extract_value(self.gen_expr(node.value), 1)
+
+    def gen_call(self, node: parser.CallNode):
+        function, arguments = self.gen_arguments(node)
+        return self.builder.call(function, arguments)
+
+    def gen_arguments(self, node: parser.CallNode) -> tuple:
+        # the called function and the arguments converted to its parameter types
+        if node.name not in self.functions and node.name in self.std:
+            self.declare_function(self.std[node.name])
+
+        function = self.functions.get(node.name)
+
+        if function is None:
+            raise CodegenError(node.name_token, f"'{node.name}' is not a function")
+
+        parameter_types = function.function_type.args
+
+        if len(parameter_types) != len(node.arguments):
+            raise CodegenError(node.name_token, f"Function '{node.name}' takes {len(parameter_types)} argument(s), {len(node.arguments)} given")
+
+        parameters = self.signatures[node.name].parameters
+        arguments = [self.convert(self.gen_expr(arg), arg.concrete_type, p.parameter_type) for arg, p in zip(node.arguments, parameters)]
+
+        return function, arguments
+
+    def gen_unary(self, node: parser.UnaryExprNode):
+        value = self.gen_expr(node.right)
+
+        if node.operation == "NOT":
+            return self.builder.not_(self.to_bool(value))
+
+        value = self.convert(value, node.right.concrete_type, node.concrete_type) # bool and char are u8
+
+        if node.operation == "PLUS":
+            return value
+
+        if node.operation == "MINUS":
+            if is_float_type(value.type):
+                return self.builder.fneg(value)
+
+            return self.builder.sub(ir.Constant(value.type, None), value)
+
+        if node.operation == "BITWISE_NOT":
+            return self.builder.not_(value)
+
+        raise CodegenError(node.token, f"Unsupported unary operation '{node.token.value}'")
+
+    def gen_binary(self, node: parser.ExprNode):
+        if node.operation in ["AND", "OR"]:
+            return self.gen_short_circuit(node)
+
+        text = get_constant_string(node)
+
+        if text is not None:
+            return self.get_string(text) # concatenation of literals, nothing to allocate
+
+        left = self.gen_expr(node.left)
+        right = self.gen_expr(node.right)
+
+        if node.operand_type == "str":
+            return self.gen_string_operation(node, left, right)
+
+        if node.operation == "XOR":
+            return self.builder.xor(self.to_bool(left), self.to_bool(right))
+
+        # both operands are converted to the promoted type, see semantic.promote
+        operand_type = node.operand_type
+        left = self.convert(left, node.left.concrete_type, operand_type)
+        right = self.convert(right, node.right.concrete_type, operand_type)
+
+        if implang_types.is_vector(operand_type):
+            operand_type = implang_types.get_element_type(operand_type) # element-wise, see semantic.get_vector_operand_type
+
+        return self.gen_arithmetic(node.operation, left, right, operand_type, node.token)
+
+    def gen_arithmetic(self, operation: str, left, right, operand_type: str, token = None):
+        # 'operation' on two numbers (or vector lanes) of ImpLang type 'operand_type'
+        if implang_types.is_float(operand_type):
+            if operation in COMPARISON_OPERATIONS:
+                return self.builder.fcmp_ordered(COMPARISON_OPERATIONS[operation], left, right)
+
+            if operation == "POWER":
+                pow_function = self.module.declare_intrinsic("llvm.pow", [left.type])
+                return self.builder.call(pow_function, [left, right])
+
+            if operation in FLOAT_BINARY_OPERATIONS:
+                return getattr(self.builder, FLOAT_BINARY_OPERATIONS[operation])(left, right)
+
+            raise CodegenError(token, f"Illegal operation ('{token.value}') on floating point values")
+
+        signed = implang_types.is_signed(operand_type)
+
+        if operation in COMPARISON_OPERATIONS:
+            if signed:
+                return self.builder.icmp_signed(COMPARISON_OPERATIONS[operation], left, right)
+
+            return self.builder.icmp_unsigned(COMPARISON_OPERATIONS[operation], left, right)
+
+        if operation == "POWER":
+            # the helper works on 64-bit integers, the result is truncated to the operand type
+            result = self.builder.call(self.get_ipow_helper(), [self.convert(left, operand_type, "i64"), self.convert(right, operand_type, "i64")])
+            return self.convert(result, "i64", operand_type)
+
+        if not signed and operation in UNSIGNED_BINARY_OPERATIONS:
+            return getattr(self.builder, UNSIGNED_BINARY_OPERATIONS[operation])(left, right)
+
+        if operation in INT_BINARY_OPERATIONS:
+            return getattr(self.builder, INT_BINARY_OPERATIONS[operation])(left, right)
+
+        raise CodegenError(token, f"Unsupported operation '{token.value}'")
+
+    def gen_short_circuit(self, node: parser.ExprNode):
+        left = self.to_bool(self.gen_expr(node.left))
+        left_block = self.builder.block
+
+        right_block = self.func.append_basic_block("logic.rhs")
+        end_block = self.func.append_basic_block("logic.end")
+
+        if node.operation == "AND":
+            self.builder.cbranch(left, right_block, end_block)
+        else:
+            self.builder.cbranch(left, end_block, right_block)
+
+        self.builder.position_at_end(right_block)
+        right = self.to_bool(self.gen_expr(node.right))
+        right_block = self.builder.block
+        self.builder.branch(end_block)
+
+        self.builder.position_at_end(end_block)
+        result = self.builder.phi(BOOL)
+        result.add_incoming(ir.Constant(BOOL, node.operation == "OR"), left_block)
+        result.add_incoming(right, right_block)
+
+        return result
+
+    def gen_string_operation(self, node: parser.ExprNode, left, right):
+        if left.type != STR or right.type != STR:
+            raise CodegenError(node.token, f"Illegal operation ('{node.token.value}') on string and non-string value")
+
+        if node.operation == "PLUS":
+            return self.builder.call(self.get_concat_helper(id(node) in self.local_strings), [left, right])
+
+        if node.operation in ["EQUALS", "NOT_EQUALS"]:
+            return self.gen_string_comparison(node.operation, left, right)
+
+        raise CodegenError(node.token, f"Illegal operation ('{node.token.value}') on strings")
+
+    def gen_string_comparison(self, operation: str, left, right):
+        strcmp = self.get_libc_function("strcmp", C_INT, [STR, STR])
+        result = self.builder.call(strcmp, [left, right])
+
+        return self.builder.icmp_signed(COMPARISON_OPERATIONS[operation], result, ir.Constant(C_INT, 0))
+
+    ###################
+
+    def gen_mir_function(self, function: mir.Function):
+        # the body from its SSA form (see mir.py): the values are registers and the phis get their operands once
+        # all blocks are generated. LLVM blocks are added when a branch first targets them, so the targets of a
+        # switch turned into a lookup table are skipped
+        self.mir_values = {}
+        self.mir_blocks = {0: self.builder.block}
+        phis = []
+
+        for index in mir.get_reverse_postorder(function):
+            if index not in self.mir_blocks:
+                continue # only reached through a lookup table
+
+            self.builder.position_at_end(self.mir_blocks[index])
+
+            for value in function.blocks[index].instructions:
+                opcode = function.opcodes[value]
+
+                if opcode == "phi":
+                    self.mir_values[value] = self.builder.phi(IR_TYPES[function.types[value]])
+                    phis.append((value, index))
+                elif opcode in mir.TERMINATORS:
+                    self.gen_mir_terminator(function, value)
+                else:
+                    self.mir_values[value] = self.gen_mir_instruction(function, value)
+
+        for value, index in phis:
+            for operand, predecessor in zip(function.operands[value], function.blocks[index].predecessors):
+                self.mir_values[value].add_incoming(self.get_mir_value(function, operand), self.mir_blocks[predecessor])
+
+    def get_mir_block(self, function: mir.Function, index: int) -> ir.Block:
+        if index not in self.mir_blocks:
+            self.mir_blocks[index] = self.func.append_basic_block(function.blocks[index].name)
+
+        return self.mir_blocks[index]
+
+    def get_mir_value(self, function: mir.Function, value: int):
+        if value in self.mir_values:
+            return self.mir_values[value]
+
+        if function.opcodes[value] == "param":
+            return self.func.args[function.data[value]]
+
+        type_name = function.types[value]
+        constant = function.data[value]
+
+        if type_name == "str":
+            result = ir.Constant(STR, None) if constant is None else self.get_string(constant)
+        elif implang_types.is_float(type_name):
+            result = ir.Constant(IR_TYPES[type_name], constant)
+        else:
+            result = ir.Constant(IR_TYPES[type_name], constant & ((1 << IR_TYPES[type_name].width) - 1))
+
+        self.mir_values[value] = result
+        return result
+
+    def gen_mir_instruction(self, function: mir.Function, value: int):
+        opcode = function.opcodes[value]
+        type_name = function.types[value]
+        operands = [self.get_mir_value(function, operand) for operand in function.operands[value]]
+        data = function.data[value]
+
+        if opcode == "call":
+            if data not in self.functions and data in self.std:
+                self.declare_function(self.std[data])
+
+            return self.builder.call(self.functions[data], operands)
+
+        if opcode == "load":
+            return self.builder.load(self.global_variables[data], name=data)
+
+        if opcode == "store":
+            self.builder.store(operands[0], self.global_variables[data])
+            return None
+
+        operand_type = function.types[function.operands[value][0]]
+
+        if opcode == "convert":
+            return self.convert(operands[0], operand_type, type_name)
+
+        if opcode == "concat":
+            return self.builder.call(self.get_concat_helper(data), operands)
+
+        if opcode in ["not", "lnot"]:
+            return self.builder.not_(operands[0])
+
+        if opcode == "neg":
+            if implang_types.is_float(type_name):
+                return self.builder.fneg(operands[0])
+
+            return self.builder.sub(ir.Constant(operands[0].type, None), operands[0])
+
+        if operand_type == "str":
+            return self.gen_string_comparison(MIR_OPERATIONS[opcode], *operands)
+
+        return self.gen_arithmetic(MIR_OPERATIONS[opcode], *operands, operand_type)
+
+    def gen_mir_terminator(self, function: mir.Function, value: int):
+        opcode = function.opcodes[value]
+        operands = [self.get_mir_value(function, operand) for operand in function.operands[value]]
+        data = function.data[value]
+
+        if opcode == "br":
+            self.builder.branch(self.get_mir_block(function, data[0]))
+        elif opcode == "cbr":
+            self.builder.cbranch(operands[0], self.get_mir_block(function, data[0]), self.get_mir_block(function, data[1]))
+        elif opcode == "switch":
+            self.gen_mir_switch(function, value, operands[0])
+        elif not operands:
+            self.gen_default_return()
+        else:
+            self.release_arena()
+            self.builder.ret(operands[0])
+
+    def gen_mir_switch(self, function: mir.Function, value: int, subject):
+        subject_type = function.types[function.operands[value][0]]
+        default, cases = function.data[value]
+
+        # every target is 'ret <constant>': index a constant table instead of branching, like gen_lookup_table
+        returned = [get_mir_returned_constant(function, target) for target in [default] + [target for _, target in cases]]
+
+        if function.return_type is not None and None not in returned:
+            entries = [(constant, self.get_mir_value(function, result)) for (constant, _), result in zip(cases, returned[1:])]
+
+            if self.gen_table_lookup(subject, subject_type, entries, self.get_mir_value(function, returned[0])):
+                return
+
+        switch = self.builder.switch(subject, self.get_mir_block(function, default))
+
+        for constant, target in cases:
+            switch.add_case(ir.Constant(subject.type, constant & ((1 << subject.type.width) - 1)), self.get_mir_block(function, target))
+
+    ###################
+
+    def get_concat_helper(self, local: bool = False):
+        # 'local' results are allocated in the arena of the call, the others on the heap
+        name = "concat_local" if local else "concat"
+
+        if name in self.helpers:
+            return self.helpers[name]
+
+        strlen = self.get_libc_function("strlen", INT, [STR])
+        allocate = self.get_arena_alloc_helper() if local else self.get_libc_function("malloc", STR, [INT])
+        memcpy = self.get_libc_function("memcpy", STR, [STR, STR, INT])
+
+        function = ir.Function(self.module, ir.FunctionType(STR, [STR, STR]), name="__impl_str_concat_local" if local else "__impl_str_concat")
+        function.linkage = "internal"
+        left, right = function.args
+
+        builder = ir.IRBuilder(function.append_basic_block("entry"))
+        left_length = builder.call(strlen, [left])
+        right_length = builder.call(strlen, [right])
+        length = builder.add(left_length, right_length)
+
+        result = builder.call(allocate, [builder.add(length, ir.Constant(INT, 1))])
+        builder.call(memcpy, [result, left, left_length])
+        builder.call(memcpy, [builder.gep(result, [left_length]), right, right_length])
+        builder.store(ir.Constant(CHAR, 0), builder.gep(result, [length]))
+        builder.ret(result)
+
+        self.helpers[name] = function
+        return function
+
+    def get_arena(self):
+        # the arena is a stack of malloc'ed chunks, strings are bump allocated from 'top' up to 'end' of the last one
+        if self.arena is None:
+            variables = []
+
+            # every thread has its own arena, initial-exec: programs are executables, the variables are at a fixed
+            # offset of the thread pointer
+            for name in ["chunk", "top", "end"]:
+                variable = ir.GlobalVariable(self.module, STR, name=f"__impl_arena_{name}")
+                variable.initializer = ir.Constant(STR, None)
+                variable.linkage = "internal"
+                variable.storage_class = "thread_local(initialexec)"
+                variables.append(variable)
+
+            self.arena = tuple(variables)
+
+        return self.arena
+
+    def get_arena_alloc_helper(self):
+        if "arena_alloc" in self.helpers:
+            return self.helpers["arena_alloc"]
+
+        _, top, end = self.get_arena()
+
+        function = ir.Function(self.module, ir.FunctionType(STR, [INT]), name="__impl_arena_alloc")
+        function.linkage = "internal"
+        size, = function.args
+
+        entry_block = function.append_basic_block("entry")
+        bump_block = function.append_basic_block("bump")
+        grow_block = function.append_basic_block("grow")
+
+        builder = ir.IRBuilder(entry_block)
+        result = builder.load(top)
+        next_top = builder.gep(result, [size])
+        builder.cbranch(builder.icmp_unsigned("<=", next_top, builder.load(end)), bump_block, grow_block)
+
+        builder.position_at_end(bump_block)
+        builder.store(next_top, top)
+        builder.ret(result)
+
+        builder.position_at_end(grow_block)
+        builder.ret(builder.call(self.get_arena_grow_helper(), [size]))
+
+        self.helpers["arena_alloc"] = function
+        return function
+
+    def get_arena_grow_helper(self):
+        if "arena_grow" in self.helpers:
+            return self.helpers["arena_grow"]
+
+        chunk, top, end = self.get_arena()
+        malloc = self.get_libc_function("malloc", STR, [INT])
+
+        # pushes a new chunk big enough for 'size' bytes, the rest of the previous one is left unused
+        function = ir.Function(self.module, ir.FunctionType(STR, [INT]), name="__impl_arena_grow")
+        function.linkage = "internal"
+        function.attributes.add("noinline")
+        size, = function.args
+
+        builder = ir.IRBuilder(function.append_basic_block("entry"))
+        needed = builder.add(size, ir.Constant(INT, ARENA_HEADER_SIZE))
+        chunk_size = builder.select(builder.icmp_unsigned(">", needed, ir.Constant(INT, ARENA_CHUNK_SIZE)), needed, ir.Constant(INT, ARENA_CHUNK_SIZE))
+        new_chunk = builder.call(malloc, [chunk_size])
+
+        header = builder.bitcast(new_chunk, STR.as_pointer())
+        builder.store(builder.load(chunk), header)
+        builder.store(builder.load(end), builder.gep(header, [ir.Constant(INT, 1)]))
+
+        result = builder.gep(new_chunk, [ir.Constant(INT, ARENA_HEADER_SIZE)])
+        builder.store(new_chunk, chunk)
+        builder.store(builder.gep(result, [size]), top)
+        builder.store(builder.gep(new_chunk, [chunk_size]), end)
+        builder.ret(result)
+
+        self.helpers["arena_grow"] = function
+        return function
+
+    def get_arena_release_helper(self):
+        if "arena_release" in self.helpers:
+            return self.helpers["arena_release"]
+
+        chunk, top, end = self.get_arena()
+        free = self.get_libc_function("free", VOID, [STR])
+
+        # frees the chunks pushed after 'mark' and resets 'top' to it, the first chunk is kept for the next calls
+        function = ir.Function(self.module, ir.FunctionType(VOID, [STR]), name="__impl_arena_release")
+        function.linkage = "internal"
+        mark, = function.args
+
+        entry_block = function.append_basic_block("entry")
+        loop_block = function.append_basic_block("loop")
+        check_block = function.append_basic_block("check")
+        pop_block = function.append_basic_block("pop")
+        free_block = function.append_basic_block("free")
+        keep_block = function.append_basic_block("keep")
+        done_block = function.append_basic_block("done")
+
+        builder = ir.IRBuilder(entry_block)
+        builder.branch(loop_block)
+
+        builder.position_at_end(loop_block)
+        current = builder.load(chunk)
+        builder.cbranch(builder.icmp_unsigned("==", current, ir.Constant(STR, None)), done_block, check_block)
+
+        builder.position_at_end(check_block)
+        data = builder.gep(current, [ir.Constant(INT, ARENA_HEADER_SIZE)])
+        after_start = builder.icmp_unsigned(">=", mark, data)
+        before_end = builder.icmp_unsigned("<=", mark, builder.load(end))
+        builder.cbranch(builder.and_(after_start, before_end), done_block, pop_block)
+
+        builder.position_at_end(pop_block)
+        header = builder.bitcast(current, STR.as_pointer())
+        previous = builder.load(header)
+        builder.cbranch(builder.icmp_unsigned("==", previous, ir.Constant(STR, None)), keep_block, free_block)
+
+        builder.position_at_end(free_block)
+        builder.store(previous, chunk)
+        builder.store(builder.load(builder.gep(header, [ir.Constant(INT, 1)])), end)
+        builder.call(free, [current])
+        builder.branch(loop_block)
+
+        builder.position_at_end(keep_block)
+        builder.store(data, top)
+        builder.ret_void()
+
+        builder.position_at_end(done_block)
+        builder.store(mark, top)
+        builder.ret_void()
+
+        self.helpers["arena_release"] = function
+        return function
+
+    def get_task_function(self, name: str):
+        return self.get_libc_function(name, *runtime.TASK_FUNCTIONS[name])
+
+    def get_task_wrapper(self, name: str, function: ir.Function, block_type: ir.LiteralStructType, type_name: str):
+        # task running a spawned call of 'function' from its block, the result is converted to 'type_name' and stored
+        # into the variable at the end of the block (without 'type_name' it is discarded)
+        key = f"task.{name}.{type_name}"
+
+        if key in self.helpers:
+            return self.helpers[key]
+
+        task = ir.Function(self.module, runtime.TASK_TYPE, name=self.module.get_unique_name(f"__impl_task.{name}"))
+        task.linkage = "internal"
+        data = task.args[0]
+
+        builder = ir.IRBuilder(task.append_basic_block("entry"))
+        block = builder.bitcast(data, block_type.as_pointer())
+        values = [builder.load(builder.gep(block, [ir.Constant(C_INT, 0), ir.Constant(C_INT, i)], inbounds=True)) for i in range(len(block_type.elements))]
+        result = builder.call(function, values[:-1])
+
+        if type_name is not None:
+            builder.store(self.convert(result, self.signatures[name].return_type, type_name, builder), values[-1])
+
+        builder.call(self.get_libc_function("free", VOID, [STR]), [data])
+        builder.ret_void()
+
+        self.helpers[key] = task
+        return task
+
+    def get_index_error_helper(self):
+        if "index_error" in self.helpers:
+            return self.helpers["index_error"]
+
+        dprintf = self.get_libc_function("dprintf", C_INT, [C_INT, STR], var_arg=True)
+        fflush = self.get_libc_function("fflush", C_INT, [STR])
+        abort = self.get_libc_function("abort", VOID, [])
+
+        # reports the out of bounds index on stderr and aborts, after writing the buffered output of stdio and of the
+        # standard runtime (abort doesn't)
+        function = ir.Function(self.module, ir.FunctionType(VOID, [INT, INT, C_INT]), name="__impl_index_error")
+        function.linkage = "internal"
+        function.attributes.add("noreturn")
+        function.attributes.add("cold")
+        function.attributes.add("noinline")
+        index, length, line = function.args
+
+        builder = ir.IRBuilder(function.append_basic_block("entry"))
+        message = self.get_string(f"{os.path.basename(self.file)}:%d: index %llu is out of bounds for length %llu\n")
+        builder.call(fflush, [ir.Constant(STR, None)])
+
+        flush = self.std.get("flush")
+
+        if flush is not None and self.signatures.get("flush", flush) is flush:
+            if "flush" not in self.functions:
+                self.declare_function(flush)
+
+            builder.call(self.functions["flush"], [])
+
+        builder.call(dprintf, [ir.Constant(C_INT, 2), message, line, index, length])
+        builder.call(abort, [])
+        builder.unreachable()
+
+        self.helpers["index_error"] = function
+        return function
+
+    def get_ipow_helper(self):
+        if "ipow" in self.helpers:
+            return self.helpers["ipow"]
+
+        # exponentiation by squaring, negative exponents yield 0
+        function = ir.Function(self.module, ir.FunctionType(INT, [INT, INT]), name="__impl_ipow")
+        function.linkage = "internal"
+        base, exponent = function.args
+
+        entry_block = function.append_basic_block("entry")
+        loop_block = function.append_basic_block("loop")
+        end_block = function.append_basic_block("end")
+
+        builder = ir.IRBuilder(entry_block)
+        is_negative = builder.icmp_signed("<", exponent, ir.Constant(INT, 0))
+        builder.cbranch(is_negative, end_block, loop_block)
+
+        builder.position_at_end(loop_block)
+        result = builder.phi(INT)
+        current_base = builder.phi(INT)
+        current_exponent = builder.phi(INT)
+
+        odd = builder.trunc(current_exponent, BOOL)
+        next_result = builder.select(odd, builder.mul(result, current_base), result)
+        next_base = builder.mul(current_base, current_base)
+        next_exponent = builder.lshr(current_exponent, ir.Constant(INT, 1))
+        done = builder.icmp_unsigned("==", next_exponent, ir.Constant(INT, 0))
+
+        result.add_incoming(ir.Constant(INT, 1), entry_block)
+        result.add_incoming(next_result, loop_block)
+        current_base.add_incoming(base, entry_block)
+        current_base.add_incoming(next_base, loop_block)
+        current_exponent.add_incoming(exponent, entry_block)
+        current_exponent.add_incoming(next_exponent, loop_block)
+
+        builder.cbranch(done, end_block, loop_block)
+
+        builder.position_at_end(end_block)
+        final = builder.phi(INT)
+        final.add_incoming(ir.Constant(INT, 0), entry_block)
+        final.add_incoming(next_result, loop_block)
+        builder.ret(final)
+
+        self.helpers["ipow"] = function
+        return function
+
+###################
+
+def create_target_machine(opt_level: int, cpu: str = None) -> llvm.TargetMachine:
+    # the CPU decides the instruction set extensions (e.g. the vector registers used for vector types and
+    # by the auto-vectorizer), the generic CPU gives binaries running on every machine of the target
+    llvm.initialize_native_target()
+    llvm.initialize_native_asmprinter()
+
+    features = ""
+
+    if cpu == "native":
+        cpu = llvm.get_host_cpu_name()
+        features = llvm.get_host_cpu_features().flatten()
+
+    target = llvm.Target.from_triple(llvm.get_process_triple())
+    return target.create_target_machine(cpu=cpu or "", features=features, opt=opt_level, reloc="pic", codemodel="default")
+
+def optimize(llvm_module: llvm.ModuleRef, target_machine: llvm.TargetMachine, opt_level: int):
+    # the passes lay out types like the object code emitted for the target (the IR has no data layout, whose
+    # default aligns i64 to 4 bytes)
+    llvm_module.data_layout = str(target_machine.target_data)
+
+    if opt_level == 0:
+        return
+
+    tuning_options = llvm.create_pipeline_tuning_options(speed_level=opt_level)
+    pass_builder = llvm.create_pass_builder(target_machine, tuning_options)
+    pass_builder.getModulePassManager().run(llvm_module, pass_builder)
+
+def link_modules(llvm_modules: list[llvm.ModuleRef]) -> llvm.ModuleRef:
+    # link-time optimization: one module for the whole program, so functions can be inlined across files
+    merged = llvm_modules[0]
+
+    for llvm_module in llvm_modules[1:]:
+        try:
+            merged.link_in(llvm_module)
+        except RuntimeError as e:
+            logger.compiler_error(f"Linking modules failed: {e}")
+            raise SystemExit(1)
+
+    merged.verify()
+    return merged
+
+def internalize(llvm_module: llvm.ModuleRef, preserved: set[str]):
+    # nothing outside of the module uses its definitions, except for 'preserved' (the entry point),
+    # this lets the optimizer inline, specialize and delete them freely
+    for value in itertools.chain(llvm_module.functions, llvm_module.global_variables):
+        if not value.is_declaration and value.name not in preserved and value.linkage == llvm.Linkage.external:
+            value.linkage = llvm.Linkage.internal
+
+def get_declaration(value) -> str:
+    # a function or variable defined in another codegen unit, the metadata (debug info, profile counts) stays with the definition
+    if isinstance(value, LoweredFunction):
+        value = value.function
+
+    if isinstance(value, ir.Function):
+        blocks, metadata = value.blocks, value.metadata
+        value.blocks, value.metadata = [], {}
+
+        try:
+            return str(value)
+        finally:
+            value.blocks, value.metadata = blocks, metadata
+
+    # str() of a variable is cached, the declaration is rendered through descr()
+    initializer, linkage = value.initializer, value.linkage
+    value.initializer, value.linkage = None, "external"
+    text = [f"{value.get_reference()} = "]
+
+    try:
+        value.descr(text)
+    finally:
+        value.initializer, value.linkage = initializer, linkage
+
+    return "".join(text).rstrip()
+
+def split_module(module: ir.Module, count: int) -> list[str]:
+    """Render 'module' as the IR of up to 'count' codegen units. Every external function is defined in one unit (consecutive
+    functions together, balanced by size) and declared in the others, the variables are defined in the first unit, the
+    internal helpers and private constants are copied to every unit using them."""
+    header = [f'; ModuleID = "{module.name}"', f'target triple = "{module.triple}"', f'target datalayout = "{module.data_layout}"', ""]
+    header += [it.get_declaration() for it in module.get_identified_types().values()]
+
+    metadata = [f"!{name} = !{{ {', '.join(operand.get_reference() for operand in node.operands)} }}" for name, node in module.namedmetadata.items()]
+    metadata += [str(node) for node in module.metadata]
+
+    texts = {} # name -> definition
+    units = {} # name -> unit index, for the external definitions
+    functions = []
+
+    for value in module.globals.values():
+        if isinstance(value, LoweredFunction) or (isinstance(value, ir.Function) and value.blocks) or (isinstance(value, ir.GlobalVariable) and value.initializer is not None):
+            texts[value.name] = str(value)
+
+            if value.linkage in ["", "external"]:
+                if isinstance(value, ir.GlobalVariable):
+                    units[value.name] = 0
+                else:
+                    functions.append(value.name)
+
+    total = sum(len(texts[name]) for name in functions) or 1
+    done = 0
+
+    for name in functions:
+        units[name] = min(count - 1, (2 * done + len(texts[name])) * count // (2 * total))
+        done += len(texts[name])
+
+    output = []
+
+    for unit in sorted(set(units.values()) | {0}):
+        lines = []
+        local = [] # internal definitions, included when referenced
+
+        for value in module.globals.values():
+            if value.name not in texts:
+                lines.append(str(value))
+            elif value.name in units:
+                lines.append(texts[value.name] if units[value.name] == unit else get_declaration(value))
+            elif value.linkage == "appending":
+                if unit == 0:
+                    lines.append(texts[value.name])
+            else:
+                local.append(value)
+
+        references = set(re.findall(r'@(?:"[^"]*"|[-\w$.]+)', "\n".join(lines)))
+        included = set()
+
+        while True:
+            new = [value for value in local if value.name not in included and value.get_reference() in references]
+
+            if not new:
+                break
+
+            for value in new:
+                included.add(value.name)
+                references.update(re.findall(r'@(?:"[^"]*"|[-\w$.]+)', texts[value.name]))
+
+        lines += [texts[value.name] for value in local if value.name in included]
+        output.append("\n".join(header + lines + metadata))
+
+    return output
+
+def compile_unit(unit: tuple) -> tuple:
+    """Worker of compile_units, returns the object code of a codegen unit and its optimized IR (when 'verbose')"""
+    text, opt_level, cpu, verbose = unit
+    target_machine = create_target_machine(opt_level, cpu)
+
+    llvm_module = llvm.parse_assembly(text)
+    llvm_module.verify()
+    optimize(llvm_module, target_machine, opt_level)
+
+    return target_machine.emit_object(llvm_module), str(llvm_module) if verbose else None
+
+def compile_units(file: str, module: ir.Module, options: CodegenOptions, verbose: bool) -> list[bytes]:
+    # every unit is optimized and emitted in a process of its own
+    units = [(text, options.opt_level, options.cpu, verbose) for text in split_module(module, options.units)]
+
+    with multiprocessing.Pool(len(units)) as pool:
+        results = pool.map(compile_unit, units)
+
+    if verbose:
+        for i, (_, text) in enumerate(results):
+            logger.compiler_debug(f"LLVM IR for '{file}' (codegen unit {i}):")
+            logger.compiler_debug(text)
+
+    return [object_code for object_code, _ in results]
+
+def link(object_files: list[str], output_file: str, relocatable: bool = False):
+    if relocatable:
+        command = ["cc", "-r", "-nostdlib", "-o", output_file] + object_files
+    else:
+        command = ["cc", "-o", output_file] + object_files + ["-lm", "-lpthread"]
+
+    result = subprocess.run(command, capture_output=True, text=True)
+
+    if result.returncode != 0:
+        for line in result.stderr.splitlines():
+            logger.compiler_error(line)
+
+        logger.compiler_error("Linking failed")
+        raise SystemExit(1)
+
+def write_archive(object_code: bytes, directory: str, name: str) -> str:
+    # a static library, the linker only uses it when an object calls into it
+    object_file = os.path.join(directory, f"{name}.o")
+    archive = os.path.join(directory, f"lib{name}.a")
+
+    with open(object_file, "wb") as f:
+        f.write(object_code)
+
+    result = subprocess.run(["ar", "rcs", archive, object_file], capture_output=True, text=True)
+
+    if result.returncode != 0:
+        for line in result.stderr.splitlines():
+            logger.compiler_error(line)
+
+        logger.compiler_error(f"Creating the archive '{archive}' failed")
+        raise SystemExit(1)
+
+    return archive
+
+def generate_module(file: str, program: parser.Program, options: CodegenOptions, atomic_counters: bool = False) -> ir.Module:
+    try:
+        return ModuleCodegen(file, program, options, atomic_counters).generate()
+    except CodegenError as e:
+        if isinstance(program, parser.ProgramStream):
+            # parse and semantic errors are reported first, like without streaming
+            for _ in program.functions:
+                pass
+
+        if e.token is None:
+            logger.compiler_error(f"{file}: {e.message}")
+        else:
+            logger.code_error(file, e.token.line, e.token.column, len(e.token.value), e.message)
+
+        raise SystemExit(1)
+
+def codegen(input_files: list[str], ast: list[parser.Program], output_file: str, verbose: bool = False, options: CodegenOptions = None, object_files: list[str] = None):
+    # 'object_files' are linked into the output together with the compiled inputs
+    options = options or CodegenOptions()
+    object_files = object_files or []
+
+    if verbose:
+        logger.compiler_debug("Codegen started")
+
+    if (options.compile_only or options.assembly) and len(input_files) > 1 and not options.lto:
+        logger.compiler_error("Cannot write a single output file for multiple inputs with -c or -S (without -flto)")
+        raise SystemExit(1)
+
+    if (options.compile_only or options.assembly) and object_files:
+        logger.compiler_error("Object files can only be used as inputs when linking")
+        raise SystemExit(1)
+
+    if options.units > 1 and (options.assembly or options.lto or options.profile_instr):
+        # -flto optimizes a single module, the profile counters of a module are internal to it
+        logger.compiler_error("Multiple codegen units cannot be used with -S, -flto or -fprofile-instr")
+        raise SystemExit(1)
+
+    if options.emit_mir:
+        with open(output_file, "w") as f:
+            for file, program in zip(input_files, ast):
+                f.write(f"; {file}\n\n{mir.build_module(program, escape.get_nocapture_functions(program), options.string_arena, get_switch_min_cases(options), checked=True)}")
+
+        if verbose:
+            logger.compiler_debug(f"MIR written to '{output_file}'")
+
+        return
+
+    target_machine = create_target_machine(options.opt_level, options.cpu)
+    llvm_modules = []
+    unit_objects = [] # object code of the inputs split into codegen units
+    uses_std = False
+    uses_tasks = False
+
+    # the tasks runtime is linked when a program uses tasks, or may be when the objects are linked elsewhere
+    atomic_counters = options.profile_instr and (options.compile_only or options.assembly or bool(object_files) or any(parser.uses_tasks(program) for program in ast))
+
+    for file, program in zip(input_files, ast):
+        module = generate_module(file, program, options, atomic_counters)
+        uses_std = uses_std or (parser.uses_std(program) and any(name in module.globals for name in defs.STD_FUNCTIONS))
+        uses_tasks = uses_tasks or any(name in module.globals for name in runtime.TASK_FUNCTIONS)
+
+        if options.units > 1:
+            unit_objects += compile_units(file, module, options, verbose)
+            continue
+
+        llvm_module = llvm.parse_assembly(str(module))
+        llvm_module.verify()
+
+        if not options.lto:
+            optimize(llvm_module, target_machine, options.opt_level)
+
+        if verbose:
+            logger.compiler_debug(f"LLVM IR for '{file}':")
+            logger.compiler_debug(str(llvm_module))
+
+        llvm_modules.append(llvm_module)
+
+    runtime_module = None
+    tasks_module = None
+
+    if not (options.compile_only or options.assembly) and (uses_std or object_files):
+        # like libc, the standard runtime is linked into executables (not into -c objects) and always optimized,
+        # its output buffers are locked when tasks may print at the same time
+        runtime_module = llvm.parse_assembly(str(runtime.generate(threads=uses_tasks or bool(object_files))))
+        runtime_module.verify()
+        optimize(runtime_module, target_machine, runtime.OPT_LEVEL)
+
+        if options.lto and uses_std and llvm_modules:
+            llvm_modules.append(runtime_module)
+            runtime_module = None
+
+    if not (options.compile_only or options.assembly) and (uses_tasks or object_files):
+        tasks_module = llvm.parse_assembly(str(runtime.generate_tasks()))
+        tasks_module.verify()
+        optimize(tasks_module, target_machine, runtime.OPT_LEVEL)
+
+        if options.lto and uses_tasks and llvm_modules:
+            llvm_modules.append(tasks_module)
+            tasks_module = None
+
+    if options.lto and llvm_modules:
+        llvm_module = link_modules(llvm_modules)
+
+        # objects linked in from outside may call any function
+        if not (options.compile_only or options.assembly or object_files):
+            internalize(llvm_module, {"main"})
+
+        optimize(llvm_module, target_machine, options.opt_level)
+
+        if verbose:
+            logger.compiler_debug("LLVM IR after link-time optimization:")
+            logger.compiler_debug(str(llvm_module))
+
+        llvm_modules = [llvm_module]
+
+    if options.assembly:
+        with open(output_file, "w") as f:
+            f.write(target_machine.emit_assembly(llvm_modules[0]))
+        return
+
+    object_code = [target_machine.emit_object(llvm_module) for llvm_module in llvm_modules] + unit_objects
+
+    if options.compile_only and len(object_code) == 1:
+        with open(output_file, "wb") as f:
+            f.write(object_code[0])
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        generated_files = []
+
+        for i, code in enumerate(object_code):
+            object_file = os.path.join(tmp_dir, f"{i}.o")
+
+            with open(object_file, "wb") as f:
+                f.write(code)
+
+            generated_files.append(object_file)
+
+        if runtime_module is not None:
+            object_files = object_files + [write_archive(target_machine.emit_object(runtime_module), tmp_dir, "implstd")]
+
+        if tasks_module is not None:
+            object_files = object_files + [write_archive(target_machine.emit_object(tasks_module), tmp_dir, "impltasks")]
+
+        # the codegen units of a -c build are combined into one relocatable object
+        link(generated_files + object_files, output_file, relocatable=options.compile_only)
+
+    if verbose:
+        logger.compiler_debug(f"Output written to '{output_file}'")
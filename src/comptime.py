@@ -0,0 +1,776 @@
+# Compile-time evaluation
+#
+# Runs between the semantic analysis and codegen. Calls of the program's functions whose arguments are all
+# constants are run by an interpreter over the typed AST and replaced by the returned value (a ValueNode),
+# e.g. 'u64_to_str(sum_to(100))' becomes "5050". Calls are folded bottom-up, so a folded call can be the
+# constant argument of the next one. At -O1 and above every such call is tried with a small step budget and
+# left alone when the evaluation fails, a '@comptime' function is always evaluated at compile time and a call
+# that cannot be is an error (its arguments have to be constants, except inside other '@comptime' functions).
+#
+# The interpreter follows codegen: integers wrap around to their type, floats are rounded to f32 where
+# codegen uses it, strings end at their first NUL, arrays are copied on assignment and passed as slices by
+# reference, spawned calls run directly and parallel loops in order. The evaluation stops, and the call
+# stays a call, on anything it cannot reproduce exactly:
+#
+#   side effects    assigning a global variable or calling an imported function (also the standard runtime)
+#   changing state  reading a global variable the program assigns or passes as a slice
+#   undefined       division by zero, shifts by the width or more, float to integer conversions out of range,
+#                   index errors (the program would abort)
+#   unsupported     vectors, float pow on f32 and parallel loops with float reductions
+#   limits          more than MAX_STEPS statements and loop iterations, MAX_MEMORY array elements and string
+#                   bytes or MAX_CALL_DEPTH nested calls
+#
+# With -fstream the function bodies are released by codegen before the later ones are parsed, so nothing is
+# folded and '@comptime' is an error.
+
+import math
+import struct
+import sys
+
+import implang_types
+import lexer
+import logger
+import parser
+import semantic
+
+MAX_STEPS = 1_000_000 # steps of the evaluation of a '@comptime' call
+FOLD_MAX_STEPS = 10_000 # steps of an optional evaluation (at -O1 and above)
+FOLD_TOTAL_STEPS = 1_000_000 # steps of all optional evaluations of a program
+MAX_MEMORY = 1 << 20 # array elements and string bytes allocated by an evaluation
+MAX_CALL_DEPTH = 1000
+RECURSION_LIMIT = 20 * MAX_CALL_DEPTH # Python frames, a call of the program takes about ten
+
+COMPARISONS = {
+    "EQUALS": lambda a, b: a == b,
+    "NOT_EQUALS": lambda a, b: a != b,
+    "GREATER_THAN": lambda a, b: a > b,
+    "LESS_THAN": lambda a, b: a < b,
+    "GREATER_THAN_OR_EQUAL": lambda a, b: a >= b,
+    "LESS_THAN_OR_EQUAL": lambda a, b: a <= b
+}
+
+SHIFTS = {
+    "BITWISE_LEFT_SHIFT": "left",
+    "BITWISE_RIGHT_SHIFT": "right"
+}
+
+ESCAPED_CHARACTERS = {"\n": "\\n", "\t": "\\t", "\r": "\\r", "\\": "\\\\", "\"": "\\\""} # inverse of lexer.unescape
+
+class ComptimeError(Exception):
+    """A call of a '@comptime' function that cannot be evaluated at compile time"""
+    def __init__(self, token, message: str):
+        self.token = token
+        self.message = message
+
+class NotConstant(Exception):
+    """Stops an evaluation, 'reason' completes 'it ...' (e.g. "divides by zero")"""
+    def __init__(self, reason: str):
+        self.reason = reason
+
+class Return:
+    """A 'return' statement that was run, passed up to the call"""
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return f"Return({self.value})"
+
+    def __repr__(self):
+        return self.__str__()
+
+BREAK = "break"
+CONTINUE = "continue"
+
+def wrap(value: int, type_name: str) -> int:
+    # two's complement truncation of 'value' to an integer type (bool and char are u1 and u8)
+    width = implang_types.get_width(type_name)
+    value &= (1 << width) - 1
+
+    if implang_types.is_signed(type_name) and value >> (width - 1):
+        value -= 1 << width
+
+    return value
+
+def to_f32(value: float) -> float:
+    try:
+        return struct.unpack("f", struct.pack("f", value))[0]
+    except OverflowError:
+        return math.copysign(math.inf, value) # rounds to infinity like fptrunc
+
+def round_float(value: float, type_name: str) -> float:
+    return to_f32(value) if type_name == "f32" else value
+
+def to_bool(value) -> int:
+    if isinstance(value, float):
+        return int(not math.isnan(value) and value != 0.0)
+
+    return int(value != 0)
+
+def cut_string(text: str) -> str:
+    # the runtime sees strings up to their first NUL
+    end = text.find("\0")
+    return text if end == -1 else text[:end]
+
+def convert(value, from_type: str, to_type: str):
+    """'value' of ImpLang type 'from_type' converted to 'to_type', like codegen.ModuleCodegen.convert"""
+    if from_type == to_type or implang_types.is_array_or_slice(to_type) or to_type == "str":
+        return value # arrays are passed as slices by reference
+
+    if implang_types.is_vector(to_type) or implang_types.is_vector(from_type):
+        raise NotConstant("uses vectors")
+
+    if to_type == "bool":
+        return to_bool(value)
+
+    if implang_types.is_float(to_type):
+        if isinstance(value, int) and to_type == "f32" and abs(value) > 1 << 53:
+            raise NotConstant(f"converts {value} to 'f32'") # rounded once by codegen, twice through a double
+
+        return round_float(float(value), to_type)
+
+    if isinstance(value, float):
+        # fptosi and fptoui give poison for values out of range
+        if math.isnan(value) or math.isinf(value) or not implang_types.fits(int(value), to_type if to_type != "char" else "u8"):
+            raise NotConstant(f"converts {value} to '{to_type}' out of range")
+
+        return int(value)
+
+    return wrap(value, to_type)
+
+def zero(type_name: str):
+    # the value of a variable without initializer
+    if implang_types.is_array(type_name):
+        element_type, length = implang_types.split_array_type(type_name)
+        return [zero(element_type) for _ in range(length)]
+
+    if implang_types.is_slice(type_name):
+        return []
+
+    if implang_types.is_vector(type_name):
+        raise NotConstant("uses vectors")
+
+    if implang_types.is_float(type_name):
+        return 0.0
+
+    if type_name == "str":
+        return None # a null pointer
+
+    return 0
+
+def copy_array(value):
+    return [copy_array(element) if isinstance(element, (list, tuple)) else element for element in value]
+
+def freeze_array(value):
+    # global arrays are read-only for the interpreter
+    return tuple(freeze_array(element) if isinstance(element, (list, tuple)) else element for element in value)
+
+def get_array_size(value) -> int:
+    return sum(get_array_size(element) if isinstance(element, (list, tuple)) else 1 for element in value)
+
+def is_constant(node) -> bool:
+    # literals and operations on them, the arguments a call is folded for
+    if isinstance(node, parser.ValueNode):
+        return node.value_type != "NULL"
+
+    if isinstance(node, parser.UnaryExprNode):
+        return is_constant(node.right)
+
+    if isinstance(node, parser.ExprNode):
+        return is_constant(node.left) and is_constant(node.right)
+
+    return False
+
+def is_ast_node(value) -> bool:
+    return parser.is_ast_record(value) and not isinstance(value, lexer.Token)
+
+def get_literal(value, type_name: str, token) -> parser.ValueNode:
+    # a ValueNode of the evaluated 'value', None when it has no literal
+    if type_name == "str":
+        if value is None:
+            return None
+
+        node = parser.ValueNode(token, "STRING", "\"" + "".join(ESCAPED_CHARACTERS.get(c, c) for c in value) + "\"")
+    elif type_name == "bool":
+        node = parser.ValueNode(token, "BOOLEAN", "true" if value else "false")
+    elif implang_types.is_float(type_name):
+        if math.isnan(value) or math.isinf(value):
+            return None # no literal, the call stays
+
+        node = parser.ValueNode(token, "FLOAT", repr(value))
+    else:
+        node = parser.ValueNode(token, "INTEGER", str(value))
+
+    node.concrete_type = type_name
+    return node
+
+def get_changed_globals(program: parser.Program, global_names: set) -> set:
+    # the global variables assigned by any function or passed to one as a slice (which may change it)
+    changed = set()
+    pending = [statement.body for statement in program.statements if isinstance(statement, parser.FuncNode) and statement.body is not None]
+
+    while pending:
+        node = pending.pop()
+
+        if isinstance(node, parser.AssignmentNode) and node.name in global_names:
+            changed.add(node.name)
+        elif isinstance(node, parser.IndexAssignmentNode):
+            root = node.target
+
+            while isinstance(root, parser.IndexNode):
+                root = root.target
+
+            if isinstance(root, parser.VariableNode) and root.name in global_names:
+                changed.add(root.name)
+        elif isinstance(node, parser.CallNode):
+            for argument in node.arguments:
+                if isinstance(argument, parser.VariableNode) and argument.name in global_names and implang_types.is_array(argument.concrete_type):
+                    changed.add(argument.name)
+
+        pending.extend(parser.get_children(node))
+
+    return changed
+
+class Interpreter:
+    def __init__(self, program: parser.Program):
+        self.functions = {} # name -> parser.FuncNode defined by the program
+        self.global_variables = {} # name -> parser.VarNode
+        self.global_values = {} # name -> value of the global variables read so far
+
+        for statement in program.statements:
+            if isinstance(statement, parser.FuncNode) and statement.body is not None:
+                self.functions[statement.name] = statement
+            elif isinstance(statement, parser.VarNode):
+                self.global_variables[statement.name] = statement
+
+        self.changed_globals = get_changed_globals(program, set(self.global_variables))
+
+        self.steps = 0
+        self.max_steps = 0
+        self.memory = 0
+        self.depth = 0
+
+    def evaluate(self, function: parser.FuncNode, arguments: list, max_steps: int):
+        """Run 'function' with constant arguments (of the parameter types), returns its result or raises NotConstant"""
+        self.steps = 0
+        self.max_steps = max_steps
+        self.memory = 0
+        self.depth = 0
+
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursion_limit, RECURSION_LIMIT))
+
+        try:
+            return self.call(function, arguments)
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+
+    def step(self):
+        self.steps += 1
+
+        if self.steps > self.max_steps:
+            raise NotConstant(f"runs more than {self.max_steps} steps")
+
+    def allocate(self, size: int):
+        self.memory += size
+
+        if self.memory > MAX_MEMORY:
+            raise NotConstant(f"uses more than {MAX_MEMORY} array elements and string bytes")
+
+    def call(self, function: parser.FuncNode, arguments: list):
+        if self.depth >= MAX_CALL_DEPTH:
+            raise NotConstant(f"nests more than {MAX_CALL_DEPTH} calls")
+
+        self.step()
+        self.depth += 1
+
+        variables = {parameter.name: argument for parameter, argument in zip(function.parameters, arguments)}
+        result = self.exec_block(function.body, variables, function)
+
+        self.depth -= 1
+
+        if isinstance(result, Return):
+            return result.value
+
+        if function.return_type is None:
+            return None
+
+        return zero(function.return_type) # codegen returns zero when the end of the body is reached
+
+    def call_node(self, node: parser.CallNode, variables: dict):
+        function = self.functions.get(node.name)
+
+        if function is None:
+            raise NotConstant(f"calls the imported function '{node.name}'")
+
+        arguments = [convert(self.eval(argument, variables), argument.concrete_type, parameter.parameter_type)
+                     for argument, parameter in zip(node.arguments, function.parameters)]
+
+        return self.call(function, arguments)
+
+    ###################
+
+    def exec_block(self, block: parser.BlockNode, variables: dict, function: parser.FuncNode):
+        # None when the end of the block is reached, otherwise BREAK, CONTINUE or a Return
+        for statement in block.statements:
+            result = self.exec_statement(statement, variables, function)
+
+            if result is not None:
+                return result
+
+        return None
+
+    def exec_statement(self, node, variables: dict, function: parser.FuncNode):
+        self.step()
+
+        if isinstance(node, parser.VarNode):
+            if node.value is None:
+                value = zero(node.value_type)
+
+                if isinstance(value, list):
+                    self.allocate(get_array_size(value))
+
+                variables[node.name] = value
+            else:
+                variables[node.name] = self.eval_stored(node.value, node.value_type, variables)
+        elif isinstance(node, parser.AssignmentNode):
+            if node.name not in variables:
+                raise NotConstant(f"assigns the global variable '{node.name}'")
+
+            variables[node.name] = self.eval_stored(node.value, node.concrete_type, variables)
+        elif isinstance(node, parser.IndexAssignmentNode):
+            self.exec_index_assignment(node, variables)
+        elif isinstance(node, parser.IfNode):
+            for arm in [node] + node.else_ifs:
+                if to_bool(self.eval(arm.condition, variables)):
+                    return self.exec_block(arm.body, variables, function)
+
+            if node.else_statement is not None:
+                return self.exec_block(node.else_statement, variables, function)
+        elif isinstance(node, parser.WhileNode):
+            return self.exec_while(node, variables, function)
+        elif isinstance(node, parser.BreakNode):
+            return BREAK
+        elif isinstance(node, parser.ContinueNode):
+            return CONTINUE
+        elif isinstance(node, parser.ReturnNode):
+            if node.value is None or (isinstance(node.value, parser.ValueNode) and node.value.value_type == "NULL"):
+                return Return(zero(function.return_type) if function.return_type is not None else None)
+
+            return Return(convert(self.eval(node.value, variables), node.value.concrete_type, function.return_type))
+        elif isinstance(node, parser.JoinNode):
+            pass # spawned calls have run already
+        else:
+            self.eval(node, variables) # an expression, e.g. a call
+
+        return None
+
+    def exec_index_assignment(self, node: parser.IndexAssignmentNode, variables: dict):
+        target = node.target
+
+        if implang_types.is_vector(target.target.concrete_type):
+            raise NotConstant("uses vectors")
+
+        array = self.eval(target.target, variables)
+        index = self.eval_index(target, array, variables)
+
+        if isinstance(array, tuple):
+            raise NotConstant("assigns an element of a global array")
+
+        array[index] = self.eval_stored(node.value, target.concrete_type, variables)
+
+    def exec_while(self, node: parser.WhileNode, variables: dict, function: parser.FuncNode):
+        if node.parallel and self.has_float_reduction(node, variables):
+            # the partial results of the threads are added in a different order than sequentially
+            raise NotConstant("has a parallel loop with a float reduction")
+
+        while to_bool(self.eval(node.condition, variables)):
+            self.step()
+            result = self.exec_block(node.body, variables, function)
+
+            if result is BREAK:
+                break
+
+            if isinstance(result, Return):
+                return result
+
+        return None
+
+    def has_float_reduction(self, node: parser.WhileNode, variables: dict) -> bool:
+        pending = [node.body]
+
+        while pending:
+            child = pending.pop()
+
+            if isinstance(child, parser.AssignmentNode) and child.name in variables and implang_types.is_float(child.concrete_type):
+                return True
+
+            pending.extend(parser.get_children(child))
+
+        return False
+
+    ###################
+
+    def eval_stored(self, node, type_name: str, variables: dict):
+        # the value of 'node' converted to 'type_name', arrays are copied (see codegen.ModuleCodegen.gen_store)
+        if isinstance(node, parser.ArrayNode) and implang_types.is_array(type_name):
+            element_type = implang_types.get_element_type(type_name)
+            self.allocate(len(node.elements))
+            return [self.eval_stored(element, element_type, variables) for element in node.elements]
+
+        value = self.eval(node, variables)
+
+        if implang_types.is_array(type_name):
+            self.allocate(get_array_size(value))
+            return copy_array(value)
+
+        return convert(value, node.concrete_type, type_name)
+
+    def eval_index(self, node: parser.IndexNode, array, variables: dict) -> int:
+        index = convert(self.eval(node.index, variables), node.index.concrete_type, "i64")
+
+        if not 0 <= index < len(array):
+            raise NotConstant(f"indexes out of bounds (index {index}, length {len(array)})")
+
+        return index
+
+    def eval(self, node, variables: dict):
+        if implang_types.is_vector(getattr(node, "concrete_type", None)):
+            raise NotConstant("uses vectors")
+
+        if isinstance(node, parser.ValueNode):
+            return self.eval_value(node)
+
+        if isinstance(node, parser.VariableNode):
+            if node.name in variables:
+                return variables[node.name]
+
+            return self.get_global(node.name)
+
+        if isinstance(node, parser.CallNode):
+            return self.call_node(node, variables)
+
+        if isinstance(node, parser.SpawnNode):
+            return self.call_node(node.call, variables)
+
+        if isinstance(node, parser.UnaryExprNode):
+            return self.eval_unary(node, variables)
+
+        if isinstance(node, parser.ExprNode):
+            return self.eval_binary(node, variables)
+
+        if isinstance(node, parser.IndexNode):
+            array = self.eval(node.target, variables)
+            return array[self.eval_index(node, array, variables)]
+
+        if isinstance(node, parser.LenNode):
+            return len(self.eval(node.value, variables))
+
+        raise NotConstant(f"uses {type(node).__name__}")
+
+    def eval_value(self, node: parser.ValueNode):
+        type_name = node.concrete_type
+
+        if node.value_type == "STRING":
+            return cut_string(lexer.unescape(node.value[1:-1]))
+
+        if node.value_type == "BOOLEAN":
+            return int(node.value == "true")
+
+        if node.value_type == "CHAR":
+            value = ord(lexer.unescape(node.value[1:-1]))
+        elif node.value_type == "INTEGER":
+            value = int(node.value)
+        elif node.value_type == "FLOAT":
+            value = float(node.value)
+        else:
+            raise NotConstant("uses 'null'")
+
+        if implang_types.is_float(type_name):
+            return round_float(float(value), type_name)
+
+        return wrap(value, type_name)
+
+    def get_global(self, name: str):
+        if name in self.global_values:
+            return self.global_values[name]
+
+        if name in self.changed_globals:
+            raise NotConstant(f"reads the global variable '{name}', which the program changes")
+
+        node = self.global_variables[name]
+
+        if node.value is None:
+            value = zero(node.value_type)
+        else:
+            value = self.eval_stored(node.value, node.value_type, {})
+
+        if isinstance(value, list):
+            value = freeze_array(value)
+
+        self.global_values[name] = value
+        return value
+
+    def eval_unary(self, node: parser.UnaryExprNode, variables: dict):
+        value = self.eval(node.right, variables)
+
+        if node.operation == "NOT":
+            return int(not to_bool(value))
+
+        type_name = node.concrete_type
+        value = convert(value, node.right.concrete_type, type_name) # bool and char are u8
+
+        if node.operation == "PLUS":
+            return value
+
+        if node.operation == "MINUS":
+            return -value if isinstance(value, float) else wrap(-value, type_name)
+
+        if node.operation == "BITWISE_NOT":
+            return wrap(~value, type_name)
+
+        raise NotConstant(f"uses the unary operation '{node.token.value}'")
+
+    def eval_binary(self, node: parser.ExprNode, variables: dict):
+        if node.operation == "AND":
+            return int(to_bool(self.eval(node.left, variables)) and to_bool(self.eval(node.right, variables)))
+
+        if node.operation == "OR":
+            return int(to_bool(self.eval(node.left, variables)) or to_bool(self.eval(node.right, variables)))
+
+        left = self.eval(node.left, variables)
+        right = self.eval(node.right, variables)
+
+        if node.operand_type == "str":
+            return self.eval_string_operation(node, left, right)
+
+        if node.operation == "XOR":
+            return int(to_bool(left) != to_bool(right))
+
+        operand_type = node.operand_type
+        left = convert(left, node.left.concrete_type, operand_type)
+        right = convert(right, node.right.concrete_type, operand_type)
+
+        if implang_types.is_float(operand_type):
+            return self.eval_float_operation(node, left, right, operand_type)
+
+        return self.eval_int_operation(node, left, right, operand_type)
+
+    def eval_string_operation(self, node: parser.ExprNode, left, right):
+        if left is None or right is None:
+            raise NotConstant("uses a null string")
+
+        if node.operation == "PLUS":
+            self.allocate(len(left) + len(right) + 1)
+            return left + right
+
+        if node.operation == "EQUALS":
+            return int(left == right)
+
+        return int(left != right)
+
+    def eval_float_operation(self, node: parser.ExprNode, left: float, right: float, operand_type: str):
+        operation = node.operation
+
+        if operation in COMPARISONS:
+            # ordered comparisons, false when either operand is NaN
+            return int(not math.isnan(left) and not math.isnan(right) and COMPARISONS[operation](left, right))
+
+        if operation == "PLUS":
+            result = left + right
+        elif operation == "MINUS":
+            result = left - right
+        elif operation == "MULTIPLY":
+            result = left * right
+        elif operation == "DIVIDE":
+            if right == 0.0:
+                result = math.nan if left == 0.0 or math.isnan(left) else math.copysign(math.inf, left) * math.copysign(1.0, right)
+            else:
+                result = left / right
+        elif operation == "MODULO":
+            try:
+                result = math.fmod(left, right)
+            except ValueError:
+                result = math.nan
+        elif operation == "POWER" and operand_type == "f64":
+            try:
+                result = math.pow(left, right)
+            except (ValueError, OverflowError):
+                raise NotConstant(f"raises {left} to the power of {right}")
+        else:
+            raise NotConstant(f"uses the operation '{node.token.value}' on '{operand_type}'")
+
+        return round_float(result, operand_type)
+
+    def eval_int_operation(self, node: parser.ExprNode, left: int, right: int, operand_type: str):
+        operation = node.operation
+        signed = implang_types.is_signed(operand_type)
+
+        if operation in COMPARISONS:
+            return int(COMPARISONS[operation](left, right))
+
+        if operation == "PLUS":
+            result = left + right
+        elif operation == "MINUS":
+            result = left - right
+        elif operation == "MULTIPLY":
+            result = left * right
+        elif operation in ["DIVIDE", "MODULO"]:
+            if right == 0:
+                raise NotConstant("divides by zero")
+
+            if signed and right == -1 and left == wrap(1 << (implang_types.get_width(operand_type) - 1), operand_type):
+                raise NotConstant(f"divides the smallest '{operand_type}' by -1")
+
+            # sdiv truncates toward zero, srem has the sign of the dividend
+            quotient = abs(left) // abs(right) * (1 if (left < 0) == (right < 0) else -1)
+            result = quotient if operation == "DIVIDE" else left - right * quotient
+        elif operation == "POWER":
+            # see codegen.ModuleCodegen.get_ipow_helper, 64-bit and 0 for negative exponents
+            base, exponent = wrap(left, "i64"), wrap(right, "i64")
+            result = 0 if exponent < 0 else pow(base, exponent, 1 << 64)
+        elif operation == "BITWISE_AND":
+            result = left & right
+        elif operation == "BITWISE_OR":
+            result = left | right
+        elif operation == "BITWISE_XOR":
+            result = left ^ right
+        elif operation in SHIFTS:
+            if not 0 <= right < implang_types.get_width(operand_type):
+                raise NotConstant(f"shifts '{operand_type}' by {right} bits")
+
+            # the canonical value of an unsigned type is non-negative, so '>>' is lshr for it and ashr otherwise
+            result = left << right if SHIFTS[operation] == "left" else left >> right
+        else:
+            raise NotConstant(f"uses the operation '{node.token.value}' on '{operand_type}'")
+
+        return wrap(result, operand_type)
+
+###################
+
+class Folder:
+    def __init__(self, program: parser.Program, fold_calls: bool):
+        self.interpreter = Interpreter(program)
+        self.fold_calls = fold_calls # also the calls of functions without '@comptime'
+        self.budget = FOLD_TOTAL_STEPS # steps left for optional evaluations
+        self.values = {} # (name, arguments) -> result of a successful evaluation
+        self.failed = set() # (name, arguments) of failed optional evaluations
+        self.forced = True # calls of '@comptime' functions have to be evaluated (not inside '@comptime' functions)
+
+    def fold_program(self, program: parser.Program):
+        for statement in program.statements:
+            if isinstance(statement, parser.FuncNode) and statement.body is not None:
+                self.forced = not statement.comptime
+                self.fold(statement.body)
+            elif isinstance(statement, parser.VarNode) and statement.value is not None:
+                # global initializers have to be constants, their calls are folded at every optimization level
+                fold_calls, self.fold_calls, self.forced = self.fold_calls, True, True
+                statement.value = self.fold_initializer(statement)
+                self.fold_calls = fold_calls
+
+    def fold_initializer(self, node: parser.VarNode):
+        # also the operations on constants, codegen only takes literals
+        value = self.fold(node.value)
+
+        if isinstance(value, parser.ValueNode) or not is_constant(value):
+            return value
+
+        try:
+            result = convert(self.interpreter.eval(value, {}), value.concrete_type, node.value_type)
+        except NotConstant:
+            return value
+
+        return get_literal(result, node.value_type, semantic.get_token(value)) or value
+
+    def fold(self, node):
+        # folds the calls in the children of 'node' first, returns the node replacing 'node'
+        if isinstance(node, parser.SpawnNode):
+            # the call of a task stays a call
+            self.fold(node.call)
+
+            if self.is_comptime(node.call) and self.forced:
+                raise ComptimeError(node.call.name_token, f"'@comptime' function '{node.call.name}' cannot be spawned")
+
+            return node
+
+        for name, value in vars(node).items():
+            if isinstance(value, list):
+                value[:] = [self.fold(item) if is_ast_node(item) else item for item in value]
+            elif is_ast_node(value):
+                setattr(node, name, self.fold(value))
+
+        if isinstance(node, parser.CallNode):
+            return self.fold_call(node)
+
+        return node
+
+    def is_comptime(self, node: parser.CallNode) -> bool:
+        function = self.interpreter.functions.get(node.name)
+        return function is not None and function.comptime
+
+    def fold_call(self, node: parser.CallNode):
+        function = self.interpreter.functions.get(node.name)
+
+        if function is None or function.return_type is None:
+            return node
+
+        forced = function.comptime and self.forced
+
+        if not forced and (not self.fold_calls or self.budget <= 0):
+            return node
+
+        if not all(is_constant(argument) for argument in node.arguments):
+            if forced:
+                raise ComptimeError(node.name_token, f"'@comptime' function '{node.name}' can only be called with constant arguments")
+
+            return node
+
+        try:
+            arguments = tuple(convert(self.interpreter.eval(argument, {}), argument.concrete_type, parameter.parameter_type)
+                              for argument, parameter in zip(node.arguments, function.parameters))
+        except NotConstant as e:
+            return self.fail(node, forced, e)
+
+        key = (node.name, arguments)
+
+        if key not in self.values:
+            if key in self.failed and not forced:
+                return node
+
+            try:
+                self.values[key] = self.interpreter.evaluate(function, list(arguments), MAX_STEPS if forced else min(FOLD_MAX_STEPS, self.budget))
+            except NotConstant as e:
+                self.failed.add(key)
+                return self.fail(node, forced, e)
+            finally:
+                if not forced:
+                    self.budget -= self.interpreter.steps
+
+        value = self.values[key]
+        literal = get_literal(value, function.return_type, node.name_token)
+
+        if literal is None:
+            return self.fail(node, forced, NotConstant(f"returns {value}, which has no literal"))
+
+        return literal
+
+    def fail(self, node: parser.CallNode, forced: bool, error: NotConstant):
+        # the call stays, unless it had to be evaluated
+        if forced:
+            raise ComptimeError(node.name_token, f"'@comptime' call of '{node.name}' cannot be evaluated at compile time, it {error.reason}")
+
+        return node
+
+def evaluate(file: str, program: parser.Program, fold_calls: bool) -> parser.Program:
+    """Replace the calls with constant arguments by their results, 'fold_calls' also those of functions without '@comptime'"""
+    try:
+        if isinstance(program, parser.ProgramStream):
+            for statement in program.statements:
+                if isinstance(statement, parser.FuncNode) and statement.comptime:
+                    raise ComptimeError(statement.name_token, "'@comptime' cannot be used with -fstream, the function bodies are released while compiling")
+        else:
+            Folder(program, fold_calls).fold_program(program)
+    except ComptimeError as e:
+        logger.code_error(file, e.token.line, e.token.column, len(e.token.value), e.message)
+        raise SystemExit(1)
+
+    return program
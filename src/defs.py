@@ -4,9 +4,9 @@ COMPILER_SHORT_NAME = "impc"
 
 OPERATORS = [
     "PLUS", "MINUS", "MULTIPLY", "DIVIDE", "POWER", "MODULO", # arithmetic
-    "EQUALS", "NOT_EQUALS", "GREATER_THAN", "LESS_THAN", "GREATER_THAN_OR_EQUAL", "LESS_THAN_OR_EQUAL" # comparison
+    "EQUALS", "NOT_EQUALS", "GREATER_THAN", "LESS_THAN", "GREATER_THAN_OR_EQUAL", "LESS_THAN_OR_EQUAL", # comparison
     "AND", "OR", "XOR", "NOT", # logical
-    "BITWISE_AND", "BITWISE_OR", "BITWISE_XOR", "BITWISE_NOT", "BITWISE_SHIFT_LEFT", "BITWISE_SHIFT_RIGHT" # bitwise
+    "BITWISE_AND", "BITWISE_OR", "BITWISE_XOR", "BITWISE_NOT", "BITWISE_LEFT_SHIFT", "BITWISE_RIGHT_SHIFT" # bitwise
 ]
 
 TOKENS_WITH_VALUE = [
@@ -31,10 +31,28 @@ ASSIGNMENT_OPERATORS = [
 ]
 
 KEYWORDS = [
-    "if", "else", "while", "break", "continue", "func", "return", "var"
+    "if", "else", "while", "break", "continue", "func", "return", "var", "spawn", "join"
 ]
 
-TYPES = ["u8", "u16", "u32", "u64", "i8", "i16", "i32", "i64", "f32", "f64", "bool", "char", "str"]
+VECTOR_TYPES = {
+    # type: (lane type, lane count) - lowered to LLVM vector types, 128 and 256 bits wide
+    "f32x4": ("f32", 4),
+    "f32x8": ("f32", 8),
+    "f64x2": ("f64", 2),
+    "f64x4": ("f64", 4),
+    "i32x4": ("i32", 4),
+    "i32x8": ("i32", 8),
+    "u32x4": ("u32", 4),
+    "u32x8": ("u32", 8),
+    "i64x2": ("i64", 2),
+    "i64x4": ("i64", 4),
+    "u64x2": ("u64", 2),
+    "u64x4": ("u64", 4),
+    "u8x16": ("u8", 16),
+    "u8x32": ("u8", 32)
+}
+
+TYPES = ["u8", "u16", "u32", "u64", "i8", "i16", "i32", "i64", "f32", "f64", "bool", "char", "str"] + list(VECTOR_TYPES)
 
 INT_TYPES = {
     # type: (minimum_value, maximum_value) - this is used by the compiler to warn the user if overflow occurs
@@ -53,3 +71,35 @@ FLOAT_TYPES = {
     "f32": (-3.4028234663852886e+38, 3.4028234663852886e+38),
     "f64": (-1.7976931348623157e+308, 1.7976931348623157e+308)
 }
+
+STD_FUNCTIONS = {
+    # name: ([(parameter, type)], return type) - the standard runtime (see runtime.py), imported by every program without '@no_std'
+    "print": ([("text", "str")], None),
+    "eprint": ([("text", "str")], None),
+    "print_u64": ([("value", "u64")], None),
+    "print_i64": ([("value", "i64")], None),
+    "print_f64": ([("value", "f64"), ("precision", "u64")], None),
+    "print_bytes": ([("buffer", "[u8]"), ("length", "u64")], None),
+    "flush": ([], None),
+    "format_u64": ([("buffer", "[u8]"), ("value", "u64")], "u64"),
+    "format_i64": ([("buffer", "[u8]"), ("value", "i64")], "u64"),
+    "format_f64": ([("buffer", "[u8]"), ("value", "f64"), ("precision", "u64")], "u64"),
+    "read_file": ([("path", "str")], "str"),
+    "write_file": ([("path", "str"), ("text", "str")], "bool"),
+    "read_bytes": ([("path", "str"), ("buffer", "[u8]")], "i64"),
+    "write_bytes": ([("path", "str"), ("buffer", "[u8]"), ("length", "u64")], "bool")
+}
+
+# standard runtime functions without side effects, they only write into the buffer they are given
+STD_PURE_FUNCTIONS = frozenset(["format_u64", "format_i64", "format_f64"])
+
+FUNCTION_ATTRIBUTES = frozenset(["@memoize", "@comptime"]) # on the lines before a function, in any order
+
+MEMOIZE_POLICIES = {
+    # policy: what happens to a cache slot on a miss - the optional string after '@memoize'
+    "replace": "the new result replaces the cached one", # default
+    "keep": "the first result stays, the new one is not cached",
+    "lru": "two results per slot, the new one replaces the least recently used"
+}
+
+MEMOIZE_DEFAULT_POLICY = "replace"
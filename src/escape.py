@@ -0,0 +1,128 @@
+# Escape analysis of strings
+#
+# Every string concatenation allocates its result. The result escapes its function when it can outlive
+# the call: it is returned, stored in a global variable or an array, or passed to a function that may
+# keep a reference to it. Results that don't escape are allocated in the arena of the call and freed in
+# bulk when the function returns (see codegen.ModuleCodegen.get_arena_alloc_helper), the others on the heap.
+#
+# The analysis is flow-insensitive: a local variable escapes when any of its uses does, and then every
+# string assigned to it escapes too.
+
+import parser
+
+# C library functions (@import_symbol) that only read their string arguments during the call
+NOCAPTURE_FUNCTIONS = frozenset([
+    "strlen", "strcmp", "strncmp", "strcasecmp", "strstr", "puts", "printf", "dprintf", "fputs", "write",
+    "atoi", "atol", "atoll", "atof", "strtol", "strtoul", "strtoll", "strtoull", "strtod",
+    "getenv", "system", "open", "fopen", "access", "unlink", "remove"
+])
+
+def is_allocation(node) -> bool:
+    return isinstance(node, parser.ExprNode) and node.operation == "PLUS" and node.operand_type == "str"
+
+def get_nocapture_functions(program: parser.Program) -> set:
+    # names of the imported functions that don't keep their string arguments
+    nocapture = set()
+
+    for attribute in program.attributes:
+        if attribute.name == "@import_symbol" and isinstance(attribute.value, parser.FuncNode):
+            if attribute.value.name in NOCAPTURE_FUNCTIONS:
+                nocapture.add(attribute.value.name)
+        elif attribute.name == "@import" and isinstance(attribute.value, parser.ImportNode) and attribute.value.module == parser.STD_MODULE:
+            nocapture.update(function.name for function in attribute.value.functions) # the standard runtime copies what it keeps
+
+    return nocapture
+
+def get_local_strings(function: parser.FuncNode, nocapture: set) -> set:
+    """Find the string concatenations of a typed function whose result doesn't escape the call, returns {id(node)}
+
+    'nocapture' has the names of the called functions that don't keep their arguments, calls to any
+    other function make their string arguments escape.
+    """
+    allocations = []
+    assignments = [] # (variable name, assigned value)
+    escaping = [] # values stored where they outlive the call
+    local_names = {parameter.name for parameter in function.parameters}
+
+    def walk(node):
+        if isinstance(node, parser.BlockNode):
+            for statement in node.statements:
+                walk(statement)
+        elif isinstance(node, parser.VarNode):
+            local_names.add(node.name)
+
+            if node.value is not None:
+                assignments.append((node.name, node.value))
+                walk(node.value)
+        elif isinstance(node, parser.AssignmentNode):
+            assignments.append((node.name, node.value))
+            walk(node.value)
+        elif isinstance(node, parser.IndexAssignmentNode):
+            escaping.append(node.value)
+            walk(node.target)
+            walk(node.value)
+        elif isinstance(node, parser.IfNode):
+            for arm in [node] + node.else_ifs:
+                walk(arm.condition)
+                walk(arm.body)
+
+            if node.else_statement is not None:
+                walk(node.else_statement)
+        elif isinstance(node, parser.WhileNode):
+            walk(node.condition)
+            walk(node.body)
+        elif isinstance(node, parser.ReturnNode):
+            if node.value is not None:
+                escaping.append(node.value)
+                walk(node.value)
+        elif isinstance(node, parser.ExprNode):
+            # the operands of a concatenation are copied, so they don't escape through it
+            if is_allocation(node):
+                allocations.append(node)
+
+            walk(node.left)
+            walk(node.right)
+        elif isinstance(node, parser.CallNode):
+            if node.name not in nocapture:
+                escaping.extend(node.arguments)
+
+            for argument in node.arguments:
+                walk(argument)
+        elif isinstance(node, parser.ArrayNode):
+            escaping.extend(node.elements)
+
+            for element in node.elements:
+                walk(element)
+        elif isinstance(node, parser.IndexNode):
+            walk(node.target)
+            walk(node.index)
+        elif isinstance(node, parser.UnaryExprNode):
+            walk(node.right)
+        elif isinstance(node, (parser.LenNode, parser.ReduceNode)):
+            walk(node.value)
+        elif isinstance(node, parser.SpawnNode):
+            walk(node.call)
+
+    walk(function.body)
+
+    values = {} # local variable name -> assigned values
+
+    for name, value in assignments:
+        if name in local_names:
+            values.setdefault(name, []).append(value)
+        else:
+            escaping.append(value) # global variable
+
+    escaped = set()
+    escaped_names = set()
+
+    while escaping:
+        node = escaping.pop()
+
+        if is_allocation(node):
+            escaped.add(id(node))
+        elif isinstance(node, parser.VariableNode) and node.name in local_names and node.name not in escaped_names:
+            escaped_names.add(node.name)
+            escaping.extend(values.get(node.name, []))
+
+    return {id(node) for node in allocations if id(node) not in escaped}
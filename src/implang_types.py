@@ -11,5 +11,82 @@ def get_base_type(specific_type: str):
         return "CHAR"
     elif specific_type == "str":
         return "STRING"
+    elif is_array_or_slice(specific_type):
+        return "ARRAY"
+    elif is_vector(specific_type):
+        return "VECTOR"
 
     return specific_type # if it's not a base type, it's a custom type
+
+def is_integer(specific_type: str) -> bool:
+    return specific_type in defs.INT_TYPES
+
+def is_float(specific_type: str) -> bool:
+    return specific_type in defs.FLOAT_TYPES
+
+def is_numeric(specific_type: str) -> bool:
+    return is_integer(specific_type) or is_float(specific_type)
+
+def is_signed(specific_type: str) -> bool:
+    # bool and char are unsigned, they are zero-extended when converted to wider integers
+    return specific_type.startswith("i") or is_float(specific_type)
+
+def get_width(specific_type: str) -> int:
+    if specific_type == "bool":
+        return 1
+    elif specific_type == "char":
+        return 8
+
+    return int(specific_type[1:])
+
+def fits(value, specific_type: str) -> bool:
+    """Whether the constant 'value' can be represented by 'specific_type' without changing it"""
+    if is_integer(specific_type):
+        minimum, maximum = defs.INT_TYPES[specific_type]
+        return isinstance(value, int) and minimum <= value <= maximum
+    elif is_float(specific_type):
+        minimum, maximum = defs.FLOAT_TYPES[specific_type]
+        return minimum <= value <= maximum
+    elif specific_type == "char":
+        return isinstance(value, int) and 0 <= value <= 255
+
+    return False
+
+def is_vector(specific_type: str) -> bool:
+    # 'f32x4', lanes are operated on element-wise
+    return specific_type in defs.VECTOR_TYPES
+
+def is_array_or_slice(specific_type: str) -> bool:
+    return specific_type is not None and specific_type.startswith("[")
+
+def is_array(specific_type: str) -> bool:
+    # '[u64; 16]', fixed size and stored in place
+    return is_array_or_slice(specific_type) and get_array_length(specific_type) is not None
+
+def is_slice(specific_type: str) -> bool:
+    # '[u64]', a pointer to the first element and a length
+    return is_array_or_slice(specific_type) and get_array_length(specific_type) is None
+
+def split_array_type(specific_type: str) -> tuple:
+    # '[[u8; 4]; 16]' -> ('[u8; 4]', 16), '[u64]' -> ('u64', None)
+    inner = specific_type[1:-1]
+    separator = inner.rfind(";")
+
+    if separator == -1 or "]" in inner[separator:]:
+        return inner, None
+
+    return inner[:separator], int(inner[separator + 1:])
+
+def get_element_type(specific_type: str) -> str:
+    # also the lane type of vectors
+    if is_vector(specific_type):
+        return defs.VECTOR_TYPES[specific_type][0]
+
+    return split_array_type(specific_type)[0]
+
+def get_array_length(specific_type: str) -> int:
+    # also the lane count of vectors
+    if is_vector(specific_type):
+        return defs.VECTOR_TYPES[specific_type][1]
+
+    return split_array_type(specific_type)[1]
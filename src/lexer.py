@@ -1,3 +1,4 @@
+import multiprocessing
 import re
 from typing import Iterable
 
@@ -23,106 +24,115 @@ class Token:
 
 class LexerError:
     """A syntax error that occured during lexing"""
-    def __init__(self, line: int, column: int, char: str):
+    def __init__(self, line: int, column: int, char: str, position: int = None):
         self.line = line
         self.column = column
         self.char = char
+        self.position = position
 
-def lex(input_text: str) -> Iterable[Token]:
-    def xstrip(test: str) -> str:
-        if test.strip() == "":
-            return ""
-        
-        return test
-
-    input_text = "\n".join([xstrip(line) for line in input_text.split("\n")])
-
-    tokens = [
-        ("COMMENT", r"\/\/.*"),
-        ("BLOCK_COMMENT", r"\/\*(.|\n)*?\*\/"),
-
-        ("ATTRIBUTE", r"\@[a-zA-z][a-zA-z0-9_]*"),
-        ("IDENTIFIER", r"[a-zA-Z_][a-zA-Z0-9_]*(\.[a-zA-Z_][a-zA-Z0-9_]*)*"),
-        ("FLOAT", r"([0-9]*)?\.[0-9]+"),
-        ("INTEGER", r"[0-9]+"),
-        ("STRING", r"\".*?\""),
-        ("CHAR", r"\'(\\.|[^\\'])\'"),
-
-        ("ARROW", r"\-\>"),
-
-        ("NEWLINE", r"\n"),
-        ("WHITESPACE", r"\s+"),
-
-        ("EQUALS", r"\=\="),
-        ("NOT_EQUALS", r"\!\="),
-        ("LESS_THAN", r"\<"),
-        ("GREATER_THAN", r"\>"),
-        ("LESS_THAN_OR_EQUAL", r"\<\="),
-        ("GREATER_THAN_OR_EQUAL", r"\>\="),
-
-        ("ASSIGN", r"\="),
-        ("PLUS_ASSIGN", r"\+\="),
-        ("MINUS_ASSIGN", r"\-\="),
-        ("MULTIPLY_ASSIGN", r"\*\="),
-        ("DIVIDE_ASSIGN", r"\/\="),
-        ("POWER_ASSIGN", r"\^\="),
-        ("MODULO_ASSIGN", r"\%\="),
-        ("AND_ASSIGN", r"\&\&\="),
-        ("OR_ASSIGN", r"\|\|\="),
-        ("XOR_ASSIGN", r"\^\^\="),
-        ("BITWISE_AND_ASSIGN", r"\&\="),
-        ("BITWISE_OR_ASSIGN", r"\|\="),
-        ("BITWISE_XOR_ASSIGN", r"\^\="),
-        ("BITWISE_LEFT_SHIFT_ASSIGN", r"\<\<\="),
-        ("BITWISE_RIGHT_SHIFT_ASSIGN", r"\>\>\="),
-
-        ("PLUS", r"\+"),
-        ("MINUS", r"\-"),
-        ("MULTIPLY", r"\*"),
-        ("DIVIDE", r"\/"),
-        ("POWER", r"\^"),
-        ("MODULO", r"\%"),
-
-        ("AND", r"\&\&"),
-        ("OR", r"\|\|"),
-        ("XOR", r"\^\^"),
-        ("NOT", r"\!"),
-
-        ("BITWISE_AND", r"\&"),
-        ("BITWISE_OR", r"\|"),
-        ("BITWISE_XOR", r"\^"),
-        ("BITWISE_NOT", r"\~"),
-        ("BITWISE_LEFT_SHIFT", r"\<\<"),
-        ("BITWISE_RIGHT_SHIFT", r"\>\>"),
-
-        ("LPAREN", r"\("),
-        ("RPAREN", r"\)"),
-        ("LBRACE", r"\{"),
-        ("RBRACE", r"\}"),
-        ("LBRACKET", r"\["),
-        ("RBRACKET", r"\]"),
-
-        ("COMMA", r"\,"),
-        ("SEMICOLON", r"\;"),
-        ("COLON", r"\:")
-    ]
-
-    token_regex = "|".join(f"(?P<{name}>{regex})" for name, regex in tokens)
-
-    line = 1
-    column = 1
-
-    pos = 0
-    while pos < len(input_text):
-        match = re.match(token_regex, input_text[pos:])
+TOKENS = [
+    ("COMMENT", r"\/\/.*"),
+    ("BLOCK_COMMENT", r"\/\*(.|\n)*?\*\/"),
+
+    ("ATTRIBUTE", r"\@[a-zA-z][a-zA-z0-9_]*"),
+    ("IDENTIFIER", r"[a-zA-Z_][a-zA-Z0-9_]*(\.[a-zA-Z_][a-zA-Z0-9_]*)*"),
+    ("FLOAT", r"([0-9]*)?\.[0-9]+"),
+    ("INTEGER", r"[0-9]+"),
+    ("STRING", r"\".*?\""),
+    ("CHAR", r"\'(\\.|[^\\'\n])\'"), # a newline is '\n', so only block comments span lines
+
+    ("ARROW", r"\-\>"),
+
+    ("NEWLINE", r"\n"),
+    ("WHITESPACE", r"[^\S\n]+"), # newlines are matched separately, so they are never swallowed
+
+    # the first alternative that matches is taken, so '<<=', '<<' and '<=' come before '<'
+    ("BITWISE_LEFT_SHIFT_ASSIGN", r"\<\<\="),
+    ("BITWISE_RIGHT_SHIFT_ASSIGN", r"\>\>\="),
+    ("BITWISE_LEFT_SHIFT", r"\<\<"),
+    ("BITWISE_RIGHT_SHIFT", r"\>\>"),
+
+    ("EQUALS", r"\=\="),
+    ("NOT_EQUALS", r"\!\="),
+    ("LESS_THAN_OR_EQUAL", r"\<\="),
+    ("GREATER_THAN_OR_EQUAL", r"\>\="),
+    ("LESS_THAN", r"\<"),
+    ("GREATER_THAN", r"\>"),
+
+    ("ASSIGN", r"\="),
+    ("PLUS_ASSIGN", r"\+\="),
+    ("MINUS_ASSIGN", r"\-\="),
+    ("MULTIPLY_ASSIGN", r"\*\="),
+    ("DIVIDE_ASSIGN", r"\/\="),
+    ("POWER_ASSIGN", r"\^\="),
+    ("MODULO_ASSIGN", r"\%\="),
+    ("AND_ASSIGN", r"\&\&\="),
+    ("OR_ASSIGN", r"\|\|\="),
+    ("XOR_ASSIGN", r"\^\^\="),
+    ("BITWISE_AND_ASSIGN", r"\&\="),
+    ("BITWISE_OR_ASSIGN", r"\|\="),
+    ("BITWISE_XOR_ASSIGN", r"\^\="),
+
+    ("PLUS", r"\+"),
+    ("MINUS", r"\-"),
+    ("MULTIPLY", r"\*"),
+    ("DIVIDE", r"\/"),
+    ("POWER", r"\^"),
+    ("MODULO", r"\%"),
+
+    ("AND", r"\&\&"),
+    ("OR", r"\|\|"),
+    ("XOR", r"\^\^"),
+    ("NOT", r"\!"),
+
+    ("BITWISE_AND", r"\&"),
+    ("BITWISE_OR", r"\|"),
+    ("BITWISE_XOR", r"\^"),
+    ("BITWISE_NOT", r"\~"),
+
+    ("LPAREN", r"\("),
+    ("RPAREN", r"\)"),
+    ("LBRACE", r"\{"),
+    ("RBRACE", r"\}"),
+    ("LBRACKET", r"\["),
+    ("RBRACKET", r"\]"),
+
+    ("COMMA", r"\,"),
+    ("SEMICOLON", r"\;"),
+    ("COLON", r"\:")
+]
+
+TOKEN_REGEX = re.compile("|".join(f"(?P<{name}>{regex})" for name, regex in TOKENS))
+
+ESCAPE_SEQUENCES = {"n": "\n", "t": "\t", "r": "\r", "0": "\0", "\\": "\\", "\"": "\"", "'": "'"}
+
+PARALLEL_MIN_CHUNK_SIZE = 1024 * 1024 # characters, smaller inputs are not worth starting worker processes for
+PARALLEL_CHUNKS_PER_JOB = 4 # more chunks than workers balance the load
+
+def lex(input_text: str, position: int = 0, line: int = 1, column: int = 1, end: int = None) -> Iterable[Token]:
+    """Lex input_text[position:end], 'line' and 'column' are the coordinates of 'position'"""
+    if end is None:
+        end = len(input_text)
+
+    pos = position
+    match_token = TOKEN_REGEX.match
+
+    while pos < end:
+        match = match_token(input_text, pos, end)
         if match:
             kind = match.lastgroup
             value = match.group()
 
             if kind in ["COMMENT", "BLOCK_COMMENT"]:
-                pass
+                newlines = value.count("\n")
+
+                if newlines > 0:
+                    line += newlines
+                    column = len(value) - value.rfind("\n")
+                else:
+                    column += len(value)
             elif kind == "WHITESPACE":
-                pass
+                column += len(value)
             elif kind == "NEWLINE":
                 column = 1
                 line += 1
@@ -141,24 +151,193 @@ def lex(input_text: str) -> Iterable[Token]:
                     kind = "NULL"
 
                 yield Token(kind, value, pos, line, column)
+                column += len(value)
             else:
                 yield Token(kind, value, pos, line, column)
+                column += len(value)
 
             pos += len(value)
-
-            if kind != "NEWLINE":
-                column += len(value)
         else:
-            yield LexerError(line, column, input_text[pos])
+            yield LexerError(line, column, input_text[pos], pos)
             pos += 1
             column += 1
 
-def lex_file(file: str) -> list[Token]:
+def lex_chunk(arguments: tuple) -> tuple:
+    """Lex a chunk of the input in a worker process of lex_parallel, returns (columns, index of the first unterminated block comment)"""
+    # tokens are returned as lists of their fields (with the kind None for errors), which are much cheaper
+    # to pickle than objects, see build_tokens
+    chunk, offset, line, column = arguments
+    kinds, values, positions, lines, columns = [], [], [], [], []
+    opener = None
+
+    for token in lex(chunk, 0, line, column):
+        if isinstance(token, LexerError):
+            kinds.append(None)
+            values.append(token.char)
+        else:
+            # '/*' without '*/' before the end of the chunk, the comment may end in one of the next chunks
+            if opener is None and token.kind == "DIVIDE" and chunk.startswith("*", token.position + 1):
+                opener = len(kinds)
+
+            kinds.append(token.kind)
+            values.append(token.value)
+
+        positions.append(token.position + offset)
+        lines.append(token.line)
+        columns.append(token.column)
+
+    return (kinds, values, positions, lines, columns), opener
+
+def build_tokens(columns: tuple, count: int = None) -> list:
+    # the first 'count' tokens (all by default) of the columns of lex_chunk
+    kinds, values, positions, lines, column_numbers = (field[:count] for field in columns)
+    tokens = list(map(Token, kinds, values, positions, lines, column_numbers))
+
+    if None in kinds:
+        for i, kind in enumerate(kinds):
+            if kind is None:
+                tokens[i] = LexerError(lines[i], column_numbers[i], values[i], positions[i])
+
+    return tokens
+
+def find_split_points(input_text: str, count: int) -> list[int]:
+    # starts of up to 'count' chunks of about the same size, each one (but the first) right after a newline
+    points = [0]
+
+    for i in range(1, count):
+        newline = input_text.find("\n", max(len(input_text) * i // count, points[-1]))
+
+        if newline == -1 or newline + 1 == len(input_text):
+            break
+
+        if newline + 1 > points[-1]:
+            points.append(newline + 1)
+
+    return points
+
+def lex_parallel(input_text: str, jobs: int) -> list:
+    """Same as list(lex(input_text)), the input is split at newlines and the chunks are lexed by 'jobs' worker processes"""
+    count = min(jobs * PARALLEL_CHUNKS_PER_JOB, len(input_text) // PARALLEL_MIN_CHUNK_SIZE)
+
+    if jobs < 2 or count < 2:
+        return list(lex(input_text))
+
+    # only block comments span lines, so a chunk starting after a newline lexes like the serial lexer unless
+    # it starts inside a block comment, line and column only depend on the position
+    starts = find_split_points(input_text, count)
+    ends = starts[1:] + [len(input_text)]
+    lines = [1]
+
+    for previous, start in zip(starts, starts[1:]):
+        lines.append(lines[-1] + input_text.count("\n", previous, start))
+
+    tokens = []
+    cursor = 0 # position up to which the input is lexed, always the start of a token in the serial lexing
+    cursor_line = 1
+
+    with multiprocessing.Pool(jobs) as pool:
+        chunks = pool.imap(lex_chunk, ((input_text[start:end], start, line, 1) for start, end, line in zip(starts, ends, lines)))
+
+        for start, end, (columns, opener) in zip(starts, ends, chunks):
+            if cursor >= end:
+                continue # the whole chunk is inside a block comment
+
+            if cursor != start:
+                columns, opener = lex_chunk((input_text[cursor:end], cursor, cursor_line, get_column(input_text, cursor)))
+
+            while True:
+                _, _, positions, lines, _ = columns
+                closer = -1 if opener is None else input_text.find("*/", positions[opener] + 2)
+
+                if closer == -1:
+                    # no block comment continues after the chunk (an unterminated one is a division in the serial lexing too)
+                    tokens.extend(build_tokens(columns))
+                    cursor = end
+                    break
+
+                # the comment ends in a later chunk, lex again from its end
+                tokens.extend(build_tokens(columns, opener))
+                cursor = closer + 2
+                cursor_line = lines[opener] + input_text.count("\n", positions[opener], cursor)
+
+                if cursor >= end:
+                    break
+
+                columns, opener = lex_chunk((input_text[cursor:end], cursor, cursor_line, get_column(input_text, cursor)))
+
+    return tokens
+
+def get_column(input_text: str, position: int) -> int:
+    return position - input_text.rfind("\n", 0, position)
+
+def unescape(text: str) -> str:
+    # the text of a string or char literal (without the quotes) with its escape sequences replaced
+    result = []
+    i = 0
+
+    while i < len(text):
+        if text[i] == "\\" and i + 1 < len(text):
+            result.append(ESCAPE_SEQUENCES.get(text[i + 1], text[i + 1]))
+            i += 2
+        else:
+            result.append(text[i])
+            i += 1
+
+    return "".join(result)
+
+def lex_outline(input_text: str) -> list:
+    """Same as list(lex(input_text)) without the tokens inside the function bodies, only the braces of a body are kept.
+    The body is lexed again with lex_body when it is needed (see parser.parse_stream)"""
+    tokens = []
+    depth = 0
+    signature = False # after 'func' at the top level, the next block is its body
+    body = False
+
+    for token in lex(input_text):
+        if isinstance(token, LexerError):
+            tokens.append(token)
+            continue
+
+        if token.kind == "LBRACE":
+            depth += 1
+
+            if depth == 1:
+                body = signature
+                signature = False
+                tokens.append(token)
+                continue
+        elif token.kind == "RBRACE" and depth > 0:
+            depth -= 1
+
+            if depth == 0:
+                tokens.append(token)
+                continue
+        elif token.kind == "KEYWORD" and token.value == "func" and depth == 0:
+            signature = True
+
+        if depth == 0 or not body:
+            tokens.append(token)
+
+    return tokens
+
+def lex_body(input_text: str, lbrace: Token, rbrace: Token) -> list[Token]:
+    # the tokens lex_outline dropped between the braces of a function body, with the braces
+    return list(lex(input_text, lbrace.position, lbrace.line, lbrace.column, rbrace.position + 1))
+
+def lex_file(file: str, jobs: int = 1, outline: bool = False) -> list[Token]:
+    """Lex a file and report its lexer errors, with 'outline' the function bodies are left out (see lex_outline)"""
     syntax_error_count = 0
     temp = []
 
     with open(file, "r") as f:
-        for token in lex(f.read()):
+        input_text = f.read()
+
+        if outline:
+            tokens = lex_outline(input_text)
+        else:
+            tokens = lex_parallel(input_text, jobs) if jobs > 1 else lex(input_text)
+
+        for token in tokens:
             if isinstance(token, LexerError):
                 logger.code_error(file, token.line, token.column, 1, f"Undefined token: {token.char}")
                 syntax_error_count += 1
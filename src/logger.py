@@ -95,7 +95,15 @@ def compiler_debug(msg: str):
 
 ###################
 
+# When set, code_error, code_warning and code_note call it as
+# diagnostic_handler(severity, file, line, position, lenght, msg) instead of printing (used by the language server)
+diagnostic_handler = None
+
 def code_error(file: str, line: int, position: int, lenght: int, msg: str):
+    if diagnostic_handler is not None:
+        diagnostic_handler("error", file, line, position, lenght, msg)
+        return
+
     print(f"{file}:{line}:{position} {COLORS['RED'] + COLORS['BOLD']}error:{COLORS['RESET']} {msg}", file=sys.stderr)
     print(file=sys.stderr)
 
@@ -105,6 +113,10 @@ def code_error(file: str, line: int, position: int, lenght: int, msg: str):
     print(file=sys.stderr)
 
 def code_warning(file: str, line: int, position: int, lenght: int, msg: str):
+    if diagnostic_handler is not None:
+        diagnostic_handler("warning", file, line, position, lenght, msg)
+        return
+
     print(f"{file}:{line}:{position} {COLORS['YELLOW'] + COLORS['BOLD']}warning:{COLORS['RESET']} {msg}", file=sys.stderr)
     print(file=sys.stderr)
 
@@ -114,6 +126,10 @@ def code_warning(file: str, line: int, position: int, lenght: int, msg: str):
     print(file=sys.stderr)
 
 def code_note(file: str, line: int, position: int, lenght: int, msg: str):
+    if diagnostic_handler is not None:
+        diagnostic_handler("note", file, line, position, lenght, msg)
+        return
+
     print(f"{file}:{line}:{position} {COLORS['CYAN'] + COLORS['BOLD']}note:{COLORS['RESET']} {msg}", file=sys.stderr)
     print(file=sys.stderr)
 
@@ -0,0 +1,777 @@
+# Language server (Language Server Protocol over stdio), started with 'impc --lsp'
+#
+# Open documents are kept in memory as a list of lines split into chunks, one per top-level
+# statement (function, global variable or attribute). A chunk owns its tokens, with line numbers
+# relative to its first line, so an edit never has to touch the tokens of the other chunks.
+#
+# On an edit, the lexer restarts at the first NEWLINE token before the edited lines and stops
+# as soon as it produces a NEWLINE token that lines up with one of the old token stream after
+# the edit, the rest of the old tokens are reused. Only the edited chunks are parsed again,
+# together with the chunks using a name whose signature changed.
+
+import bisect
+import json
+import sys
+import traceback
+import urllib.parse
+
+import defs
+import lexer
+import logger
+import parser
+
+TEXT_DOCUMENT_SYNC_INCREMENTAL = 2
+
+DIAGNOSTIC_SEVERITIES = {"error": 1, "warning": 2}
+
+# JSON-RPC error codes
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+
+CHUNK_KEYWORDS = frozenset(["func", "var"])
+STD_FUNCTIONS = {function.name: function for function in parser.get_std_functions()} # visible in documents without '@no_std'
+
+def is_chunk_start(tokens: list, index: int) -> bool:
+    # top-level statements start at the beginning of a line
+    token = tokens[index]
+    previous = tokens[index - 1]
+
+    if not isinstance(token, lexer.Token) or not isinstance(previous, lexer.Token):
+        return False
+
+    if token.column != 1 or previous.kind != "NEWLINE":
+        return False
+
+    # '@parallel' is on a loop inside a function, function attributes can be stacked
+    if token.kind == "ATTRIBUTE":
+        return token.value != "@parallel" and not follows_function_attribute(tokens, index)
+
+    return token.kind == "KEYWORD" and token.value in CHUNK_KEYWORDS and not follows_function_attribute(tokens, index)
+
+def follows_function_attribute(tokens: list, index: int) -> bool:
+    # whether the token at 'index' starts the line after a '@memoize' (with its policy) or '@comptime', whose chunk it belongs to
+    index -= 1
+
+    while index >= 0 and isinstance(tokens[index], lexer.Token) and tokens[index].kind == "NEWLINE":
+        index -= 1
+
+    if index >= 0 and isinstance(tokens[index], lexer.Token) and tokens[index].kind == "STRING":
+        index -= 1
+
+    return index >= 0 and isinstance(tokens[index], lexer.Token) and tokens[index].kind == "ATTRIBUTE" and tokens[index].value in defs.FUNCTION_ATTRIBUTES
+
+def shift_lines(tokens: list, delta: int):
+    if delta != 0:
+        for token in tokens:
+            token.line += delta
+
+def find_unterminated_comment(tokens: list) -> int:
+    # '/*' without a matching '*/' is lexed as DIVIDE MULTIPLY(_ASSIGN), a '*/' further in the document ends the comment
+    previous = None
+
+    for i, token in enumerate(tokens):
+        if not isinstance(token, lexer.Token):
+            previous = None
+            continue
+
+        if previous is not None and previous.kind == "DIVIDE" and token.value.startswith("*") \
+                and token.line == previous.line and token.column == previous.column + 1:
+            return i - 1
+
+        previous = token
+
+    return None
+
+def uri_to_path(uri: str) -> str:
+    parsed = urllib.parse.urlparse(uri)
+
+    if parsed.scheme != "file":
+        return uri
+
+    return urllib.parse.unquote(parsed.path)
+
+def get_declared_name(tokens: list) -> str:
+    # name defined by the statement starting the chunk ('func name', 'var name' or '@import_symbol name')
+    tokens = [t for t in tokens[:12] if isinstance(t, lexer.Token) and t.kind != "NEWLINE"]
+
+    while tokens and tokens[0].kind == "ATTRIBUTE" and tokens[0].value in defs.FUNCTION_ATTRIBUTES:
+        tokens = tokens[2:] if len(tokens) > 1 and tokens[1].kind == "STRING" else tokens[1:]
+
+    if len(tokens) > 1 and tokens[1].kind == "IDENTIFIER":
+        if tokens[0].kind == "KEYWORD" and tokens[0].value in CHUNK_KEYWORDS:
+            return tokens[1].value
+
+        if tokens[0].kind == "ATTRIBUTE" and tokens[0].value == "@import_symbol":
+            return tokens[1].value
+
+    return None
+
+def get_signature(node) -> tuple:
+    if isinstance(node, parser.FuncNode):
+        return ("func", node.name, tuple(p.parameter_type for p in node.parameters), node.return_type)
+
+    return ("var", node.name, node.value_type)
+
+def collect_locals(node, v_locals: dict):
+    if isinstance(node, parser.FuncNode):
+        for parameter in node.parameters:
+            if parameter.name is not None:
+                v_locals[parameter.name] = parameter
+
+        collect_locals(node.body, v_locals)
+    elif isinstance(node, parser.BlockNode):
+        for statement in node.statements:
+            collect_locals(statement, v_locals)
+    elif isinstance(node, parser.IfNode):
+        collect_locals(node.body, v_locals)
+
+        for else_if in node.else_ifs:
+            collect_locals(else_if.body, v_locals)
+
+        collect_locals(node.else_statement, v_locals)
+    elif isinstance(node, parser.WhileNode):
+        collect_locals(node.body, v_locals)
+    elif isinstance(node, parser.VarNode):
+        v_locals[node.name] = node
+
+def describe(node, type_token: lexer.Token) -> str:
+    if isinstance(node, parser.FuncNode):
+        parameters = ", ".join(
+            p.parameter_type if p.name is None else f"{p.name}: {p.parameter_type}"
+            for p in node.parameters
+        )
+        text = f"func {node.name}({parameters})"
+
+        if node.return_type is not None:
+            text += f" -> {node.return_type}"
+
+        if node.body is None and node.func_token.value == "@import_symbol":
+            text = "@import_symbol " + text[len("func "):]
+
+        return text
+    elif isinstance(node, parser.VarNode):
+        return f"var {node.name}: {type_token.value}"
+
+    return f"{node.name}: {type_token.value}"
+
+def to_column(text: str, character: int, utf16: bool) -> int:
+    # LSP character offset -> index in 'text'
+    if not utf16 or text.isascii():
+        return min(character, len(text))
+
+    units = 0
+
+    for index, char in enumerate(text):
+        if units >= character:
+            return index
+
+        units += 2 if ord(char) > 0xFFFF else 1
+
+    return len(text)
+
+def to_character(text: str, column: int, utf16: bool) -> int:
+    # index in 'text' -> LSP character offset
+    if not utf16 or text.isascii():
+        return column
+
+    return column + sum(1 for char in text[:column] if ord(char) > 0xFFFF)
+
+class Chunk:
+    """A top-level statement of a document, with its tokens and parse results"""
+    def __init__(self, start_line: int, tokens: list):
+        self.start_line = start_line # First line of the chunk in the document
+        self.tokens = tokens # Tokens and lexer errors, line numbers are relative to start_line
+        self.names = {t.value for t in tokens if isinstance(t, lexer.Token) and t.kind == "IDENTIFIER"}
+        self.declared_name = get_declared_name(tokens)
+        self.open_comment = find_unterminated_comment(tokens) is not None
+        self.definitions = {} # Top-level name -> node
+        self.locals = {} # Parameters and variables of the functions of the chunk
+        self.unresolved = set() # Names that were not defined anywhere when the chunk was parsed
+        self.diagnostics = [] # (severity, line, column, length, message), line relative to start_line
+
+    def get_signatures(self) -> set:
+        return {get_signature(node) for node in self.definitions.values()}
+
+    def __str__(self):
+        return f"Chunk({self.start_line}, {list(self.definitions)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class ChunkGlobals(dict):
+    """Parser globals while parsing a chunk: its own definitions, then the ones of the other chunks
+
+    Like in a whole-file parse, only definitions above the chunk and functions are visible. The name
+    declared by the chunk is never looked up in the other chunks, duplicate definitions are reported
+    by the document so the result does not depend on the order chunks are parsed in"""
+    def __init__(self, document, chunk: Chunk):
+        super().__init__()
+        self.document = document
+        self.chunk = chunk
+
+    def get(self, name: str, default=None):
+        if name in self:
+            return self[name]
+
+        if self.chunk is not None and name == self.chunk.declared_name:
+            return default
+
+        _, node = self.document.lookup(name, exclude=self.chunk)
+
+        if node is None:
+            node = self.document.get_std_function(name)
+
+        if node is None:
+            if self.chunk is not None:
+                self.chunk.unresolved.add(name)
+
+            return default
+
+        return node
+
+class Document:
+    def __init__(self, uri: str, text: str, import_paths: list[str] = None):
+        self.uri = uri
+        self.path = uri_to_path(uri)
+        self.import_paths = import_paths or [] # searched by '@import', after the directory of the document
+        self.set_text(text)
+
+    def set_text(self, text: str):
+        self.lines = text.split("\n")
+        self.chunks = []
+        self.symbols = {} # name -> [(chunk, node)], every top-level definition
+        self.duplicates = set() # names defined by more than one chunk
+        self.unresolved_chunks = set()
+
+        self.replace_chunks(0, 0, self.split(1, list(lexer.lex(text))))
+
+    def get_text(self, start_line: int, end_line: int) -> str:
+        # lines [start_line, end_line), with the newline ending the last one
+        text = "\n".join(self.lines[start_line - 1:end_line - 1])
+
+        if end_line - 1 < len(self.lines):
+            text += "\n"
+
+        return text
+
+    def find_chunk(self, line: int) -> int:
+        return max(bisect.bisect_right(self.chunks, line, key=lambda chunk: chunk.start_line) - 1, 0)
+
+    def split(self, start_line: int, tokens: list) -> list[Chunk]:
+        # 'tokens' have line numbers relative to start_line
+        starts = [0] + [i for i in range(1, len(tokens)) if is_chunk_start(tokens, i)]
+        chunks = [Chunk(start_line, tokens[:starts[1]] if len(starts) > 1 else tokens)]
+
+        for i, start in enumerate(starts[1:], 1):
+            chunk_tokens = tokens[start:starts[i + 1]] if i + 1 < len(starts) else tokens[start:]
+            offset = chunk_tokens[0].line - 1
+
+            shift_lines(chunk_tokens, -offset)
+            chunks.append(Chunk(start_line + offset, chunk_tokens))
+
+        return chunks
+
+    def apply_change(self, start: tuple, end: tuple, text: str):
+        """Replace the text between 'start' and 'end', (line, column) pairs counted from 0"""
+        (start_line, start_column), (end_line, end_column) = start, end
+
+        new_lines = (self.lines[start_line][:start_column] + text + self.lines[end_line][end_column:]).split("\n")
+        self.lines[start_line:end_line + 1] = new_lines
+
+        delta = len(new_lines) - (end_line - start_line + 1)
+
+        first = self.find_chunk(start_line + 1)
+        last = self.find_chunk(end_line + 1)
+
+        if first > 0 and self.chunks[first].start_line == start_line + 1:
+            first -= 1 # the edit may remove the start of the chunk, merging it into the previous one
+
+        for i in range(first):
+            if self.chunks[i].open_comment:
+                first = i # the edit may end that comment
+                break
+
+        self.relex(first, last, start_line + 1, end_line + 1 + delta, delta)
+
+    def relex(self, first: int, last: int, edit_start: int, edit_end: int, delta: int):
+        """Lex chunks first..last again after lines edit_start..edit_end (new line numbers) changed"""
+        region_start = self.chunks[first].start_line
+        edit_start -= region_start - 1
+        edit_end -= region_start - 1
+
+        # old tokens of the region, relative to region_start
+        old_tokens = []
+        merged = first
+
+        while True:
+            for chunk in self.chunks[merged:last + 1]:
+                shift_lines(chunk.tokens, chunk.start_line - region_start)
+                old_tokens.extend(chunk.tokens)
+
+            merged = last + 1
+
+            # restart after the last NEWLINE token before the edit (and before an unterminated comment),
+            # it is never inside a comment or string
+            restart = 0
+            restart_line = 1
+            comment = find_unterminated_comment(old_tokens)
+
+            for i, token in enumerate(old_tokens):
+                if token.line > edit_start or i == comment:
+                    break
+
+                if isinstance(token, lexer.Token) and token.kind == "NEWLINE":
+                    restart = i + 1
+                    restart_line = token.line
+
+            old_newlines = {
+                token.line: i for i, token in enumerate(old_tokens)
+                if isinstance(token, lexer.Token) and token.kind == "NEWLINE" and token.line > edit_end - delta
+            }
+
+            if last + 1 < len(self.chunks):
+                region_end = self.chunks[last + 1].start_line + delta # not shifted yet
+            else:
+                region_end = len(self.lines) + 1
+
+            text = self.get_text(region_start + restart_line - 1, region_end)
+            tokens = []
+            tail = []
+
+            for token in lexer.lex(text, line=restart_line):
+                tokens.append(token)
+
+                if isinstance(token, lexer.Token) and token.kind == "NEWLINE" and token.line > edit_end:
+                    resync = old_newlines.get(token.line - delta)
+
+                    if resync is not None:
+                        tail = old_tokens[resync + 1:]
+                        break
+
+            if find_unterminated_comment(tokens) is not None and last + 1 < len(self.chunks):
+                last += 1 # the comment may end in the next chunk
+                continue
+
+            region_tokens = old_tokens[:restart] + tokens + tail
+
+            if follows_function_attribute(region_tokens, len(region_tokens)) and last + 1 < len(self.chunks):
+                last += 1 # the function after a '@memoize' or '@comptime' belongs to its chunk
+                continue
+
+            break
+
+        shift_lines(tail, delta)
+        self.replace_chunks(first, last + 1, self.split(region_start, old_tokens[:restart] + tokens + tail), delta)
+
+    def replace_chunks(self, first: int, end: int, new_chunks: list[Chunk], delta: int = 0):
+        removed = self.chunks[first:end]
+        uses_std = self.uses_std()
+        self.chunks[first:end] = new_chunks
+
+        for chunk in self.chunks[first + len(new_chunks):]:
+            chunk.start_line += delta
+
+        old_signatures = set()
+
+        for chunk in removed:
+            old_signatures |= chunk.get_signatures()
+            self.remove_symbols(chunk)
+
+        new_signatures = set()
+
+        for chunk in new_chunks:
+            self.parse_chunk(chunk)
+            new_signatures |= chunk.get_signatures()
+
+        # chunks using a name whose definition changed, and chunks using names that were missing
+        changed = {signature[1] for signature in old_signatures ^ new_signatures}
+
+        if self.uses_std() != uses_std:
+            changed |= STD_FUNCTIONS.keys()
+        new_ids = {id(chunk) for chunk in new_chunks}
+        outdated = []
+
+        if changed:
+            outdated = [chunk for chunk in self.chunks if id(chunk) not in new_ids and not chunk.names.isdisjoint(changed)]
+
+        outdated += [chunk for chunk in self.unresolved_chunks if any(name in self.symbols for name in chunk.unresolved)]
+
+        for chunk in dict.fromkeys(outdated):
+            self.parse_chunk(chunk)
+
+    def lookup(self, name: str, exclude: Chunk = None) -> tuple:
+        # the first definition in the document wins, only functions are visible below 'exclude'
+        entries = self.symbols.get(name, ())
+
+        if exclude is not None:
+            entries = [
+                (chunk, node) for chunk, node in entries
+                if chunk is not exclude and (chunk.start_line < exclude.start_line or isinstance(node, parser.FuncNode))
+            ]
+
+        if not entries:
+            return None, None
+
+        return min(entries, key=lambda entry: entry[0].start_line)
+
+    def uses_std(self) -> bool:
+        # the standard runtime, unless the attributes at the beginning of the document have '@no_std'
+        return not parser.has_attribute((t for chunk in self.chunks for t in chunk.tokens if isinstance(t, lexer.Token)), "@no_std")
+
+    def get_std_function(self, name: str):
+        return STD_FUNCTIONS.get(name) if self.uses_std() else None
+
+    def remove_symbols(self, chunk: Chunk):
+        for name in chunk.definitions:
+            entries = [entry for entry in self.symbols.get(name, ()) if entry[0] is not chunk]
+
+            if entries:
+                self.symbols[name] = entries
+            else:
+                self.symbols.pop(name, None)
+
+            if len(entries) < 2:
+                self.duplicates.discard(name)
+
+        self.unresolved_chunks.discard(chunk)
+
+    def parse_chunk(self, chunk: Chunk):
+        self.remove_symbols(chunk)
+
+        chunk.definitions = {}
+        chunk.locals = {}
+        chunk.unresolved = set()
+        chunk.diagnostics = [
+            ("error", t.line, t.column, 1, f"Undefined token: {t.char}")
+            for t in chunk.tokens if isinstance(t, lexer.LexerError)
+        ]
+
+        tokens = [t for t in chunk.tokens if isinstance(t, lexer.Token)]
+
+        if not tokens:
+            return
+
+        if tokens[-1].kind != "NEWLINE":
+            tokens.append(lexer.Token("NEWLINE", "\n", None, tokens[-1].line + 1, 1))
+
+        def on_diagnostic(severity, file, line, column, length, message):
+            if severity in DIAGNOSTIC_SEVERITIES: # notes point into other chunks
+                chunk.diagnostics.append((severity, line, column, length, message))
+
+        scope = ChunkGlobals(self, chunk)
+        logger.diagnostic_handler = on_diagnostic
+
+        try:
+            p = parser.Parser(self.path, tokens, self.import_paths)
+            parser.ctx_mgr.globals = scope
+            p.parse_program()
+        except parser.ParserError as e:
+            chunk.diagnostics.append(("error", e.token.line, e.token.column, len(e.token.value), e.message))
+        except SystemExit:
+            pass # already reported through on_diagnostic
+        except Exception as e:
+            if parser.ctx_mgr.token_index >= len(tokens) - 1:
+                message = "Unexpected end of input"
+            else:
+                message = f"Internal compiler error: {type(e).__name__}: {e}"
+
+            token = tokens[min(parser.ctx_mgr.token_index, len(tokens) - 1)]
+            chunk.diagnostics.append(("error", token.line, token.column, max(len(token.value), 1), message))
+        finally:
+            logger.diagnostic_handler = None
+
+        chunk.definitions = dict(scope)
+
+        # a function that failed to parse still has its signature and parameters in the open scope
+        for i, (kind, v_locals) in enumerate(parser.ctx_mgr.stack):
+            if kind != "func":
+                continue
+
+            for name, node in v_locals.items():
+                if i == 0 and isinstance(node, parser.FuncNode):
+                    chunk.definitions.setdefault(name, node)
+                else:
+                    chunk.locals[name] = node
+
+        for node in chunk.definitions.values():
+            if isinstance(node, parser.FuncNode) and node.body is not None:
+                collect_locals(node, chunk.locals)
+
+        chunk.unresolved -= chunk.definitions.keys() | chunk.locals.keys()
+
+        for name, node in chunk.definitions.items():
+            entries = self.symbols.setdefault(name, [])
+            entries.append((chunk, node))
+
+            if len(entries) > 1:
+                self.duplicates.add(name)
+
+        if chunk.unresolved:
+            self.unresolved_chunks.add(chunk)
+
+    def get_diagnostics(self) -> list:
+        # (severity, line, column, length, message) with document line numbers
+        diagnostics = []
+
+        for chunk in self.chunks:
+            for severity, line, column, length, message in chunk.diagnostics:
+                diagnostics.append((severity, chunk.start_line + line - 1, column, length, message))
+
+        for name in self.duplicates:
+            entries = sorted(self.symbols[name], key=lambda entry: entry[0].start_line)
+
+            for chunk, node in entries[1:]:
+                token = node.name_token
+                diagnostics.append(("error", chunk.start_line + token.line - 1, token.column, len(token.value), f"'{name}' is already defined"))
+
+        return diagnostics
+
+    def find_token(self, line: int, column: int) -> tuple:
+        chunk = self.chunks[self.find_chunk(line)]
+        line -= chunk.start_line - 1
+
+        for token in chunk.tokens:
+            if isinstance(token, lexer.Token) and token.kind != "NEWLINE" and token.line == line \
+                    and token.column <= column < token.column + len(token.value):
+                return chunk, token
+
+        return chunk, None
+
+    def resolve(self, line: int, column: int) -> tuple:
+        """Find the definition of the identifier at (line, column), returns (chunk, node, type token)"""
+        chunk, token = self.find_token(line, column)
+
+        if token is None or token.kind != "IDENTIFIER" or token.value in defs.TYPES:
+            return None, None, None
+
+        # same lookup as the parser: function scope first, then globals
+        ctx = parser.ContextManager()
+        ctx.globals = ChunkGlobals(self, None)
+        ctx.enter_func()
+        ctx.stack[-1][1].update(chunk.locals)
+
+        node = ctx.lookup(token.value)
+
+        if node is None:
+            return None, None, None
+
+        if chunk.locals.get(token.value) is node:
+            owner = chunk
+        elif node is STD_FUNCTIONS.get(token.value):
+            owner = None
+        else:
+            owner = next(c for c, n in self.symbols[token.value] if n is node)
+
+        return owner, node, ctx.get_type(token)
+
+class LanguageServer:
+    def __init__(self, input_stream=None, output_stream=None):
+        self.input = input_stream or sys.stdin.buffer
+        self.output = output_stream or sys.stdout.buffer
+        self.documents = {}
+        self.utf16 = True # position encoding, unless the client supports UTF-32
+        self.import_paths = []
+        self.shutdown_requested = False
+        self.running = True
+
+        self.request_handlers = {
+            "initialize": self.initialize,
+            "shutdown": self.shutdown,
+            "textDocument/hover": self.hover,
+            "textDocument/definition": self.definition
+        }
+
+        self.notification_handlers = {
+            "initialized": lambda params: None,
+            "exit": self.exit,
+            "textDocument/didOpen": self.did_open,
+            "textDocument/didChange": self.did_change,
+            "textDocument/didClose": self.did_close
+        }
+
+    def read_message(self) -> dict:
+        headers = {}
+
+        while True:
+            line = self.input.readline()
+
+            if not line:
+                return None
+
+            line = line.decode("ascii").strip()
+
+            if line == "":
+                break
+
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        body = self.input.read(int(headers.get("content-length", 0)))
+        return json.loads(body.decode("utf-8"))
+
+    def send(self, message: dict):
+        message["jsonrpc"] = "2.0"
+        body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+
+        self.output.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+        self.output.flush()
+
+    def serve(self) -> int:
+        while self.running:
+            try:
+                message = self.read_message()
+            except (ValueError, UnicodeDecodeError) as e:
+                logger.compiler_error(f"Invalid message: {e}")
+                continue
+
+            if message is None:
+                break
+
+            self.dispatch(message)
+
+        return 0 if self.shutdown_requested else 1
+
+    def dispatch(self, message: dict):
+        method = message.get("method")
+        params = message.get("params") or {}
+
+        if method is None:
+            return # response to a server request, none are sent
+
+        if "id" not in message:
+            handler = self.notification_handlers.get(method)
+
+            if handler is not None:
+                try:
+                    handler(params)
+                except Exception:
+                    for line in traceback.format_exc().splitlines():
+                        logger.compiler_error(line)
+
+            return
+
+        handler = self.request_handlers.get(method)
+
+        if handler is None:
+            self.send({"id": message["id"], "error": {"code": METHOD_NOT_FOUND, "message": f"Unknown method '{method}'"}})
+            return
+
+        try:
+            result = handler(params)
+        except Exception as e:
+            for line in traceback.format_exc().splitlines():
+                logger.compiler_error(line)
+
+            self.send({"id": message["id"], "error": {"code": INTERNAL_ERROR, "message": f"{type(e).__name__}: {e}"}})
+            return
+
+        self.send({"id": message["id"], "result": result})
+
+    def to_lsp_position(self, document: Document, line: int, column: int) -> dict:
+        # 1-based (line, column) -> LSP position
+        text = document.lines[line - 1] if 0 < line <= len(document.lines) else ""
+        return {"line": line - 1, "character": to_character(text, column - 1, self.utf16)}
+
+    def from_lsp_position(self, document: Document, position: dict) -> tuple:
+        # LSP position -> 0-based (line, column)
+        line = min(position["line"], len(document.lines) - 1)
+        return line, to_column(document.lines[line], position["character"], self.utf16)
+
+    def get_range(self, document: Document, line: int, column: int, length: int) -> dict:
+        return {
+            "start": self.to_lsp_position(document, line, column),
+            "end": self.to_lsp_position(document, line, column + length)
+        }
+
+    def publish_diagnostics(self, uri: str):
+        document = self.documents.get(uri)
+        diagnostics = []
+
+        if document is not None:
+            for severity, line, column, length, message in document.get_diagnostics():
+                diagnostics.append({
+                    "range": self.get_range(document, line, column, length),
+                    "severity": DIAGNOSTIC_SEVERITIES[severity],
+                    "source": defs.COMPILER_SHORT_NAME,
+                    "message": message
+                })
+
+        self.send({"method": "textDocument/publishDiagnostics", "params": {"uri": uri, "diagnostics": diagnostics}})
+
+    ###################
+
+    def initialize(self, params: dict) -> dict:
+        encodings = params.get("capabilities", {}).get("general", {}).get("positionEncodings", [])
+        self.utf16 = "utf-32" not in encodings
+        self.import_paths = (params.get("initializationOptions") or {}).get("importPaths", [])
+
+        return {
+            "capabilities": {
+                "positionEncoding": "utf-16" if self.utf16 else "utf-32",
+                "textDocumentSync": {"openClose": True, "change": TEXT_DOCUMENT_SYNC_INCREMENTAL},
+                "hoverProvider": True,
+                "definitionProvider": True
+            },
+            "serverInfo": {"name": defs.COMPILER_NAME, "version": defs.COMPILER_VERSION}
+        }
+
+    def shutdown(self, params: dict):
+        self.shutdown_requested = True
+        return None
+
+    def exit(self, params: dict):
+        self.running = False
+
+    def did_open(self, params: dict):
+        uri = params["textDocument"]["uri"]
+
+        self.documents[uri] = Document(uri, params["textDocument"]["text"], self.import_paths)
+        self.publish_diagnostics(uri)
+
+    def did_change(self, params: dict):
+        uri = params["textDocument"]["uri"]
+        document = self.documents[uri]
+
+        for change in params["contentChanges"]:
+            if "range" in change:
+                start = self.from_lsp_position(document, change["range"]["start"])
+                end = self.from_lsp_position(document, change["range"]["end"])
+
+                document.apply_change(start, end, change["text"])
+            else:
+                document.set_text(change["text"])
+
+        self.publish_diagnostics(uri)
+
+    def did_close(self, params: dict):
+        uri = params["textDocument"]["uri"]
+
+        self.documents.pop(uri, None)
+        self.publish_diagnostics(uri)
+
+    def hover(self, params: dict) -> dict:
+        document = self.documents[params["textDocument"]["uri"]]
+        line, column = self.from_lsp_position(document, params["position"])
+
+        _, node, type_token = document.resolve(line + 1, column + 1)
+
+        if node is None:
+            return None
+
+        return {"contents": {"kind": "markdown", "value": f"```implang\n{describe(node, type_token)}\n```"}}
+
+    def definition(self, params: dict) -> dict:
+        uri = params["textDocument"]["uri"]
+        document = self.documents[uri]
+        line, column = self.from_lsp_position(document, params["position"])
+
+        chunk, node, _ = document.resolve(line + 1, column + 1)
+
+        if node is None or chunk is None or node.name_token is None:
+            return None
+
+        token = node.name_token
+        return {"uri": uri, "range": self.get_range(document, chunk.start_line + token.line - 1, token.column, len(token.value))}
+
+def serve() -> int:
+    return LanguageServer().serve()
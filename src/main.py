@@ -38,14 +38,37 @@ import defs
 import logger
 import lexer
 import parser
+import semantic
+import comptime
+import codegen
+import lsp
+import profiling
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "profile-report":
+        raise SystemExit(profiling.report_main(sys.argv[2:]))
+
     arg_parser = argparse.ArgumentParser(description=f"{defs.COMPILER_NAME} v{defs.COMPILER_VERSION}")
 
-    arg_parser.add_argument("input", help="The input file(s) to compile", nargs="*")
+    arg_parser.add_argument("input", help="The input file(s) to compile, object files (.o, .a) are passed to the linker", nargs="*")
     arg_parser.add_argument("-o", "--output", help="The output file to write to", default="a.out")
     arg_parser.add_argument("-c", "--compile-only", help="Only compile the input file, do not link", action="store_true")
     arg_parser.add_argument("-S", "--assembly", help="Compile the input file to assembly", action="store_true")
+    arg_parser.add_argument("-I", "--import-path", help="Directory searched for module interfaces (.impi) by '@import' (can be repeated)", action="append", default=[])
+    arg_parser.add_argument("-j", "--jobs", help="Number of worker processes used to lex and parse large input files (default: 1)", type=int, default=1)
+    arg_parser.add_argument("--codegen-units", help="Split every input into N modules, optimized and emitted by parallel worker processes (default: 1, more units compile faster but inline less across them)", type=int, default=1, metavar="N")
+    arg_parser.add_argument("-O", "--optimize", help="Optimization level (default: 0)", type=int, choices=[0, 1, 2, 3], default=0)
+    arg_parser.add_argument("-g", "--debug-info", help="Emit DWARF debug information (functions and source lines)", action="store_true")
+    arg_parser.add_argument("-flto", help="Link-time optimization: link all inputs into one module before optimizing", action="store_true")
+    arg_parser.add_argument("-fprofile-instr", help=f"Count function calls, branches and loop iterations, the program writes them to '{profiling.DEFAULT_PROFILE_FILE}' (or ${profiling.PROFILE_FILE_ENV}) at exit, see 'impc profile-report'", action="store_true")
+    arg_parser.add_argument("-fprofile-use", help="Optimize using a profile collected from a -fprofile-instr build (branch weights, hot and cold functions)", metavar="PROFILE")
+    arg_parser.add_argument("-march", help="Target CPU, its instruction set extensions are used for vector types and vectorized loops ('native' for the host CPU, default: generic)", metavar="CPU")
+    arg_parser.add_argument("-fstream", help="Lex, parse, analyze and lower one function at a time, releasing its tokens and AST once it is lowered (lower peak memory)", action="store_true")
+    arg_parser.add_argument("-fno-switch-tables", help="Do not lower 'else if' equality chains to switches and lookup tables", action="store_true")
+    arg_parser.add_argument("-fmir", help="Generate LLVM IR through the SSA mid-level IR and its passes (functions outside its scalar subset are generated from the AST)", action="store_true")
+    arg_parser.add_argument("--emit", help="Write the given intermediate representation to the output file instead of compiling ('mir': the mid-level IR after its passes)", choices=["mir"])
+    arg_parser.add_argument("-fno-string-arena", help="Allocate every string concatenation on the heap, also the ones that don't escape their function", action="store_true")
+    arg_parser.add_argument("--lsp", help="Run the language server (Language Server Protocol over stdio)", action="store_true")
     arg_parser.add_argument("-v", "--verbose", help="Enable verbose output", action="store_true")
     arg_parser.add_argument("-V", "--version", help="Print the compiler version", action="store_true")
     
@@ -54,6 +77,8 @@ def main():
     if args.version:
         print(f"{defs.COMPILER_NAME} v{defs.COMPILER_VERSION}")
         raise SystemExit(0)
+    elif args.lsp:
+        raise SystemExit(lsp.serve())
     else:
         if not args.input:
             logger.compiler_error("No input files specified")
@@ -74,6 +99,26 @@ def main():
             logger.compiler_info(f"Make sure that you have the correct permissions to read the file")
             raise SystemExit(1)
 
+    if args.jobs < 1:
+        logger.compiler_error(f"Invalid number of jobs: {args.jobs}")
+        raise SystemExit(1)
+
+    if args.codegen_units < 1:
+        logger.compiler_error(f"Invalid number of codegen units: {args.codegen_units}")
+        raise SystemExit(1)
+
+    if args.fstream and (args.fprofile_instr or args.fprofile_use is not None):
+        logger.compiler_error("-fstream cannot be used with -fprofile-instr or -fprofile-use (the profile sites are numbered over the whole program)")
+        raise SystemExit(1)
+
+    if args.fmir and (args.debug_info or args.fprofile_instr or args.fprofile_use is not None):
+        logger.compiler_error("-fmir cannot be used with -g, -fprofile-instr or -fprofile-use (the MIR has no source locations or profiling sites)")
+        raise SystemExit(1)
+
+    args.import_path = [os.path.abspath(path) for path in args.import_path]
+    object_files = [input_file for input_file in args.input if input_file.endswith((".o", ".a"))]
+    source_files = [input_file for input_file in args.input if input_file not in object_files]
+
     args.output = os.path.abspath(args.output)
 
     if os.path.isfile(args.output):
@@ -101,28 +146,103 @@ def main():
     if args.verbose:
         logger.compiler_debug("Arguments:")
         logger.compiler_debug(f"Input file(s): {args.input}")
+        logger.compiler_debug(f"Import path(s): {args.import_path}")
         logger.compiler_debug(f"Output file: {args.output}")
         logger.compiler_debug(f"Compile only: {args.compile_only}")
         logger.compiler_debug(f"Assembly: {args.assembly}")
+        logger.compiler_debug(f"Optimization level: {args.optimize}")
+        logger.compiler_debug(f"Jobs: {args.jobs}")
+        logger.compiler_debug(f"Codegen units: {args.codegen_units}")
+        logger.compiler_debug(f"Link-time optimization: {args.flto}")
+        logger.compiler_debug(f"Profile instrumentation: {args.fprofile_instr}")
+        logger.compiler_debug(f"Profile: {args.fprofile_use}")
+        logger.compiler_debug(f"Streaming: {args.fstream}")
+        logger.compiler_debug(f"MIR: {args.fmir}")
+        logger.compiler_debug(f"Emit: {args.emit}")
         logger.compiler_debug(f"Verbose: {args.verbose}")
 
-    lexer_output = {}
+    parser_output = {}
 
-    for input_file in args.input:
-        lexer_output[input_file] = lexer.lex_file(input_file)
+    if args.fstream:
+        # the inputs are read when codegen reaches them, see stream_programs
+        ast = stream_programs(source_files, args, parser_output)
+    else:
+        lexer_output = {}
 
-    if args.verbose:
-        logger.compiler_debug("Lexer output:")
-        logger.compiler_debug(lexer_output)
+        for input_file in source_files:
+            lexer_output[input_file] = lexer.lex_file(input_file, args.jobs)
 
-    parser_output = {}
+        if args.verbose:
+            logger.compiler_debug("Lexer output:")
+            logger.compiler_debug(lexer_output)
 
-    for f_name, tokens in lexer_output.items():
-        parser_output[f_name] = parser.parse(f_name, tokens)
+        modules = {} # module name -> Program, '@import' can use the inputs parsed before
 
-    if args.verbose:
-        logger.compiler_debug("Parser output:")
-        logger.compiler_debug(parser_output)
+        for f_name, tokens in lexer_output.items():
+            parser_output[f_name] = parser.parse(f_name, tokens, args.import_path, modules, args.jobs)
+            modules[os.path.splitext(os.path.basename(f_name))[0]] = parser_output[f_name]
+
+        for f_name, program in parser_output.items():
+            semantic.analyze(f_name, program)
+            comptime.evaluate(f_name, program, args.optimize > 0)
+
+        if args.verbose:
+            logger.compiler_debug("Parser output:")
+            logger.compiler_debug(parser_output)
+
+        ast = list(parser_output.values())
+
+    profile = None
+
+    if args.fprofile_use is not None:
+        try:
+            profile = profiling.read_profile(args.fprofile_use)
+        except OSError as e:
+            logger.compiler_error(f"Cannot read profile '{args.fprofile_use}': {e.strerror}")
+            raise SystemExit(1)
+        except profiling.ProfileFormatError as e:
+            logger.compiler_error(f"Invalid profile '{args.fprofile_use}': {e}")
+            raise SystemExit(1)
+
+    codegen_options = codegen.CodegenOptions(
+        opt_level=args.optimize,
+        compile_only=args.compile_only,
+        assembly=args.assembly,
+        switch_tables=not args.fno_switch_tables,
+        lto=args.flto,
+        debug_info=args.debug_info,
+        profile_instr=args.fprofile_instr,
+        profile=profile,
+        cpu=args.march,
+        units=args.codegen_units,
+        string_arena=not args.fno_string_arena,
+        mir=args.fmir,
+        emit_mir=args.emit == "mir"
+    )
+
+    codegen.codegen(source_files, ast, args.output, args.verbose, codegen_options, object_files)
+
+    if args.compile_only and not args.assembly and parser_output:
+        # other modules import this one through its interface file, see parser.write_interface
+        interface_file = os.path.splitext(args.output)[0] + parser.INTERFACE_EXTENSION
+        parser.write_interface(list(parser_output.values()), interface_file)
+
+        if args.verbose:
+            logger.compiler_debug(f"Interface written to '{interface_file}'")
+
+def stream_programs(source_files: list[str], args, parser_output: dict):
+    """Lex, parse and analyze the inputs one at a time, yields parser.ProgramStreams whose functions are lexed and parsed while
+    codegen lowers them"""
+    modules = {} # module name -> Program with the signatures, '@import' can use the inputs parsed before
+
+    for input_file in source_files:
+        tokens = lexer.lex_file(input_file, outline=True)
+        program = parser.parse_stream(input_file, tokens, args.import_path, modules)
+
+        parser_output[input_file] = program
+        modules[os.path.splitext(os.path.basename(input_file))[0]] = program
+
+        yield comptime.evaluate(input_file, semantic.analyze(input_file, program), args.optimize > 0)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,1414 @@
+# Mid-level IR
+#
+# Functions in SSA form, between the typed AST and LLVM IR. A function is a control flow graph of basic blocks
+# over numbered values, stored column-wise: the opcode, ImpLang type, operands (value numbers) and data of value n
+# are opcodes[n], types[n], operands[n] and data[n]. Constants and parameters belong to no block, the other values
+# are instructions listed by their block in order, phis first and the terminator last:
+#
+#   const                         data: the value, an int (wrapped to the type), float or str (None for null)
+#   param                         data: the index of the parameter
+#   copy x                        data: the name of the assigned variable, removed by propagate_copies
+#   convert x                     from the type of x, like codegen.ModuleCodegen.convert
+#   add sub mul div rem pow       x, y of the type of the instruction
+#   and or xor shl shr
+#   eq ne lt le gt ge x, y        bool, x and y have the same type (numbers, bool, char or str)
+#   neg not lnot x                'not' is bitwise, 'lnot' negates a bool
+#   concat x, y                   data: the result is allocated in the arena of the call (see escape.py)
+#   call args...                  data: the name of the called function, no type when it returns nothing
+#   load                          data: the name of the global variable
+#   store x                       data: the name of the global variable
+#   phi values...                 one per predecessor of the block, in the order of Block.predecessors
+#   br                            data: (target block,)
+#   cbr c                         data: (then block, else block)
+#   switch x                      data: (default block, ((constant, block), ...))
+#   ret [x]
+#
+# Builder covers the scalar part of the language: locals and parameters of the number types, bool, char and
+# str, scalar globals, if, while, calls and all operators. Functions using arrays, slices, vectors, tasks or
+# parallel loops are generated from the AST by codegen (see Unsupported). The passes run at every optimization
+# level, so LLVM gets registers instead of a stack slot per variable and less code to work on:
+#
+#   propagate_copies      uses the source of copies and of phis whose operands are all the same value
+#   number_values         global value numbering, an instruction computing the value of a dominating one is removed
+#   simplify_cfg          folds branches on constants, removes unreachable blocks, merges straight-line blocks
+#   eliminate_dead_code   removes the instructions whose value is not used and that have no side effects
+#   inline_calls          replaces calls of small straight-line functions with their body
+#
+# Like codegen, the builder lowers 'else if' chains comparing a variable to constants to a switch (see
+# semantic.get_switch_cases), codegen turns the switches whose targets all return a constant into a lookup table.
+#
+# Codegen lowers through the MIR only with -fmir: it has no source locations or profiling sites yet, so -g and
+# the profile flags need the AST path, which stays the default until the MIR covers them. 'impc --emit=mir' writes
+# the functions after the passes, checked by verify.
+
+import json
+import sys
+
+import defs
+import escape
+import implang_types
+import lexer
+import parser
+import semantic
+
+INLINE_MAX_INSTRUCTIONS = 16 # largest inlined body, constants and parameters are not counted
+RECURSION_LIMIT = 100_000 # Python frames, looking a variable up recurses through the joins before its use
+
+VALUE_TYPES = frozenset(type_name for type_name in defs.TYPES if not implang_types.is_vector(type_name))
+
+OPERATIONS = {
+    # ImpLang operation (see parser.ExprNode) -> opcode
+    "PLUS": "add",
+    "MINUS": "sub",
+    "MULTIPLY": "mul",
+    "DIVIDE": "div",
+    "MODULO": "rem",
+    "POWER": "pow",
+    "BITWISE_AND": "and",
+    "BITWISE_OR": "or",
+    "BITWISE_XOR": "xor",
+    "BITWISE_LEFT_SHIFT": "shl",
+    "BITWISE_RIGHT_SHIFT": "shr",
+    "EQUALS": "eq",
+    "NOT_EQUALS": "ne",
+    "LESS_THAN": "lt",
+    "LESS_THAN_OR_EQUAL": "le",
+    "GREATER_THAN": "gt",
+    "GREATER_THAN_OR_EQUAL": "ge"
+}
+
+COMPARISONS = frozenset(["eq", "ne", "lt", "le", "gt", "ge"])
+COMMUTATIVE = frozenset(["add", "mul", "and", "or", "xor", "eq", "ne"])
+TERMINATORS = frozenset(["br", "cbr", "switch", "ret"])
+SIDE_EFFECTS = TERMINATORS | {"call", "store"}
+PURE = frozenset(["convert", "add", "sub", "mul", "div", "rem", "pow", "and", "or", "xor", "shl", "shr", "neg", "not", "lnot"]) | COMPARISONS
+
+FOLDED = {
+    # integer operations evaluated when their operands are constants (the others may trap or depend on LLVM)
+    "add": lambda a, b: a + b,
+    "sub": lambda a, b: a - b,
+    "mul": lambda a, b: a * b,
+    "and": lambda a, b: a & b,
+    "or": lambda a, b: a | b,
+    "xor": lambda a, b: a ^ b,
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "lt": lambda a, b: a < b,
+    "le": lambda a, b: a <= b,
+    "gt": lambda a, b: a > b,
+    "ge": lambda a, b: a >= b
+}
+
+class Unsupported(Exception):
+    """A function the builder doesn't cover, 'reason' completes 'it ...' (e.g. "uses arrays")"""
+    def __init__(self, reason: str):
+        self.reason = reason
+
+class MIRError(Exception):
+    """An invalid function found by verify, a bug of the builder or of a pass"""
+    def __init__(self, function: str, message: str):
+        super().__init__(f"'{function}': {message}")
+        self.function = function
+        self.message = message
+
+class Block:
+    def __init__(self, index: int, name: str):
+        self.index = index
+        self.name = name # kind of block, e.g. "if.then", used for the LLVM blocks
+        self.instructions = [] # value numbers, phis first and the terminator last
+        self.predecessors = [] # block indices, once per edge, in the order of the operands of the phis
+
+    def __str__(self):
+        return f"Block(b{self.index}, {self.name}, {len(self.instructions)} instructions)"
+
+    def __repr__(self):
+        return self.__str__()
+
+class Function:
+    def __init__(self, name: str, parameter_types: list, return_type: str, memoized: bool = False):
+        self.name = name
+        self.parameter_types = parameter_types
+        self.return_type = return_type # None for functions without a return value
+        self.memoized = memoized # '@memoize' function, never inlined
+        self.local_strings = set() # id(node) of the concatenations allocated in the arena of the call
+
+        self.opcodes = []
+        self.types = []
+        self.operands = []
+        self.data = []
+
+        self.blocks = [] # the entry block first
+        self.constants = {} # (type, value key) -> value number, every constant is added once
+
+        for index, parameter_type in enumerate(parameter_types):
+            self.add_value("param", parameter_type, (), index)
+
+    def __str__(self):
+        return format_function(self)
+
+    def __repr__(self):
+        return f"Function({self.name}, {len(self.blocks)} blocks, {len(self.opcodes)} values)"
+
+    def add_value(self, opcode: str, type_name: str, operands: tuple = (), data = None) -> int:
+        self.opcodes.append(opcode)
+        self.types.append(type_name)
+        self.operands.append(operands)
+        self.data.append(data)
+
+        return len(self.opcodes) - 1
+
+    def add_block(self, name: str) -> Block:
+        block = Block(len(self.blocks), name)
+        self.blocks.append(block)
+
+        return block
+
+    def get_constant(self, type_name: str, value) -> int:
+        if isinstance(value, float):
+            key = (type_name, value.hex()) # keeps -0.0 and 0.0 apart
+        else:
+            key = (type_name, value)
+
+        if key not in self.constants:
+            self.constants[key] = self.add_value("const", type_name, (), value)
+
+        return self.constants[key]
+
+    def is_constant(self, value: int) -> bool:
+        return self.opcodes[value] == "const"
+
+    def get_successors(self, block: Block) -> list:
+        terminator = block.instructions[-1]
+        opcode = self.opcodes[terminator]
+
+        if opcode in ["br", "cbr"]:
+            return list(self.data[terminator])
+
+        if opcode == "switch":
+            default, cases = self.data[terminator]
+            return [default] + [target for _, target in cases]
+
+        return []
+
+class Module:
+    """The MIR of a program: {name: Function} of the functions it covers and {name: reason} of the others"""
+    def __init__(self, program: parser.Program, nocapture: set, string_arena: bool = True, switch_min_cases: int = None, checked: bool = False):
+        self.nocapture = nocapture # see escape.get_local_strings
+        self.string_arena = string_arena
+        self.switch_min_cases = switch_min_cases # None to keep the 'else if' chains
+        self.checked = checked # verify the optimized functions, LLVM verifies the IR generated from them anyway
+
+        self.functions = {}
+        self.skipped = {}
+        self.signatures = {} # name -> parser.FuncNode of every callable function
+        self.global_types = {} # name -> ImpLang type of the global variables
+
+        for attribute in program.attributes:
+            if attribute.name == "@import_symbol" and isinstance(attribute.value, parser.FuncNode):
+                self.signatures[attribute.value.name] = attribute.value
+            elif attribute.name == "@import" and isinstance(attribute.value, parser.ImportNode):
+                for function in attribute.value.functions:
+                    self.signatures[function.name] = function
+
+        for statement in program.statements:
+            if isinstance(statement, parser.FuncNode):
+                self.signatures[statement.name] = statement
+            elif isinstance(statement, parser.VarNode):
+                self.global_types[statement.name] = statement.value_type
+
+    def __str__(self):
+        parts = [format_function(function) for function in self.functions.values()]
+        parts += [f"; func {name}: generated from the AST, it {reason}\n" for name, reason in self.skipped.items()]
+
+        return "\n".join(parts)
+
+    def __repr__(self):
+        return f"Module({len(self.functions)} functions, {len(self.skipped)} skipped)"
+
+    def build_function(self, node: parser.FuncNode) -> Function:
+        """Build the SSA form of a typed function and run the passes that need no other function, None when unsupported"""
+        local_strings = escape.get_local_strings(node, self.nocapture) if self.string_arena else set()
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, RECURSION_LIMIT))
+
+        try:
+            function = Builder(node, self.signatures, self.global_types, local_strings, self.switch_min_cases).build()
+        except Unsupported as e:
+            self.skipped[node.name] = e.reason
+            return None
+        except RecursionError:
+            self.skipped[node.name] = "is too deeply nested"
+            return None
+        finally:
+            sys.setrecursionlimit(limit)
+
+        propagate_copies(function)
+        simplify_cfg(function)
+
+        return function
+
+    def optimize_function(self, function: Function):
+        """The passes after inlining, they clean up what it and the builder left"""
+        number_values(function)
+        simplify_cfg(function)
+        propagate_copies(function) # phis of merged blocks and of calls folded by inlining
+        eliminate_dead_code(function)
+
+        if self.checked:
+            verify(function)
+
+def build_module(program: parser.Program, nocapture: set, string_arena: bool = True, switch_min_cases: int = None, checked: bool = False) -> Module:
+    module = Module(program, nocapture, string_arena, switch_min_cases, checked)
+
+    if isinstance(program, parser.ProgramStream):
+        nodes = program.functions
+    else:
+        nodes = [statement for statement in program.statements if isinstance(statement, parser.FuncNode)]
+
+    for node in nodes:
+        function = module.build_function(node)
+
+        if function is not None:
+            module.functions[node.name] = function
+
+    for function in module.functions.values():
+        inline_calls(function, module.functions)
+
+    for function in module.functions.values():
+        module.optimize_function(function)
+
+    return module
+
+###################
+
+def wrap(value: int, type_name: str) -> int:
+    # two's complement truncation of 'value' to an integer type (bool and char are u1 and u8)
+    width = implang_types.get_width(type_name)
+    value &= (1 << width) - 1
+
+    if implang_types.is_signed(type_name) and value >> (width - 1):
+        value -= 1 << width
+
+    return value
+
+def is_integer_type(type_name: str) -> bool:
+    return implang_types.is_integer(type_name) or type_name in ["bool", "char"]
+
+def get_zero(type_name: str):
+    if type_name == "str":
+        return None
+
+    if implang_types.is_float(type_name):
+        return 0.0
+
+    return 0
+
+def fold(function: Function, opcode: str, type_name: str, operands: tuple) -> int:
+    # the constant computed by an instruction on integer constants, None when it has to run
+    if not all(function.is_constant(operand) for operand in operands):
+        return None
+
+    operand_type = function.types[operands[0]]
+    values = [function.data[operand] for operand in operands]
+
+    if not is_integer_type(operand_type) or not is_integer_type(type_name):
+        return None
+
+    if opcode == "convert":
+        value = int(values[0] != 0) if type_name == "bool" else values[0]
+    elif opcode == "neg":
+        value = -values[0]
+    elif opcode in ["not", "lnot"]:
+        value = ~values[0]
+    elif opcode in FOLDED:
+        value = FOLDED[opcode](*values) # the constants are wrapped, so signed types compare as signed
+    else:
+        return None
+
+    return function.get_constant(type_name, wrap(int(value), type_name))
+
+def remove_predecessor(function: Function, block: Block, predecessor: int):
+    # removes an edge into 'block' and the operands of its phis for it
+    position = block.predecessors.index(predecessor)
+    del block.predecessors[position]
+
+    for value in block.instructions:
+        if function.opcodes[value] != "phi":
+            break
+
+        operands = function.operands[value]
+        function.operands[value] = operands[:position] + operands[position + 1:]
+
+def replace_values(function: Function, replacements: dict):
+    # rewrites the uses of the replaced values, 'replacements' maps a value to its replacement
+    if not replacements:
+        return
+
+    def find(value):
+        while value in replacements:
+            value = replacements[value]
+
+        return value
+
+    for block in function.blocks:
+        for value in block.instructions:
+            operands = function.operands[value]
+
+            if any(operand in replacements for operand in operands):
+                function.operands[value] = tuple(find(operand) for operand in operands)
+
+def remove_blocks(function: Function, removed: set):
+    # drops blocks that no remaining block branches to, the others are renumbered in order
+    if not removed:
+        return
+
+    blocks = [block for block in function.blocks if block.index not in removed]
+    numbers = {block.index: i for i, block in enumerate(blocks)}
+
+    for block in blocks:
+        block.index = numbers[block.index]
+        block.predecessors = [numbers[predecessor] for predecessor in block.predecessors]
+
+        terminator = block.instructions[-1]
+        opcode = function.opcodes[terminator]
+
+        if opcode in ["br", "cbr"]:
+            function.data[terminator] = tuple(numbers[target] for target in function.data[terminator])
+        elif opcode == "switch":
+            default, cases = function.data[terminator]
+            function.data[terminator] = (numbers[default], tuple((constant, numbers[target]) for constant, target in cases))
+
+    function.blocks = blocks
+
+def get_reverse_postorder(function: Function) -> list:
+    # indices of the blocks reachable from the entry, each after its predecessors (except along back edges)
+    order = []
+    visited = {0}
+    stack = [(0, iter(function.get_successors(function.blocks[0])))]
+
+    while stack:
+        block, successors = stack[-1]
+
+        for successor in successors:
+            if successor not in visited:
+                visited.add(successor)
+                stack.append((successor, iter(function.get_successors(function.blocks[successor]))))
+                break
+        else:
+            stack.pop()
+            order.append(block)
+
+    order.reverse()
+    return order
+
+def get_dominators(function: Function) -> dict:
+    """Immediate dominators of the reachable blocks, {block: idom} (the entry is its own)
+
+    Cooper, Harvey and Kennedy, "A Simple, Fast Dominance Algorithm".
+    """
+    order = get_reverse_postorder(function)
+    positions = {block: i for i, block in enumerate(order)}
+    dominators = {0: 0}
+
+    def intersect(a, b):
+        while a != b:
+            while positions[a] > positions[b]:
+                a = dominators[a]
+
+            while positions[b] > positions[a]:
+                b = dominators[b]
+
+        return a
+
+    changed = True
+
+    while changed:
+        changed = False
+
+        for block in order[1:]:
+            dominator = None
+
+            for predecessor in function.blocks[block].predecessors:
+                if predecessor in dominators:
+                    dominator = predecessor if dominator is None else intersect(predecessor, dominator)
+
+            if dominators.get(block) != dominator:
+                dominators[block] = dominator
+                changed = True
+
+    return dominators
+
+def get_loop_variables(node) -> dict:
+    # id(WhileNode) -> names of the variables declared or assigned in its loop, for every loop in 'node'
+    loops = {}
+
+    def walk(node) -> set:
+        names = {node.name} if isinstance(node, (parser.VarNode, parser.AssignmentNode)) else set()
+
+        for child in parser.get_children(node):
+            if child is not None:
+                names |= walk(child)
+
+        if isinstance(node, parser.WhileNode):
+            loops[id(node)] = names
+
+        return names
+
+    walk(node)
+    return loops
+
+def get_dominator_tree(function: Function) -> dict:
+    # {block: [blocks it immediately dominates]} of the reachable blocks
+    tree = {}
+
+    for block, dominator in get_dominators(function).items():
+        tree.setdefault(block, [])
+
+        if block != dominator:
+            tree.setdefault(dominator, []).append(block)
+
+    return tree
+
+###################
+
+class Builder:
+    """Builds the SSA form of a typed function
+
+    Braun et al., "Simple and Efficient Construction of Static Single Assignment Form": the variables are looked
+    up backwards from their uses, phis are added at joins, and joins whose predecessors are not all known yet
+    (loop headers) get incomplete phis until the block is sealed.
+    """
+    def __init__(self, node: parser.FuncNode, signatures: dict, global_types: dict, local_strings: set, switch_min_cases: int = None):
+        self.node = node
+        self.signatures = signatures
+        self.global_types = global_types
+        self.local_strings = local_strings # id(node) of the concatenations allocated in the arena of the call
+        self.switch_min_cases = switch_min_cases # None to keep the 'else if' chains
+
+        for parameter in node.parameters:
+            self.check_type(parameter.parameter_type)
+
+        if node.return_type is not None:
+            self.check_type(node.return_type)
+
+        self.function = Function(node.name, [p.parameter_type for p in node.parameters], node.return_type, node.memoize is not None)
+        self.function.local_strings = local_strings
+
+        self.block = None # the block instructions are added to, None after a terminator (unreachable code)
+        self.variable_types = {} # local name -> ImpLang type
+        self.definitions = [] # block -> {variable: value}
+        self.sealed = set() # blocks whose predecessors are all known
+        self.incomplete = {} # unsealed block -> [(variable, phi)]
+        self.loops = [] # (continue block, break block)
+        self.assigned = {} # id(WhileNode) -> names assigned in the loop, see get_loop_variables
+        self.loop_variables = {} # condition block of a loop -> names assigned in it, the others need no phi there
+
+    def build(self) -> Function:
+        entry = self.add_block("entry")
+        self.seal(entry)
+        self.block = entry
+
+        for index, parameter in enumerate(self.node.parameters):
+            self.variable_types[parameter.name] = parameter.parameter_type
+            self.definitions[entry][parameter.name] = index # the parameters are the first values
+
+        self.build_block(self.node.body)
+
+        if self.block is not None:
+            if self.function.return_type is None:
+                self.terminate("ret", ())
+            else:
+                self.terminate("ret", (self.zero(self.function.return_type),))
+
+        return self.function
+
+    def check_type(self, type_name: str):
+        if implang_types.is_vector(type_name):
+            raise Unsupported("uses vectors")
+
+        if type_name not in VALUE_TYPES:
+            raise Unsupported("uses arrays")
+
+    def add_block(self, name: str) -> int:
+        self.definitions.append({})
+        return self.function.add_block(name).index
+
+    def emit(self, opcode: str, type_name: str, operands: tuple = (), data = None) -> int:
+        folded = fold(self.function, opcode, type_name, operands) if opcode in PURE else None
+
+        if folded is not None:
+            return folded
+
+        value = self.function.add_value(opcode, type_name, operands, data)
+        self.function.blocks[self.block].instructions.append(value)
+
+        return value
+
+    def terminate(self, opcode: str, operands: tuple, data: tuple = ()):
+        self.function.blocks[self.block].instructions.append(self.function.add_value(opcode, None, operands, data))
+
+        for target in self.function.get_successors(self.function.blocks[self.block]):
+            self.function.blocks[target].predecessors.append(self.block)
+
+        self.block = None
+
+    def jump(self, target: int):
+        if self.block is not None:
+            self.terminate("br", (), (target,))
+
+    def zero(self, type_name: str) -> int:
+        return self.function.get_constant(type_name, get_zero(type_name))
+
+    ###################
+
+    def write_variable(self, name: str, block: int, value: int):
+        self.definitions[block][name] = value
+
+    def read_variable(self, name: str, block: int) -> int:
+        # blocks with a single predecessor and loops not assigning the variable are walked iteratively, only joins
+        # recurse (through add_phi_operands)
+        path = []
+
+        while name not in self.definitions[block]:
+            predecessors = self.function.blocks[block].predecessors
+
+            if block in self.sealed and len(predecessors) == 1:
+                path.append(block)
+                block = predecessors[0]
+                continue
+
+            if name not in self.loop_variables.get(block, {name}):
+                # the same value on every iteration, the first predecessor enters the loop
+                path.append(block)
+                block = predecessors[0]
+                continue
+
+            value = self.add_phi(name, block)
+            break
+        else:
+            value = self.definitions[block][name]
+
+        for visited in path:
+            self.definitions[visited][name] = value
+
+        return value
+
+    def add_phi(self, name: str, block: int) -> int:
+        phi = self.function.add_value("phi", self.variable_types[name], ())
+        instructions = self.function.blocks[block].instructions
+        position = 0
+
+        while position < len(instructions) and self.function.opcodes[instructions[position]] == "phi":
+            position += 1
+
+        instructions.insert(position, phi)
+        self.definitions[block][name] = phi # before the operands, a loop reads it back
+
+        if block in self.sealed:
+            self.add_phi_operands(name, phi, block)
+        else:
+            self.incomplete.setdefault(block, []).append((name, phi))
+
+        return phi
+
+    def add_phi_operands(self, name: str, phi: int, block: int):
+        self.function.operands[phi] = tuple(self.read_variable(name, predecessor) for predecessor in self.function.blocks[block].predecessors)
+
+    def seal(self, block: int):
+        for name, phi in self.incomplete.pop(block, []):
+            self.add_phi_operands(name, phi, block)
+
+        self.sealed.add(block)
+
+    ###################
+
+    def build_block(self, block: parser.BlockNode):
+        for statement in block.statements:
+            if self.block is None:
+                break # the rest of the block is unreachable
+
+            self.build_statement(statement)
+
+    def build_statement(self, node):
+        if isinstance(node, parser.VarNode):
+            self.check_type(node.value_type)
+
+            if self.variable_types.get(node.name, node.value_type) != node.value_type:
+                raise Unsupported("declares a variable twice with different types")
+
+            self.variable_types[node.name] = node.value_type
+            value = self.zero(node.value_type) if node.value is None else self.build_value(node.value, node.value_type)
+            self.write_variable(node.name, self.block, self.emit("copy", node.value_type, (value,), node.name))
+
+        elif isinstance(node, parser.AssignmentNode):
+            value = self.build_value(node.value, node.concrete_type)
+
+            if node.name in self.variable_types:
+                self.write_variable(node.name, self.block, self.emit("copy", node.concrete_type, (value,), node.name))
+            else:
+                self.check_type(node.concrete_type)
+                self.emit("store", None, (value,), node.name)
+
+        elif isinstance(node, parser.IfNode):
+            self.build_if(node)
+
+        elif isinstance(node, parser.WhileNode):
+            self.build_while(node)
+
+        elif isinstance(node, parser.BreakNode):
+            self.jump(self.loops[-1][1])
+
+        elif isinstance(node, parser.ContinueNode):
+            self.jump(self.loops[-1][0])
+
+        elif isinstance(node, parser.ReturnNode):
+            if self.function.return_type is None:
+                self.terminate("ret", ())
+            elif isinstance(node.value, parser.ValueNode) and node.value.value_type == "NULL":
+                self.terminate("ret", (self.zero(self.function.return_type),))
+            else:
+                self.terminate("ret", (self.build_value(node.value, self.function.return_type),))
+
+        elif isinstance(node, (parser.SpawnNode, parser.JoinNode)):
+            raise Unsupported("spawns tasks")
+
+        elif isinstance(node, parser.IndexAssignmentNode):
+            raise Unsupported("uses arrays")
+
+        else:
+            self.build_expr(node)
+
+    def build_if(self, node: parser.IfNode):
+        switch = semantic.get_switch_cases(node, self.switch_min_cases) if self.switch_min_cases is not None else None
+
+        if switch is not None:
+            self.build_switch(node, *switch)
+            return
+
+        open_blocks = [] # blocks that fall through to the end of the if statement
+
+        for arm in [node] + node.else_ifs:
+            condition = self.build_condition(arm.condition)
+            then_block = self.add_block("if.then")
+            else_block = self.add_block("if.else")
+
+            self.terminate("cbr", (condition,), (then_block, else_block))
+            self.seal(then_block)
+            self.seal(else_block)
+
+            self.block = then_block
+            self.build_block(arm.body)
+
+            if self.block is not None:
+                open_blocks.append(self.block)
+
+            self.block = else_block
+
+        if node.else_statement is not None:
+            self.build_block(node.else_statement)
+
+        if self.block is not None:
+            open_blocks.append(self.block)
+
+        self.join(open_blocks, "if.end")
+
+    def build_switch(self, node: parser.IfNode, subject: parser.VariableNode, cases: list):
+        value = self.build_expr(subject)
+        type_name = self.function.types[value]
+
+        case_blocks = [self.add_block("switch.case") for _ in cases]
+        default_block = self.add_block("switch.default")
+
+        self.terminate("switch", (value,), (default_block, tuple((wrap(constant, type_name), block) for (constant, _), block in zip(cases, case_blocks))))
+
+        open_blocks = [] # blocks that fall through to the end of the if statement
+
+        for (_, body), block in zip(cases, case_blocks):
+            self.seal(block)
+            self.block = block
+            self.build_block(body)
+
+            if self.block is not None:
+                open_blocks.append(self.block)
+
+        self.seal(default_block)
+        self.block = default_block
+
+        if node.else_statement is not None:
+            self.build_block(node.else_statement)
+
+        if self.block is not None:
+            open_blocks.append(self.block)
+
+        self.join(open_blocks, "switch.end")
+
+    def join(self, open_blocks: list, name: str):
+        # continue in a new block reached from all the open blocks, nowhere when every arm returns or leaves the loop
+        if not open_blocks:
+            return
+
+        end_block = self.add_block(name)
+
+        for block in open_blocks:
+            self.block = block
+            self.jump(end_block)
+
+        self.seal(end_block)
+        self.block = end_block
+
+    def build_while(self, node: parser.WhileNode):
+        if node.parallel:
+            raise Unsupported("has a parallel loop")
+
+        condition_block = self.add_block("while.cond")
+        body_block = self.add_block("while.body")
+        end_block = self.add_block("while.end")
+
+        self.jump(condition_block)
+        if id(node) not in self.assigned:
+            self.assigned.update(get_loop_variables(node)) # the outermost loop, the inner ones are found with it
+
+        self.loop_variables[condition_block] = self.assigned[id(node)]
+
+        # the condition block is sealed after the body, 'continue' and the end of the body jump back to it
+        self.block = condition_block
+        self.terminate("cbr", (self.build_condition(node.condition),), (body_block, end_block))
+        self.seal(body_block)
+
+        self.block = body_block
+        self.loops.append((condition_block, end_block))
+        self.build_block(node.body)
+        self.loops.pop()
+
+        self.jump(condition_block)
+        self.seal(condition_block)
+        self.seal(end_block)
+
+        self.block = end_block
+
+    ###################
+
+    def build_value(self, node, type_name: str) -> int:
+        # the value of 'node' converted to 'type_name' (assigned, passed or returned)
+        if isinstance(node, parser.ValueNode) and node.value_type == "NULL":
+            return self.zero(type_name)
+
+        return self.convert(self.build_expr(node), type_name)
+
+    def build_condition(self, node) -> int:
+        return self.convert(self.build_expr(node), "bool")
+
+    def convert(self, value: int, type_name: str) -> int:
+        if self.function.types[value] == type_name:
+            return value
+
+        return self.emit("convert", type_name, (value,))
+
+    def build_expr(self, node) -> int:
+        if isinstance(node, parser.ValueNode):
+            return self.build_literal(node)
+
+        if isinstance(node, parser.VariableNode):
+            if node.name in self.variable_types:
+                return self.read_variable(node.name, self.block)
+
+            self.check_type(node.concrete_type)
+            return self.emit("load", node.concrete_type, (), node.name)
+
+        if isinstance(node, parser.CallNode):
+            return self.build_call(node)
+
+        if isinstance(node, parser.ExprNode):
+            return self.build_binary(node)
+
+        if isinstance(node, parser.UnaryExprNode):
+            return self.build_unary(node)
+
+        if isinstance(node, parser.ReduceNode):
+            raise Unsupported("uses vectors")
+
+        if isinstance(node, parser.SpawnNode):
+            raise Unsupported("spawns tasks")
+
+        raise Unsupported("uses arrays") # IndexNode, ArrayNode and LenNode
+
+    def build_literal(self, node: parser.ValueNode) -> int:
+        type_name = node.concrete_type
+
+        if type_name is None:
+            raise Unsupported(f"has an untyped {node.value_type.lower()} literal")
+
+        self.check_type(type_name)
+
+        if node.value_type == "NULL":
+            return self.zero(type_name)
+
+        if node.value_type == "STRING":
+            return self.function.get_constant(type_name, lexer.unescape(node.value[1:-1]))
+
+        if node.value_type == "BOOLEAN":
+            value = int(node.value == "true")
+        elif node.value_type == "CHAR":
+            value = ord(lexer.unescape(node.value[1:-1]))
+        elif node.value_type == "FLOAT":
+            value = float(node.value)
+        else:
+            value = int(node.value)
+
+        if implang_types.is_float(type_name):
+            return self.function.get_constant(type_name, float(value))
+
+        return self.function.get_constant(type_name, wrap(value, type_name))
+
+    def build_call(self, node: parser.CallNode) -> int:
+        signature = self.signatures.get(node.name)
+
+        if signature is None:
+            raise Unsupported(f"calls '{node.name}', which is not a function")
+
+        for parameter in signature.parameters:
+            self.check_type(parameter.parameter_type)
+
+        if signature.return_type is not None:
+            self.check_type(signature.return_type)
+
+        arguments = tuple(self.build_value(argument, parameter.parameter_type) for argument, parameter in zip(node.arguments, signature.parameters))
+
+        return self.emit("call", signature.return_type, arguments, node.name)
+
+    def build_unary(self, node: parser.UnaryExprNode) -> int:
+        self.check_type(node.concrete_type)
+
+        if node.operation == "NOT":
+            return self.emit("lnot", "bool", (self.build_condition(node.right),))
+
+        value = self.convert(self.build_expr(node.right), node.concrete_type) # bool and char are u8
+
+        if node.operation == "MINUS":
+            if implang_types.is_float(node.concrete_type) and self.function.is_constant(value):
+                return self.function.get_constant(node.concrete_type, -self.function.data[value]) # negative literal
+
+            return self.emit("neg", node.concrete_type, (value,))
+
+        if node.operation == "BITWISE_NOT":
+            return self.emit("not", node.concrete_type, (value,))
+
+        return value
+
+    def build_binary(self, node: parser.ExprNode) -> int:
+        if node.operation in ["AND", "OR"]:
+            return self.build_short_circuit(node)
+
+        if node.operand_type is None or implang_types.is_vector(node.operand_type):
+            raise Unsupported("uses vectors")
+
+        if node.operation == "XOR":
+            return self.emit("xor", "bool", (self.build_condition(node.left), self.build_condition(node.right)))
+
+        left = self.convert(self.build_expr(node.left), node.operand_type)
+        right = self.convert(self.build_expr(node.right), node.operand_type)
+
+        if node.operand_type == "str" and node.operation == "PLUS":
+            if self.function.is_constant(left) and self.function.is_constant(right) and None not in [self.function.data[left], self.function.data[right]]:
+                # concatenation of literals, nothing to allocate
+                return self.function.get_constant("str", self.function.data[left] + self.function.data[right])
+
+            return self.emit("concat", "str", (left, right), id(node) in self.local_strings)
+
+        opcode = OPERATIONS[node.operation]
+
+        return self.emit(opcode, "bool" if opcode in COMPARISONS else node.operand_type, (left, right))
+
+    def build_short_circuit(self, node: parser.ExprNode) -> int:
+        left = self.build_condition(node.left)
+        right_block = self.add_block("logic.rhs")
+        end_block = self.add_block("logic.end")
+
+        if node.operation == "AND":
+            self.terminate("cbr", (left,), (right_block, end_block))
+        else:
+            self.terminate("cbr", (left,), (end_block, right_block))
+
+        self.seal(right_block)
+        self.block = right_block
+        right = self.build_condition(node.right)
+        self.jump(end_block)
+
+        self.seal(end_block)
+        self.block = end_block
+
+        # the left operand decides when the right one is skipped
+        skipped = self.function.get_constant("bool", int(node.operation == "OR"))
+        result = self.function.add_value("phi", "bool", (skipped, right))
+        self.function.blocks[end_block].instructions.insert(0, result)
+
+        return result
+
+###################
+
+def propagate_copies(function: Function):
+    """Replaces copies, and phis whose operands are all the same value (or the phi itself), with their source"""
+    replacements = {}
+    users = {} # value -> phis using it, checked again when it is replaced
+
+    def find(value):
+        while value in replacements:
+            value = replacements[value]
+
+        return value
+
+    work = []
+
+    for block in function.blocks:
+        for value in block.instructions:
+            opcode = function.opcodes[value]
+
+            if opcode == "phi":
+                for operand in function.operands[value]:
+                    users.setdefault(operand, []).append(value)
+
+            if opcode in ["copy", "phi"]:
+                work.append(value)
+
+    work.reverse() # in order, the sources of most copies are replaced before them
+
+    while work:
+        value = work.pop()
+
+        if value in replacements:
+            continue
+
+        if function.opcodes[value] == "copy":
+            source = find(function.operands[value][0])
+        else:
+            sources = {find(operand) for operand in function.operands[value]} - {value}
+
+            if len(sources) != 1:
+                continue
+
+            source = sources.pop()
+
+        replacements[value] = source
+
+        if value in users:
+            work.extend(users[value])
+            users.setdefault(source, []).extend(users.pop(value))
+
+    for block in function.blocks:
+        block.instructions = [value for value in block.instructions if value not in replacements]
+
+    replace_values(function, replacements)
+
+def number_values(function: Function):
+    """Removes the pure instructions that compute the same value as an instruction dominating them
+
+    The dominator tree is walked in preorder with a scoped table of (opcode, type, operands, data), so an
+    instruction is only found from the blocks it dominates.
+    """
+    tree = get_dominator_tree(function)
+    replacements = {}
+    table = {}
+    scopes = {} # block -> keys it added to the table
+    stack = [0]
+
+    while stack:
+        block = stack.pop()
+
+        if block < 0:
+            for key in scopes.pop(~block):
+                del table[key]
+
+            continue
+
+        instructions = []
+        keys = []
+
+        for value in function.blocks[block].instructions:
+            opcode = function.opcodes[value]
+
+            if opcode in PURE:
+                operands = tuple(replacements.get(operand, operand) for operand in function.operands[value])
+                function.operands[value] = operands
+
+                if opcode in COMMUTATIVE:
+                    operands = tuple(sorted(operands))
+
+                key = (opcode, function.types[value], operands)
+                leader = table.get(key)
+
+                if leader is not None:
+                    replacements[value] = leader
+                    continue
+
+                table[key] = value
+                keys.append(key)
+
+            instructions.append(value)
+
+        function.blocks[block].instructions = instructions
+        scopes[block] = keys
+
+        stack.append(~block)
+        stack.extend(tree.get(block, []))
+
+    replace_values(function, replacements)
+
+def simplify_cfg(function: Function):
+    """Folds branches on constants, removes unreachable blocks and merges a block into its only predecessor"""
+    for block in function.blocks:
+        terminator = block.instructions[-1]
+
+        if function.opcodes[terminator] != "cbr":
+            continue
+
+        condition = function.operands[terminator][0]
+        then_block, else_block = function.data[terminator]
+
+        if function.is_constant(condition) or then_block == else_block:
+            taken, skipped = (then_block, else_block) if function.data[condition] or then_block == else_block else (else_block, then_block)
+
+            function.opcodes[terminator] = "br"
+            function.operands[terminator] = ()
+            function.data[terminator] = (taken,)
+
+            remove_predecessor(function, function.blocks[skipped], block.index)
+
+    reachable = set(get_reverse_postorder(function))
+    removed = set()
+
+    for block in function.blocks:
+        if block.index in reachable:
+            continue
+
+        removed.add(block.index)
+
+        for successor in function.get_successors(block):
+            if successor in reachable:
+                remove_predecessor(function, function.blocks[successor], block.index)
+
+    replacements = {}
+
+    for block in function.blocks:
+        if block.index in removed:
+            continue
+
+        while True:
+            terminator = block.instructions[-1]
+
+            if function.opcodes[terminator] != "br":
+                break
+
+            target = function.blocks[function.data[terminator][0]]
+
+            if target.index in [0, block.index] or target.predecessors != [block.index]:
+                break
+
+            # the phis of the target have a single operand
+            instructions = []
+
+            for value in target.instructions:
+                if function.opcodes[value] == "phi":
+                    replacements[value] = function.operands[value][0]
+                else:
+                    instructions.append(value)
+
+            block.instructions = block.instructions[:-1] + instructions
+
+            for successor in function.get_successors(target):
+                predecessors = function.blocks[successor].predecessors
+                predecessors[predecessors.index(target.index)] = block.index
+
+            removed.add(target.index)
+
+    replace_values(function, replacements)
+    remove_blocks(function, removed)
+
+def eliminate_dead_code(function: Function):
+    """Removes the instructions without side effects whose value is never used"""
+    live = set()
+    work = [value for block in function.blocks for value in block.instructions if function.opcodes[value] in SIDE_EFFECTS]
+
+    while work:
+        value = work.pop()
+
+        if value in live:
+            continue
+
+        live.add(value)
+        work.extend(operand for operand in function.operands[value] if function.opcodes[operand] not in ["const", "param"])
+
+    for block in function.blocks:
+        block.instructions = [value for value in block.instructions if value in live]
+
+def can_inline(callee: Function, caller: Function) -> bool:
+    # straight-line bodies only: the call is replaced by the instructions of the single block
+    if callee is caller or callee.memoized or callee.name == "main" or len(callee.blocks) != 1:
+        return False
+
+    instructions = callee.blocks[0].instructions
+
+    if len(instructions) > INLINE_MAX_INSTRUCTIONS:
+        return False
+
+    for value in instructions:
+        opcode = callee.opcodes[value]
+
+        if opcode == "phi" or (opcode == "call" and callee.data[value] == callee.name):
+            return False
+
+        if opcode == "concat" and callee.data[value]:
+            return False # allocated in the arena of the callee, released when it returns
+
+    return True
+
+def inline_calls(function: Function, functions: dict):
+    """Replaces the calls of small straight-line functions of 'functions' with a copy of their body
+
+    The calls in the inlined bodies are not inlined again, so recursion ends after one step.
+    """
+    replacements = {}
+
+    for block in function.blocks:
+        instructions = []
+
+        for value in block.instructions:
+            callee = functions.get(function.data[value]) if function.opcodes[value] == "call" else None
+
+            if callee is None or not can_inline(callee, function):
+                instructions.append(value)
+                continue
+
+            arguments = [replacements.get(operand, operand) for operand in function.operands[value]]
+            copies = {} # value of the callee -> value of the caller
+
+            def get_copy(operand):
+                if operand in copies:
+                    return copies[operand]
+
+                if callee.opcodes[operand] == "param":
+                    return arguments[callee.data[operand]]
+
+                return function.get_constant(callee.types[operand], callee.data[operand])
+
+            for inlined in callee.blocks[0].instructions:
+                opcode = callee.opcodes[inlined]
+                operands = tuple(get_copy(operand) for operand in callee.operands[inlined])
+
+                if opcode == "ret":
+                    if operands:
+                        replacements[value] = operands[0]
+
+                    break
+
+                folded = fold(function, opcode, callee.types[inlined], operands) if opcode in PURE else None
+
+                if folded is None:
+                    folded = function.add_value(opcode, callee.types[inlined], operands, callee.data[inlined])
+                    instructions.append(folded)
+
+                copies[inlined] = folded
+
+        block.instructions = instructions
+
+    replace_values(function, replacements)
+
+###################
+
+def verify(function: Function):
+    """Checks the structure, the types and that every value dominates its uses, raises MIRError"""
+    def fail(message: str):
+        raise MIRError(function.name, message)
+
+    if not function.blocks:
+        fail("has no blocks")
+
+    positions = {} # value -> (block, position)
+
+    for block in function.blocks:
+        if not block.instructions or function.opcodes[block.instructions[-1]] not in TERMINATORS:
+            fail(f"block b{block.index} does not end with a terminator")
+
+        phis = True
+
+        for position, value in enumerate(block.instructions):
+            opcode = function.opcodes[value]
+
+            if value in positions:
+                fail(f"%{value} is in more than one place")
+
+            if opcode in ["const", "param"]:
+                fail(f"%{value} ({opcode}) is in block b{block.index}")
+
+            if opcode in TERMINATORS and position != len(block.instructions) - 1:
+                fail(f"terminator %{value} in the middle of block b{block.index}")
+
+            if opcode == "phi" and not phis:
+                fail(f"phi %{value} after other instructions in block b{block.index}")
+
+            phis = phis and opcode == "phi"
+            positions[value] = (block.index, position)
+
+    edges = {block.index: [] for block in function.blocks}
+
+    for block in function.blocks:
+        for successor in function.get_successors(block):
+            if successor not in edges:
+                fail(f"block b{block.index} branches to a missing block")
+
+            edges[successor].append(block.index)
+
+    for block in function.blocks:
+        if sorted(edges[block.index]) != sorted(block.predecessors):
+            fail(f"wrong predecessors of block b{block.index}")
+
+    tree = get_dominator_tree(function)
+    entered = {}
+    left = {}
+    clock = 0
+    stack = [0]
+
+    while stack:
+        block = stack.pop()
+
+        if block < 0:
+            left[~block] = clock
+        else:
+            entered[block] = clock
+            stack.append(~block)
+            stack.extend(tree.get(block, []))
+
+        clock += 1
+
+    def dominates(definition: int, block: int, position: int) -> bool:
+        if definition not in positions:
+            return function.opcodes[definition] in ["const", "param"]
+
+        definition_block, definition_position = positions[definition]
+
+        if definition_block not in entered:
+            return False
+
+        if definition_block == block:
+            return definition_position < position
+
+        return entered[definition_block] <= entered[block] and left[block] <= left[definition_block]
+
+    for block in function.blocks:
+        if block.index not in tree:
+            continue # unreachable, removed by simplify_cfg
+
+        for position, value in enumerate(block.instructions):
+            opcode = function.opcodes[value]
+            type_name = function.types[value]
+            operands = function.operands[value]
+
+            for operand in operands:
+                if not 0 <= operand < len(function.opcodes) or function.types[operand] is None:
+                    fail(f"%{value} uses %{operand}, which has no value")
+
+            operand_types = [function.types[operand] for operand in operands]
+
+            if opcode == "phi":
+                if len(operands) != len(block.predecessors):
+                    fail(f"phi %{value} has {len(operands)} operands for {len(block.predecessors)} predecessors")
+
+                for operand, predecessor in zip(operands, block.predecessors):
+                    end = len(function.blocks[predecessor].instructions)
+
+                    if predecessor in tree and not dominates(operand, predecessor, end):
+                        fail(f"phi %{value} uses %{operand}, which does not dominate the end of b{predecessor}")
+            else:
+                for operand in operands:
+                    if not dominates(operand, block.index, position):
+                        fail(f"%{value} uses %{operand}, which does not dominate it")
+
+            if opcode == "phi" or opcode in OPERATIONS.values() and opcode not in COMPARISONS or opcode in ["neg", "not", "copy"]:
+                expected = [type_name] * len(operands)
+            elif opcode in COMPARISONS:
+                expected = [operand_types[0]] * 2
+            elif opcode == "concat":
+                expected = ["str", "str"]
+            elif opcode in ["lnot", "cbr"]:
+                expected = ["bool"]
+            elif opcode == "ret":
+                expected = [] if function.return_type is None else [function.return_type]
+            else:
+                expected = operand_types # convert, call, store and switch take any type
+
+            if operand_types != expected:
+                fail(f"%{value} ({opcode}) has operands of types {', '.join(map(str, operand_types))}")
+
+###################
+
+def format_operand(function: Function, value: int) -> str:
+    if not function.is_constant(value):
+        return f"%{value}"
+
+    constant = function.data[value]
+    type_name = function.types[value]
+
+    if type_name == "str":
+        return "null" if constant is None else json.dumps(constant)
+
+    if type_name == "bool":
+        return "true" if constant else "false"
+
+    return repr(constant)
+
+def format_instruction(function: Function, value: int) -> str:
+    opcode = function.opcodes[value]
+    type_name = function.types[value]
+    operands = [format_operand(function, operand) for operand in function.operands[value]]
+    data = function.data[value]
+
+    if opcode == "br":
+        return f"br b{data[0]}"
+
+    if opcode == "cbr":
+        return f"cbr {operands[0]}, b{data[0]}, b{data[1]}"
+
+    if opcode == "switch":
+        cases = ", ".join(f"{constant}: b{target}" for constant, target in data[1])
+        return f"switch {function.types[function.operands[value][0]]} {operands[0]}, b{data[0]} [{cases}]"
+
+    if opcode == "ret":
+        return f"ret {operands[0]}" if operands else "ret"
+
+    if opcode == "store":
+        return f"store @{data}, {operands[0]}"
+
+    if opcode == "call":
+        text = f"call {data}({', '.join(operands)})"
+    elif opcode == "load":
+        text = f"load @{data}"
+    elif opcode == "phi":
+        predecessors = next(block.predecessors for block in function.blocks if value in block.instructions)
+        text = "phi " + ", ".join(f"[{operand}, b{predecessor}]" for operand, predecessor in zip(operands, predecessors))
+    else:
+        text = f"{opcode} {', '.join(operands)}"
+
+    if opcode == "convert":
+        text += f" from {function.types[function.operands[value][0]]}"
+    elif opcode == "copy":
+        text += f"  ; {data}"
+    elif opcode == "concat" and data:
+        text += "  ; arena"
+
+    if type_name is None:
+        return text
+
+    return f"%{value} = {type_name} {text}"
+
+def format_function(function: Function) -> str:
+    parameters = ", ".join(f"%{index}: {type_name}" for index, type_name in enumerate(function.parameter_types))
+    lines = [f"func {function.name}({parameters})" + (f" -> {function.return_type}" if function.return_type else "") + " {"]
+
+    for block in function.blocks:
+        predecessors = ", ".join(f"b{predecessor}" for predecessor in block.predecessors)
+        lines.append(f"b{block.index}:  ; {block.name}" + (f", from {predecessors}" if predecessors else ""))
+
+        for value in block.instructions:
+            lines.append("    " + format_instruction(function, value))
+
+    lines.append("}")
+    return "\n".join(lines) + "\n"
@@ -1,3 +1,15 @@
+import array
+import contextlib
+import copy
+import gc
+import io
+import keyword
+import multiprocessing
+import os
+import struct
+import sys
+import zlib
+
 import defs
 import implang_types
 import lexer
@@ -18,6 +30,9 @@ class ContextManager:
         self.globals = {}
         self.require_defined_in_future_dict = {}
         self.level = 0
+        self.definitions = None # when a list, global definitions are recorded in it (see parse_parallel)
+        self.std = {} # name -> FuncNode of the standard runtime, when the program uses it (see Parser)
+        self.requirements = None # same for the tokens of the functions required to be defined in future
 
     def init(self, file: str, tokens: list[lexer.Token]):
         self.__init__() # Reset
@@ -103,14 +118,19 @@ class ContextManager:
                 
                 del self.require_defined_in_future_dict[node.name] # it's defined now
         
-        globals_and_locals = {}
-        globals_and_locals.update(self.globals)
+        previous = self.lookup(node.name)
 
-        for _, v_locals in self.stack:
-            if v_locals is not None:
-                globals_and_locals.update(v_locals)
+        if previous is not None and previous is self.std.get(node.name):
+            logger.code_error(
+                self.file,
+                node.name_token.line,
+                node.name_token.column,
+                len(node.name),
+                f"'{node.name}' is already defined by the standard runtime (add '@no_std' to define it)"
+            )
+            raise SystemExit(1)
 
-        if node.name in globals_and_locals:
+        if previous is not None:
             logger.code_error(
                 self.file,
                 node.name_token.line,
@@ -120,9 +140,9 @@ class ContextManager:
             )
             logger.code_note(
                 self.file,
-                globals_and_locals[node.name].name_token.line,
-                globals_and_locals[node.name].name_token.column,
-                len(globals_and_locals[node.name].name_token.value),
+                previous.name_token.line,
+                previous.name_token.column,
+                len(previous.name_token.value),
                 f"'{node.name}' defined here"
             )
             raise SystemExit(1)
@@ -132,7 +152,10 @@ class ContextManager:
                 self.stack[i][1][node.name] = node
                 return
         
-        self.globals[node.name] = node   
+        self.globals[node.name] = node
+
+        if self.definitions is not None:
+            self.definitions.append(node)
 
     def delete(self, name: str):
         for i in range(len(self.stack) - 1, -1, -1):
@@ -144,35 +167,35 @@ class ContextManager:
         if name in self.globals:
             del self.globals[name]
 
-    def get_type(self, token: lexer.Token) -> lexer.Token:
-        globals_and_locals = {}
-        globals_and_locals.update(self.globals)
+    def lookup(self, name: str):
+        # innermost function scope wins, then globals
+        for i in range(len(self.stack) - 1, -1, -1):
+            v_locals = self.stack[i][1]
+            if v_locals is not None and name in v_locals:
+                return v_locals[name]
 
-        for _, v_locals in self.stack:
-            if v_locals is not None:
-                globals_and_locals.update(v_locals)
+        return self.globals.get(name)
+
+    def get_type(self, token: lexer.Token) -> lexer.Token:
+        node = self.lookup(token.value)
 
-        if token.value in globals_and_locals:
-            if isinstance(globals_and_locals[token.value], FuncNode):
-                return globals_and_locals[token.value].func_token
-            elif isinstance(globals_and_locals[token.value], VarNode):
-                return globals_and_locals[token.value].value_type_token
+        if node is not None:
+            if isinstance(node, FuncNode):
+                return node.func_token
+            elif isinstance(node, VarNode):
+                return node.value_type_token
             else:
-                return globals_and_locals[token.value].parameter_type_token
+                return node.parameter_type_token
 
         raise ParserError(token, f"'{token.value}' is not defined")
 
     def require_defined_in_future_for_func(self, token: lexer.Token):
-        globals_and_locals = {}
-        globals_and_locals.update(self.globals)
-
-        for _, v_locals in self.stack:
-            if v_locals is not None:
-                globals_and_locals.update(v_locals)
-
-        if token.value in globals_and_locals:
+        if self.lookup(token.value) is not None:
             return
 
+        if self.requirements is not None:
+            self.requirements.append(token)
+
         if token.value in self.require_defined_in_future_dict:
             if self.require_defined_in_future_dict[token.value][0] > self.level:
                 self.require_defined_in_future_dict[token.value] = [self.level, token]
@@ -204,6 +227,36 @@ class ContextManager:
 
 ctx_mgr = ContextManager()
 
+VECTOR_OPERAND_TYPES = frozenset(["VECTOR", "INTEGER", "FLOAT"])
+CONDITION_TYPES = frozenset(["BOOLEAN", "INTEGER", "FLOAT"])
+REDUCTIONS = {"reduce_add": "add", "reduce_mul": "mul", "reduce_min": "min", "reduce_max": "max"}
+
+def can_assign(type_name: str, value_type: str) -> bool:
+    # compares base types, vectors also take array literals and scalars (copied to all lanes)
+    if type_name == "VECTOR":
+        return value_type in VECTOR_OPERAND_TYPES or value_type == "ARRAY"
+
+    return type_name == value_type
+
+def get_vector_type(node) -> str:
+    # the vector type of an expression with the base type "VECTOR", None if it is only known after the semantic analysis
+    if isinstance(node, VariableNode):
+        return ctx_mgr.get_type(node.token).value
+
+    if isinstance(node, IndexNode):
+        return node.element_type
+
+    if isinstance(node, ExprNode):
+        return get_vector_type(node.left if node.left.value_type == "VECTOR" else node.right)
+
+    if isinstance(node, UnaryExprNode):
+        return get_vector_type(node.right)
+
+    if isinstance(node, CallNode) and isinstance(ctx_mgr.lookup(node.name), FuncNode):
+        return ctx_mgr.lookup(node.name).return_type
+
+    return None
+
 class ExprNode:
     def __init__(self, operator_token: lexer.Token, operation: str, left, right):
         self.token = operator_token
@@ -211,7 +264,13 @@ class ExprNode:
         self.left = left
         self.right = right
 
-        if left.value_type in ["INTEGER", "FLOAT"] and right.value_type in ["INTEGER", "FLOAT"]:
+        if "VECTOR" in [left.value_type, right.value_type] and left.value_type in VECTOR_OPERAND_TYPES and right.value_type in VECTOR_OPERAND_TYPES:
+            self.value_type = "VECTOR" # element-wise, a scalar operand is copied to all lanes
+
+        elif operation in LOGICAL_OPERATORS and "BOOLEAN" in [left.value_type, right.value_type] and {left.value_type, right.value_type} <= CONDITION_TYPES:
+            self.value_type = "BOOLEAN" # comparisons have the base type "INTEGER"
+
+        elif left.value_type in ["INTEGER", "FLOAT"] and right.value_type in ["INTEGER", "FLOAT"]:
             self.value_type = "FLOAT"
 
             if left.value_type == "INTEGER" and right.value_type == "INTEGER":
@@ -235,8 +294,8 @@ class UnaryExprNode:
         self.operation = operation
         self.right = right
 
-        if right.value_type in ["INTEGER", "FLOAT"]:
-            self.value_type = token.value_type
+        if right.value_type in ["INTEGER", "FLOAT", "VECTOR"]:
+            self.value_type = right.value_type
         else:
             raise ParserError(token, f"Illegal unary operation ('{token.value}') on type '{right.value_type}'")
 
@@ -283,29 +342,39 @@ class BlockNode:
         return self.__str__()
 
 class IfNode:
-    def __init__(self, condition: ExprNode, body: BlockNode, else_statement: BlockNode = None):
+    def __init__(self, condition: ExprNode, body: BlockNode, else_statement: BlockNode = None, else_ifs: list = None, token: lexer.Token = None):
+        self.token = token # Keyword (if) token
         self.condition = condition
         self.body = body
+        self.else_ifs = else_ifs if else_ifs is not None else [] # Flat list of 'else if' arms (IfNode without else), in source order
         self.else_statement = else_statement
 
     def __str__(self):
-        return f"IfNode({self.condition}, {self.body}, {self.else_statement})"
+        return f"IfNode({self.condition}, {self.body}, {self.else_ifs}, {self.else_statement})"
 
     def __repr__(self):
         return self.__str__()
 
 class WhileNode:
-    def __init__(self, condition: ExprNode, body: BlockNode):
+    def __init__(self, condition: ExprNode, body: BlockNode, token: lexer.Token = None, parallel: bool = False):
+        self.token = token # Keyword (while) token
         self.condition = condition
         self.body = body
+        self.parallel = parallel # '@parallel' loop, the iterations run concurrently (see semantic.Analyzer.analyze_parallel_loop)
 
     def __str__(self):
+        if self.parallel:
+            return f"WhileNode(@parallel, {self.condition}, {self.body})"
+
         return f"WhileNode({self.condition}, {self.body})"
 
     def __repr__(self):
         return self.__str__()
 
 class BreakNode:
+    def __init__(self, token: lexer.Token = None):
+        self.token = token # Keyword (break) token
+
     def __str__(self):
         return "BreakNode()"
 
@@ -313,6 +382,9 @@ class BreakNode:
         return self.__str__()
 
 class ContinueNode:
+    def __init__(self, token: lexer.Token = None):
+        self.token = token # Keyword (continue) token
+
     def __str__(self):
         return "ContinueNode()"
 
@@ -328,6 +400,8 @@ class FuncNode:
         self.parameters = parameters
         self.return_type = return_type
         self.body = body
+        self.memoize = None # cache policy of a '@memoize' function (see defs.MEMOIZE_POLICIES)
+        self.comptime = False # '@comptime' function, its calls are evaluated at compile time (see comptime.py)
 
     def __str__(self):
         return f"FuncNode({self.name}, {self.parameters}, {self.body}, {self.return_type})"
@@ -335,8 +409,31 @@ class FuncNode:
     def __repr__(self):
         return self.__str__()
 
+class SpawnNode:
+    def __init__(self, token: lexer.Token, call):
+        self.token = token # Keyword (spawn) token
+        self.call = call # CallNode, run as a task
+        self.value_type = call.value_type
+
+    def __str__(self):
+        return f"SpawnNode({self.call})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class JoinNode:
+    def __init__(self, token: lexer.Token = None):
+        self.token = token # Keyword (join) token
+
+    def __str__(self):
+        return "JoinNode()"
+
+    def __repr__(self):
+        return self.__str__()
+
 class ReturnNode:
-    def __init__(self, value: ExprNode):
+    def __init__(self, value: ExprNode, token: lexer.Token = None):
+        self.token = token # Keyword (return) token
         self.value = value
 
     def __str__(self):
@@ -376,7 +473,8 @@ class VarNode:
         return self.__str__()
 
 class AssignmentNode:
-    def __init__(self, name: str, value: ExprNode):
+    def __init__(self, name: str, value: ExprNode, token: lexer.Token = None):
+        self.token = token # Identifier token (assigned variable)
         self.name = name
         self.value = value
 
@@ -386,6 +484,86 @@ class AssignmentNode:
     def __repr__(self):
         return self.__str__()
 
+class IndexNode:
+    def __init__(self, token: lexer.Token, target, index, array_type: str):
+        self.token = token # Opening bracket token
+        self.target = target # VariableNode or IndexNode of an array, slice or vector
+        self.index = index
+        self.array_type = array_type # Type of the target, e.g. "[u64; 16]" or "[u64]"
+        self.element_type = implang_types.get_element_type(array_type)
+        self.value_type = implang_types.get_base_type(self.element_type)
+        self.checked = True # Bounds checked at runtime, cleared by the semantic analysis when the index is known to be in bounds
+
+        if index.value_type != "INTEGER":
+            raise ParserError(token, f"Array index must be an integer, got {index.value_type}")
+
+    def __str__(self):
+        return f"IndexNode({self.target}, {self.index})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class IndexAssignmentNode:
+    def __init__(self, target: IndexNode, value, token: lexer.Token = None):
+        self.token = token # Opening bracket token of the target
+        self.target = target
+        self.value = value
+
+    def __str__(self):
+        return f"IndexAssignmentNode({self.target}, {self.value})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class ArrayNode:
+    def __init__(self, token: lexer.Token, elements: list):
+        self.token = token # Opening bracket token
+        self.elements = elements
+        self.value_type = "ARRAY"
+
+    def __str__(self):
+        return f"ArrayNode({self.elements})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class LenNode:
+    def __init__(self, token: lexer.Token, value):
+        self.token = token # Identifier token (len)
+        self.value = value
+        self.value_type = "INTEGER"
+
+        if value.value_type != "ARRAY":
+            raise ParserError(token, f"'len' expects an array or slice, got {value.value_type}")
+
+    def __str__(self):
+        return f"LenNode({self.value})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class ReduceNode:
+    def __init__(self, token: lexer.Token, operation: str, value):
+        self.token = token # Identifier token (e.g. reduce_add)
+        self.operation = operation # "add", "mul", "min" or "max"
+        self.value = value
+
+        if value.value_type != "VECTOR":
+            raise ParserError(token, f"'{token.value}' expects a vector, got {value.value_type}")
+
+        vector_type = get_vector_type(value)
+
+        if vector_type is None:
+            raise ParserError(token, f"Cannot determine the vector type of the argument of '{token.value}'")
+
+        self.value_type = implang_types.get_base_type(implang_types.get_element_type(vector_type))
+
+    def __str__(self):
+        return f"ReduceNode({self.operation}, {self.value})"
+
+    def __repr__(self):
+        return self.__str__()
+
 class AttributeNode:
     def __init__(self, token: lexer.Token, name: str, value = None):
         self.token = token
@@ -398,14 +576,29 @@ class AttributeNode:
     def __repr__(self):
         return self.__str__()
 
+class ImportNode:
+    def __init__(self, token: lexer.Token, module: str, path: str, functions: list[FuncNode]):
+        self.token = token # Module name (string) token
+        self.module = module
+        self.path = path # Interface file the functions were loaded from, None for a module compiled in the same invocation
+        self.functions = functions
+
+    def __str__(self):
+        return f"ImportNode({self.module}, {self.functions})"
+
+    def __repr__(self):
+        return self.__str__()
+
 class CallNode:
     def __init__(self, name_token: lexer.Token, name: str, arguments: list[ExprNode]):
         self.name_token = name_token # Identifier token
         self.name = name
         self.arguments = arguments
         
-        if name in ctx_mgr.get_functions():
-            self.value_type = implang_types.get_base_type(ctx_mgr.get_functions()[name].return_type)
+        func = ctx_mgr.lookup(name)
+
+        if isinstance(func, FuncNode):
+            self.value_type = implang_types.get_base_type(func.return_type)
         else:
             # Dumb scanning all the file for the function definition
             # TODO: Make this better
@@ -468,202 +661,312 @@ class Program:
     def __repr__(self):
         return self.__str__()
 
-def parse(file: str, tokens: list[lexer.Token]) -> Program:
-    ctx_mgr.init(file, tokens)
+class ProgramStream(Program):
+    """Program with the signatures of its functions, their bodies are parsed while iterating 'functions' (see parse_stream)"""
+    def __init__(self):
+        super().__init__()
+        self.functions = None # iterator of the FuncNodes with their bodies, in the order of the statements
+
+    def __str__(self):
+        return f"ProgramStream(attributes={self.attributes}, statements={self.statements})"
+
+
+STATEMENT_SEPARATORS = frozenset(["NEWLINE", "SEMICOLON"])
+ASSIGNMENT_OPERATORS = frozenset(defs.ASSIGNMENT_OPERATORS)
+VALUE_TOKENS = frozenset(["INTEGER", "FLOAT", "CHAR", "STRING", "BOOLEAN", "NULL"])
+UNARY_OPERATORS = frozenset(["PLUS", "MINUS", "NOT", "BITWISE_NOT"])
+
+MULTIPLY_OPERATORS = frozenset(["MULTIPLY", "DIVIDE", "MODULO"])
+ADD_OPERATORS = frozenset(["PLUS", "MINUS"])
+SHIFT_OPERATORS = frozenset(["BITWISE_LEFT_SHIFT", "BITWISE_RIGHT_SHIFT"])
+COMPARISON_OPERATORS = frozenset(["EQUALS", "NOT_EQUALS", "GREATER_THAN", "LESS_THAN", "GREATER_THAN_OR_EQUAL", "LESS_THAN_OR_EQUAL"])
+BITWISE_OPERATORS = frozenset(["BITWISE_AND", "BITWISE_OR", "BITWISE_XOR"])
+LOGICAL_OPERATORS = frozenset(["AND", "OR", "XOR"])
+
+class Parser:
+    def __init__(self, file: str, tokens: list[lexer.Token], import_paths: list[str] = None, modules: dict = None):
+        ctx_mgr.init(file, tokens)
 
-    def next_token():
+        self.file = file
+        self.tokens = tokens
+        self.import_paths = [os.path.dirname(os.path.abspath(file))] + (import_paths or []) # searched by '@import'
+        self.modules = modules or {} # module name -> Program, inputs parsed before this one, preferred by '@import'
+        self.skip_bodies = False # function bodies are skipped and left None, phase one of parse_parallel
+        self.std = None if has_attribute(tokens, "@no_std") else get_std_functions() # imported standard runtime
+
+        for function in self.std or []:
+            ctx_mgr.std[function.name] = function
+            ctx_mgr.globals[function.name] = function
+
+        # keyword -> handler, used by parse_statement
+        self.keyword_handlers = {
+            "if": self.parse_if,
+            "while": self.parse_while,
+            "break": self.parse_break,
+            "continue": self.parse_continue,
+            "func": self.parse_func,
+            "return": self.parse_return,
+            "var": self.parse_var,
+            "spawn": self.parse_spawn,
+            "join": self.parse_join
+        }
+
+        # kind of the first token of the statement -> handler
+        self.statement_handlers = {
+            "KEYWORD": self.parse_keyword,
+            "IDENTIFIER": self.parse_identifier,
+            "ATTRIBUTE": self.parse_attribute,
+            "LPAREN": self.parse_expr
+        }
+
+    def next_token(self):
         ctx_mgr.token_index += 1
-        return ctx_mgr.tokens[ctx_mgr.token_index - 1]
+        return self.tokens[ctx_mgr.token_index - 1]
 
-    def peek_token(n=0):
+    def peek_token(self, n=0):
         try:
-            return ctx_mgr.tokens[ctx_mgr.token_index + n]
+            return self.tokens[ctx_mgr.token_index + n]
         except IndexError:
             return None
 
-    def expect_token(kind: str, value: str = None):
-        token = peek_token()
+    def expect_token(self, kind: str, value: str = None):
+        token = self.peek_token()
         if token.kind != kind:
             if kind in defs.TOKENS_HUMAN_READABLE:
                 if token.kind in defs.TOKENS_HUMAN_READABLE:
                     raise ParserError(token, f"Expected {defs.TOKENS_HUMAN_READABLE[kind]}, got {defs.TOKENS_HUMAN_READABLE[token.kind]}")
                 else:
                     raise ParserError(token, f"Expected {defs.TOKENS_HUMAN_READABLE[kind]}, got '{token.kind}'")
-            
+
             if token.kind in defs.TOKENS_HUMAN_READABLE:
                 raise ParserError(token, f"Expected {kind.lower()}, got {defs.TOKENS_HUMAN_READABLE[token.kind]}")
             else:
                 raise ParserError(token, f"Expected {kind.lower()}, got '{token.kind}'")
-        
+
         if value is not None and token.value != value:
             raise ParserError(token, f"Expected token with value '{value}', got {token.value}")
-        
+
         return token
 
-    def skip_newlines() -> int:
+    def skip_newlines(self) -> int:
         counter = 0
+        tokens = self.tokens
+        index = ctx_mgr.token_index
 
-        if peek_token() is None:
-            return counter
-        
-        while peek_token().kind == "NEWLINE":
-            next_token()
+        while index < len(tokens) and tokens[index].kind == "NEWLINE":
+            index += 1
             counter += 1
 
-            if peek_token() is None:
-                return counter
-
+        ctx_mgr.token_index = index
         return counter
 
-    def skip_newlines_or_semicolons() -> int:
+    def skip_newlines_or_semicolons(self) -> int:
         counter = 0
-        
-        if peek_token() is None:
-            return counter
+        tokens = self.tokens
+        index = ctx_mgr.token_index
 
-        while peek_token().kind in ["NEWLINE", "SEMICOLON"]:
-            next_token()
+        while index < len(tokens) and tokens[index].kind in STATEMENT_SEPARATORS:
+            index += 1
             counter += 1
 
-            if peek_token() is None:
-                return counter
-
+        ctx_mgr.token_index = index
         return counter
 
-    def parse_statement():
-        token = peek_token()
+    def parse_statement(self):
+        self.skip_newlines_or_semicolons()
 
-        if peek_token() is None:
-            return None
+        token = self.peek_token()
 
-        if token.kind in ["NEWLINE", "SEMICOLON"]:
-            next_token()
-            return parse_statement()
-
-        if token.kind == "KEYWORD":
-            if token.value == "if":
-                ans = parse_if()
-            elif token.value == "while":
-                ans = parse_while()
-            elif token.value == "break":
-                ans = parse_break()
-            elif token.value == "continue":
-                ans = parse_continue()
-            elif token.value == "func":
-                ans = parse_func()
-            elif token.value == "return":
-                ans = parse_return()
-            elif token.value == "var":
-                ans = parse_var()
-            else:
-                raise ParserError(token, f"Unexpected keyword '{token.value}'")
+        if token is None:
+            return None
 
-        elif token.kind == "IDENTIFIER":
-            # this could be an assignment, a function call, or just an expression on its own (this is actually useless)
-            if peek_token(1).kind in ["ASSIGN", "PLUS_ASSIGN", "MINUS_ASSIGN", "MULTIPLY_ASSIGN", "DIVIDE_ASSIGN", "POWER_ASSIGN", "MODULO_ASSIGN", "AND_ASSIGN", "OR_ASSIGN", "XOR_ASSIGN", "BITWISE_AND_ASSIGN", "BITWISE_OR_ASSIGN", "BITWISE_XOR_ASSIGN", "BITWISE_LEFT_SHIFT_ASSIGN", "BITWISE_RIGHT_SHIFT_ASSIGN"]:
-                ans = parse_assignment()
-            elif peek_token(1).kind == "OPEN_PAREN":
-                ans = parse_call()
-            else:
-                ans = parse_expr()
+        handler = self.statement_handlers.get(token.kind)
 
-        elif token.kind == "ATTRIBUTE":
-            ans = parse_attribute()
+        if handler is None:
+            raise ParserError(token, f"Unexpected token '{token.value}'")
 
-        elif token.kind == "LPAREN":
-            ans = parse_expr()
+        ans = handler()
 
-        else:
-            raise ParserError(token, f"Unexpected token '{token.value}'")
+        next_token = self.peek_token()
 
-        if peek_token() is None:
+        if next_token is None:
             return ans
-        
-        if not peek_token().kind in ["NEWLINE", "SEMICOLON"]:
-            if peek_token().kind in defs.TOKENS_WITH_VALUE:
-                if peek_token().kind in defs.TOKENS_HUMAN_READABLE:
-                    raise ParserError(peek_token(), f"Expected newline or semicolon, got {defs.TOKENS_HUMAN_READABLE[peek_token().kind]} {peek_token().value}")
+
+        if next_token.kind not in STATEMENT_SEPARATORS:
+            if next_token.kind in defs.TOKENS_WITH_VALUE:
+                if next_token.kind in defs.TOKENS_HUMAN_READABLE:
+                    raise ParserError(next_token, f"Expected newline or semicolon, got {defs.TOKENS_HUMAN_READABLE[next_token.kind]} {next_token.value}")
                 else:
-                    raise ParserError(peek_token(), f"Expected newline or semicolon, got {peek_token().kind.lower()} {peek_token().value}")
+                    raise ParserError(next_token, f"Expected newline or semicolon, got {next_token.kind.lower()} {next_token.value}")
             else:
-                if peek_token().kind in defs.TOKENS_HUMAN_READABLE:
-                    raise ParserError(peek_token(), f"Expected newline or semicolon, got {defs.TOKENS_HUMAN_READABLE[peek_token().kind]}")
+                if next_token.kind in defs.TOKENS_HUMAN_READABLE:
+                    raise ParserError(next_token, f"Expected newline or semicolon, got {defs.TOKENS_HUMAN_READABLE[next_token.kind]}")
                 else:
-                    raise ParserError(peek_token(), f"Expected newline or semicolon, got {peek_token().kind.lower()}")
+                    raise ParserError(next_token, f"Expected newline or semicolon, got {next_token.kind.lower()}")
 
         return ans
 
-    def parse_if():
-        expect_token("KEYWORD", "if")
-        next_token()
+    def parse_keyword(self):
+        token = self.peek_token()
+        handler = self.keyword_handlers.get(token.value)
+
+        if handler is None:
+            raise ParserError(token, f"Unexpected keyword '{token.value}'")
+
+        return handler()
+
+    def parse_identifier(self):
+        # this could be an assignment, a function call, or just an expression on its own (this is actually useless)
+        if self.peek_token(1).kind in ASSIGNMENT_OPERATORS:
+            return self.parse_assignment()
+
+        if self.peek_token(1).kind == "LBRACKET":
+            start = ctx_mgr.token_index
+            target = self.parse_unary()
+
+            if isinstance(target, IndexNode) and self.peek_token().kind in ASSIGNMENT_OPERATORS:
+                return self.parse_index_assignment(target)
+
+            ctx_mgr.token_index = start # an expression starting with an indexed array
+
+        return self.parse_expr()
+
+    def parse_type(self) -> lexer.Token:
+        # 'u64', '[u64; 16]' (array) or '[u64]' (slice), array types are returned as a single identifier token
+        if self.peek_token().kind != "LBRACKET":
+            type_token = self.expect_token("IDENTIFIER")
+            self.next_token()
+
+            return type_token
 
-        condition = parse_expr()
-        skip_newlines()
+        bracket = self.next_token()
+        element_type = self.parse_type()
 
-        expect_token("LBRACE")
+        if self.peek_token().kind == "SEMICOLON":
+            self.next_token()
+
+            length = self.expect_token("INTEGER")
+            self.next_token()
+
+            if int(length.value) == 0:
+                raise ParserError(length, "Array length must be greater than zero")
+
+            type_name = f"[{element_type.value}; {int(length.value)}]"
+        else:
+            type_name = f"[{element_type.value}]"
+
+        self.expect_token("RBRACKET")
+        self.next_token()
+
+        return lexer.Token("IDENTIFIER", type_name, bracket.position, bracket.line, bracket.column)
+
+    def parse_if_arm(self) -> IfNode:
+        if_token = self.expect_token("KEYWORD", "if")
+        self.next_token()
+
+        condition = self.parse_expr()
+        self.skip_newlines()
+
+        self.expect_token("LBRACE")
 
         ctx_mgr.enter_if()
-        body = parse_block()
+        body = self.parse_block()
         ctx_mgr.exit_if()
 
-        newline_count = skip_newlines()
+        return IfNode(condition, body, token=if_token)
 
-        if peek_token().kind == "KEYWORD" and peek_token().value == "else":
-            next_token()
-            skip_newlines()
-            
-            ctx_mgr.enter_if()
+    def parse_if(self):
+        # 'else if' arms are collected into a flat list instead of nesting IfNodes,
+        # so long chains don't recurse once per arm
+        if_node = self.parse_if_arm()
 
-            if peek_token().kind == "KEYWORD" and peek_token().value == "if":
-                else_body = parse_if()
-            else:
-                expect_token("LBRACE")
-                else_body = parse_block()
-            
-            ctx_mgr.exit_if()
+        while True:
+            newline_count = self.skip_newlines()
 
-            return IfNode(condition, body, else_body)
+            token = self.peek_token()
 
-        ctx_mgr.token_index -= newline_count
+            if token is None or token.kind != "KEYWORD" or token.value != "else":
+                ctx_mgr.token_index -= newline_count
+                break
 
-        return IfNode(condition, body)
+            self.next_token()
+            self.skip_newlines()
 
-    def parse_while():
-        expect_token("KEYWORD", "while")
-        next_token()
+            token = self.peek_token()
 
-        condition = parse_expr()
-        skip_newlines()
+            if token.kind == "KEYWORD" and token.value == "if":
+                if_node.else_ifs.append(self.parse_if_arm())
+                continue
+
+            self.expect_token("LBRACE")
+
+            ctx_mgr.enter_if()
+            if_node.else_statement = self.parse_block()
+            ctx_mgr.exit_if()
+            break
+
+        return if_node
+
+    def parse_while(self):
+        while_token = self.expect_token("KEYWORD", "while")
+        self.next_token()
+
+        condition = self.parse_expr()
+        self.skip_newlines()
+
+        self.expect_token("LBRACE")
 
-        expect_token("LBRACE")
-        
         ctx_mgr.enter_loop()
-        body = parse_block()
+        body = self.parse_block()
         ctx_mgr.exit_loop()
 
-        return WhileNode(condition, body)
+        return WhileNode(condition, body, while_token)
+
+    def parse_break(self):
+        break_token = self.expect_token("KEYWORD", "break")
+        self.next_token()
+
+        return BreakNode(break_token)
+
+    def parse_continue(self):
+        continue_token = self.expect_token("KEYWORD", "continue")
+        self.next_token()
+
+        return ContinueNode(continue_token)
+
+    def parse_spawn(self):
+        spawn_token = self.expect_token("KEYWORD", "spawn")
+        self.next_token()
 
-    def parse_break():
-        expect_token("KEYWORD", "break")
-        next_token()
+        if self.peek_token().kind != "IDENTIFIER" or self.peek_token(1).kind != "LPAREN":
+            raise ParserError(self.peek_token(), "Expected function call after 'spawn'")
 
-        return BreakNode()
+        return SpawnNode(spawn_token, self.parse_call())
 
-    def parse_continue():
-        expect_token("KEYWORD", "continue")
-        next_token()
+    def parse_join(self):
+        join_token = self.expect_token("KEYWORD", "join")
+        self.next_token()
 
-        return ContinueNode()
+        return JoinNode(join_token)
 
-    def parse_func():
-        expect_token("KEYWORD", "func")
-        func_token = next_token()
+    def parse_value(self):
+        # right-hand side of a variable definition or an assignment, the result of a task can be assigned too
+        token = self.peek_token()
 
-        name = expect_token("IDENTIFIER")
-        next_token()
+        if token.kind == "KEYWORD" and token.value == "spawn":
+            return self.parse_spawn()
 
-        expect_token("LPAREN")
-        next_token()
+        return self.parse_expr()
+
+    def parse_func(self):
+        self.expect_token("KEYWORD", "func")
+        func_token = self.next_token()
+
+        name = self.expect_token("IDENTIFIER")
+        self.next_token()
+
+        self.expect_token("LPAREN")
+        self.next_token()
 
         parameters = []
 
@@ -672,48 +975,49 @@ def parse(file: str, tokens: list[lexer.Token]) -> Program:
         except:
             raise ParserError(func_token, "Cannot define function inside another function")
 
-        while peek_token().kind != "RPAREN":
-            skip_newlines()
+        while self.peek_token().kind != "RPAREN":
+            self.skip_newlines()
 
-            arg_name = expect_token("IDENTIFIER")
-            next_token()
+            arg_name = self.expect_token("IDENTIFIER")
+            self.next_token()
 
-            expect_token("COLON")
-            next_token()
+            self.expect_token("COLON")
+            self.next_token()
 
-            arg_type = expect_token("IDENTIFIER")
-            next_token()
+            arg_type = self.parse_type()
 
             new_parameter = ParameterNode(arg_name, arg_type, arg_name.value, arg_type.value)
 
             parameters.append(new_parameter)
             ctx_mgr.define(new_parameter)
 
-            if peek_token().kind == "COMMA":
-                next_token()
+            if self.peek_token().kind == "COMMA":
+                self.next_token()
 
-            skip_newlines()
+            self.skip_newlines()
 
-        next_token()
+        self.next_token()
 
         return_type = None
         return_type_token = func_token
 
-        if peek_token().kind == "ARROW":
-            next_token()
+        if self.peek_token().kind == "ARROW":
+            self.next_token()
 
-            return_type_token = expect_token("IDENTIFIER")
+            return_type_token = self.parse_type()
             return_type = return_type_token.value
 
-            next_token()
-        
-        skip_newlines()
+        self.skip_newlines()
 
         ctx_mgr.define(FuncNode(func_token, name, return_type_token, name.value, parameters, return_type, None))
 
-        expect_token("LBRACE")
+        self.expect_token("LBRACE")
+
+        if self.skip_bodies:
+            body = self.skip_block()
+        else:
+            body = self.parse_block()
 
-        body = parse_block()
         ctx_mgr.exit_func()
 
         ctx_mgr.delete(name.value)
@@ -722,46 +1026,45 @@ def parse(file: str, tokens: list[lexer.Token]) -> Program:
 
         return func_node
 
-    def parse_return():
-        expect_token("KEYWORD", "return")
-        next_token()
+    def parse_return(self):
+        return_token = self.expect_token("KEYWORD", "return")
+        self.next_token()
 
-        if peek_token().kind in ["NEWLINE", "SEMICOLON"]:
-            return ReturnNode(ValueNode(peek_token(-1), "NULL", "null"))
+        if self.peek_token().kind in STATEMENT_SEPARATORS:
+            return ReturnNode(ValueNode(self.peek_token(-1), "NULL", "null"), return_token)
 
-        value = parse_expr()
+        value = self.parse_expr()
 
-        return ReturnNode(value)
+        return ReturnNode(value, return_token)
 
-    def parse_var():
-        expect_token("KEYWORD", "var")
-        next_token()
+    def parse_var(self):
+        self.expect_token("KEYWORD", "var")
+        self.next_token()
 
-        name = expect_token("IDENTIFIER")
-        next_token()
+        name = self.expect_token("IDENTIFIER")
+        self.next_token()
 
-        expect_token("COLON")
-        next_token()
+        self.expect_token("COLON")
+        self.next_token()
 
-        var_type = expect_token("IDENTIFIER")
-        next_token()
+        var_type = self.parse_type()
 
-        if peek_token().kind in ["NEWLINE", "SEMICOLON"]:
+        if self.peek_token().kind in STATEMENT_SEPARATORS:
             var_node = VarNode(name, var_type, name.value, var_type.value, None)
             ctx_mgr.define(var_node)
 
             return var_node
 
         try:
-            assign_token = expect_token("ASSIGN")
+            assign_token = self.expect_token("ASSIGN")
         except ParserError as e:
             raise ParserError(e.token, f"Expected newline, semicolon or assigment, got {e.message.split('got')[1].strip()}")
-        
-        next_token()
 
-        value = parse_expr()
+        self.next_token()
 
-        if implang_types.get_base_type(var_type.value) != value.value_type:
+        value = self.parse_value()
+
+        if not can_assign(implang_types.get_base_type(var_type.value), value.value_type):
             raise ParserError(assign_token, f"Cannot assign value of type {value.value_type} to variable of type {implang_types.get_base_type(var_type.value)}")
 
         var_node = VarNode(name, var_type, name.value, var_type.value, value)
@@ -769,70 +1072,164 @@ def parse(file: str, tokens: list[lexer.Token]) -> Program:
 
         return var_node
 
-    def parse_assignment():
-        name = expect_token("IDENTIFIER")
-        next_token()
+    def parse_assignment(self):
+        name = self.expect_token("IDENTIFIER")
+        self.next_token()
 
-        assignment_type = next_token()
+        assignment_type = self.next_token()
 
-        if assignment_type.kind not in ["ASSIGN", "PLUS_ASSIGN", "MINUS_ASSIGN", "MULTIPLY_ASSIGN", "DIVIDE_ASSIGN", "POWER_ASSIGN", "MODULO_ASSIGN", "AND_ASSIGN", "OR_ASSIGN", "XOR_ASSIGN", "BITWISE_AND_ASSIGN", "BITWISE_OR_ASSIGN", "BITWISE_XOR_ASSIGN", "BITWISE_LEFT_SHIFT_ASSIGN", "BITWISE_RIGHT_SHIFT_ASSIGN"]:
+        if assignment_type.kind not in ASSIGNMENT_OPERATORS:
             raise ParserError(assignment_type, f"Unexpected token '{assignment_type.value}'")
 
-        value = parse_expr()
+        value = self.parse_value()
+
+        if isinstance(value, SpawnNode) and assignment_type.kind != "ASSIGN":
+            raise ParserError(assignment_type, "The result of 'spawn' can only be assigned with '='")
 
         try:
             orig_type = ctx_mgr.get_type(name)
         except ParserError:
             raise ParserError(name, f"Tried to assign to undeclared variable '{name.value}'")
 
-        if implang_types.get_base_type(orig_type.value) != value.value_type:
+        operation = assignment_type.kind.replace("_ASSIGN", "")
+
+        if operation in LOGICAL_OPERATORS:
+            value = ExprNode(assignment_type, operation, VariableNode(name, name.value), value) # 'x &&= c' assigns a condition
+
+        if not can_assign(implang_types.get_base_type(orig_type.value), value.value_type):
             raise ParserError(assignment_type, f"Cannot assign value of type {value.value_type} to variable of type {implang_types.get_base_type(orig_type.value)}")
 
+        if assignment_type.kind == "ASSIGN" or operation in LOGICAL_OPERATORS:
+            return AssignmentNode(name.value, value, name)
+        else:
+            return AssignmentNode(name.value, ExprNode(assignment_type, operation, VariableNode(name, name.value), value), name)
+
+    def parse_index_assignment(self, target: IndexNode):
+        assignment_type = self.next_token()
+        value = self.parse_expr()
+
+        if not can_assign(target.value_type, value.value_type):
+            raise ParserError(assignment_type, f"Cannot assign value of type {value.value_type} to element of type {target.value_type}")
+
         if assignment_type.kind == "ASSIGN":
-            return AssignmentNode(name.value, value)
+            return IndexAssignmentNode(target, value, target.token)
+        else:
+            return IndexAssignmentNode(target, ExprNode(assignment_type, assignment_type.kind.replace("_ASSIGN", ""), target, value), target.token)
+
+    def parse_index(self, target):
+        bracket = self.expect_token("LBRACKET")
+        self.next_token()
+
+        if isinstance(target, VariableNode):
+            array_type = ctx_mgr.get_type(target.token).value
         else:
-            return AssignmentNode(name.value, ExprNode(assignment_type, assignment_type.kind.replace("_ASSIGN", ""), VariableNode(name, name.value), value))
+            array_type = target.element_type
+
+        if not implang_types.is_array_or_slice(array_type) and not implang_types.is_vector(array_type):
+            raise ParserError(bracket, f"Only arrays, slices and vectors can be indexed, got '{array_type}'")
+
+        index = self.parse_expr()
+
+        self.expect_token("RBRACKET")
+        self.next_token()
+
+        return IndexNode(bracket, target, index, array_type)
+
+    def parse_array(self):
+        bracket = self.expect_token("LBRACKET")
+        self.next_token()
+        self.skip_newlines()
+
+        elements = []
+
+        while self.peek_token().kind != "RBRACKET":
+            elements.append(self.parse_expr())
+
+            if self.peek_token().kind == "COMMA":
+                self.next_token()
+            elif self.peek_token().kind != "RBRACKET" and self.peek_token().kind != "NEWLINE":
+                raise ParserError(self.peek_token(), "Expected comma or closing bracket in array")
+
+            self.skip_newlines()
+
+        self.next_token()
 
-    def parse_call(check_defined=True):
-        name = expect_token("IDENTIFIER")
-        next_token()
+        return ArrayNode(bracket, elements)
 
-        expect_token("LPAREN")
-        next_token()
+    def parse_len(self):
+        name = self.expect_token("IDENTIFIER")
+        self.next_token()
+
+        self.expect_token("LPAREN")
+        self.next_token()
+
+        value = self.parse_expr()
+
+        self.expect_token("RPAREN")
+        self.next_token()
+
+        return LenNode(name, value)
+
+    def parse_reduce(self):
+        name = self.expect_token("IDENTIFIER")
+        self.next_token()
+
+        self.expect_token("LPAREN")
+        self.next_token()
+
+        value = self.parse_expr()
+
+        self.expect_token("RPAREN")
+        self.next_token()
+
+        return ReduceNode(name, REDUCTIONS[name.value], value)
+
+    def parse_call(self, check_defined=True):
+        name = self.expect_token("IDENTIFIER")
+        self.next_token()
+
+        self.expect_token("LPAREN")
+        self.next_token()
 
         if check_defined:
             ctx_mgr.require_defined_in_future_for_func(name)
 
-        skip_newlines()
+        self.skip_newlines()
 
         arguments = []
 
-        while peek_token().kind != "RPAREN":
-            arguments.append(parse_expr())
+        while self.peek_token().kind != "RPAREN":
+            arguments.append(self.parse_expr())
 
-            if peek_token().kind == "COMMA":
-                next_token()
+            if self.peek_token().kind == "COMMA":
+                self.next_token()
 
-            skip_newlines()
+            self.skip_newlines()
 
-        next_token()
+        self.next_token()
 
         return CallNode(name, name.value, arguments)
 
-    def parse_attribute():
-        attr_token = expect_token("ATTRIBUTE")
-        next_token()
+    def parse_attribute(self):
+        attr_token = self.expect_token("ATTRIBUTE")
+        self.next_token()
 
-        if peek_token().kind in ["NEWLINE", "SEMICOLON"]:
+        if attr_token.value == "@parallel":
+            return self.parse_parallel_loop(attr_token)
+
+        if attr_token.value in defs.FUNCTION_ATTRIBUTES:
+            return self.parse_function_attribute(attr_token)
+
+        if self.peek_token().kind in STATEMENT_SEPARATORS:
             return AttributeNode(attr_token, attr_token.value)
         else:
             ctx_mgr.enter_attribute()
 
-            if peek_token().kind == "IDENTIFIER" and peek_token(1).kind == "LPAREN":
+            if self.peek_token().kind == "IDENTIFIER" and self.peek_token(1).kind == "LPAREN":
                 if not attr_token.value == "@import_symbol":
                     raise ParserError(attr_token, f"Symbol definition is only allowed for imported symbols (attribute '@import_symbol')")
-                
-                value = parse_call(check_defined=False)
+
+                value = self.parse_call(check_defined=False)
 
                 for arg in value.arguments:
                     if not isinstance(arg, VariableNode):
@@ -841,10 +1238,10 @@ def parse(file: str, tokens: list[lexer.Token]) -> Program:
                         else:
                             raise ParserError(attr_token, f"In imported symbol, expected types of arguments, got {arg}")
                 # here we can have also return type
-                if peek_token().kind == "ARROW":
-                    next_token()
-                    return_type = expect_token("IDENTIFIER")
-                    next_token()
+                if self.peek_token().kind == "ARROW":
+                    self.next_token()
+                    return_type = self.expect_token("IDENTIFIER")
+                    self.next_token()
                     value = FuncNode(
                         attr_token,
                         value.name_token,
@@ -869,173 +1266,261 @@ def parse(file: str, tokens: list[lexer.Token]) -> Program:
 
                 ctx_mgr.define(value)
             else:
-                value = parse_expr()
+                value = self.parse_expr()
+
+                if attr_token.value == "@import":
+                    value = self.import_module(attr_token, value)
 
-            if peek_token().kind not in ["NEWLINE", "SEMICOLON"]:
-                raise ParserError(peek_token(), "Expected newline or semicolon after attribute value")
+            if self.peek_token().kind not in STATEMENT_SEPARATORS:
+                raise ParserError(self.peek_token(), "Expected newline or semicolon after attribute value")
 
-            ctx_mgr.exit_attribute()            
+            ctx_mgr.exit_attribute()
             return AttributeNode(attr_token, attr_token.value, value)
 
-    def parse_block():
-        expect_token("LBRACE")
-        next_token()
+    def parse_parallel_loop(self, attr_token: lexer.Token) -> WhileNode:
+        # '@parallel' stands on the line before the loop it applies to
+        if not any(kind == "func" for kind, _ in ctx_mgr.stack):
+            raise ParserError(attr_token, "'@parallel' can only be used on loops inside functions")
+
+        self.skip_newlines()
+        token = self.peek_token()
+
+        if token is None or token.kind != "KEYWORD" or token.value != "while":
+            raise ParserError(attr_token, "Expected 'while' loop after '@parallel'")
+
+        loop = self.parse_while()
+        loop.parallel = True
+
+        return loop
+
+    def parse_function_attribute(self, attr_token: lexer.Token) -> FuncNode:
+        # '@memoize' (with an optional cache policy) and '@comptime' stand on the lines before the function they apply to
+        if len(ctx_mgr.stack) > 0:
+            raise ParserError(attr_token, f"'{attr_token.value}' can only be used on top-level functions")
+
+        policy = defs.MEMOIZE_DEFAULT_POLICY
+
+        if attr_token.value == "@memoize" and self.peek_token() is not None and self.peek_token().kind == "STRING":
+            policy_token = self.next_token()
+            policy = policy_token.value[1:-1]
+
+            if policy not in defs.MEMOIZE_POLICIES:
+                raise ParserError(policy_token, f"Unknown cache policy '{policy}', expected one of: {', '.join(defs.MEMOIZE_POLICIES)}")
+
+        self.skip_newlines()
+        token = self.peek_token()
+
+        if token is not None and token.kind == "ATTRIBUTE" and token.value in defs.FUNCTION_ATTRIBUTES:
+            self.next_token()
+            function = self.parse_function_attribute(token)
+        elif token is None or token.kind != "KEYWORD" or token.value != "func":
+            raise ParserError(attr_token, f"Expected function after '{attr_token.value}'")
+        else:
+            function = self.parse_func()
+
+        if attr_token.value == "@memoize":
+            function.memoize = policy
+        else:
+            function.comptime = True
+
+        return function
+
+    def parse_definition(self) -> FuncNode:
+        # a function, with its attributes ('@memoize', '@comptime'), parsed again from its first token (see parse_bodies)
+        if self.peek_token().kind == "ATTRIBUTE":
+            return self.parse_attribute()
+
+        return self.parse_func()
+
+    def import_module(self, attr_token: lexer.Token, value) -> ImportNode:
+        if not isinstance(value, ValueNode) or value.value_type != "STRING":
+            raise ParserError(attr_token, "Expected module name (string) after '@import'")
+
+        module = value.value[1:-1]
+
+        if module in self.modules:
+            path = None
+            functions = copy.deepcopy(get_exports(self.modules[module]))
+        else:
+            path = find_interface(module, self.import_paths)
+
+            if path is None:
+                raise ParserError(value.token, f"Interface file for module '{module}' not found (compile the module with -c first)")
+
+            try:
+                functions = load_interface(path)
+            except (OSError, ASTFormatError) as e:
+                raise ParserError(value.token, f"Cannot load interface file '{path}': {e}")
+
+        for function in functions:
+            # the tokens point into the module, errors about imported functions point to the import
+            relocate_tokens(function, value.token)
+            ctx_mgr.define(function)
+
+        return ImportNode(value.token, module, path, functions)
+
+    def parse_block(self):
+        self.expect_token("LBRACE")
+        self.next_token()
 
         statements = []
 
-        skip_newlines()
+        self.skip_newlines()
 
-        while peek_token().kind != "RBRACE":
-            statements.append(parse_statement())
+        while self.peek_token().kind != "RBRACE":
+            statements.append(self.parse_statement())
 
-            skip_newlines_or_semicolons()
+            self.skip_newlines_or_semicolons()
 
-        expect_token("RBRACE")
-        next_token()
+        self.expect_token("RBRACE")
+        self.next_token()
 
         return BlockNode(statements)
 
-    def parse_expr():
-        def parse_power():
-            left = parse_unary()
+    def skip_block(self):
+        # only blocks use braces, so the matching one ends the block
+        depth = 0
 
-            while peek_token().kind == "POWER":
-                power_token = next_token()
+        for index in range(ctx_mgr.token_index, len(self.tokens)):
+            kind = self.tokens[index].kind
 
-                right = parse_unary()
+            if kind == "LBRACE":
+                depth += 1
+            elif kind == "RBRACE":
+                depth -= 1
 
-                left = ExprNode(power_token, "POWER", left, right)
+                if depth == 0:
+                    ctx_mgr.token_index = index + 1
+                    return None
 
-            return left
+        raise ParserError(self.tokens[-1], "Expected '}' at the end of the block")
 
-        def parse_multiply():
-            left = parse_power()
+    def parse_expr(self):
+        # check if the expression is a parenthesized expression
+        if self.peek_token().kind == "LPAREN":
+            self.next_token()
 
-            while peek_token().kind in ["MULTIPLY", "DIVIDE", "MODULO"]:
-                operator = peek_token()
-                next_token()
+            expr = self.parse_expr()
 
-                right = parse_power()
+            self.expect_token("RPAREN")
+            self.next_token()
 
-                left = ExprNode(operator, operator.kind, left, right)
+            return expr
 
-            return left
+        return self.parse_logical()
 
-        def parse_add():
-            left = parse_multiply()
+    def parse_binary(self, operand, operators: frozenset):
+        left = operand()
 
-            while peek_token().kind in ["PLUS", "MINUS"]:
-                operator = peek_token()
-                next_token()
+        while self.peek_token().kind in operators:
+            operator = self.next_token()
 
-                right = parse_multiply()
+            right = operand()
 
-                left = ExprNode(operator, operator.kind, left, right)
+            left = ExprNode(operator, operator.kind, left, right)
 
-            return left
+        return left
 
-        def parse_comparison():
-            left = parse_add()
+    def parse_power(self):
+        left = self.parse_unary()
 
-            while peek_token().kind in ["EQUALS", "NOT_EQUALS", "GREATER_THAN", "LESS_THAN", "GREATER_THAN_OR_EQUAL", "LESS_THAN_OR_EQUAL"]:
-                operator = peek_token()
-                next_token()
+        while self.peek_token().kind == "POWER":
+            power_token = self.next_token()
 
-                right = parse_add()
+            right = self.parse_unary()
 
-                left = ExprNode(operator, operator.kind, left, right)
+            left = ExprNode(power_token, "POWER", left, right)
 
-            return left
-        
-        def parse_bitwise():
-            left = parse_comparison()
+        return left
 
-            while peek_token().kind in ["BITWISE_AND", "BITWISE_OR", "BITWISE_XOR", "BITWISE_SHIFT_LEFT", "BITWISE_SHIFT_RIGHT"]:
-                operator = peek_token()
-                next_token()
+    def parse_multiply(self):
+        return self.parse_binary(self.parse_power, MULTIPLY_OPERATORS)
 
-                right = parse_comparison()
+    def parse_add(self):
+        return self.parse_binary(self.parse_multiply, ADD_OPERATORS)
 
-                left = ExprNode(operator, operator.kind, left, right)
+    def parse_shift(self):
+        return self.parse_binary(self.parse_add, SHIFT_OPERATORS)
 
-            return left
+    def parse_comparison(self):
+        return self.parse_binary(self.parse_shift, COMPARISON_OPERATORS)
 
-        def parse_logical():
-            left = parse_bitwise()
+    def parse_bitwise(self):
+        return self.parse_binary(self.parse_comparison, BITWISE_OPERATORS)
 
-            while peek_token().kind in ["AND", "OR", "XOR"]:
-                operator = peek_token()
-                next_token()
+    def parse_logical(self):
+        return self.parse_binary(self.parse_bitwise, LOGICAL_OPERATORS)
 
-                right = parse_bitwise()
+    def parse_unary(self):
+        token = self.peek_token()
 
-                left = ExprNode(operator, operator.kind, left, right)
+        if token.kind == "LPAREN":
+            self.next_token()
 
-            return left
-        
-        def parse_unary():
-            if peek_token().kind == "LPAREN":
-                next_token()
+            expr = self.parse_expr()
 
-                expr = parse_expr()
+            self.expect_token("RPAREN")
+            self.next_token()
 
-                expect_token("RPAREN")
-                next_token()
+            return expr
+        # check if the expression starts with a unary operator
+        elif token.kind in UNARY_OPERATORS:
+            operator = self.next_token()
+            value = self.parse_unary()
 
-                return expr
-            # check if the expression starts with a unary operator
-            elif peek_token().kind in ["PLUS", "MINUS", "NOT", "BITWISE_NOT"]:
-                operator = next_token()
-                value = parse_unary()
+            return UnaryExprNode(operator, operator.kind, value)
 
-                return UnaryExprNode(operator, operator.kind, value)
+        elif token.kind == "IDENTIFIER":
+            # check if the expression is a function call ('len' and the reductions are built in, unless the program defines them)
+            if self.peek_token(1).kind == "LPAREN" and token.value == "len" and ctx_mgr.lookup("len") is None:
+                return self.parse_len()
 
-            # check if the expression is a function call
-            elif peek_token().kind == "IDENTIFIER" and peek_token(1).kind == "LPAREN":
-                return parse_call()
+            if self.peek_token(1).kind == "LPAREN" and token.value in REDUCTIONS and ctx_mgr.lookup(token.value) is None:
+                return self.parse_reduce()
 
-            # check if the expression is a variable
-            elif peek_token().kind == "IDENTIFIER":
-                name = next_token()
+            if self.peek_token(1).kind == "LPAREN":
+                return self.parse_call()
 
-                if len(ctx_mgr.stack) == 0:
-                    raise ParserError(name, f"Expected fixed value or variable name, got function '{name.value}'")
+            # otherwise it is a variable
+            name = self.next_token()
 
-                if not ctx_mgr.stack[-1][0] == "attribute":
-                    if ctx_mgr.get_type(name).value == "func":
-                        raise ParserError(name, f"Expected fixed value or variable name, got function '{name.value}'")
+            if len(ctx_mgr.stack) == 0:
+                raise ParserError(name, f"Expected fixed value or variable name, got function '{name.value}'")
 
-                return VariableNode(name, name.value)
+            if not ctx_mgr.stack[-1][0] == "attribute":
+                if ctx_mgr.get_type(name).value == "func":
+                    raise ParserError(name, f"Expected fixed value or variable name, got function '{name.value}'")
 
-            # check if the expression is a int, float, char, string, boolen or null
-            elif peek_token().kind in ["INTEGER", "FLOAT", "CHAR", "STRING", "BOOLEAN", "NULL"]:
-                token = next_token()
+            variable = VariableNode(name, name.value)
 
-                return ValueNode(token, token.kind, token.value)
+            while self.peek_token().kind == "LBRACKET":
+                variable = self.parse_index(variable)
 
-            else:
-                raise ParserError(peek_token(), "Expected expression")
+            return variable
 
-        # check if the expression is a parenthesized expression
-        if peek_token().kind == "LPAREN":
-            next_token()
+        elif token.kind == "LBRACKET":
+            return self.parse_array()
 
-            expr = parse_expr()
+        # check if the expression is a int, float, char, string, boolen or null
+        elif token.kind in VALUE_TOKENS:
+            self.next_token()
 
-            expect_token("RPAREN")
-            next_token()
+            return ValueNode(token, token.kind, token.value)
 
-            left = expr
         else:
-            left = parse_logical()
+            raise ParserError(token, "Expected expression")
 
-        return left
+    def import_std(self, program: Program):
+        # the standard runtime is imported like a module, see get_std_functions
+        if self.std is not None:
+            program.attributes.append(AttributeNode(self.std[0].func_token, "@import", ImportNode(self.std[0].func_token, STD_MODULE, None, self.std)))
 
-    def parse_program() -> Program:
+    def parse_program(self) -> Program:
         p = Program()
+        self.import_std(p)
 
-        while peek_token() is not None:
-            stmt = parse_statement()
+        while self.peek_token() is not None:
+            stmt = self.parse_statement()
 
             if stmt is not None:
                 p.append(stmt)
@@ -1043,8 +1528,232 @@ def parse(file: str, tokens: list[lexer.Token]) -> Program:
         ctx_mgr.end_of_file()
         return p
 
+STD_MODULE = "<std>" # name of the standard runtime's import, not a valid module name
+
+PARALLEL_MIN_TOKENS = 100_000 # below this the worker processes cost more than they save
+PARALLEL_SPANS_PER_JOB = 4
+
+# set before the workers are forked, which inherit them instead of receiving the tokens
+parallel_parser = None
+parallel_statements = None
+
+def parse_signatures(file: str, tokens: list[lexer.Token], import_paths: list[str], modules: dict, program: Program) -> list:
+    """Parse the top level statements into 'program', each function body is skipped to its matching brace and left None.
+    Returns (statement, first token index, last token index + 1, defined globals, required function tokens) per statement,
+    None when the program has an error (parse it with parse to report it)"""
+    signature_parser = Parser(file, tokens, import_paths, modules)
+    signature_parser.skip_bodies = True
+    signature_parser.import_std(program)
+
+    statements = []
+
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            while True:
+                signature_parser.skip_newlines_or_semicolons()
+                start = ctx_mgr.token_index
+
+                if signature_parser.peek_token() is None:
+                    break
+
+                ctx_mgr.definitions = []
+                ctx_mgr.requirements = []
+
+                statement = signature_parser.parse_statement()
+                program.append(statement)
+
+                statements.append((statement, start, ctx_mgr.token_index, ctx_mgr.definitions, ctx_mgr.requirements))
+        except (Exception, SystemExit):
+            return None
+        finally:
+            ctx_mgr.definitions = None
+            ctx_mgr.requirements = None
+
+    signature_parser.skip_bodies = False
+    return statements
+
+def parse_stream(file: str, tokens: list[lexer.Token], import_paths: list[str] = None, modules: dict = None) -> Program:
+    """Parse the signatures of a program lexed by lexer.lex_file(file, outline=True), its functions are lexed and parsed
+    one at a time while its 'functions' are iterated, and the tokens of a body are released once it is parsed, so only
+    one function body is in memory"""
+    with open(file, "r") as f:
+        input_text = f.read()
+
+    program = ProgramStream()
+    statements = parse_signatures(file, tokens, import_paths, modules, program)
+
+    if statements is None:
+        return parse(file, list(lexer.lex(input_text)), import_paths, modules) # reports the error
+
+    program.functions = parse_bodies(file, input_text, tokens, statements)
+    return program
+
+def parse_bodies(file: str, input_text: str, tokens: list[lexer.Token], statements: list):
+    """Generator of parse_stream, the ContextManager sees the statements in the same order as in the serial parsing"""
+    body_parser = Parser(file, tokens)
+
+    try:
+        for statement, start, end, definitions, requirements in statements:
+            if not isinstance(statement, FuncNode):
+                # already parsed by parse_signatures, only its effects on the scope are repeated
+                for token in requirements:
+                    ctx_mgr.require_defined_in_future_for_func(token)
+
+                for node in definitions:
+                    ctx_mgr.define(node)
+
+                continue
+
+            # the body takes the place of its braces while it is parsed, the later statements keep their indices
+            body = lexer.lex_body(input_text, tokens[end - 2], tokens[end - 1])
+            tokens[end - 2:end] = body
+
+            ctx_mgr.token_index = start
+            function = body_parser.parse_definition()
+
+            tokens[end - 2:end - 2 + len(body)] = [body[0], body[-1]]
+            body = None
+
+            # the later functions only need the signature, the body must not stay referenced by the scope
+            ctx_mgr.globals[statement.name] = statement
+
+            yield function
+
+            function = None
+
+        ctx_mgr.end_of_file()
+    except ParserError as e:
+        logger.code_error(file, e.token.line, e.token.column, len(e.token.value), e.message)
+        raise SystemExit(1)
+
+def parse_parallel(file: str, tokens: list[lexer.Token], import_paths: list[str], modules: dict, jobs: int) -> Program:
+    """Same as Parser(...).parse_program(), but the function bodies are parsed by 'jobs' worker processes.
+    Returns None when the program has an error (parse it serially to report it) or is too small to be worth it"""
+    global parallel_parser, parallel_statements
+
+    if len(tokens) < PARALLEL_MIN_TOKENS or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+
+    # phase one: the top level statements with the function signatures
+    program = Program()
+    statements = parse_signatures(file, tokens, import_paths, modules, program)
+
+    if statements is None:
+        return None
+
+    functions = [i for i, (statement, *_) in enumerate(statements) if isinstance(statement, FuncNode)]
+    count = min(jobs * PARALLEL_SPANS_PER_JOB, len(functions))
+
+    if count < 2:
+        return None
+
+    # phase two: every worker parses the bodies in a span of top level statements, in the scope the serial parsing has there
+    bounds = [functions[len(functions) * i // count] for i in range(count)] + [len(statements)]
+    bounds[0] = 0
+
+    parallel_parser = Parser(file, tokens, import_paths, modules)
+    parallel_statements = statements
+
+    # keeps the garbage collector of the workers from touching (and so copying) the inherited objects
+    gc.freeze()
+
+    try:
+        with multiprocessing.get_context("fork").Pool(jobs) as pool:
+            spans = pool.map(parse_functions, zip(bounds, bounds[1:]))
+    finally:
+        gc.unfreeze()
+        parallel_parser = None
+        parallel_statements = None
+
+    if None in spans:
+        return None
+
+    spans = [loads(span) for span in spans]
+
+    # the bodies may call functions defined further down, check those like ContextManager.define and end_of_file do
+    parsed = iter(function for span in spans for function in zip(span.functions, span.requirements))
+    required = set()
+    program.statements = []
+
+    for statement, _, _, definitions, requirements in statements:
+        if isinstance(statement, FuncNode):
+            statement, requirements = next(parsed)
+            definitions = [statement]
+
+        required.update(token.value for token in requirements)
+
+        for node in definitions:
+            if node.name in required:
+                if not isinstance(node, FuncNode):
+                    return None
+
+                required.remove(node.name)
+
+        if not isinstance(statement, AttributeNode):
+            program.statements.append(statement)
+
+    if len(required) > 0:
+        return None
+
+    return program
+
+class ParsedSpan:
+    """Result of a parse_functions worker, sent back to the parent in the serialized AST format"""
+    def __init__(self):
+        self.functions = []
+        self.requirements = [] # per function, the tokens of the required functions not defined before it
+
+    def __str__(self):
+        return f"ParsedSpan(functions={self.functions}, requirements={self.requirements})"
+
+    def __repr__(self):
+        return self.__str__()
+
+def parse_functions(span: tuple) -> bytes:
+    """Worker of parse_parallel, returns the functions among the statements in 'span' as a serialized ParsedSpan, None on an error"""
+    first, last = span
+    result = ParsedSpan()
+
+    ctx_mgr.globals = dict(ctx_mgr.std)
+
+    for _, _, _, definitions, _ in parallel_statements[:first]:
+        for node in definitions:
+            ctx_mgr.globals[node.name] = node
+
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            for statement, start, end, definitions, _ in parallel_statements[first:last]:
+                if not isinstance(statement, FuncNode):
+                    for node in definitions:
+                        ctx_mgr.globals[node.name] = node
+
+                    continue
+
+                # defines the function with its body, seen by the next ones
+                ctx_mgr.token_index = start
+                ctx_mgr.require_defined_in_future_dict = {}
+                ctx_mgr.requirements = []
+
+                function = parallel_parser.parse_definition()
+
+                if ctx_mgr.token_index != end:
+                    return None
+
+                result.functions.append(function)
+                result.requirements.append(ctx_mgr.requirements)
+        except (Exception, SystemExit):
+            return None
+
+    return dumps(result)
+
+def parse(file: str, tokens: list[lexer.Token], import_paths: list[str] = None, modules: dict = None, jobs: int = 1) -> Program:
     try:
-        return parse_program()
+        program = parse_parallel(file, tokens, import_paths, modules, jobs) if jobs > 1 else None
+
+        if program is not None:
+            return program
+
+        return Parser(file, tokens, import_paths, modules).parse_program()
     except ParserError as e:
         logger.code_error(file, e.token.line, e.token.column, len(e.token.value), e.message)
         raise SystemExit(1)
@@ -1083,3 +1792,520 @@ def parse(file: str, tokens: list[lexer.Token]) -> Program:
         logger.compiler_info("Please report this error in the GitHub issue")
 
         raise SystemExit(1)
+
+###################
+# Serialized AST
+#
+# The AST is stored as one flat value table. Every reference (node field, list item,
+# root) is an index into that table, which is laid out as:
+#   None, False, True | strings | integers | floats | records (tokens, lists and nodes)
+# Records are written children first, so loading is a single pass over them.
+#
+# File layout (all integers little endian):
+#   header   magic, format version, section sizes, root index
+#   strings  length of every interned string, followed by the UTF-8 blob
+#   integers int64 per interned integer
+#   floats   float64 per interned float
+#   shapes   (class name, field count, field names...) per distinct node layout
+#   records  (shape, field references...) per node, (shape count + length, item references...) per list
+# Everything after the header is zlib compressed.
+
+AST_MAGIC = b"IMPAST"
+AST_FORMAT_VERSION = 2
+
+AST_HEADER = struct.Struct("<6sHIIIIIII")
+
+CATEGORY_CONSTANT, CATEGORY_STRING, CATEGORY_INT, CATEGORY_FLOAT, CATEGORY_RECORD, CATEGORY_LIST, CATEGORY_SHAPE = range(7)
+CATEGORY_BITS = 3 # the writer keeps the category in the low bits of a reference
+CATEGORY_MASK = (1 << CATEGORY_BITS) - 1
+
+class ASTFormatError(Exception):
+    """Serialized AST is malformed or was written by an incompatible compiler version"""
+
+def is_ast_record(value) -> bool:
+    return type(value) is lexer.Token or (type(value).__module__ == __name__ and hasattr(value, "__dict__"))
+
+def get_ast_node_class(name: str):
+    if name == "Token":
+        return lexer.Token
+
+    cls = globals().get(name)
+
+    if not isinstance(cls, type) or cls.__module__ != __name__:
+        raise ASTFormatError(f"Unknown AST node class '{name}'")
+
+    return cls
+
+def make_record_loader(cls, fields: tuple):
+    """Build a function creating a 'cls' object from a record (generated per shape, like namedtuple does)"""
+    for field in fields:
+        if not field.isidentifier() or keyword.iskeyword(field):
+            raise ASTFormatError(f"Invalid field name '{field}' in serialized AST")
+
+    lines = ["def load_record(values, record_data, i):", "    node = new_object(cls)"]
+    lines += [f"    node.{field} = values[record_data[i + {k}]]" for k, field in enumerate(fields)]
+    lines.append("    return node")
+
+    namespace = {"new_object": object.__new__, "cls": cls}
+    exec("\n".join(lines), namespace)
+
+    return namespace["load_record"]
+
+def to_little_endian(data: array.array) -> bytes:
+    if sys.byteorder != "little":
+        data = array.array(data.typecode, data)
+        data.byteswap()
+
+    return data.tobytes()
+
+def from_little_endian(typecode: str, data) -> array.array:
+    result = array.array(typecode)
+    result.frombytes(data)
+
+    if sys.byteorder != "little":
+        result.byteswap()
+
+    return result
+
+class ASTWriter:
+    def __init__(self):
+        self.strings = {} # string -> index
+        self.ints = {} # integer -> index
+        self.floats = {} # float -> index
+        self.shapes = {} # (class, field names) -> index
+        self.records = {} # id(node) -> reference
+        self.record_types = {} # class -> whether its objects are records
+        self.record_count = 0
+
+        self.shape_data = array.array("I")
+        self.record_data = [] # references are category | index << CATEGORY_BITS until the layout is known, so are shapes and list heads
+
+    def intern(self, table: dict, value) -> int:
+        index = table.get(value)
+
+        if index is None:
+            index = table[value] = len(table)
+
+        return index
+
+    def is_record(self, value) -> bool:
+        result = self.record_types.get(type(value))
+
+        if result is None:
+            result = self.record_types[type(value)] = is_ast_record(value)
+
+        return result
+
+    def reference(self, value) -> int:
+        value_type = type(value)
+
+        if value_type is str:
+            return CATEGORY_STRING | self.intern(self.strings, value) << CATEGORY_BITS
+
+        record = self.records.get(id(value))
+
+        if record is not None:
+            return record
+        elif value is None:
+            return CATEGORY_CONSTANT
+        elif value_type is bool:
+            return CATEGORY_CONSTANT | (1 + value) << CATEGORY_BITS
+        elif value_type is int:
+            return CATEGORY_INT | self.intern(self.ints, value) << CATEGORY_BITS
+        elif value_type is float:
+            return CATEGORY_FLOAT | self.intern(self.floats, value) << CATEGORY_BITS
+        elif value_type is list:
+            items = [self.reference(item) for item in value]
+
+            self.record_data.append(CATEGORY_LIST | len(items) << CATEGORY_BITS)
+            self.record_data.extend(items)
+
+            return self.next_record()
+
+        raise ASTFormatError(f"Cannot serialize value of type '{value_type.__name__}'")
+
+    def next_record(self) -> int:
+        index = self.record_count
+        self.record_count += 1
+
+        return CATEGORY_RECORD | index << CATEGORY_BITS
+
+    def add_node(self, node):
+        fields = node.__dict__
+        shape_key = (type(node), tuple(fields))
+        shape = self.shapes.get(shape_key)
+
+        if shape is None:
+            shape = self.shapes[shape_key] = len(self.shapes)
+            self.shape_data.extend((self.intern(self.strings, type(node).__name__), len(fields)))
+            self.shape_data.extend(self.intern(self.strings, field) for field in fields)
+
+        strings = self.strings
+        ints = self.ints
+        records = self.records
+        references = []
+
+        # the common values are inlined, lists inside the node are written (and numbered) before the node itself
+        for value in fields.values():
+            value_type = type(value)
+
+            if value_type is str:
+                index = strings.get(value)
+
+                if index is None:
+                    index = strings[value] = len(strings)
+
+                references.append(CATEGORY_STRING | index << CATEGORY_BITS)
+            elif value_type is int:
+                index = ints.get(value)
+
+                if index is None:
+                    index = ints[value] = len(ints)
+
+                references.append(CATEGORY_INT | index << CATEGORY_BITS)
+            else:
+                references.append(records.get(id(value)) or self.reference(value))
+
+        self.record_data.append(CATEGORY_SHAPE | shape << CATEGORY_BITS)
+        self.record_data.extend(references)
+        self.records[id(node)] = self.next_record()
+
+    def add_tree(self, root):
+        records = self.records
+        record_types = self.record_types
+
+        # iterative post-order walk, so deep trees don't hit the recursion limit
+        stack = [(root, False)]
+
+        while stack:
+            node, children_done = stack.pop()
+
+            if id(node) in records:
+                continue
+
+            if children_done:
+                self.add_node(node)
+                continue
+
+            stack.append((node, True))
+
+            pending = list(node.__dict__.values())
+
+            while pending:
+                value = pending.pop()
+                value_type = type(value)
+
+                if value_type is str or value is None:
+                    continue
+                elif value_type is lexer.Token:
+                    # tokens have no children, they are written right away
+                    if id(value) not in records:
+                        self.add_node(value)
+                elif value_type is list:
+                    pending.extend(value)
+                elif (record_types.get(value_type) or self.is_record(value)) and id(value) not in records:
+                    stack.append((value, False))
+
+    def to_bytes(self, root) -> bytes:
+        # the walk creates many short lived containers, none of them in a reference cycle
+        gc_enabled = gc.isenabled()
+        gc.disable()
+
+        try:
+            self.add_tree(root)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        root_reference = self.reference(root)
+
+        bases = [0, 3]
+        bases.append(bases[-1] + len(self.strings))
+        bases.append(bases[-1] + len(self.ints))
+        bases.append(bases[-1] + len(self.floats))
+
+        bases.append(len(self.shapes)) # list heads come after the shape indices
+        bases.append(0)
+
+        record_data = array.array("I", [bases[item & CATEGORY_MASK] + (item >> CATEGORY_BITS) for item in self.record_data])
+
+        string_blob = "".join(self.strings)
+        string_lengths = array.array("I", [len(string) for string in self.strings])
+        encoded_blob = string_blob.encode("utf-8")
+
+        header = AST_HEADER.pack(
+            AST_MAGIC,
+            AST_FORMAT_VERSION,
+            len(encoded_blob),
+            len(self.strings),
+            len(self.ints),
+            len(self.floats),
+            len(self.shape_data),
+            len(record_data),
+            bases[root_reference & CATEGORY_MASK] + (root_reference >> CATEGORY_BITS)
+        )
+
+        body = b"".join([
+            to_little_endian(string_lengths),
+            encoded_blob,
+            to_little_endian(array.array("q", self.ints)),
+            to_little_endian(array.array("d", self.floats)),
+            to_little_endian(self.shape_data),
+            to_little_endian(record_data)
+        ])
+
+        return header + zlib.compress(body, 1)
+
+def dumps(program: Program) -> bytes:
+    """Serialize an AST into the binary format"""
+    return ASTWriter().to_bytes(program)
+
+def loads(data: bytes) -> Program:
+    """Rebuild an AST serialized with dumps"""
+    if len(data) < AST_HEADER.size:
+        raise ASTFormatError("Serialized AST is truncated")
+
+    magic, version, blob_size, string_count, int_count, float_count, shape_size, record_size, root = AST_HEADER.unpack_from(data)
+
+    if magic != AST_MAGIC:
+        raise ASTFormatError("Not a serialized AST")
+
+    if version != AST_FORMAT_VERSION:
+        raise ASTFormatError(f"Unsupported AST format version {version} (expected {AST_FORMAT_VERSION})")
+
+    try:
+        view = memoryview(zlib.decompress(memoryview(data)[AST_HEADER.size:]))
+    except zlib.error:
+        raise ASTFormatError("Serialized AST is corrupted")
+
+    expected_size = 4 * string_count + blob_size + 8 * (int_count + float_count) + 4 * (shape_size + record_size)
+
+    if len(view) != expected_size:
+        raise ASTFormatError("Serialized AST is truncated")
+
+    offset = 0
+
+    def read_section(typecode: str, count: int) -> array.array:
+        nonlocal offset
+        section = from_little_endian(typecode, view[offset:offset + count * array.array(typecode).itemsize])
+        offset += count * section.itemsize
+
+        return section
+
+    string_lengths = read_section("I", string_count)
+
+    string_blob = bytes(view[offset:offset + blob_size]).decode("utf-8")
+    offset += blob_size
+
+    ints = read_section("q", int_count)
+    floats = read_section("d", float_count)
+    shape_data = read_section("I", shape_size)
+    record_data = read_section("I", record_size).tolist()
+
+    values = [None, False, True]
+
+    start = 0
+    for length in string_lengths:
+        values.append(string_blob[start:start + length])
+        start += length
+
+    values.extend(ints)
+    values.extend(floats)
+
+    shapes = []
+    i = 0
+
+    while i < len(shape_data):
+        field_count = shape_data[i + 1]
+        fields = tuple(values[3 + index] for index in shape_data[i + 2:i + 2 + field_count])
+
+        shapes.append((make_record_loader(get_ast_node_class(values[3 + shape_data[i]]), fields), field_count))
+        i += 2 + field_count
+
+    get_value = values.__getitem__
+    append = values.append
+    shape_count = len(shapes)
+
+    # the AST has no reference cycles, so there is nothing for the collector to find while loading
+    gc_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        i = 0
+
+        while i < len(record_data):
+            head = record_data[i]
+
+            if head >= shape_count:
+                end = i + 1 + head - shape_count
+                append(list(map(get_value, record_data[i + 1:end])))
+                i = end
+                continue
+
+            load_record, field_count = shapes[head]
+            append(load_record(values, record_data, i + 1))
+
+            i += 1 + field_count
+    except IndexError:
+        raise ASTFormatError("Serialized AST is corrupted")
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    if not 0 <= root < len(values):
+        raise ASTFormatError("Serialized AST is truncated")
+
+    return values[root]
+
+def dump(program: Program, file: str):
+    with open(file, "wb") as f:
+        f.write(dumps(program))
+
+def load(file: str) -> Program:
+    with open(file, "rb") as f:
+        return loads(f.read())
+
+###################
+# Module interfaces
+#
+# 'impc -c' writes the signatures of the functions exported by a module to an interface file
+# (the object file name with the .impi extension) in the serialized AST format. '@import "name"'
+# loads name.impi from the directory of the importing file or from the import paths (-I), so
+# the implementation of an imported module is never parsed again. An input file given earlier
+# on the same command line can be imported by name without an interface file.
+
+INTERFACE_EXTENSION = ".impi"
+
+def has_attribute(tokens: list[lexer.Token], name: str) -> bool:
+    # attributes are at the beginning of the file, one per line
+    line_start = True
+
+    for token in tokens:
+        if token.kind in STATEMENT_SEPARATORS:
+            line_start = True
+        elif line_start:
+            if token.kind != "ATTRIBUTE":
+                return False
+
+            if token.value == name:
+                return True
+
+            line_start = False
+
+    return False
+
+def uses_std(program: Program) -> bool:
+    return not any(attribute.name == "@no_std" for attribute in program.attributes)
+
+def uses_tasks(program: Program) -> bool:
+    # whether a function of the program spawns tasks or has a parallel loop
+    def is_task(node) -> bool:
+        if isinstance(node, SpawnNode) or (isinstance(node, WhileNode) and node.parallel):
+            return True
+
+        return any(is_task(child) for child in get_children(node))
+
+    return any(isinstance(statement, FuncNode) and is_task(statement.body) for statement in program.statements)
+
+def get_std_functions() -> list[FuncNode]:
+    # signatures of defs.STD_FUNCTIONS, their tokens are at the start of the file
+    functions = []
+
+    for name, (parameters, return_type) in defs.STD_FUNCTIONS.items():
+        functions.append(FuncNode(
+            lexer.Token("ATTRIBUTE", "@import", 0, 1, 1),
+            lexer.Token("IDENTIFIER", name, 0, 1, 1),
+            lexer.Token("IDENTIFIER", return_type, 0, 1, 1) if return_type is not None else None,
+            name,
+            [ParameterNode(lexer.Token("IDENTIFIER", p_name, 0, 1, 1), lexer.Token("IDENTIFIER", p_type, 0, 1, 1), p_name, p_type) for p_name, p_type in parameters],
+            return_type,
+            None
+        ))
+
+    return functions
+
+def get_exports(program: Program) -> list[FuncNode]:
+    # every top-level function except the entry point, without its body
+    return [
+        FuncNode(s.func_token, s.name_token, s.return_type_token, s.name, s.parameters, s.return_type, None)
+        for s in program.statements if isinstance(s, FuncNode) and s.name != "main"
+    ]
+
+def write_interface(programs: list[Program], file: str):
+    interface = Program()
+
+    for program in programs:
+        for function in get_exports(program):
+            interface.append(function)
+
+    dump(interface, file)
+
+def load_interface(file: str) -> list[FuncNode]:
+    interface = load(file)
+
+    if not isinstance(interface, Program) or not all(isinstance(s, FuncNode) and s.body is None for s in interface.statements):
+        raise ASTFormatError("Not an interface file")
+
+    return interface.statements
+
+def find_interface(module: str, import_paths: list[str]) -> str:
+    name = module if module.endswith(INTERFACE_EXTENSION) else module + INTERFACE_EXTENSION
+
+    for directory in import_paths:
+        path = os.path.join(directory, name)
+
+        if os.path.isfile(path):
+            return path
+
+    return None
+
+def get_children(node) -> list:
+    # the statements and expressions directly inside 'node'
+    if isinstance(node, BlockNode):
+        return node.statements
+
+    if isinstance(node, IfNode):
+        children = [child for arm in [node] + node.else_ifs for child in [arm.condition, arm.body]]
+        return children + [node.else_statement] if node.else_statement is not None else children
+
+    if isinstance(node, WhileNode):
+        return [node.condition, node.body]
+
+    if isinstance(node, ExprNode):
+        return [node.left, node.right]
+
+    if isinstance(node, CallNode):
+        return node.arguments
+
+    if isinstance(node, IndexNode):
+        return [node.target, node.index]
+
+    if isinstance(node, IndexAssignmentNode):
+        return [node.target, node.value]
+
+    if isinstance(node, ArrayNode):
+        return node.elements
+
+    if isinstance(node, UnaryExprNode):
+        return [node.right]
+
+    if isinstance(node, SpawnNode):
+        return [node.call]
+
+    value = getattr(node, "value", None) # variables, assignments, returns, len and reductions
+    return [value] if value is not None and not isinstance(value, str) else []
+
+def contains(node, node_type) -> bool:
+    return isinstance(node, node_type) or any(contains(child, node_type) for child in get_children(node))
+
+def relocate_tokens(node, token: lexer.Token):
+    # move every token of 'node' to the position of 'token'
+    for name, value in vars(node).items():
+        if isinstance(value, lexer.Token):
+            setattr(node, name, lexer.Token(value.kind, value.value, token.position, token.line, token.column))
+        elif isinstance(value, list):
+            for item in value:
+                if is_ast_record(item):
+                    relocate_tokens(item, token)
+        elif is_ast_record(value):
+            relocate_tokens(value, token)
@@ -0,0 +1,343 @@
+# Instrumentation profiles
+#
+# Programs compiled with -fprofile-instr count how often every profiling site runs (see collect_sites)
+# and append one record per module to the profile file when they exit. A record is:
+#
+#   header       PROFILE_HEADER (magic, version, source checksum, site count, metadata length)
+#   metadata     source path, function names and the site table (kind, line, column, function)
+#   counters     one u64 per site
+#
+# All integers are little-endian. Records of the same source are summed when reading a profile,
+# so running a program several times accumulates the counts.
+
+import argparse
+import struct
+import zlib
+
+import logger
+import parser
+
+PROFILE_MAGIC = b"IMPPRF"
+PROFILE_FORMAT_VERSION = 1
+PROFILE_FILE_ENV = "IMPL_PROFILE_FILE"
+DEFAULT_PROFILE_FILE = "default.impprof"
+
+PROFILE_HEADER = struct.Struct("<6sHIII")
+PROFILE_SITE = struct.Struct("<BIII")
+PROFILE_LENGTH = struct.Struct("<I")
+
+SITE_FUNCTION, SITE_IF_ARM, SITE_ELSE, SITE_LOOP, SITE_BACK_EDGE = range(5)
+SITE_KIND_NAMES = ["function", "if arm", "else", "loop", "back edge"]
+
+# fractions (in millionths) of the total count for the detailed profile summary, the ones LLVM uses
+SUMMARY_CUTOFFS = [10000, 100000, 200000, 300000, 400000, 500000, 600000, 700000, 800000, 900000, 950000, 990000, 999000, 999900, 999990, 999999]
+MAX_BRANCH_WEIGHT = 0xFFFFFFFF
+
+class ProfileFormatError(Exception):
+    """Profile file is malformed or was written by an incompatible compiler version"""
+
+class Site:
+    def __init__(self, kind: int, line: int, column: int, function: str, in_loop: bool = False):
+        self.kind = kind
+        self.line = line
+        self.column = column
+        self.function = function
+        self.in_loop = in_loop # only known when compiling, not stored in profiles
+
+    def key(self) -> tuple:
+        return (self.kind, self.line, self.column, self.function)
+
+    def __str__(self):
+        return f"Site({SITE_KIND_NAMES[self.kind]}, {self.line}:{self.column}, {self.function})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class ProfileRecord:
+    def __init__(self, file: str, checksum: int, sites: list[Site], counts: list[int]):
+        self.file = file
+        self.checksum = checksum
+        self.sites = sites
+        self.counts = counts
+        self.runs = 1
+
+    def __str__(self):
+        return f"ProfileRecord({self.file}, {len(self.sites)} sites, {self.runs} runs)"
+
+    def __repr__(self):
+        return self.__str__()
+
+def get_checksum(file: str) -> int:
+    # identifies the source a profile was collected from, 0 if it can't be read
+    try:
+        with open(file, "rb") as f:
+            return zlib.crc32(f.read())
+    except OSError:
+        return 0
+
+def collect_sites(program: parser.Program) -> tuple:
+    """Number the profiling sites of a program, returns ([Site], {id(node): index of its first site})
+
+    A function has one site (entry), an if statement one per arm plus one for the else branch
+    (taken when no arm is, even without 'else') and a while loop two (entry and back edge).
+    """
+    sites = []
+    indices = {}
+
+    def add(node, kind: int, token, function: str, in_loop: bool):
+        indices.setdefault(id(node), len(sites))
+        sites.append(Site(kind, token.line, token.column, function, in_loop))
+
+    def walk(node, function: str, in_loop: bool):
+        if isinstance(node, parser.BlockNode):
+            for statement in node.statements:
+                walk(statement, function, in_loop)
+        elif isinstance(node, parser.IfNode):
+            arms = [node] + node.else_ifs
+
+            for arm in arms:
+                add(node, SITE_IF_ARM, arm.token, function, in_loop)
+
+            add(node, SITE_ELSE, node.token, function, in_loop)
+
+            for arm in arms:
+                walk(arm.body, function, in_loop)
+
+            if node.else_statement is not None:
+                walk(node.else_statement, function, in_loop)
+        elif isinstance(node, parser.WhileNode):
+            add(node, SITE_LOOP, node.token, function, in_loop)
+            add(node, SITE_BACK_EDGE, node.token, function, True)
+            walk(node.body, function, True)
+
+    for statement in program.statements:
+        if isinstance(statement, parser.FuncNode) and statement.body is not None:
+            add(statement, SITE_FUNCTION, statement.name_token, statement.name, False)
+            walk(statement.body, statement.name, False)
+
+    return sites, indices
+
+def encode_string(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return PROFILE_LENGTH.pack(len(data)) + data
+
+def encode_header(file: str, checksum: int, sites: list[Site]) -> bytes:
+    """Header and metadata of a record, the program writes its counters right after them"""
+    functions = list(dict.fromkeys(site.function for site in sites))
+    function_indices = {name: i for i, name in enumerate(functions)}
+
+    metadata = [encode_string(file), PROFILE_LENGTH.pack(len(functions))]
+    metadata += [encode_string(name) for name in functions]
+    metadata += [PROFILE_SITE.pack(site.kind, site.line, site.column, function_indices[site.function]) for site in sites]
+    metadata = b"".join(metadata)
+
+    return PROFILE_HEADER.pack(PROFILE_MAGIC, PROFILE_FORMAT_VERSION, checksum, len(sites), len(metadata)) + metadata
+
+class ProfileReader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def read(self, size: int) -> bytes:
+        if self.offset + size > len(self.data):
+            raise ProfileFormatError("Profile is truncated")
+
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += size
+
+        return chunk
+
+    def unpack(self, structure: struct.Struct) -> tuple:
+        return structure.unpack(self.read(structure.size))
+
+    def read_string(self) -> str:
+        length, = self.unpack(PROFILE_LENGTH)
+
+        try:
+            return self.read(length).decode("utf-8")
+        except UnicodeDecodeError:
+            raise ProfileFormatError("Invalid string in profile")
+
+    def read_record(self) -> ProfileRecord:
+        magic, version, checksum, site_count, metadata_length = self.unpack(PROFILE_HEADER)
+
+        if magic != PROFILE_MAGIC:
+            raise ProfileFormatError("Not an ImpLang profile")
+
+        if version != PROFILE_FORMAT_VERSION:
+            raise ProfileFormatError(f"Unsupported profile format version {version} (expected {PROFILE_FORMAT_VERSION})")
+
+        metadata_end = self.offset + metadata_length
+
+        file = self.read_string()
+        function_count, = self.unpack(PROFILE_LENGTH)
+        functions = [self.read_string() for _ in range(function_count)]
+
+        sites = []
+
+        for _ in range(site_count):
+            kind, line, column, function = self.unpack(PROFILE_SITE)
+
+            if kind >= len(SITE_KIND_NAMES) or function >= len(functions):
+                raise ProfileFormatError("Invalid site in profile")
+
+            sites.append(Site(kind, line, column, functions[function]))
+
+        if self.offset != metadata_end:
+            raise ProfileFormatError("Invalid metadata length in profile")
+
+        counts = list(struct.unpack(f"<{site_count}Q", self.read(8 * site_count)))
+
+        return ProfileRecord(file, checksum, sites, counts)
+
+def read_profile(file: str) -> dict:
+    """Read a profile file, returns {source file: ProfileRecord} with the records of each source summed"""
+    with open(file, "rb") as f:
+        reader = ProfileReader(f.read())
+
+    records = {}
+
+    while reader.offset < len(reader.data):
+        record = reader.read_record()
+        previous = records.get(record.file)
+
+        # the program was rebuilt from a changed source: the newer record replaces the older ones
+        if previous is not None and previous.checksum == record.checksum and [s.key() for s in previous.sites] == [s.key() for s in record.sites]:
+            previous.counts = [a + b for a, b in zip(previous.counts, record.counts)]
+            previous.runs += 1
+        else:
+            records[record.file] = record
+
+    return records
+
+def match_record(profile: dict, file: str, sites: list[Site]) -> ProfileRecord:
+    """The record of 'file' in a profile, None (with a warning) if it is missing or the source changed"""
+    record = profile.get(file)
+
+    if record is None:
+        logger.compiler_warning(f"No profile data for '{file}'")
+        return None
+
+    if record.checksum != get_checksum(file) or [s.key() for s in record.sites] != [s.key() for s in sites]:
+        logger.compiler_warning(f"'{file}' changed since the profile was collected, its profile data is ignored")
+        return None
+
+    return record
+
+def get_summary(profile: dict) -> dict:
+    """Profile summary of all records (the same for every module, so they can be linked together)"""
+    counts = []
+    function_counts = []
+
+    for record in profile.values():
+        for site, count in zip(record.sites, record.counts):
+            (function_counts if site.kind == SITE_FUNCTION else counts).append(count)
+
+    all_counts = sorted(counts + function_counts, reverse=True)
+    total = sum(all_counts)
+    detailed = []
+
+    # the smallest count among the largest ones making up each cutoff of the total
+    covered = 0
+    i = 0
+
+    for cutoff in SUMMARY_CUTOFFS:
+        while i < len(all_counts) and covered * 1000000 < cutoff * total:
+            covered += all_counts[i]
+            i += 1
+
+        if i > 0:
+            detailed.append((cutoff, all_counts[i - 1], i))
+
+    return {
+        "TotalCount": total,
+        "MaxCount": all_counts[0] if all_counts else 0,
+        "MaxInternalCount": max(counts, default=0),
+        "MaxFunctionCount": max(function_counts, default=0),
+        "NumCounts": len(all_counts),
+        "NumFunctions": len(function_counts),
+        "DetailedSummary": detailed
+    }
+
+def scale_weights(counts: list[int]) -> list[int]:
+    # branch weights are 32-bit, and LLVM treats a weight of 0 as "never" (so a branch taken once would be too)
+    scale = max(counts) // MAX_BRANCH_WEIGHT + 1
+    return [count // scale + 1 for count in counts]
+
+###################
+
+def read_source_lines(file: str, checksum: int) -> list:
+    try:
+        with open(file, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if zlib.crc32(data) != checksum:
+        logger.compiler_warning(f"'{file}' changed since the profile was collected, source lines are not shown")
+        return None
+
+    return data.decode("utf-8", errors="replace").splitlines()
+
+def print_record(record: ProfileRecord, top: int, annotate: bool):
+    lines = read_source_lines(record.file, record.checksum)
+
+    def get_line(number: int) -> str:
+        if lines is None or not 0 < number <= len(lines):
+            return ""
+
+        return lines[number - 1].strip()
+
+    print(f"{record.file} ({record.runs} run{'s' if record.runs != 1 else ''})")
+    print()
+    print(f"  {'calls':>14}  function")
+
+    functions = [(count, site) for site, count in zip(record.sites, record.counts) if site.kind == SITE_FUNCTION]
+
+    for count, site in sorted(functions, key=lambda entry: -entry[0]):
+        print(f"  {count:>14,}  {site.function} (line {site.line})")
+
+    print()
+    print(f"  {'count':>14}  {'location':<10} {'kind':<10} {'function':<20} source")
+
+    hottest = sorted(zip(record.counts, range(len(record.sites))), key=lambda entry: (-entry[0], entry[1]))
+
+    for count, index in hottest[:top]:
+        site = record.sites[index]
+        print(f"  {count:>14,}  {f'{site.line}:{site.column}':<10} {SITE_KIND_NAMES[site.kind]:<10} {site.function:<20} {get_line(site.line)}")
+
+    if annotate and lines is not None:
+        # the highest count of each line (the entry count of a function, the taken count of a branch, ...)
+        line_counts = {}
+
+        for site, count in zip(record.sites, record.counts):
+            line_counts[site.line] = max(line_counts.get(site.line, 0), count)
+
+        print()
+
+        for number, text in enumerate(lines, 1):
+            count = f"{line_counts[number]:,}" if number in line_counts else ""
+            print(f"  {count:>14}  {number:>5} | {text}")
+
+    print()
+
+def report_main(argv: list[str]) -> int:
+    arg_parser = argparse.ArgumentParser(prog="impc profile-report", description="Show the hot spots of an instrumentation profile (see -fprofile-instr)")
+    arg_parser.add_argument("profile", help=f"The profile file (default: {DEFAULT_PROFILE_FILE})", nargs="?", default=DEFAULT_PROFILE_FILE)
+    arg_parser.add_argument("-n", "--top", help="Number of hottest sites to list per source file (default: 20)", type=int, default=20)
+    arg_parser.add_argument("-a", "--annotate", help="Print the sources with the count of every line", action="store_true")
+    args = arg_parser.parse_args(argv)
+
+    try:
+        records = read_profile(args.profile)
+    except OSError as e:
+        logger.compiler_error(f"Cannot read profile '{args.profile}': {e.strerror}")
+        return 1
+    except ProfileFormatError as e:
+        logger.compiler_error(f"Invalid profile '{args.profile}': {e}")
+        return 1
+
+    for record in records.values():
+        print_record(record, args.top, args.annotate)
+
+    return 0
@@ -0,0 +1,943 @@
+from llvmlite import ir
+from llvmlite import binding as llvm
+
+import defs
+
+# The standard runtime, imported by every program without '@no_std' (see defs.STD_FUNCTIONS)
+#
+# Output to stdout and stderr is buffered and written when a buffer is full, by 'flush' and when the program exits
+# (not when it aborts), so it must not be mixed with output through libc's stdio. Numbers are formatted without
+# libc, floats with 'precision' digits after the point, rounded like snprintf's '%.*f': the exact value of the float
+# times 10^precision is rounded in 128-bit integer arithmetic, the exact ties (rounded half to even by snprintf) and
+# the floats of 2^53 or more after scaling use snprintf. With tasks (see TaskRuntimeCodegen) the buffers are guarded
+# by a lock.
+
+INT = ir.IntType(64)
+WIDE = ir.IntType(128) # the exact product of a float mantissa and a power of ten
+FLOAT = ir.DoubleType()
+BOOL = ir.IntType(1)
+CHAR = ir.IntType(8)
+STR = CHAR.as_pointer()
+VOID = ir.VoidType()
+
+C_INT = ir.IntType(32)
+
+IR_TYPES = {
+    # same IR types as in codegen.py
+    "u64": INT,
+    "i64": INT,
+    "f64": FLOAT,
+    "bool": BOOL,
+    "str": STR,
+    "[u8]": ir.LiteralStructType([STR, INT])
+}
+
+OPT_LEVEL = 2 # the runtime is optimized like a library, at every optimization level of the programs
+
+BUFFER_SIZE = 1 << 16 # bytes of output buffered per stream
+INTEGER_SIZE = 20 # longest formatted integer, '18446744073709551615' or '-9223372036854775808'
+FLOAT_SIZE = 352 # longest formatted float, sign, 309 digits, point and MAX_PRECISION digits
+MAX_PRECISION = 17
+FAST_FLOAT_LIMIT = float(1 << 53) # scaled floats below this are formatted through integer arithmetic
+
+STDOUT = 1
+STDERR = 2
+
+SEEK_SET = 0
+SEEK_END = 2
+
+# task runtime
+TASK_TYPE = ir.FunctionType(VOID, [STR, INT, INT, INT]) # (context, chunk or 0, low, high)
+TASK_FUNCTIONS = {
+    # name: (return type, parameter types), called by the generated code
+    "__impl_parallel_for": (INT, [TASK_TYPE.as_pointer(), STR, INT, INT]),
+    "__impl_spawn": (VOID, [TASK_TYPE.as_pointer(), STR, INT.as_pointer()]),
+    "__impl_join": (VOID, [INT.as_pointer()])
+}
+
+PARALLEL_CHUNKS = 256 # most chunks a parallel loop is split into, the size of its partial results arrays
+PARALLEL_MIN_CHUNK = 16 # fewest iterations per chunk
+MAX_WORKERS = 64
+DEQUE_SIZE = 1024 # tasks per worker deque (a power of 2), tasks that don't fit run at once
+THREADS_VARIABLE = "IMPL_THREADS" # environment variable with the number of threads, default: online CPUs
+SC_NPROCESSORS_ONLN = 84 # sysconf name, Linux value
+PTHREAD_STORAGE_SIZE = 8 # i64 words reserved for a pthread_mutex_t or pthread_cond_t
+
+class RuntimeCodegen:
+    def __init__(self, threads: bool = False, name: str = "runtime"):
+        # 'threads': the program may print from more than one thread
+        self.module = ir.Module(name=name)
+        self.module.triple = llvm.get_process_triple()
+        self.threads = threads
+
+        self.functions = {} # name -> ir.Function, the ImpLang visible ones are external
+        self.strings = {} # literal -> ir.GlobalVariable
+        self.buffers = {} # file descriptor -> (buffer, length) global variables
+        self.output_lock = None
+
+    ###################
+
+    def generate(self) -> ir.Module:
+        if self.threads:
+            self.define_lock()
+            self.output_lock = self.add_variable("__impl_output_lock", C_INT)
+
+        for fd, name in [(STDOUT, "stdout"), (STDERR, "stderr")]:
+            self.buffers[fd] = (self.add_variable(f"__impl_{name}_buffer", ir.ArrayType(CHAR, BUFFER_SIZE)), self.add_variable(f"__impl_{name}_length", INT))
+
+        for name, (parameters, return_type) in defs.STD_FUNCTIONS.items():
+            function_type = ir.FunctionType(IR_TYPES.get(return_type, VOID), [IR_TYPES[p_type] for _, p_type in parameters])
+            self.functions[name] = ir.Function(self.module, function_type, name=name)
+
+        self.define_write_all()
+        self.define_buffer_write()
+        self.define_flush()
+        self.define_digits()
+        self.define_format_integer()
+        self.define_format_float()
+        self.define_write_file()
+
+        self.define_print()
+        self.define_print_numbers()
+        self.define_format_numbers()
+        self.define_files()
+        self.define_exit_flush()
+
+        return self.module
+
+    def add_variable(self, name: str, value_type: ir.Type, initializer = None, constant: bool = False) -> ir.GlobalVariable:
+        variable = ir.GlobalVariable(self.module, value_type, name=name)
+        variable.initializer = ir.Constant(value_type, initializer)
+        variable.global_constant = constant
+        variable.linkage = "internal"
+
+        return variable
+
+    def add_function(self, name: str, return_type: ir.Type, parameter_types: list) -> ir.Function:
+        function = ir.Function(self.module, ir.FunctionType(return_type, parameter_types), name=name)
+        function.linkage = "internal"
+        self.functions[name] = function
+
+        return function
+
+    def get_libc_function(self, name: str, return_type: ir.Type, parameter_types: list, var_arg: bool = False) -> ir.Function:
+        if name not in self.functions:
+            self.functions[name] = ir.Function(self.module, ir.FunctionType(return_type, parameter_types, var_arg=var_arg), name=name)
+
+        return self.functions[name]
+
+    def get_string(self, builder: ir.IRBuilder, text: str):
+        if text not in self.strings:
+            data = bytearray(text.encode("utf-8") + b"\0")
+            self.strings[text] = self.add_variable(f".str.{len(self.strings)}", ir.ArrayType(CHAR, len(data)), data, constant=True)
+
+        return builder.gep(self.strings[text], [ir.Constant(C_INT, 0), ir.Constant(C_INT, 0)], inbounds=True)
+
+    def memcpy(self, builder: ir.IRBuilder, destination, source, length):
+        builder.call(self.get_libc_function("memcpy", STR, [STR, STR, INT]), [destination, source, length])
+
+    def start(self, name: str) -> tuple:
+        # builder at the entry of the function 'name' and its arguments
+        function = self.functions[name]
+        return ir.IRBuilder(function.append_basic_block("entry")), function.args
+
+    def start_internal(self, name: str, return_type: ir.Type, parameter_types: list) -> tuple:
+        self.add_function(name, return_type, parameter_types)
+        return self.start(name)
+
+    def lock(self, builder: ir.IRBuilder, lock):
+        if lock is not None:
+            builder.call(self.functions["__impl_lock"], [lock])
+
+    def unlock(self, builder: ir.IRBuilder, lock):
+        if lock is not None:
+            builder.call(self.functions["__impl_unlock"], [lock])
+
+    def loop(self, builder: ir.IRBuilder, name: str) -> tuple:
+        # (loop block, end block), the builder is left in the loop block
+        loop_block = builder.append_basic_block(name)
+        end_block = builder.append_basic_block(f"{name}.end")
+
+        builder.branch(loop_block)
+        builder.position_at_end(loop_block)
+
+        return loop_block, end_block
+
+    ###################
+
+    def define_lock(self):
+        # spinlock on an i32, yields the CPU while another thread holds it
+        sched_yield = self.get_libc_function("sched_yield", C_INT, [])
+        builder, (lock,) = self.start_internal("__impl_lock", VOID, [C_INT.as_pointer()])
+
+        loop_block, end_block = self.loop(builder, "acquire")
+        wait_block = builder.append_basic_block("wait")
+        held = builder.atomic_rmw("xchg", lock, ir.Constant(C_INT, 1), "acquire")
+        builder.cbranch(builder.icmp_unsigned("==", held, ir.Constant(C_INT, 0)), end_block, wait_block)
+
+        builder.position_at_end(wait_block)
+        builder.call(sched_yield, [])
+        builder.branch(loop_block)
+
+        builder.position_at_end(end_block)
+        builder.ret_void()
+
+        builder, (lock,) = self.start_internal("__impl_unlock", VOID, [C_INT.as_pointer()])
+        builder.store_atomic(ir.Constant(C_INT, 0), lock, "release", 4)
+        builder.ret_void()
+
+    def define_write_all(self):
+        # write(2) until everything is written or it fails
+        write = self.get_libc_function("write", INT, [C_INT, STR, INT])
+        builder, (fd, data, length) = self.start_internal("__impl_write_all", VOID, [C_INT, STR, INT])
+
+        entry_block = builder.block
+        loop_block, end_block = self.loop(builder, "write")
+        position = builder.phi(INT)
+        position.add_incoming(ir.Constant(INT, 0), entry_block)
+
+        remaining = builder.sub(length, position)
+        continue_block = builder.append_basic_block("continue")
+        builder.cbranch(builder.icmp_signed(">", remaining, ir.Constant(INT, 0)), continue_block, end_block)
+
+        builder.position_at_end(continue_block)
+        written = builder.call(write, [fd, builder.gep(data, [position]), remaining])
+        position.add_incoming(builder.add(position, written), continue_block)
+        builder.cbranch(builder.icmp_signed(">", written, ir.Constant(INT, 0)), loop_block, end_block)
+
+        builder.position_at_end(end_block)
+        builder.ret_void()
+
+    def define_buffer_write(self):
+        # appends to the buffer of 'fd', written directly when it would not fit an empty buffer either
+        builder, (fd, buffer, buffer_length, data, length) = self.start_internal("__impl_buffer_write", VOID, [C_INT, STR, INT.as_pointer(), STR, INT])
+        write_all = self.functions["__impl_write_all"]
+
+        self.lock(builder, self.output_lock)
+
+        entry_block = builder.block
+        flush_block = builder.append_basic_block("flush")
+        direct_block = builder.append_basic_block("direct")
+        append_block = builder.append_basic_block("append")
+
+        used = builder.load(buffer_length)
+        builder.cbranch(builder.icmp_unsigned("<=", length, builder.sub(ir.Constant(INT, BUFFER_SIZE), used)), append_block, flush_block)
+
+        builder.position_at_end(flush_block)
+        builder.call(write_all, [fd, buffer, used])
+        builder.store(ir.Constant(INT, 0), buffer_length)
+        builder.cbranch(builder.icmp_unsigned(">=", length, ir.Constant(INT, BUFFER_SIZE)), direct_block, append_block)
+
+        builder.position_at_end(direct_block)
+        builder.call(write_all, [fd, data, length])
+        self.unlock(builder, self.output_lock)
+        builder.ret_void()
+
+        builder.position_at_end(append_block)
+        offset = builder.phi(INT)
+        offset.add_incoming(used, entry_block)
+        offset.add_incoming(ir.Constant(INT, 0), flush_block)
+
+        self.memcpy(builder, builder.gep(buffer, [offset]), data, length)
+        builder.store(builder.add(offset, length), buffer_length)
+        self.unlock(builder, self.output_lock)
+        builder.ret_void()
+
+    def write_stream(self, builder: ir.IRBuilder, fd: int, data, length):
+        buffer, buffer_length = self.buffers[fd]
+        data_buffer = builder.gep(buffer, [ir.Constant(INT, 0), ir.Constant(INT, 0)], inbounds=True)
+
+        builder.call(self.functions["__impl_buffer_write"], [ir.Constant(C_INT, fd), data_buffer, buffer_length, data, length])
+
+    def define_flush(self):
+        builder, _ = self.start("flush")
+        self.lock(builder, self.output_lock)
+
+        for fd, (buffer, buffer_length) in self.buffers.items():
+            data = builder.gep(buffer, [ir.Constant(INT, 0), ir.Constant(INT, 0)], inbounds=True)
+
+            builder.call(self.functions["__impl_write_all"], [ir.Constant(C_INT, fd), data, builder.load(buffer_length)])
+            builder.store(ir.Constant(INT, 0), buffer_length)
+
+        self.unlock(builder, self.output_lock)
+        builder.ret_void()
+
+    def define_digits(self):
+        # writes the decimal digits of 'value' backwards from 'end', two at a time, returns the first one
+        pairs = "".join(f"{i:02}" for i in range(100)).encode("ascii")
+        table = self.add_variable("__impl_digit_pairs", ir.ArrayType(CHAR, len(pairs)), bytearray(pairs), constant=True)
+
+        builder, (end, value) = self.start_internal("__impl_digits", STR, [STR, INT])
+        entry_block = builder.block
+        pair_type = ir.IntType(16).as_pointer()
+
+        loop_block, end_block = self.loop(builder, "pairs")
+        position = builder.phi(STR)
+        remaining = builder.phi(INT)
+        position.add_incoming(end, entry_block)
+        remaining.add_incoming(value, entry_block)
+
+        pair_block = builder.append_basic_block("pair")
+        builder.cbranch(builder.icmp_unsigned(">=", remaining, ir.Constant(INT, 100)), pair_block, end_block)
+
+        builder.position_at_end(pair_block)
+        quotient = builder.udiv(remaining, ir.Constant(INT, 100))
+        pair = builder.sub(remaining, builder.mul(quotient, ir.Constant(INT, 100)))
+        next_position = builder.gep(position, [ir.Constant(INT, -2)])
+        self.store_pair(builder, table, pair, next_position, pair_type)
+        position.add_incoming(next_position, pair_block)
+        remaining.add_incoming(quotient, pair_block)
+        builder.branch(loop_block)
+
+        # the last one or two digits
+        builder.position_at_end(end_block)
+        two_block = builder.append_basic_block("two")
+        one_block = builder.append_basic_block("one")
+        builder.cbranch(builder.icmp_unsigned(">=", remaining, ir.Constant(INT, 10)), two_block, one_block)
+
+        builder.position_at_end(two_block)
+        first = builder.gep(position, [ir.Constant(INT, -2)])
+        self.store_pair(builder, table, remaining, first, pair_type)
+        builder.ret(first)
+
+        builder.position_at_end(one_block)
+        first = builder.gep(position, [ir.Constant(INT, -1)])
+        builder.store(builder.trunc(builder.add(remaining, ir.Constant(INT, ord("0"))), CHAR), first)
+        builder.ret(first)
+
+    def store_pair(self, builder: ir.IRBuilder, table, pair, destination, pair_type: ir.Type):
+        source = builder.gep(table, [ir.Constant(INT, 0), builder.mul(pair, ir.Constant(INT, 2))], inbounds=True)
+        digits = builder.load(builder.bitcast(source, pair_type), align=1)
+        builder.store(digits, builder.bitcast(destination, pair_type), align=1)
+
+    def define_format_integer(self):
+        # writes 'value' to 'destination' (at least INTEGER_SIZE bytes), returns the length
+        builder, (destination, value, signed) = self.start_internal("__impl_format_integer", INT, [STR, INT, BOOL])
+
+        negative = builder.and_(signed, builder.icmp_signed("<", value, ir.Constant(INT, 0)))
+        magnitude = builder.select(negative, builder.neg(value), value)
+
+        digits = builder.alloca(ir.ArrayType(CHAR, INTEGER_SIZE))
+        end = builder.gep(digits, [ir.Constant(INT, 0), ir.Constant(INT, INTEGER_SIZE)], inbounds=True)
+        first = builder.call(self.functions["__impl_digits"], [end, magnitude])
+        length = builder.sub(builder.ptrtoint(end, INT), builder.ptrtoint(first, INT))
+
+        with builder.if_then(negative):
+            builder.store(ir.Constant(CHAR, ord("-")), destination)
+
+        sign_length = builder.zext(negative, INT)
+        self.memcpy(builder, builder.gep(destination, [sign_length]), first, length)
+        builder.ret(builder.add(length, sign_length))
+
+    def define_format_float(self):
+        # writes 'value' to 'destination' (at least FLOAT_SIZE bytes), returns the length
+        builder, (destination, value, precision) = self.start_internal("__impl_format_float", INT, [STR, FLOAT, INT])
+        function = builder.function
+
+        powers = self.add_variable("__impl_powers_of_ten", ir.ArrayType(INT, MAX_PRECISION + 1), [ir.Constant(INT, 10 ** i) for i in range(MAX_PRECISION + 1)], constant=True)
+
+        precision = builder.select(builder.icmp_unsigned("<", precision, ir.Constant(INT, MAX_PRECISION)), precision, ir.Constant(INT, MAX_PRECISION))
+        scale = builder.load(builder.gep(powers, [ir.Constant(INT, 0), precision], inbounds=True))
+
+        # the sign bit, so -0.0 is formatted as '-0'
+        negative = builder.icmp_signed("<", builder.bitcast(value, INT), ir.Constant(INT, 0))
+        scaled = builder.fmul(builder.select(negative, builder.fneg(value), value), builder.uitofp(scale, FLOAT))
+
+        fast_block = function.append_basic_block("fast")
+        slow_block = function.append_basic_block("slow")
+        builder.cbranch(builder.fcmp_ordered("<", scaled, ir.Constant(FLOAT, FAST_FLOAT_LIMIT)), fast_block, slow_block)
+
+        builder.position_at_end(slow_block)
+        snprintf = self.get_libc_function("snprintf", C_INT, [STR, INT, STR], var_arg=True)
+        length = builder.call(snprintf, [destination, ir.Constant(INT, FLOAT_SIZE), self.get_string(builder, "%.*f"), builder.trunc(precision, C_INT), value])
+        builder.ret(builder.sext(length, INT))
+
+        # the float is m * 2^e exactly, m * 10^precision is at most 2^110 and shifted right by -e, the bits shifted
+        # out are compared with half of the last unit
+        builder.position_at_end(fast_block)
+        bits = builder.bitcast(value, INT)
+        exponent = builder.and_(builder.lshr(bits, ir.Constant(INT, 52)), ir.Constant(INT, 0x7ff))
+        mantissa = builder.and_(bits, ir.Constant(INT, (1 << 52) - 1))
+        subnormal = builder.icmp_unsigned("==", exponent, ir.Constant(INT, 0))
+        mantissa = builder.select(subnormal, mantissa, builder.or_(mantissa, ir.Constant(INT, 1 << 52)))
+        exponent = builder.sub(builder.select(subnormal, ir.Constant(INT, 1), exponent), ir.Constant(INT, 1075))
+
+        product = builder.mul(builder.zext(mantissa, WIDE), builder.zext(scale, WIDE))
+        left = builder.select(builder.icmp_signed(">", exponent, ir.Constant(INT, 0)), exponent, ir.Constant(INT, 0))
+        right = builder.select(builder.icmp_signed("<", exponent, ir.Constant(INT, -127)), ir.Constant(INT, 127), builder.neg(exponent))
+        right = builder.zext(builder.select(builder.icmp_signed("<", right, ir.Constant(INT, 0)), ir.Constant(INT, 0), right), WIDE)
+
+        truncated = builder.shl(builder.lshr(product, right), builder.zext(left, WIDE))
+        remainder = builder.and_(product, builder.sub(builder.shl(ir.Constant(WIDE, 1), right), ir.Constant(WIDE, 1)))
+        half = builder.lshr(builder.shl(ir.Constant(WIDE, 1), right), ir.Constant(WIDE, 1)) # 0 without a remainder
+
+        tie = builder.and_(builder.icmp_unsigned("==", remainder, half), builder.icmp_unsigned("!=", half, ir.Constant(WIDE, 0)))
+        round_block = function.append_basic_block("round")
+        builder.cbranch(tie, slow_block, round_block)
+
+        builder.position_at_end(round_block)
+        rounded = builder.add(builder.trunc(truncated, INT), builder.zext(builder.icmp_unsigned(">", remainder, half), INT))
+        integer = builder.udiv(rounded, scale)
+        fraction = builder.sub(rounded, builder.mul(integer, scale))
+
+        with builder.if_then(negative):
+            builder.store(ir.Constant(CHAR, ord("-")), destination)
+
+        sign_length = builder.zext(negative, INT)
+        integer_length = builder.call(self.functions["__impl_format_integer"], [builder.gep(destination, [sign_length]), integer, ir.Constant(BOOL, 0)])
+        point = builder.gep(destination, [builder.add(sign_length, integer_length)])
+
+        no_fraction_block = function.append_basic_block("no_fraction")
+        fraction_block = function.append_basic_block("fraction")
+        builder.cbranch(builder.icmp_unsigned("==", precision, ir.Constant(INT, 0)), no_fraction_block, fraction_block)
+
+        builder.position_at_end(no_fraction_block)
+        builder.ret(builder.add(sign_length, integer_length))
+
+        # 'precision' digits with leading zeros, written backwards
+        builder.position_at_end(fraction_block)
+        builder.store(ir.Constant(CHAR, ord(".")), point)
+        end = builder.gep(point, [builder.add(precision, ir.Constant(INT, 1))])
+
+        loop_block, end_block = self.loop(builder, "fraction_digits")
+        position = builder.phi(STR)
+        remaining = builder.phi(INT)
+        position.add_incoming(end, fraction_block)
+        remaining.add_incoming(fraction, fraction_block)
+
+        next_position = builder.gep(position, [ir.Constant(INT, -1)])
+        quotient = builder.udiv(remaining, ir.Constant(INT, 10))
+        digit = builder.sub(remaining, builder.mul(quotient, ir.Constant(INT, 10)))
+        builder.store(builder.trunc(builder.add(digit, ir.Constant(INT, ord("0"))), CHAR), next_position)
+
+        position.add_incoming(next_position, loop_block)
+        remaining.add_incoming(quotient, loop_block)
+        builder.cbranch(builder.icmp_unsigned("==", next_position, builder.gep(point, [ir.Constant(INT, 1)])), end_block, loop_block)
+
+        builder.position_at_end(end_block)
+        builder.ret(builder.add(builder.add(sign_length, integer_length), builder.add(precision, ir.Constant(INT, 1))))
+
+    def define_write_file(self):
+        # replaces the file at 'path' with 'length' bytes of 'data', returns whether it succeeded
+        builder, (path, data, length) = self.start_internal("__impl_write_file", BOOL, [STR, STR, INT])
+
+        fopen = self.get_libc_function("fopen", STR, [STR, STR])
+        fwrite = self.get_libc_function("fwrite", INT, [STR, INT, INT, STR])
+        fclose = self.get_libc_function("fclose", C_INT, [STR])
+
+        file = builder.call(fopen, [path, self.get_string(builder, "wb")])
+
+        with builder.if_then(builder.icmp_unsigned("==", file, ir.Constant(STR, None)), likely=False):
+            builder.ret(ir.Constant(BOOL, 0))
+
+        written = builder.call(fwrite, [data, ir.Constant(INT, 1), length, file])
+        closed = builder.icmp_signed("==", builder.call(fclose, [file]), ir.Constant(C_INT, 0))
+        builder.ret(builder.and_(closed, builder.icmp_unsigned("==", written, length)))
+
+    ###################
+
+    def define_print(self):
+        strlen = self.get_libc_function("strlen", INT, [STR])
+
+        for name, fd in [("print", STDOUT), ("eprint", STDERR)]:
+            builder, (text,) = self.start(name)
+            self.write_stream(builder, fd, text, builder.call(strlen, [text]))
+            builder.ret_void()
+
+        builder, (buffer, length) = self.start("print_bytes")
+        available = builder.extract_value(buffer, 1)
+        length = builder.select(builder.icmp_unsigned("<", length, available), length, available)
+        self.write_stream(builder, STDOUT, builder.extract_value(buffer, 0), length)
+        builder.ret_void()
+
+    def define_print_numbers(self):
+        for name, signed in [("print_u64", False), ("print_i64", True)]:
+            builder, (value,) = self.start(name)
+            text = builder.bitcast(builder.alloca(ir.ArrayType(CHAR, INTEGER_SIZE)), STR)
+            length = builder.call(self.functions["__impl_format_integer"], [text, value, ir.Constant(BOOL, signed)])
+            self.write_stream(builder, STDOUT, text, length)
+            builder.ret_void()
+
+        builder, (value, precision) = self.start("print_f64")
+        text = builder.bitcast(builder.alloca(ir.ArrayType(CHAR, FLOAT_SIZE)), STR)
+        length = builder.call(self.functions["__impl_format_float"], [text, value, precision])
+        self.write_stream(builder, STDOUT, text, length)
+        builder.ret_void()
+
+    def define_format_numbers(self):
+        # formatted into a local buffer first, nothing is written when the result does not fit (0 is returned)
+        formats = [
+            ("format_u64", "__impl_format_integer", INTEGER_SIZE, [ir.Constant(BOOL, 0)]),
+            ("format_i64", "__impl_format_integer", INTEGER_SIZE, [ir.Constant(BOOL, 1)]),
+            ("format_f64", "__impl_format_float", FLOAT_SIZE, [])
+        ]
+
+        for name, formatter, size, extra_arguments in formats:
+            builder, (buffer, *arguments) = self.start(name)
+            text = builder.bitcast(builder.alloca(ir.ArrayType(CHAR, size)), STR)
+            length = builder.call(self.functions[formatter], [text] + arguments + extra_arguments)
+
+            with builder.if_then(builder.icmp_unsigned(">", length, builder.extract_value(buffer, 1)), likely=False):
+                builder.ret(ir.Constant(INT, 0))
+
+            self.memcpy(builder, builder.extract_value(buffer, 0), text, length)
+            builder.ret(length)
+
+    def define_files(self):
+        fopen = self.get_libc_function("fopen", STR, [STR, STR])
+        fread = self.get_libc_function("fread", INT, [STR, INT, INT, STR])
+        fclose = self.get_libc_function("fclose", C_INT, [STR])
+        fseek = self.get_libc_function("fseek", C_INT, [STR, INT, C_INT])
+        ftell = self.get_libc_function("ftell", INT, [STR])
+        malloc = self.get_libc_function("malloc", STR, [INT])
+        strlen = self.get_libc_function("strlen", INT, [STR])
+
+        # the whole file as a string, empty when it cannot be read
+        builder, (path,) = self.start("read_file")
+        file = builder.call(fopen, [path, self.get_string(builder, "rb")])
+
+        with builder.if_then(builder.icmp_unsigned("==", file, ir.Constant(STR, None)), likely=False):
+            builder.ret(self.get_string(builder, ""))
+
+        builder.call(fseek, [file, ir.Constant(INT, 0), ir.Constant(C_INT, SEEK_END)])
+        size = builder.call(ftell, [file])
+
+        with builder.if_then(builder.icmp_signed("<", size, ir.Constant(INT, 0)), likely=False):
+            builder.call(fclose, [file])
+            builder.ret(self.get_string(builder, ""))
+
+        builder.call(fseek, [file, ir.Constant(INT, 0), ir.Constant(C_INT, SEEK_SET)])
+        data = builder.call(malloc, [builder.add(size, ir.Constant(INT, 1))])
+        length = builder.call(fread, [data, ir.Constant(INT, 1), size, file])
+        builder.call(fclose, [file])
+        builder.store(ir.Constant(CHAR, 0), builder.gep(data, [length]))
+        builder.ret(data)
+
+        # up to len(buffer) bytes, returns how many were read or -1
+        builder, (path, buffer) = self.start("read_bytes")
+        file = builder.call(fopen, [path, self.get_string(builder, "rb")])
+
+        with builder.if_then(builder.icmp_unsigned("==", file, ir.Constant(STR, None)), likely=False):
+            builder.ret(ir.Constant(INT, -1))
+
+        length = builder.call(fread, [builder.extract_value(buffer, 0), ir.Constant(INT, 1), builder.extract_value(buffer, 1), file])
+        builder.call(fclose, [file])
+        builder.ret(length)
+
+        builder, (path, text) = self.start("write_file")
+        builder.ret(builder.call(self.functions["__impl_write_file"], [path, text, builder.call(strlen, [text])]))
+
+        builder, (path, buffer, length) = self.start("write_bytes")
+        available = builder.extract_value(buffer, 1)
+        length = builder.select(builder.icmp_unsigned("<", length, available), length, available)
+        builder.ret(builder.call(self.functions["__impl_write_file"], [path, builder.extract_value(buffer, 0), length]))
+
+    def define_exit_flush(self):
+        # run at exit, after 'main' returns or 'exit' is called
+        builder, _ = self.start_internal("__impl_flush_at_exit", VOID, [])
+        builder.call(self.functions["flush"], [])
+        builder.ret_void()
+
+        entry_type = ir.LiteralStructType([C_INT, self.functions["__impl_flush_at_exit"].type, STR])
+        destructors_type = ir.ArrayType(entry_type, 1)
+
+        destructors = ir.GlobalVariable(self.module, destructors_type, name="llvm.global_dtors")
+        destructors.initializer = ir.Constant(destructors_type, [ir.Constant(entry_type, [ir.Constant(C_INT, 65535), self.functions["__impl_flush_at_exit"], ir.Constant(STR, None)])])
+        destructors.linkage = "appending"
+
+class TaskRuntimeCodegen(RuntimeCodegen):
+    """The thread pool running parallel loops and spawned tasks (see TASK_FUNCTIONS)
+
+    Every worker thread (the main thread is worker 0) has a deque of tasks: it pushes and pops at the bottom,
+    idle workers steal from the top of the others. The deques are guarded by spinlocks. Workers without tasks
+    sleep on a condition variable until one is pushed. The pool is started by the first parallel loop or spawn.
+    A task is a call of a TASK_TYPE function, it decrements the counter of its group when it returns, joining
+    a group runs (or steals) other tasks until the counter is 0.
+    """
+    def __init__(self):
+        super().__init__(threads=True, name="tasks")
+
+        self.task_type = ir.LiteralStructType([TASK_TYPE.as_pointer(), STR, INT, INT, INT, INT.as_pointer()]) # function, context, 3 arguments, group
+        self.deque_type = ir.LiteralStructType([C_INT, INT, INT, ir.ArrayType(self.task_type, DEQUE_SIZE)]) # lock, top, bottom, tasks
+        self.storage_type = ir.ArrayType(INT, PTHREAD_STORAGE_SIZE)
+
+    def generate(self) -> ir.Module:
+        self.define_lock()
+
+        self.deques = self.add_variable("__impl_deques", ir.ArrayType(self.deque_type, MAX_WORKERS))
+        self.workers = self.add_variable("__impl_workers", INT) # 0 until the pool is started
+        self.queued = self.add_variable("__impl_queued", INT) # tasks in the deques
+        self.sleeping = self.add_variable("__impl_sleeping", INT)
+        self.mutex = self.add_variable("__impl_pool_mutex", self.storage_type)
+        self.condition = self.add_variable("__impl_pool_condition", self.storage_type)
+
+        # initial-exec: programs are executables, the variable is at a fixed offset of the thread pointer
+        self.worker_index = self.add_variable("__impl_worker_index", INT)
+        self.worker_index.storage_class = "thread_local(initialexec)"
+
+        for name, (return_type, parameter_types) in TASK_FUNCTIONS.items():
+            self.functions[name] = ir.Function(self.module, ir.FunctionType(return_type, parameter_types), name=name)
+
+        self.define_push()
+        self.define_pop()
+        self.define_steal()
+        self.define_find()
+        self.define_run()
+        self.define_wake()
+        self.define_worker()
+        self.define_pool_start()
+
+        self.define_parallel_for()
+        self.define_spawn()
+        self.define_join()
+
+        return self.module
+
+    def get_deque(self, builder: ir.IRBuilder, index) -> tuple:
+        # (lock, top, bottom) pointers and the task at 'position' function of the deque of worker 'index'
+        deque = builder.gep(self.deques, [ir.Constant(INT, 0), index], inbounds=True)
+        fields = [builder.gep(deque, [ir.Constant(C_INT, 0), ir.Constant(C_INT, i)], inbounds=True) for i in range(3)]
+
+        def get_task(position):
+            slot = builder.and_(position, ir.Constant(INT, DEQUE_SIZE - 1))
+            return builder.gep(deque, [ir.Constant(C_INT, 0), ir.Constant(C_INT, 3), slot], inbounds=True)
+
+        return fields, get_task
+
+    def get_mutex(self, builder: ir.IRBuilder):
+        return builder.bitcast(self.mutex, STR), builder.bitcast(self.condition, STR)
+
+    def load_relaxed(self, builder: ir.IRBuilder, pointer):
+        # the indices of a deque are read without its lock by thieves
+        return builder.load_atomic(pointer, "monotonic", 8)
+
+    def store_relaxed(self, builder: ir.IRBuilder, value, pointer):
+        builder.store_atomic(value, pointer, "monotonic", 8)
+
+    def copy_task(self, builder: ir.IRBuilder, source, destination):
+        builder.store(builder.load(source), destination)
+
+    def count_queued(self, builder: ir.IRBuilder, delta: int):
+        builder.atomic_rmw("add", self.queued, ir.Constant(INT, delta), "seq_cst")
+
+    def define_push(self):
+        # to the bottom of the deque of the current worker, false when it is full
+        builder, (task,) = self.start_internal("__impl_task_push", BOOL, [self.task_type.as_pointer()])
+        (lock, top, bottom), get_task = self.get_deque(builder, builder.load(self.worker_index))
+
+        builder.call(self.functions["__impl_lock"], [lock])
+        position = builder.load(bottom)
+
+        with builder.if_then(builder.icmp_unsigned(">=", builder.sub(position, builder.load(top)), ir.Constant(INT, DEQUE_SIZE)), likely=False):
+            builder.call(self.functions["__impl_unlock"], [lock])
+            builder.ret(ir.Constant(BOOL, 0))
+
+        self.copy_task(builder, task, get_task(position))
+        self.store_relaxed(builder, builder.add(position, ir.Constant(INT, 1)), bottom)
+        builder.call(self.functions["__impl_unlock"], [lock])
+
+        self.count_queued(builder, 1)
+        builder.ret(ir.Constant(BOOL, 1))
+
+    def define_pop(self):
+        # the last pushed task of the current worker into 'task', false when there is none
+        builder, (task,) = self.start_internal("__impl_task_pop", BOOL, [self.task_type.as_pointer()])
+        (lock, top, bottom), get_task = self.get_deque(builder, builder.load(self.worker_index))
+
+        builder.call(self.functions["__impl_lock"], [lock])
+        position = builder.load(bottom)
+
+        with builder.if_then(builder.icmp_unsigned("==", position, builder.load(top))):
+            builder.call(self.functions["__impl_unlock"], [lock])
+            builder.ret(ir.Constant(BOOL, 0))
+
+        position = builder.sub(position, ir.Constant(INT, 1))
+        self.copy_task(builder, get_task(position), task)
+        self.store_relaxed(builder, position, bottom)
+        builder.call(self.functions["__impl_unlock"], [lock])
+
+        self.count_queued(builder, -1)
+        builder.ret(ir.Constant(BOOL, 1))
+
+    def define_steal(self):
+        # the first pushed task of worker 'victim' into 'task', false when there is none
+        builder, (victim, task) = self.start_internal("__impl_task_steal", BOOL, [INT, self.task_type.as_pointer()])
+        (lock, top, bottom), get_task = self.get_deque(builder, victim)
+
+        # empty deques are skipped without taking their lock
+        with builder.if_then(builder.icmp_unsigned("==", self.load_relaxed(builder, top), self.load_relaxed(builder, bottom))):
+            builder.ret(ir.Constant(BOOL, 0))
+
+        builder.call(self.functions["__impl_lock"], [lock])
+        position = builder.load(top)
+
+        with builder.if_then(builder.icmp_unsigned("==", position, builder.load(bottom))):
+            builder.call(self.functions["__impl_unlock"], [lock])
+            builder.ret(ir.Constant(BOOL, 0))
+
+        self.copy_task(builder, get_task(position), task)
+        self.store_relaxed(builder, builder.add(position, ir.Constant(INT, 1)), top)
+        builder.call(self.functions["__impl_unlock"], [lock])
+
+        self.count_queued(builder, -1)
+        builder.ret(ir.Constant(BOOL, 1))
+
+    def define_find(self):
+        # a task of the current worker, or stolen from the next workers in turn
+        builder, (task,) = self.start_internal("__impl_task_find", BOOL, [self.task_type.as_pointer()])
+
+        with builder.if_then(builder.call(self.functions["__impl_task_pop"], [task])):
+            builder.ret(ir.Constant(BOOL, 1))
+
+        workers = builder.load(self.workers)
+        index = builder.load(self.worker_index)
+        entry_block = builder.block
+
+        loop_block, end_block = self.loop(builder, "steal")
+        offset = builder.phi(INT)
+        offset.add_incoming(ir.Constant(INT, 1), entry_block)
+
+        try_block = builder.append_basic_block("try")
+        builder.cbranch(builder.icmp_unsigned("<", offset, workers), try_block, end_block)
+
+        builder.position_at_end(try_block)
+        victim = builder.urem(builder.add(index, offset), workers)
+
+        with builder.if_then(builder.call(self.functions["__impl_task_steal"], [victim, task])):
+            builder.ret(ir.Constant(BOOL, 1))
+
+        offset.add_incoming(builder.add(offset, ir.Constant(INT, 1)), builder.block)
+        builder.branch(loop_block)
+
+        builder.position_at_end(end_block)
+        builder.ret(ir.Constant(BOOL, 0))
+
+    def define_run(self):
+        builder, (task,) = self.start_internal("__impl_task_run", VOID, [self.task_type.as_pointer()])
+        fields = [builder.load(builder.gep(task, [ir.Constant(C_INT, 0), ir.Constant(C_INT, i)], inbounds=True)) for i in range(6)]
+
+        builder.call(fields[0], fields[1:5])
+        builder.atomic_rmw("sub", fields[5], ir.Constant(INT, 1), "acq_rel")
+        builder.ret_void()
+
+    def define_wake(self):
+        # wakes one sleeping worker, or all of them
+        builder, (wake_all,) = self.start_internal("__impl_pool_wake", VOID, [BOOL])
+        mutex, condition = self.get_mutex(builder)
+
+        with builder.if_then(builder.icmp_unsigned("==", builder.load_atomic(self.sleeping, "seq_cst", 8), ir.Constant(INT, 0))):
+            builder.ret_void()
+
+        builder.call(self.get_libc_function("pthread_mutex_lock", C_INT, [STR]), [mutex])
+
+        with builder.if_else(wake_all) as (then, otherwise):
+            with then:
+                builder.call(self.get_libc_function("pthread_cond_broadcast", C_INT, [STR]), [condition])
+            with otherwise:
+                builder.call(self.get_libc_function("pthread_cond_signal", C_INT, [STR]), [condition])
+
+        builder.call(self.get_libc_function("pthread_mutex_unlock", C_INT, [STR]), [mutex])
+        builder.ret_void()
+
+    def define_worker(self):
+        # thread of the workers 1 and up, the argument is the index
+        builder, (argument,) = self.start_internal("__impl_worker_main", STR, [STR])
+        mutex, condition = self.get_mutex(builder)
+        builder.store(builder.ptrtoint(argument, INT), self.worker_index)
+
+        task = builder.alloca(self.task_type)
+        loop_block = builder.append_basic_block("work")
+        builder.branch(loop_block)
+
+        builder.position_at_end(loop_block)
+        run_block = builder.append_basic_block("run")
+        sleep_block = builder.append_basic_block("sleep")
+        builder.cbranch(builder.call(self.functions["__impl_task_find"], [task]), run_block, sleep_block)
+
+        builder.position_at_end(run_block)
+        builder.call(self.functions["__impl_task_run"], [task])
+        builder.branch(loop_block)
+
+        # 'sleeping' is incremented before 'queued' is checked and pushes increment 'queued' before checking
+        # 'sleeping' (both sequentially consistent), so a push either sees the sleeper or is seen by it
+        builder.position_at_end(sleep_block)
+        builder.call(self.get_libc_function("pthread_mutex_lock", C_INT, [STR]), [mutex])
+        builder.atomic_rmw("add", self.sleeping, ir.Constant(INT, 1), "seq_cst")
+
+        wait_block, awake_block = self.loop(builder, "wait")
+        wait_call_block = builder.append_basic_block("wait.call")
+        builder.cbranch(builder.icmp_unsigned("==", builder.load_atomic(self.queued, "seq_cst", 8), ir.Constant(INT, 0)), wait_call_block, awake_block)
+
+        builder.position_at_end(wait_call_block)
+        builder.call(self.get_libc_function("pthread_cond_wait", C_INT, [STR, STR]), [condition, mutex])
+        builder.branch(wait_block)
+
+        builder.position_at_end(awake_block)
+        builder.atomic_rmw("sub", self.sleeping, ir.Constant(INT, 1), "seq_cst")
+        builder.call(self.get_libc_function("pthread_mutex_unlock", C_INT, [STR]), [mutex])
+        builder.branch(loop_block)
+
+    def define_pool_start(self):
+        # run by the main thread before its first parallel loop or spawn
+        builder, _ = self.start_internal("__impl_pool_start", VOID, [])
+        mutex, condition = self.get_mutex(builder)
+
+        with builder.if_then(builder.icmp_unsigned("!=", builder.load(self.workers), ir.Constant(INT, 0)), likely=True):
+            builder.ret_void()
+
+        getenv = self.get_libc_function("getenv", STR, [STR])
+        atoi = self.get_libc_function("atoi", C_INT, [STR])
+        sysconf = self.get_libc_function("sysconf", INT, [C_INT])
+
+        variable = builder.call(getenv, [self.get_string(builder, THREADS_VARIABLE)])
+        requested = builder.alloca(INT)
+        builder.store(builder.call(sysconf, [ir.Constant(C_INT, SC_NPROCESSORS_ONLN)]), requested)
+
+        with builder.if_then(builder.icmp_unsigned("!=", variable, ir.Constant(STR, None))):
+            builder.store(builder.sext(builder.call(atoi, [variable]), INT), requested)
+
+        count = builder.load(requested)
+        count = builder.select(builder.icmp_signed("<", count, ir.Constant(INT, 1)), ir.Constant(INT, 1), count)
+        count = builder.select(builder.icmp_signed(">", count, ir.Constant(INT, MAX_WORKERS)), ir.Constant(INT, MAX_WORKERS), count)
+
+        builder.call(self.get_libc_function("pthread_mutex_init", C_INT, [STR, STR]), [mutex, ir.Constant(STR, None)])
+        builder.call(self.get_libc_function("pthread_cond_init", C_INT, [STR, STR]), [condition, ir.Constant(STR, None)])
+
+        # the workers read the count, a thread that cannot be created leaves an empty deque behind
+        builder.store(count, self.workers)
+
+        pthread_create = self.get_libc_function("pthread_create", C_INT, [INT.as_pointer(), STR, self.functions["__impl_worker_main"].type, STR])
+        thread = builder.alloca(INT)
+        entry_block = builder.block
+
+        loop_block, end_block = self.loop(builder, "create")
+        index = builder.phi(INT)
+        index.add_incoming(ir.Constant(INT, 1), entry_block)
+
+        create_block = builder.append_basic_block("create.thread")
+        builder.cbranch(builder.icmp_signed("<", index, count), create_block, end_block)
+
+        builder.position_at_end(create_block)
+        builder.call(pthread_create, [thread, ir.Constant(STR, None), self.functions["__impl_worker_main"], builder.inttoptr(index, STR)])
+        index.add_incoming(builder.add(index, ir.Constant(INT, 1)), create_block)
+        builder.branch(loop_block)
+
+        builder.position_at_end(end_block)
+        builder.ret_void()
+
+    def define_parallel_for(self):
+        # runs body(context, chunk, low, high) over the chunks of begin..end-1 (begin < end), returns the number of chunks
+        builder, (body, context, begin, end) = self.start("__impl_parallel_for")
+        builder.call(self.functions["__impl_pool_start"], [])
+
+        length = builder.sub(end, begin)
+        many = builder.icmp_unsigned(">=", length, ir.Constant(INT, PARALLEL_CHUNKS * PARALLEL_MIN_CHUNK))
+        rounded_up = builder.udiv(builder.add(length, ir.Constant(INT, PARALLEL_MIN_CHUNK - 1)), ir.Constant(INT, PARALLEL_MIN_CHUNK))
+        count = builder.select(many, ir.Constant(INT, PARALLEL_CHUNKS), rounded_up)
+
+        # chunk c starts at c * size + min(c, rest), the first 'rest' chunks have an extra iteration
+        size = builder.udiv(length, count)
+        rest = builder.urem(length, count)
+
+        def get_range(chunk):
+            extra = builder.icmp_unsigned("<", chunk, rest)
+            low = builder.add(begin, builder.add(builder.mul(chunk, size), builder.select(extra, chunk, rest)))
+            return low, builder.add(low, builder.add(size, builder.zext(extra, INT)))
+
+        inline_block = builder.append_basic_block("inline")
+        push_block = builder.append_basic_block("push")
+        serial = builder.icmp_unsigned("==", builder.load(self.workers), ir.Constant(INT, 1))
+        builder.cbranch(builder.or_(serial, builder.icmp_unsigned("==", count, ir.Constant(INT, 1))), inline_block, push_block)
+
+        # the same chunks without threads, the partial results don't depend on the number of threads
+        builder.position_at_end(inline_block)
+        loop_block, end_block = self.loop(builder, "chunks")
+        chunk = builder.phi(INT)
+        chunk.add_incoming(ir.Constant(INT, 0), inline_block)
+        low, high = get_range(chunk)
+        builder.call(body, [context, chunk, low, high])
+        next_chunk = builder.add(chunk, ir.Constant(INT, 1))
+        chunk.add_incoming(next_chunk, builder.block)
+        builder.cbranch(builder.icmp_unsigned("<", next_chunk, count), loop_block, end_block)
+
+        builder.position_at_end(end_block)
+        builder.ret(count)
+
+        # pushed last to first, so the current worker pops them in order and thieves take the last ones
+        builder.position_at_end(push_block)
+        group = builder.alloca(INT)
+        builder.store(count, group)
+        task = builder.alloca(self.task_type)
+
+        loop_block, end_block = self.loop(builder, "push.chunks")
+        remaining = builder.phi(INT)
+        remaining.add_incoming(count, push_block)
+        chunk = builder.sub(remaining, ir.Constant(INT, 1))
+        low, high = get_range(chunk)
+
+        for i, value in enumerate([body, context, chunk, low, high, group]):
+            builder.store(value, builder.gep(task, [ir.Constant(C_INT, 0), ir.Constant(C_INT, i)], inbounds=True))
+
+        with builder.if_then(builder.not_(builder.call(self.functions["__impl_task_push"], [task])), likely=False):
+            builder.call(self.functions["__impl_task_run"], [task])
+
+        remaining.add_incoming(chunk, builder.block)
+        builder.cbranch(builder.icmp_unsigned("!=", chunk, ir.Constant(INT, 0)), loop_block, end_block)
+
+        builder.position_at_end(end_block)
+        builder.call(self.functions["__impl_pool_wake"], [ir.Constant(BOOL, 1)])
+        builder.call(self.functions["__impl_join"], [group])
+        builder.ret(count)
+
+    def define_spawn(self):
+        # runs body(context, 0, 0, 0) as a task of 'group', at once when it cannot be queued
+        builder, (body, context, group) = self.start("__impl_spawn")
+        builder.call(self.functions["__impl_pool_start"], [])
+        builder.atomic_rmw("add", group, ir.Constant(INT, 1), "acq_rel")
+
+        task = builder.alloca(self.task_type)
+
+        for i, value in enumerate([body, context, ir.Constant(INT, 0), ir.Constant(INT, 0), ir.Constant(INT, 0), group]):
+            builder.store(value, builder.gep(task, [ir.Constant(C_INT, 0), ir.Constant(C_INT, i)], inbounds=True))
+
+        parallel = builder.icmp_unsigned(">", builder.load(self.workers), ir.Constant(INT, 1))
+
+        with builder.if_then(parallel, likely=True):
+            with builder.if_then(builder.call(self.functions["__impl_task_push"], [task]), likely=True):
+                builder.call(self.functions["__impl_pool_wake"], [ir.Constant(BOOL, 0)])
+                builder.ret_void()
+
+        builder.call(self.functions["__impl_task_run"], [task])
+        builder.ret_void()
+
+    def define_join(self):
+        # runs tasks (of any group) until the tasks of 'group' are done
+        builder, (group,) = self.start("__impl_join")
+        sched_yield = self.get_libc_function("sched_yield", C_INT, [])
+        task = builder.alloca(self.task_type)
+
+        loop_block, end_block = self.loop(builder, "join")
+        help_block = builder.append_basic_block("help")
+        run_block = builder.append_basic_block("run")
+        wait_block = builder.append_basic_block("wait")
+        builder.cbranch(builder.icmp_unsigned("==", builder.load_atomic(group, "acquire", 8), ir.Constant(INT, 0)), end_block, help_block)
+
+        builder.position_at_end(help_block)
+        builder.cbranch(builder.call(self.functions["__impl_task_find"], [task]), run_block, wait_block)
+
+        builder.position_at_end(run_block)
+        builder.call(self.functions["__impl_task_run"], [task])
+        builder.branch(loop_block)
+
+        builder.position_at_end(wait_block)
+        builder.call(sched_yield, [])
+        builder.branch(loop_block)
+
+        builder.position_at_end(end_block)
+        builder.ret_void()
+
+def generate(threads: bool = False) -> ir.Module:
+    return RuntimeCodegen(threads).generate()
+
+def generate_tasks() -> ir.Module:
+    return TaskRuntimeCodegen().generate()
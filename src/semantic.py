@@ -0,0 +1,888 @@
+# Semantic analysis
+#
+# Runs between the parser and codegen and annotates every expression with its concrete type
+# (one of defs.TYPES) in 'concrete_type', binary expressions also with 'operand_type', the type
+# both operands are converted to before the operation. Promotion rules:
+#
+#   literals        take the type of the other operand, or of their context (the declared type of the
+#                   variable, parameter or return value), when the value fits into it, otherwise
+#                   i64 (u64 for values above its range) and f64
+#   int op int      same signedness: the wider type, mixed: the signed type if it is wider,
+#                   otherwise the unsigned type of the larger width (u32 + i64 -> i64, u64 + i32 -> u64)
+#   int op float    the float type, f32 op f64 is f64
+#   bool, char      are u8 in arithmetic
+#   shifts          the type of the left operand
+#   comparisons     bool, the operands are compared in their promoted type
+#   and, or, xor    bool
+#   vectors         arithmetic is element-wise on two vectors of the same type, a scalar operand is
+#                   converted to the lane type and copied to all lanes (v * 2.0), there are no comparisons
+#
+# Array indexes are bounds checked at runtime, unless the index is a local variable compared to the
+# array length (or a constant not above it) by a condition around the access, and not assigned since:
+#
+#   while i < len(values) {   // or 'i < 16' for a [T; 16], in a 'while' or an 'if'
+#       total += values[i]    // no check
+#       i += 1
+#   }
+#
+# The iterations of a parallel loop ('@parallel' on a 'while i < n { ... i += 1 }' loop) run concurrently:
+#
+#   the index       is private to every iteration, 'n' is evaluated once before the loop and the index
+#                   equals it after the loop (if it ran at all)
+#   body locals     are private to an iteration and not visible after the loop
+#   outer locals    are only read, except reductions: updated with 'x += e', 'x *= e', 'x &&= e' or
+#                   'x ||= e' only and not read in the loop, the partial results are combined in
+#                   iteration order (the same for any number of threads)
+#   globals, arrays are shared, iterations writing the same variable or element race (undefined result)
+#
+# 'break', 'continue' (outside nested loops), 'return', 'spawn' and 'join' cannot be used in the body.
+# 'spawn f(x)' runs a call as a task and 'v = spawn f(x)' stores its result into the local 'v' when it
+# finishes. 'join' waits for the tasks spawned by the current call, so does returning from the function.
+#
+# A '@memoize' function caches its results by its arguments (numbers, bool and char only), so it has to
+# be pure: it cannot assign global variables, read the ones the program changes (assigns or passes as a
+# slice), call '@import_symbol' or other imported functions (the standard runtime's 'format_*' aside),
+# and every function it calls has to be pure too (recursion is fine).
+
+import defs
+import implang_types
+import lexer
+import logger
+import parser
+
+COMPARISON_OPERATIONS = frozenset(["EQUALS", "NOT_EQUALS", "GREATER_THAN", "LESS_THAN", "GREATER_THAN_OR_EQUAL", "LESS_THAN_OR_EQUAL"])
+LOGICAL_OPERATIONS = frozenset(["AND", "OR", "XOR"])
+SHIFT_OPERATIONS = frozenset(["BITWISE_LEFT_SHIFT", "BITWISE_RIGHT_SHIFT"])
+BITWISE_OPERATIONS = frozenset(["BITWISE_AND", "BITWISE_OR", "BITWISE_XOR"]) | SHIFT_OPERATIONS
+ARITHMETIC_OPERATIONS = frozenset(["PLUS", "MINUS", "MULTIPLY", "DIVIDE", "MODULO", "POWER"]) | BITWISE_OPERATIONS
+
+REDUCTION_OPERATIONS = frozenset(["PLUS", "MULTIPLY", "AND", "OR"])
+
+DEFAULT_INT_TYPE = "i64"
+DEFAULT_FLOAT_TYPE = "f64"
+ARITHMETIC_TYPES = {"bool": "u8", "char": "u8"}
+
+class SemanticError(Exception):
+    """An error found by the semantic analysis, e.g. a value of the wrong type"""
+    def __init__(self, token, message: str):
+        self.token = token
+        self.message = message
+
+def get_token(node):
+    # the token of 'node' diagnostics point to, None for nodes without one
+    for attr in ["token", "name_token", "func_token"]:
+        token = getattr(node, attr, None)
+
+        if token is not None:
+            return token
+
+    return None
+
+def get_constant_int(node):
+    # the integer value of an INTEGER or CHAR literal, None for anything else
+    if not isinstance(node, parser.ValueNode):
+        return None
+
+    if node.value_type == "INTEGER":
+        return int(node.value)
+
+    if node.value_type == "CHAR":
+        return ord(lexer.unescape(node.value[1:-1]))
+
+    return None
+
+def get_switch_cases(if_node: parser.IfNode, min_cases: int):
+    """Match 'if x == C1 {...} else if x == C2 {...} ...' chains of at least 'min_cases' arms, returns (subject, [(constant, body), ...])
+    or None. codegen and the MIR builder lower them to a switch"""
+    arms = [if_node] + if_node.else_ifs
+
+    if len(arms) < min_cases:
+        return None
+
+    subject = None
+    cases = []
+    seen = set()
+
+    for arm in arms:
+        condition = arm.condition
+
+        if not isinstance(condition, parser.ExprNode) or condition.operation != "EQUALS":
+            return None
+
+        if isinstance(condition.left, parser.VariableNode):
+            variable, constant = condition.left, get_constant_int(condition.right)
+        elif isinstance(condition.right, parser.VariableNode):
+            variable, constant = condition.right, get_constant_int(condition.left)
+        else:
+            return None
+
+        if constant is None or variable.value_type not in ["INTEGER", "CHAR"]:
+            return None
+
+        if not implang_types.fits(constant, variable.concrete_type):
+            return None # never equal, the comparison is done in a wider type (see promote)
+
+        if subject is None:
+            subject = variable
+        elif variable.name != subject.name:
+            return None
+
+        if constant in seen:
+            continue # unreachable arm, the earlier one always wins
+
+        seen.add(constant)
+        cases.append((constant, arm.body))
+
+    return subject, cases
+
+def get_literal_value(node):
+    # the value of an integer or float literal (optionally negated), None for anything else
+    if isinstance(node, parser.UnaryExprNode) and node.operation == "MINUS":
+        value = get_literal_value(node.right)
+        return -value if value is not None else None
+
+    if not isinstance(node, parser.ValueNode):
+        return None
+
+    if node.value_type == "INTEGER":
+        return int(node.value)
+
+    if node.value_type == "FLOAT":
+        return float(node.value)
+
+    return None
+
+def is_untyped(node) -> bool:
+    # literals and constant arithmetic on them take the type of their context
+    if isinstance(node, parser.ValueNode):
+        return node.value_type in ["INTEGER", "FLOAT"]
+
+    if isinstance(node, parser.UnaryExprNode):
+        return node.operation in ["PLUS", "MINUS", "BITWISE_NOT"] and is_untyped(node.right)
+
+    if isinstance(node, parser.ExprNode):
+        return node.operation in ARITHMETIC_OPERATIONS and is_untyped(node.left) and is_untyped(node.right)
+
+    return False
+
+def get_literal_type(value, expected: str) -> str:
+    if implang_types.is_vector(expected):
+        expected = implang_types.get_element_type(expected) # copied to all lanes
+
+    if expected is not None and implang_types.is_numeric(expected) and implang_types.fits(value, expected):
+        if isinstance(value, int) or implang_types.is_float(expected):
+            return expected
+
+    if isinstance(value, float):
+        return DEFAULT_FLOAT_TYPE
+
+    for type_name in [DEFAULT_INT_TYPE, "u64"]:
+        if implang_types.fits(value, type_name):
+            return type_name
+
+    return None
+
+def promote(left: str, right: str) -> str:
+    """The type the operands of a binary arithmetic operation or comparison are converted to"""
+    left = ARITHMETIC_TYPES.get(left, left)
+    right = ARITHMETIC_TYPES.get(right, right)
+
+    if left == right:
+        return left
+
+    if implang_types.is_float(left) or implang_types.is_float(right):
+        floats = [t for t in [left, right] if implang_types.is_float(t)]
+        return max(floats, key=implang_types.get_width)
+
+    if implang_types.is_signed(left) == implang_types.is_signed(right):
+        return max([left, right], key=implang_types.get_width)
+
+    signed, unsigned = (left, right) if implang_types.is_signed(left) else (right, left)
+
+    if implang_types.get_width(signed) > implang_types.get_width(unsigned):
+        return signed
+
+    return unsigned
+
+def can_convert(from_type: str, to_type: str) -> bool:
+    if from_type == to_type:
+        return True
+
+    if implang_types.is_vector(from_type) or implang_types.is_vector(to_type):
+        # scalars are copied to all lanes
+        return not implang_types.is_vector(from_type) and implang_types.is_numeric(ARITHMETIC_TYPES.get(from_type, from_type))
+
+    if implang_types.is_array_or_slice(from_type) or implang_types.is_array_or_slice(to_type):
+        # arrays are passed and assigned to slices by reference
+        return implang_types.is_array(from_type) and implang_types.is_slice(to_type) \
+            and implang_types.get_element_type(from_type) == implang_types.get_element_type(to_type)
+
+    # numbers, bool and char convert to each other, strings only to strings
+    return "str" not in [from_type, to_type]
+
+def get_bounds(condition) -> set:
+    # (variable, bound) facts that hold while 'condition' is true: 'i < 16' gives ('i', 16) and
+    # 'i < len(a)' gives ('i', 'a'), only for unsigned comparisons, so 'i' is not negative either
+    if not isinstance(condition, parser.ExprNode):
+        return set()
+
+    if condition.operation == "AND":
+        return get_bounds(condition.left) | get_bounds(condition.right)
+
+    if condition.operation == "LESS_THAN":
+        index, bound = condition.left, condition.right
+    elif condition.operation == "GREATER_THAN":
+        index, bound = condition.right, condition.left
+    else:
+        return set()
+
+    if not isinstance(index, parser.VariableNode) or not implang_types.is_integer(condition.operand_type) or implang_types.is_signed(condition.operand_type):
+        return set()
+
+    if isinstance(bound, parser.ValueNode) and bound.value_type == "INTEGER":
+        return {(index.name, int(bound.value))}
+
+    if isinstance(bound, parser.LenNode) and isinstance(bound.value, parser.VariableNode):
+        return {(index.name, bound.value.name)}
+
+    return set()
+
+def get_assigned(node) -> set:
+    # names of the variables a statement assigns to (or declares)
+    if isinstance(node, parser.BlockNode):
+        return set().union(*[get_assigned(statement) for statement in node.statements])
+
+    if isinstance(node, (parser.AssignmentNode, parser.VarNode)):
+        return {node.name}
+
+    if isinstance(node, parser.IfNode):
+        blocks = [arm.body for arm in [node] + node.else_ifs] + [node.else_statement]
+        return set().union(*[get_assigned(block) for block in blocks if block is not None])
+
+    if isinstance(node, parser.WhileNode):
+        return get_assigned(node.body)
+
+    return set()
+
+def is_increment(node, name: str) -> bool:
+    # 'name += 1'
+    if not isinstance(node, parser.AssignmentNode) or node.name != name or not isinstance(node.value, parser.ExprNode):
+        return False
+
+    value = node.value
+    return value.operation == "PLUS" and isinstance(value.left, parser.VariableNode) and value.left.name == name \
+        and isinstance(value.right, parser.ValueNode) and value.right.value_type == "INTEGER" and int(value.right.value) == 1
+
+def remove_bounds(bounds: set, assigned: set) -> set:
+    return {(variable, bound) for variable, bound in bounds if variable not in assigned and bound not in assigned}
+
+class Analyzer:
+    def __init__(self, file: str, program: parser.Program):
+        self.file = file
+        self.program = program
+
+        self.functions = {} # name -> parser.FuncNode
+        self.global_variables = {} # name -> type
+        self.locals = {} # name -> type
+        self.return_type = None # return type of the function being analyzed
+        self.bounds = set() # facts of get_bounds that hold at the statement being analyzed
+
+        # the purity of the '@memoize' functions is checked after all functions, see check_memoized
+        self.memoized = [] # parser.FuncNode with a cache policy
+        self.defined = set() # names of the functions defined by the program
+        self.effects = {} # function name -> (token, description) of its first side effect
+        self.calls = {} # function name -> [(called name, token)] of the calls of functions defined by the program
+        self.global_reads = {} # function name -> [(variable name, token)] of the reads of global variables
+        self.changed_globals = set() # global variables assigned or passed as a slice by any function
+
+    def analyze(self):
+        self.analyze_declarations()
+
+        for statement in self.program.statements:
+            if isinstance(statement, parser.FuncNode):
+                self.analyze_function(statement)
+
+        self.check_memoized()
+
+    def analyze_declarations(self):
+        for attribute in self.program.attributes:
+            if attribute.name == "@import_symbol" and isinstance(attribute.value, parser.FuncNode):
+                self.functions[attribute.value.name] = attribute.value
+            elif attribute.name == "@import" and isinstance(attribute.value, parser.ImportNode):
+                for function in attribute.value.functions:
+                    self.functions[function.name] = function
+
+        for statement in self.program.statements:
+            if isinstance(statement, parser.FuncNode):
+                self.functions[statement.name] = statement
+                self.defined.add(statement.name)
+
+                if statement.memoize is not None:
+                    self.memoized.append(statement)
+
+        for statement in self.program.statements:
+            if isinstance(statement, parser.VarNode):
+                self.check_type(statement.value_type, statement.value_type_token)
+
+                if statement.value is not None:
+                    self.analyze_value(statement.value, statement.value_type)
+
+                self.global_variables[statement.name] = statement.value_type
+
+    def check_type(self, type_name: str, token, allow_slice: bool = False):
+        if type_name is None:
+            return
+
+        if implang_types.is_array_or_slice(type_name):
+            if implang_types.is_slice(type_name) and not allow_slice:
+                raise SemanticError(token, f"Slices ('{type_name}') can only be parameters and local variables")
+
+            self.check_type(implang_types.get_element_type(type_name), token)
+            return
+
+        if type_name not in defs.TYPES:
+            raise SemanticError(token, f"Unknown type '{type_name}'")
+
+    def analyze_function(self, node: parser.FuncNode):
+        if implang_types.is_array_or_slice(node.return_type):
+            raise SemanticError(node.return_type_token, "Functions cannot return arrays or slices")
+
+        self.check_type(node.return_type, node.return_type_token)
+
+        self.locals = {}
+        self.return_type = node.return_type
+        self.bounds = set()
+
+        for parameter in node.parameters:
+            if implang_types.is_array(parameter.parameter_type):
+                raise SemanticError(parameter.parameter_type_token, f"Arrays are passed as slices, use '[{implang_types.get_element_type(parameter.parameter_type)}]'")
+
+            self.check_type(parameter.parameter_type, parameter.parameter_type_token, allow_slice=True)
+            self.locals[parameter.name] = parameter.parameter_type
+
+        if node.memoize is not None:
+            self.check_memoized_signature(node)
+
+        if node.comptime:
+            self.check_comptime_signature(node)
+
+        if node.body is not None:
+            self.analyze_block(node.body)
+
+            if self.memoized:
+                self.collect_effects(node)
+
+    def check_memoized_signature(self, node: parser.FuncNode):
+        # the arguments are the key of the cache, the result its value
+        if node.return_type is None:
+            raise SemanticError(node.name_token, f"'@memoize' function '{node.name}' has to return a value")
+
+        for parameter in node.parameters:
+            parameter_type = parameter.parameter_type
+
+            if not implang_types.is_numeric(parameter_type) and parameter_type not in ["bool", "char"]:
+                raise SemanticError(parameter.parameter_type_token, f"Parameters of '@memoize' functions can only be numbers, 'bool' or 'char', got '{parameter_type}'")
+
+    def check_comptime_signature(self, node: parser.FuncNode):
+        # the calls are replaced by the returned constant, see comptime.py
+        if node.name == "main":
+            raise SemanticError(node.name_token, "'main' cannot be '@comptime', it is called by the program's entry point")
+
+        if node.return_type is None:
+            raise SemanticError(node.name_token, f"'@comptime' function '{node.name}' has to return a value")
+
+        for parameter in node.parameters:
+            parameter_type = parameter.parameter_type
+
+            if not implang_types.is_numeric(parameter_type) and parameter_type not in ["bool", "char", "str"]:
+                raise SemanticError(parameter.parameter_type_token, f"Parameters of '@comptime' functions can only be numbers, 'bool', 'char' or 'str', got '{parameter_type}'")
+
+    def collect_effects(self, node: parser.FuncNode):
+        # the direct side effects of an analyzed function (its locals are known), its calls and global reads
+        calls = self.calls.setdefault(node.name, [])
+        reads = self.global_reads.setdefault(node.name, [])
+        effect = None
+        pending = [node.body]
+
+        while pending:
+            child = pending.pop()
+            pending.extend(reversed(parser.get_children(child)))
+
+            if isinstance(child, parser.AssignmentNode) and child.name not in self.locals:
+                self.changed_globals.add(child.name)
+                effect = effect or (child.token, f"assigns the global variable '{child.name}'")
+
+            elif isinstance(child, parser.IndexAssignmentNode):
+                target = child.target
+
+                while isinstance(target, parser.IndexNode):
+                    target = target.target
+
+                if isinstance(target, parser.VariableNode) and target.name not in self.locals:
+                    self.changed_globals.add(target.name)
+                    effect = effect or (child.token, f"assigns an element of the global variable '{target.name}'")
+
+            elif isinstance(child, parser.CallNode):
+                for argument in child.arguments:
+                    # a slice argument can be written by the callee
+                    if isinstance(argument, parser.VariableNode) and argument.name not in self.locals and implang_types.is_array(argument.concrete_type):
+                        self.changed_globals.add(argument.name)
+
+                if child.name in self.defined:
+                    calls.append((child.name, child.name_token))
+                elif child.name not in defs.STD_PURE_FUNCTIONS:
+                    effect = effect or (child.name_token, f"calls the imported function '{child.name}'")
+
+            elif isinstance(child, parser.VariableNode) and child.name not in self.locals:
+                reads.append((child.name, child.token))
+
+        if effect is not None:
+            self.effects[node.name] = effect
+
+    def check_memoized(self):
+        # a function is pure without side effects and reads of changed globals, and when it only calls pure functions
+        if not self.memoized:
+            return
+
+        effects = dict(self.effects)
+
+        for name, reads in self.global_reads.items():
+            changed = [(variable, token) for variable, token in reads if variable in self.changed_globals]
+
+            if name not in effects and changed:
+                variable, token = changed[0]
+                effects[name] = (token, f"reads the global variable '{variable}', which the program changes")
+
+        found = True
+
+        while found:
+            found = False
+
+            for name, calls in self.calls.items():
+                impure = [(called, token) for called, token in calls if called in effects]
+
+                if name not in effects and impure:
+                    called, token = impure[0]
+                    effects[name] = (token, f"calls '{called}', which {effects[called][1]}")
+                    found = True
+
+        for function in self.memoized:
+            if function.name in effects:
+                token, description = effects[function.name]
+                raise SemanticError(token, f"'@memoize' function '{function.name}' is not pure, it {description}")
+
+    def analyze_block(self, block: parser.BlockNode):
+        for statement in block.statements:
+            self.analyze_statement(statement)
+            self.bounds = remove_bounds(self.bounds, get_assigned(statement))
+
+    def analyze_nested_block(self, block: parser.BlockNode, bounds: set):
+        # the bounds inside a block are restored after it, analyze_block removes the ones it invalidates
+        outer_bounds = self.bounds
+        self.bounds = bounds
+        self.analyze_block(block)
+        self.bounds = outer_bounds
+
+    def analyze_statement(self, node):
+        if isinstance(node, parser.VarNode):
+            self.check_type(node.value_type, node.value_type_token, allow_slice=True)
+
+            if node.value is not None:
+                self.analyze_value(node.value, node.value_type)
+
+            self.locals[node.name] = node.value_type
+
+        elif isinstance(node, parser.AssignmentNode):
+            node.concrete_type = self.get_variable_type(node.name, node.token)
+
+            if isinstance(node.value, parser.SpawnNode) and node.name not in self.locals:
+                raise SemanticError(node.token, "The result of 'spawn' can only be assigned to a local variable")
+
+            self.analyze_value(node.value, node.concrete_type)
+
+        elif isinstance(node, parser.IndexAssignmentNode):
+            self.analyze_expr(node.target)
+            self.analyze_value(node.value, node.target.concrete_type)
+
+        elif isinstance(node, parser.IfNode):
+            for arm in [node] + node.else_ifs:
+                self.analyze_condition(arm.condition)
+                self.analyze_nested_block(arm.body, self.bounds | get_bounds(arm.condition))
+
+            if node.else_statement is not None:
+                self.analyze_nested_block(node.else_statement, self.bounds)
+
+        elif isinstance(node, parser.WhileNode) and node.parallel:
+            self.analyze_parallel_loop(node)
+
+        elif isinstance(node, parser.WhileNode):
+            # the condition and the body also run after the body changed the variables
+            self.bounds = remove_bounds(self.bounds, get_assigned(node.body))
+
+            self.analyze_condition(node.condition)
+            self.analyze_nested_block(node.body, self.bounds | get_bounds(node.condition))
+
+        elif isinstance(node, parser.ReturnNode):
+            if isinstance(node.value, parser.ValueNode) and node.value.value_type == "NULL":
+                node.value.concrete_type = self.return_type
+            elif self.return_type is None:
+                raise SemanticError(get_token(node.value) or node.token, "Cannot return a value from function without return type")
+            else:
+                self.analyze_value(node.value, self.return_type)
+
+        elif not isinstance(node, (parser.BreakNode, parser.ContinueNode, parser.JoinNode)):
+            self.analyze_expr(node)
+
+    def analyze_parallel_loop(self, node: parser.WhileNode):
+        # annotates the loop with the name of its index, the reductions ({name: operation}) and the
+        # outer locals read in it, see the rules at the top
+        statements = node.body.statements
+        index = node.condition.left if isinstance(node.condition, parser.ExprNode) and node.condition.operation == "LESS_THAN" else None
+
+        if not isinstance(index, parser.VariableNode) or index.name not in self.locals or not statements or not is_increment(statements[-1], index.name):
+            raise SemanticError(node.token, "A parallel loop must have the form 'while i < n { ... i += 1 }' with a local variable 'i'")
+
+        outer_locals = dict(self.locals)
+
+        self.bounds = remove_bounds(self.bounds, get_assigned(node.body))
+        self.analyze_condition(node.condition)
+        self.analyze_nested_block(node.body, self.bounds | get_bounds(node.condition))
+
+        if not implang_types.is_integer(node.condition.operand_type) or not implang_types.is_integer(self.locals[index.name]):
+            raise SemanticError(index.token, "The index and the bound of a parallel loop must be integers")
+
+        node.index_name = index.name
+        node.reductions = {}
+        reads = []
+
+        for statement in statements[:-1]:
+            self.check_parallel_body(statement, node, outer_locals, reads, False)
+
+        for read in reads:
+            if read.name in node.reductions:
+                raise SemanticError(read.token, f"'{read.name}' is a reduction of the parallel loop, it cannot be read inside the loop")
+
+        node.shared = list(dict.fromkeys(read.name for read in reads if read.name != index.name))
+
+        # the variables declared in the body are private to an iteration
+        self.locals = {name: value_type for name, value_type in self.locals.items() if name in outer_locals}
+
+    def check_parallel_body(self, node, loop: parser.WhileNode, outer_locals: dict, reads: list, in_loop: bool):
+        if isinstance(node, (parser.BreakNode, parser.ContinueNode)) and not in_loop:
+            raise SemanticError(node.token, f"'{node.token.value}' cannot be used in a parallel loop")
+
+        if isinstance(node, (parser.ReturnNode, parser.SpawnNode, parser.JoinNode)):
+            raise SemanticError(node.token, f"'{node.token.value}' cannot be used in a parallel loop")
+
+        if isinstance(node, parser.VariableNode) and node.name in outer_locals:
+            reads.append(node)
+
+        if isinstance(node, parser.AssignmentNode) and node.name in outer_locals:
+            if node.name == loop.index_name:
+                raise SemanticError(node.token, f"The index '{node.name}' of a parallel loop can only be incremented at the end of the loop")
+
+            value = node.value
+            is_reduction = isinstance(value, parser.ExprNode) and value.operation in REDUCTION_OPERATIONS \
+                and isinstance(value.left, parser.VariableNode) and value.left.name == node.name
+
+            if not is_reduction or loop.reductions.get(node.name, value.operation) != value.operation:
+                raise SemanticError(node.token, f"Cannot assign to '{node.name}' in a parallel loop, it is shared (only reductions with '+=', '*=', '&&=' or '||=' are allowed)")
+
+            value_type = outer_locals[node.name]
+            logical = value.operation in ["AND", "OR"]
+
+            if (logical and not (value_type == "bool" or implang_types.is_integer(value_type))) or (not logical and not implang_types.is_numeric(value_type)):
+                raise SemanticError(node.token, f"Cannot use '{value_type}' variable '{node.name}' as a '{value.token.value}' reduction")
+
+            loop.reductions[node.name] = value.operation
+            self.check_parallel_body(value.right, loop, outer_locals, reads, in_loop)
+            return
+
+        for child in parser.get_children(node):
+            self.check_parallel_body(child, loop, outer_locals, reads, in_loop or isinstance(node, parser.WhileNode))
+
+    def analyze_condition(self, node):
+        # conditions are compared to zero (or null), any value but an array or a vector works
+        condition_type = self.require_value(node, self.analyze_expr(node))
+
+        if implang_types.is_array_or_slice(condition_type) or implang_types.is_vector(condition_type):
+            raise SemanticError(get_token(node), f"Cannot use '{condition_type}' as a condition")
+
+    def analyze_value(self, node, target_type: str):
+        # an expression converted to 'target_type' (assigned, passed or returned)
+        value_type = self.require_value(node, self.analyze_expr(node, target_type))
+
+        if not can_convert(value_type, target_type):
+            raise SemanticError(get_token(node), f"Cannot convert '{value_type}' to '{target_type}'")
+
+        value = get_literal_value(node)
+
+        if isinstance(value, int) and implang_types.is_integer(target_type) and not implang_types.fits(value, target_type):
+            token = get_token(node)
+            logger.code_warning(self.file, token.line, token.column, len(token.value), f"Integer literal {value} does not fit into '{target_type}' and is truncated")
+
+    def require_value(self, node, value_type: str) -> str:
+        if value_type is None:
+            raise SemanticError(get_token(node), "Expression does not have a value")
+
+        return value_type
+
+    def get_variable_type(self, name: str, token) -> str:
+        if name in self.locals:
+            return self.locals[name]
+
+        if name in self.global_variables:
+            return self.global_variables[name]
+
+        raise SemanticError(token, f"'{name}' is not a variable")
+
+    ###################
+
+    def analyze_expr(self, node, expected: str = None) -> str:
+        # 'expected' is the type the context converts the value to, literals adopt it
+        if isinstance(node, parser.ValueNode):
+            node.concrete_type = self.analyze_literal(node, expected)
+        elif isinstance(node, parser.VariableNode):
+            node.concrete_type = self.get_variable_type(node.name, node.token)
+        elif isinstance(node, parser.CallNode):
+            node.concrete_type = self.analyze_call(node)
+        elif isinstance(node, parser.UnaryExprNode):
+            node.concrete_type = self.analyze_unary(node, expected)
+        elif isinstance(node, parser.ExprNode):
+            node.concrete_type = self.analyze_binary(node, expected)
+        elif isinstance(node, parser.IndexNode):
+            node.concrete_type = self.analyze_index(node)
+        elif isinstance(node, parser.ArrayNode):
+            node.concrete_type = self.analyze_array(node, expected)
+        elif isinstance(node, parser.LenNode):
+            node.concrete_type = self.analyze_len(node)
+        elif isinstance(node, parser.ReduceNode):
+            node.concrete_type = self.analyze_reduce(node)
+        elif isinstance(node, parser.SpawnNode):
+            node.concrete_type = self.analyze_expr(node.call)
+        else:
+            raise SemanticError(get_token(node), f"Unexpected {type(node).__name__}")
+
+        return node.concrete_type
+
+    def analyze_literal(self, node: parser.ValueNode, expected: str) -> str:
+        if node.value_type in ["INTEGER", "FLOAT"]:
+            literal_type = get_literal_type(get_literal_value(node), expected)
+
+            if literal_type is None:
+                raise SemanticError(node.token, f"Integer literal {node.value} is too large")
+
+            return literal_type
+
+        if node.value_type == "NULL":
+            return expected
+
+        return {"CHAR": "char", "STRING": "str", "BOOLEAN": "bool"}[node.value_type]
+
+    def analyze_call(self, node: parser.CallNode) -> str:
+        function = self.functions.get(node.name)
+
+        if function is None:
+            raise SemanticError(node.name_token, f"'{node.name}' is not a function")
+
+        if len(function.parameters) != len(node.arguments):
+            raise SemanticError(node.name_token, f"Function '{node.name}' takes {len(function.parameters)} argument(s), {len(node.arguments)} given")
+
+        for argument, parameter in zip(node.arguments, function.parameters):
+            self.analyze_value(argument, parameter.parameter_type)
+
+        return function.return_type
+
+    def analyze_unary(self, node: parser.UnaryExprNode, expected: str) -> str:
+        if node.operation == "NOT":
+            self.analyze_condition(node.right)
+            return "bool"
+
+        if node.operation == "MINUS" and isinstance(node.right, parser.ValueNode) and node.right.value_type in ["INTEGER", "FLOAT"]:
+            # the range of a negative literal is checked with its sign
+            literal_type = get_literal_type(get_literal_value(node), expected)
+
+            if literal_type is None:
+                raise SemanticError(node.right.token, f"Integer literal -{node.right.value} is too large")
+
+            node.right.concrete_type = literal_type
+            return literal_type
+
+        operand_type = self.require_value(node.right, self.analyze_expr(node.right, expected))
+        operand_type = ARITHMETIC_TYPES.get(operand_type, operand_type)
+        element_type = implang_types.get_element_type(operand_type) if implang_types.is_vector(operand_type) else operand_type
+
+        if not (implang_types.is_integer(element_type) if node.operation == "BITWISE_NOT" else implang_types.is_numeric(element_type)):
+            raise SemanticError(node.token, f"Illegal unary operation ('{node.token.value}') on type '{operand_type}'")
+
+        return operand_type
+
+    def analyze_binary(self, node: parser.ExprNode, expected: str) -> str:
+        if node.operation in LOGICAL_OPERATIONS:
+            self.analyze_condition(node.left)
+            self.analyze_condition(node.right)
+
+            node.operand_type = "bool"
+            return "bool"
+
+        # an untyped operand takes the type of the other one, two untyped ones that of the context
+        hint = expected if node.operation in ARITHMETIC_OPERATIONS else None
+
+        if node.operation in SHIFT_OPERATIONS:
+            # the shift amount is converted to the type of the shifted value
+            left_type = self.analyze_operand(node.left, hint)
+            right_type = self.analyze_operand(node.right, left_type)
+        elif is_untyped(node.left) and not is_untyped(node.right):
+            right_type = self.analyze_operand(node.right, None)
+            left_type = self.analyze_operand(node.left, right_type)
+        elif is_untyped(node.right) and not is_untyped(node.left):
+            left_type = self.analyze_operand(node.left, None)
+            right_type = self.analyze_operand(node.right, left_type)
+        else:
+            left_type = self.analyze_operand(node.left, hint)
+            right_type = self.analyze_operand(node.right, hint)
+
+        if implang_types.is_vector(left_type) or implang_types.is_vector(right_type):
+            node.operand_type = self.get_vector_operand_type(node, left_type, right_type)
+            return node.operand_type
+
+        if "str" in [left_type, right_type]:
+            if left_type != right_type or node.operation not in ["PLUS", "EQUALS", "NOT_EQUALS"]:
+                raise SemanticError(node.token, f"Illegal operation ('{node.token.value}') on types '{left_type}' and '{right_type}'")
+
+            node.operand_type = "str"
+            return "bool" if node.operation in COMPARISON_OPERATIONS else "str"
+
+        if node.operation in SHIFT_OPERATIONS:
+            node.operand_type = ARITHMETIC_TYPES.get(left_type, left_type)
+        else:
+            node.operand_type = promote(left_type, right_type)
+
+        if node.operation in BITWISE_OPERATIONS and not implang_types.is_integer(promote(left_type, right_type)):
+            raise SemanticError(node.token, f"Illegal operation ('{node.token.value}') on types '{left_type}' and '{right_type}'")
+
+        if node.operation in COMPARISON_OPERATIONS:
+            return "bool"
+
+        return node.operand_type
+
+    def get_vector_operand_type(self, node: parser.ExprNode, left_type: str, right_type: str) -> str:
+        vector_type = left_type if implang_types.is_vector(left_type) else right_type
+        element_type = implang_types.get_element_type(vector_type)
+
+        if node.operation in BITWISE_OPERATIONS:
+            allowed = implang_types.is_integer(element_type)
+        else:
+            allowed = node.operation in ["PLUS", "MINUS", "MULTIPLY", "DIVIDE", "MODULO"]
+
+        if not allowed or not can_convert(left_type, vector_type) or not can_convert(right_type, vector_type):
+            raise SemanticError(node.token, f"Illegal operation ('{node.token.value}') on types '{left_type}' and '{right_type}'")
+
+        return vector_type
+
+    def analyze_index(self, node: parser.IndexNode) -> str:
+        array_type = self.require_value(node.target, self.analyze_expr(node.target))
+        index_type = self.require_value(node.index, self.analyze_expr(node.index))
+
+        if not implang_types.is_integer(ARITHMETIC_TYPES.get(index_type, index_type)):
+            raise SemanticError(node.token, f"Array index must be an integer, got '{index_type}'")
+
+        length = implang_types.get_array_length(array_type)
+        value = get_literal_value(node.index)
+
+        if value is not None and length is not None and not 0 <= value < length:
+            raise SemanticError(get_token(node.index), f"Index {value} is out of bounds for '{array_type}'")
+
+        node.checked = not self.is_in_bounds(node, length)
+        return implang_types.get_element_type(array_type)
+
+    def is_in_bounds(self, node: parser.IndexNode, length: int) -> bool:
+        if get_literal_value(node.index) is not None:
+            return length is not None # checked by analyze_index
+
+        # the variable may be changed by a call if it is not a local
+        if not isinstance(node.index, parser.VariableNode) or node.index.name not in self.locals:
+            return False
+
+        for variable, bound in self.bounds:
+            if variable != node.index.name:
+                continue
+
+            if isinstance(bound, int) and length is not None and bound <= length:
+                return True
+
+            if isinstance(node.target, parser.VariableNode) and bound == node.target.name:
+                return True
+
+        return False
+
+    def analyze_array(self, node: parser.ArrayNode, expected: str) -> str:
+        # also the lanes of a vector
+        if not implang_types.is_array(expected) and not implang_types.is_vector(expected):
+            raise SemanticError(node.token, "Array literals can only initialize arrays and vectors")
+
+        length = implang_types.get_array_length(expected)
+
+        if len(node.elements) != length:
+            raise SemanticError(node.token, f"Array literal has {len(node.elements)} element(s), '{expected}' has {length}")
+
+        for element in node.elements:
+            self.analyze_value(element, implang_types.get_element_type(expected))
+
+        return expected
+
+    def analyze_len(self, node: parser.LenNode) -> str:
+        value_type = self.require_value(node.value, self.analyze_expr(node.value))
+
+        if not implang_types.is_array_or_slice(value_type):
+            raise SemanticError(node.token, f"'len' expects an array or slice, got '{value_type}'")
+
+        return "u64"
+
+    def analyze_reduce(self, node: parser.ReduceNode) -> str:
+        value_type = self.require_value(node.value, self.analyze_expr(node.value))
+
+        if not implang_types.is_vector(value_type):
+            raise SemanticError(node.token, f"'{node.token.value}' expects a vector, got '{value_type}'")
+
+        return implang_types.get_element_type(value_type)
+
+    def analyze_operand(self, node, expected: str) -> str:
+        return self.require_value(node, self.analyze_expr(node, expected))
+
+def analyze(file: str, program: parser.Program) -> parser.Program:
+    analyzer = Analyzer(file, program)
+
+    try:
+        if isinstance(program, parser.ProgramStream):
+            # the functions are analyzed when they are parsed, see analyze_functions
+            analyzer.analyze_declarations()
+            program.functions = analyze_functions(analyzer, program.functions)
+        else:
+            analyzer.analyze()
+    except SemanticError as e:
+        report_error(file, e)
+
+    return program
+
+def analyze_functions(analyzer: Analyzer, functions):
+    for function in functions:
+        try:
+            analyzer.analyze_function(function)
+        except SemanticError as e:
+            # parse errors are reported first, like without streaming
+            for _ in functions:
+                pass
+
+            report_error(analyzer.file, e)
+
+        yield function
+
+    try:
+        analyzer.check_memoized()
+    except SemanticError as e:
+        report_error(analyzer.file, e)
+
+def report_error(file: str, error: SemanticError):
+    logger.code_error(file, error.token.line, error.token.column, len(error.token.value), error.message)
+    raise SystemExit(1)
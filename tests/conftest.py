@@ -0,0 +1,46 @@
+# Shared fixtures
+# Compiling ImpLang programs with src/main.py and running them. Tests of a single compiler phase import its module
+# from src directly.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+IMPC = os.path.join(ROOT, "src", "main.py")
+
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+def run_compiler(arguments: list, cwd: str = None) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, IMPC] + arguments, capture_output=True, text=True, cwd=cwd)
+
+@pytest.fixture
+def impc():
+    """Returns a function running the compiler with the given arguments, it returns the finished process"""
+    return run_compiler
+
+@pytest.fixture
+def compile_program(tmp_path):
+    """Returns a function compiling ImpLang source text with the given flags, it returns the path of the binary"""
+    def compile_program(source: str, flags: list = None, name: str = "program") -> str:
+        source_file = tmp_path / f"{name}.impl"
+        source_file.write_text(source)
+        binary = tmp_path / name
+
+        result = run_compiler([str(source_file), "-o", str(binary)] + (flags or []))
+        assert result.returncode == 0, result.stderr
+
+        return str(binary)
+
+    return compile_program
+
+@pytest.fixture
+def run_program():
+    """Returns a function running a binary, it returns the finished process"""
+    def run_program(binary: str, args: list = None, env: dict = None) -> subprocess.CompletedProcess:
+        args = args or []
+        return subprocess.run([binary] + args, capture_output=True, text=True, env=env)
+
+    return run_program
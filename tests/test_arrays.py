@@ -0,0 +1,124 @@
+# Arrays and slices
+# The semantic pass leaves an index unchecked when it is a literal into an array or an unsigned local bounded by an
+# enclosing condition and not assigned since, every other index is checked and aborts the program when it is out of
+# bounds (after writing the buffered output).
+
+import pytest
+
+import lexer
+import parser
+import semantic
+
+BOUNDS_SOURCE = """
+var shared: u64 = 0
+
+func sum(values: [u64]) -> u64 {
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < len(values) {
+        total += values[i] // bounded by the loop condition
+        i += 1
+        total += values[i] // 'i' changed since
+    }
+    if shared < len(values) {
+        total += values[shared] // not a local
+    }
+    var j: i64 = 0
+    if j < 4 {
+        total += values[j] // signed
+    }
+    return total + values[0] // a literal into a slice
+}
+
+func main() -> i8 {
+    var small: [u64; 8]
+    var big: [u64; 16]
+    var i: u64 = 0
+    while i < 16 {
+        big[i] = i // the bound is the length of 'big'
+        small[i] = i // larger than the length of 'small'
+        i += 1
+    }
+    var k: u64 = 3
+    if k < 8 && k > 1 {
+        small[k] = 1 // bounded by one side of the condition
+    }
+    small[7] = 2 // a literal into an array
+    return sum(small) + sum(big)
+}
+"""
+
+ABORT_SOURCE = """
+@import_symbol atoi(str) -> i32
+@import_symbol puts(str) -> i32
+
+func get(values: [u64], index: u64) -> u64 {
+    return values[index]
+}
+
+func main(args: str) -> i8 {
+    var values: [u64; 4] = [1, 2, 3, 4]
+    puts("before")
+    return get(values, atoi(args))
+}
+"""
+
+def collect_indexes(node, indexes: dict):
+    # source line of every index expression -> whether it is bounds checked
+    if isinstance(node, list):
+        for item in node:
+            collect_indexes(item, indexes)
+    elif isinstance(node, parser.IndexNode):
+        indexes.setdefault(node.token.line, []).append(node.checked)
+        collect_indexes(node.index, indexes)
+    elif type(node).__module__ == "parser":
+        for value in vars(node).values():
+            collect_indexes(value, indexes)
+
+def test_bounds_check_elimination(tmp_path):
+    path = tmp_path / "program.impl"
+    path.write_text(BOUNDS_SOURCE)
+
+    program = parser.parse(str(path), lexer.lex_file(str(path)))
+    semantic.analyze(str(path), program)
+
+    indexes = {}
+    collect_indexes(program.statements, indexes)
+    lines = BOUNDS_SOURCE.split("\n")
+
+    checked = {lines[line - 1].strip(): flags for line, flags in indexes.items()}
+
+    assert checked == {
+        "total += values[i] // bounded by the loop condition": [False],
+        "total += values[i] // 'i' changed since": [True],
+        "total += values[shared] // not a local": [True],
+        "total += values[j] // signed": [True],
+        "return total + values[0] // a literal into a slice": [True],
+        "big[i] = i // the bound is the length of 'big'": [False],
+        "small[i] = i // larger than the length of 'small'": [True],
+        "small[k] = 1 // bounded by one side of the condition": [False],
+        "small[7] = 2 // a literal into an array": [False]
+    }
+
+def test_literal_out_of_bounds(compile_program, impc, tmp_path):
+    (tmp_path / "program.impl").write_text("func main() -> i8 {\n    var values: [u64; 4]\n    return values[4]\n}\n")
+    result = impc([str(tmp_path / "program.impl"), "-o", str(tmp_path / "program")])
+
+    assert result.returncode != 0
+    assert "Index 4 is out of bounds for '[u64; 4]'" in result.stderr
+
+# the same program writing through the standard runtime's buffers instead of stdio
+STD_ABORT_SOURCE = ABORT_SOURCE.replace("@import_symbol puts(str) -> i32", "// print is buffered").replace('puts("before")', 'print("before\\n")')
+
+@pytest.mark.parametrize("source", [ABORT_SOURCE, STD_ABORT_SOURCE], ids=["stdio", "std"])
+@pytest.mark.parametrize("flags", [[], ["-O2"]], ids=" ".join)
+def test_out_of_bounds_abort(compile_program, run_program, flags, source):
+    binary = compile_program(source, flags)
+
+    assert run_program(binary, ["3"]).returncode == 4
+
+    result = run_program(binary, ["9"])
+
+    assert result.returncode < 0 # killed by SIGABRT
+    assert result.stderr == "program.impl:6: index 9 is out of bounds for length 4\n"
+    assert result.stdout == "before\n" # written before the abort
@@ -0,0 +1,90 @@
+# Binary AST format
+# parser.dumps/loads have to rebuild the AST with identical fields and shared tokens, and reject input written by
+# another format version or cut short with ASTFormatError.
+
+import pytest
+
+import lexer
+import parser
+
+SOURCE = """
+var counter: u64 = 0
+var ratio: f64 = 0.25
+
+func step(n: u64, name: str) -> u64 {
+    if n == 0 {
+        return 1
+    } else if n == 1 {
+        counter += 2
+    } else {
+        counter -= 1
+    }
+    while counter > 10 {
+        counter /= 2
+    }
+    return n * 3 + counter
+}
+
+func main() -> i8 {
+    var text: str = "a string with unicode é\\n"
+    var c: u64 = 120
+    return step(c, text) % 7
+}
+"""
+
+def parse_source(tmp_path, source: str) -> parser.Program:
+    path = tmp_path / "program.impl"
+    path.write_text(source)
+
+    return parser.parse(str(path), lexer.lex_file(str(path)))
+
+def assert_same_tree(a, b, seen: dict):
+    # 'seen' maps the objects of 'a' to the ones of 'b', an object shared in 'a' has to be shared in 'b'
+    assert type(a) is type(b)
+
+    if isinstance(a, list):
+        assert len(a) == len(b)
+
+        for x, y in zip(a, b):
+            assert_same_tree(x, y, seen)
+    elif hasattr(a, "__dict__"):
+        if id(a) in seen:
+            assert seen[id(a)] is b
+            return
+
+        seen[id(a)] = b
+        assert a.__dict__.keys() == b.__dict__.keys()
+
+        for field in a.__dict__:
+            assert_same_tree(a.__dict__[field], b.__dict__[field], seen)
+    else:
+        assert a == b
+
+def test_round_trip(tmp_path):
+    program = parse_source(tmp_path, SOURCE)
+
+    assert_same_tree(program, parser.loads(parser.dumps(program)), {})
+
+def test_round_trip_file(tmp_path):
+    program = parse_source(tmp_path, SOURCE)
+    parser.dump(program, str(tmp_path / "program.ast"))
+
+    assert_same_tree(program, parser.load(str(tmp_path / "program.ast")), {})
+
+def test_version_mismatch(tmp_path):
+    data = bytearray(parser.dumps(parse_source(tmp_path, SOURCE)))
+    data[len(parser.AST_MAGIC)] += 1 # the version follows the magic string
+
+    with pytest.raises(parser.ASTFormatError, match="version"):
+        parser.loads(bytes(data))
+
+def test_not_an_ast():
+    with pytest.raises(parser.ASTFormatError):
+        parser.loads(b"x" * parser.AST_HEADER.size)
+
+@pytest.mark.parametrize("keep", [0, 4, parser.AST_HEADER.size, parser.AST_HEADER.size + 10, -1])
+def test_truncated(tmp_path, keep):
+    data = parser.dumps(parse_source(tmp_path, SOURCE))
+
+    with pytest.raises(parser.ASTFormatError):
+        parser.loads(data[:keep])
@@ -0,0 +1,244 @@
+# Table and switch returns
+# Compiles and runs small programs whose 'else if' chains become lookup tables and switches, combined with the
+# string arena, tasks, @memoize and @comptime, under every flag that changes how the chains are lowered.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+FLAGS = [
+    [],
+    ["-O2"],
+    ["-fno-switch-tables"],
+    ["-fmir"],
+    ["-fmir", "-O2"],
+    ["-fmir", "-fno-switch-tables"],
+]
+
+ARENA_ITERATIONS = 3_000_000
+ARENA_MAX_PEAK_RSS = 24 * 1024 * 1024 # about 11 MiB when every return releases the arena, over 35 MiB when one leaks
+
+ARENA_PROGRAM = """
+@import_symbol atoi(str) -> i32
+@import_symbol strlen(str) -> u64
+
+func pick_table(n: u64, name: str) -> u64 {
+    var greeting: str = "hello " + name
+    if strlen(greeting) == 0 {
+        return 100
+    }
+    if n == 0 {
+        return 10
+    } else if n == 1 {
+        return 11
+    } else if n == 2 {
+        return 12
+    } else if n == 3 {
+        return 13
+    } else {
+        return 14
+    }
+}
+
+func pick_switch(n: u64, name: str) -> u64 {
+    var greeting: str = "hi " + name
+    if n == 0 {
+        return strlen(greeting)
+    } else if n == 1 {
+        return strlen(greeting) + 1
+    } else if n == 2 {
+        return strlen(greeting) + 2
+    }
+    return 0
+}
+
+func main(args: str) -> i8 {
+    var count: u64 = atoi(args)
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < count {
+        total += pick_table(i % 5, "world") + pick_switch(i % 4, "bob")
+        i += 1
+    }
+    print_u64(total)
+    print("\\n")
+    return 0
+}
+"""
+
+TASK_PROGRAM = """
+var finished: u64 = 0
+
+func slow(n: u64) -> u64 {
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < n {
+        total += i % 7
+        i += 1
+    }
+    finished += 1
+    return total
+}
+
+func pick(n: u64) -> u64 {
+    var work: u64 = spawn slow(n * 1000 + 1000)
+    if n == 0 {
+        return 10
+    } else if n == 1 {
+        return 11
+    } else if n == 2 {
+        return 12
+    } else if n == 3 {
+        return 13
+    } else {
+        return 14
+    }
+}
+
+func main(args: str) -> i8 {
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < 200 {
+        total += pick(i % 5)
+        i += 1
+    }
+    print_u64(finished)
+    print(" ")
+    print_u64(total)
+    print("\\n")
+    return 0
+}
+"""
+
+MEMOIZE_PROGRAM = """
+@memoize
+func code(n: u64) -> u64 {
+    if n == 1 {
+        return 7
+    } else if n == 2 {
+        return 9
+    } else if n == 3 {
+        return 4
+    } else if n == 5 {
+        return 1
+    } else {
+        return 0
+    }
+}
+
+func main(args: str) -> i8 {
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < 1000 {
+        total += code(i % 8)
+        i += 1
+    }
+    print_u64(total)
+    print("\\n")
+    return 0
+}
+"""
+
+COMPTIME_PROGRAM = """
+@comptime
+func scale(n: u64) -> u64 {
+    if n == 0 {
+        return 1
+    } else if n == 1 {
+        return 5
+    } else if n == 2 {
+        return 9
+    } else if n == 3 {
+        return 15
+    } else {
+        return 2
+    }
+}
+
+var folded: u64 = scale(0) + scale(1) * 10 + scale(3) * 100 + scale(7) * 1000
+
+func weight(n: u64) -> u64 {
+    if n == 0 {
+        return 1
+    } else if n == 1 {
+        return 5
+    } else if n == 2 {
+        return 9
+    } else if n == 3 {
+        return 15
+    } else {
+        return 2
+    }
+}
+
+func main(args: str) -> i8 {
+    // pure calls with constant arguments, evaluated by comptime from -O1 on
+    var total: u64 = weight(3) * 100 + weight(9)
+    var i: u64 = 0
+    while i < 10 {
+        total += weight(i)
+        i += 1
+    }
+    print_u64(folded)
+    print(" ")
+    print_u64(total)
+    print("\\n")
+    return 0
+}
+"""
+
+def get_peak_rss(binary: str, args: list) -> int:
+    # the program runs in a process of its own, RUSAGE_CHILDREN of this one would include the compiler
+    code = (
+        "import resource, subprocess, sys\n"
+        "subprocess.run(sys.argv[1:], check=True, stdout=subprocess.DEVNULL)\n"
+        "print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code, binary] + args, capture_output=True, text=True, check=True)
+
+    # ru_maxrss is in kilobytes on Linux
+    return int(result.stdout.strip()) * 1024
+
+@pytest.mark.parametrize("flags", FLAGS, ids=" ".join)
+def test_arena_released_on_table_and_switch_returns(compile_program, run_program, flags):
+    binary = compile_program(ARENA_PROGRAM, flags)
+    expected = sum([10, 11, 12, 13, 14][i % 5] + [6, 7, 8, 0][i % 4] for i in range(1000))
+
+    result = run_program(binary, ["1000"])
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == f"{expected}\n"
+    assert get_peak_rss(binary, [str(ARENA_ITERATIONS)]) < ARENA_MAX_PEAK_RSS
+
+@pytest.mark.parametrize("flags", FLAGS, ids=" ".join)
+def test_tasks_joined_on_table_returns(compile_program, run_program, flags):
+    binary = compile_program(TASK_PROGRAM, flags)
+    expected = sum(10 + i % 5 for i in range(200))
+
+    # with worker threads, a task that is not joined may still be running when the program prints
+    result = run_program(binary, env={**os.environ, "IMPL_THREADS": "4"})
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == f"200 {expected}\n"
+
+@pytest.mark.parametrize("flags", FLAGS, ids=" ".join)
+def test_memoized_table_returns(compile_program, run_program, flags):
+    binary = compile_program(MEMOIZE_PROGRAM, flags)
+    expected = sum([0, 7, 9, 4, 0, 1, 0, 0][i % 8] for i in range(1000))
+
+    result = run_program(binary)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == f"{expected}\n"
+
+@pytest.mark.parametrize("flags", FLAGS, ids=" ".join)
+def test_comptime_table_returns(compile_program, run_program, flags):
+    binary = compile_program(COMPTIME_PROGRAM, flags)
+    weights = [1, 5, 9, 15] + [2] * 6
+
+    result = run_program(binary)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == f"{1 + 5 * 10 + 15 * 100 + 2 * 1000} {15 * 100 + 2 + sum(weights)}\n"
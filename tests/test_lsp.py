@@ -0,0 +1,96 @@
+# Language server documents
+# After every edit, the tokens and diagnostics of an incrementally re-lexed and re-parsed lsp.Document have to be the
+# ones of a fresh Document opened with the same text.
+
+import random
+
+import pytest
+
+import lexer
+import lsp
+
+SOURCE = """var limit: u64 = 10
+
+func inc(n: u64) -> u64 {
+    return n + 1
+}
+
+/* a block comment
+   over two lines */
+func loop(n: u64) -> u64 {
+    var acc: u64 = n
+    while acc < limit {
+        acc = inc(acc)
+    }
+    return acc
+}
+
+func main() -> i8 {
+    return loop(3)
+}
+"""
+
+EDITS = {
+    # name: [(start, end, text)], (line, column) pairs counted from 0
+    "type at the end of a line": [((3, 16), (3, 16), " + 1")],
+    "insert a line": [((10, 0), (10, 0), "    acc += 2\n")],
+    "delete a line": [((9, 0), (10, 0), "")],
+    "break and fix a block": [((12, 4), (12, 4), "}"), ((12, 4), (12, 5), "")],
+    "turn '<' into '<='": [((10, 15), (10, 15), "=")],
+    "turn '<=' back into '<'": [((10, 15), (10, 15), "="), ((10, 15), (10, 16), "")],
+    "open a block comment": [((2, 0), (2, 0), "/* ")],
+    "close a block comment early": [((6, 18), (6, 18), " */\n")],
+    "remove a function header": [((8, 0), (9, 0), "")],
+    "add a function": [((16, 0), (16, 0), "func twice(n: u64) -> u64 {\n    return inc(inc(n))\n}\n\n")],
+    "rename a function": [((2, 5), (2, 8), "next")],
+    "replace across functions": [((3, 4), (11, 20), "return n\n}\n\nfunc loop(n: u64) -> u64 {\n    var acc: u64 = n\n    while acc <= limit {\n        acc = inc(acc) << 1")],
+    "invalid character": [((13, 4), (13, 4), "$")]
+}
+
+SNIPPETS = ["x", "\n", "func ", "/*", "*/", "}", "{", "  ", "<", "=", "var q: u64 = 1\n", "inc(", "\"", "$", "", "return 1\n"]
+
+def get_tokens(document: lsp.Document) -> list:
+    return [
+        (token.kind if isinstance(token, lexer.Token) else None, getattr(token, "value", None), chunk.start_line + token.line - 1, token.column)
+        for chunk in document.chunks for token in chunk.tokens
+    ]
+
+def assert_matches_fresh(document: lsp.Document):
+    text = "\n".join(document.lines)
+    fresh = lsp.Document(document.uri, text)
+
+    expected = [
+        (token.kind if isinstance(token, lexer.Token) else None, getattr(token, "value", None), token.line, token.column)
+        for token in lexer.lex(text)
+    ]
+
+    assert get_tokens(document) == expected
+    assert sorted(document.get_diagnostics()) == sorted(fresh.get_diagnostics())
+
+@pytest.mark.parametrize("name", EDITS)
+def test_edit(name):
+    document = lsp.Document("file:///test.impl", SOURCE)
+
+    for start, end, text in EDITS[name]:
+        document.apply_change(start, end, text)
+        assert_matches_fresh(document)
+
+def test_operator_edit():
+    document = lsp.Document("file:///test.impl", SOURCE)
+    document.apply_change((10, 15), (10, 15), "=")
+
+    assert ("LESS_THAN_OR_EQUAL", "<=", 11, 15) in get_tokens(document)
+
+def test_random_edits():
+    random.seed(0)
+    document = lsp.Document("file:///test.impl", SOURCE)
+
+    for _ in range(300):
+        lines = document.lines
+        start_line = random.randrange(len(lines))
+        start_column = random.randint(0, len(lines[start_line]))
+        end_line = min(len(lines) - 1, start_line + random.choice([0, 0, 0, 1, 2]))
+        end_column = random.randint(start_column if end_line == start_line else 0, len(lines[end_line]))
+
+        document.apply_change((start_line, start_column), (end_line, end_column), random.choice(SNIPPETS))
+        assert_matches_fresh(document)
@@ -0,0 +1,89 @@
+# Modules
+# 'impc -c' writes the signatures of a module to an interface file (.impi), '@import' loads them so that the module
+# is linked as an object file without being parsed again.
+
+import os
+
+import pytest
+
+import lexer
+import parser
+
+MODULE = """
+func add(a: u64, b: u64) -> u64 {
+    return a + b
+}
+
+func scale(n: u64, factor: f64) -> f64 {
+    return n * factor
+}
+"""
+
+MAIN = """
+func main() -> i8 {
+    return 0
+}
+"""
+
+PROGRAM = """
+@import "math"
+
+func main() -> i8 {
+    return add(40, 2)
+}
+"""
+
+def parse_source(path) -> parser.Program:
+    return parser.parse(str(path), lexer.lex_file(str(path)))
+
+def test_interface_round_trip(tmp_path):
+    (tmp_path / "math.impl").write_text(MODULE + MAIN)
+    parser.write_interface([parse_source(tmp_path / "math.impl")], str(tmp_path / "math.impi"))
+
+    functions = parser.load_interface(str(tmp_path / "math.impi"))
+
+    assert [function.name for function in functions] == ["add", "scale"] # without 'main'
+    assert [[p.parameter_type for p in function.parameters] for function in functions] == [["u64", "u64"], ["u64", "f64"]]
+    assert [function.return_type for function in functions] == ["u64", "f64"]
+    assert all(function.body is None for function in functions)
+
+def test_not_an_interface(tmp_path):
+    (tmp_path / "math.impl").write_text(MODULE)
+    parser.dump(parse_source(tmp_path / "math.impl"), str(tmp_path / "math.impi")) # with the function bodies
+
+    with pytest.raises(parser.ASTFormatError):
+        parser.load_interface(str(tmp_path / "math.impi"))
+
+@pytest.mark.parametrize("separate_directory", [False, True])
+def test_import(tmp_path, impc, run_program, separate_directory):
+    module_directory = tmp_path / "lib" if separate_directory else tmp_path
+    module_directory.mkdir(exist_ok=True)
+    (module_directory / "math.impl").write_text(MODULE)
+    (tmp_path / "app.impl").write_text(PROGRAM)
+
+    result = impc([str(module_directory / "math.impl"), "-c", "-o", str(module_directory / "math.o")])
+    assert result.returncode == 0, result.stderr
+    assert os.path.isfile(module_directory / "math.impi")
+
+    import_paths = ["-I", str(module_directory)] if separate_directory else []
+    result = impc([str(tmp_path / "app.impl"), str(module_directory / "math.o"), "-o", str(tmp_path / "app")] + import_paths)
+    assert result.returncode == 0, result.stderr
+
+    assert run_program(str(tmp_path / "app")).returncode == 42
+
+def test_missing_interface(tmp_path, impc):
+    (tmp_path / "app.impl").write_text(PROGRAM)
+    result = impc([str(tmp_path / "app.impl"), "-o", str(tmp_path / "app")])
+
+    assert result.returncode != 0
+    assert "Interface file for module 'math' not found" in result.stderr
+
+def test_imported_signature_checked(tmp_path, impc):
+    (tmp_path / "math.impl").write_text(MODULE)
+    (tmp_path / "app.impl").write_text(PROGRAM.replace("add(40, 2)", "add(40)"))
+
+    assert impc([str(tmp_path / "math.impl"), "-c", "-o", str(tmp_path / "math.o")]).returncode == 0
+
+    result = impc([str(tmp_path / "app.impl"), str(tmp_path / "math.o"), "-o", str(tmp_path / "app")])
+    assert result.returncode != 0
+    assert "app.impl:5:" in result.stderr
@@ -0,0 +1,139 @@
+# Comparison and shift operators
+# '<=', '>=', '<<', '>>' and the shift assignments share their first character with '<' and '>', they have to be
+# lexed as one token and parsed with the usual precedence (shifts bind tighter than comparisons).
+
+import pytest
+
+import lexer
+
+FLAGS = [[], ["-O2"], ["-fmir"], ["-fmir", "-O2"]]
+
+SOURCE = """
+func main() -> i8 {
+    var a: u64 = 5
+    var b: u64 = 3
+    var r: u64 = 0
+    if a <= 5 {
+        r += 1
+    }
+    if b >= 4 {
+        r += 100
+    }
+    if a >= b {
+        r += 2
+    }
+    if b <= 2 {
+        r += 100
+    }
+    var s: u64 = a << 2
+    s >>= 1
+    s <<= 3
+    r += s >> 2
+    if 1 << 3 > 7 {
+        r += 4
+    }
+    r += 1 << 2 + 1
+    return r
+}
+"""
+
+# right shifts are arithmetic on signed and logical on unsigned types, the shift amount takes the type of the
+# shifted value
+SIGNEDNESS_SOURCE = """
+func main() -> i8 {
+    var r: u64 = 0
+    var a: i64 = -16
+    if a >> 2 == -4 {
+        r += 1
+    }
+    var u: u64 = 18446744073709551600
+    if u >> 60 == 15 {
+        r += 2
+    }
+    var w: u32 = 1
+    var k: u64 = 4
+    if w << k == 16 {
+        r += 4
+    }
+    var b: i32 = -1
+    b <<= 4
+    if b == -16 {
+        r += 8
+    }
+    b >>= 2
+    if b <= -4 {
+        r += 16
+    }
+    if b >= -4 {
+        r += 32
+    }
+    return r
+}
+"""
+
+# the same shifts evaluated at compile time, and one that cannot be (the shift is undefined in LLVM)
+COMPTIME_SOURCE = """
+@comptime
+func shifted(a: u64, b: i64, k: u64) -> u64 {
+    var r: u64 = 0
+    if a << k == 80 {
+        r += 1
+    }
+    if a >> 1 == 2 {
+        r += 2
+    }
+    if b >> 1 == -4 {
+        r += 4
+    }
+    var c: u64 = a
+    c <<= 2
+    c >>= 1
+    if c == 10 {
+        r += 8
+    }
+    return r
+}
+
+@comptime
+func mask(k: u64) -> u64 {
+    return 1 << k
+}
+
+func main() -> i8 {
+    return shifted(5, -8, 4) + mask(BITS)
+}
+"""
+
+def get_kinds(text: str) -> list:
+    return [token.kind for token in lexer.lex(text) if token.kind != "NEWLINE"]
+
+def test_operator_tokens():
+    assert get_kinds("a <= b >= c") == ["IDENTIFIER", "LESS_THAN_OR_EQUAL", "IDENTIFIER", "GREATER_THAN_OR_EQUAL", "IDENTIFIER"]
+    assert get_kinds("a << 2 >> 1") == ["IDENTIFIER", "BITWISE_LEFT_SHIFT", "INTEGER", "BITWISE_RIGHT_SHIFT", "INTEGER"]
+    assert get_kinds("a <<= 2") == ["IDENTIFIER", "BITWISE_LEFT_SHIFT_ASSIGN", "INTEGER"]
+    assert get_kinds("a >>= 2") == ["IDENTIFIER", "BITWISE_RIGHT_SHIFT_ASSIGN", "INTEGER"]
+    assert get_kinds("a < b > c") == ["IDENTIFIER", "LESS_THAN", "IDENTIFIER", "GREATER_THAN", "IDENTIFIER"]
+
+@pytest.mark.parametrize("flags", FLAGS, ids=" ".join)
+def test_comparison_and_shift_operators(compile_program, run_program, flags):
+    binary = compile_program(SOURCE, flags)
+
+    # 1 + 2 + (((5 << 2) >> 1) << 3) >> 2 + 4 + (1 << 3)
+    assert run_program(binary).returncode == 1 + 2 + 20 + 4 + 8
+
+@pytest.mark.parametrize("flags", FLAGS, ids=" ".join)
+def test_shift_signedness(compile_program, run_program, flags):
+    binary = compile_program(SIGNEDNESS_SOURCE, flags)
+
+    assert run_program(binary).returncode == 63
+
+def test_comptime_shifts(compile_program, run_program, impc, tmp_path):
+    binary = compile_program(COMPTIME_SOURCE.replace("BITS", "3"))
+
+    assert run_program(binary).returncode == 15 + 8
+
+    (tmp_path / "program.impl").write_text(COMPTIME_SOURCE.replace("BITS", "64"))
+    result = impc([str(tmp_path / "program.impl"), "-o", str(tmp_path / "program")])
+
+    assert result.returncode != 0
+    assert "'@comptime' call of 'mask' cannot be evaluated at compile time, it shifts 'u64' by 64 bits" in result.stderr
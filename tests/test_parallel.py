@@ -0,0 +1,119 @@
+# Parallel lexing and parsing (-j)
+# The input is split into chunks at newlines and lexed by worker processes, the tokens have to be the same as the
+# serial lexer's, including for block comments that span chunks, lexer errors and an unterminated comment. The
+# function bodies are parsed by worker processes, the AST has to be the same as the serial one (compared in the
+# serialized format). The chunks and spans are made small so that a small input is split into many of them.
+
+import random
+
+import pytest
+
+import lexer
+import parser
+
+FUNCTION = """
+func f{0}(a: u64) -> u64 {{
+    var b: u64 = a << 2 // line comment /* not a block comment
+    /* a block
+       comment */ b >>= 1
+    if b <= {0} && a >= 3 {{
+        return b / 2 * 1.5
+    }}
+    return b $ {0}
+}}
+"""
+
+def get_source(seed: int) -> str:
+    generator = random.Random(seed)
+    parts = []
+
+    for i in range(200):
+        parts.append(FUNCTION.format(i))
+
+        if generator.random() < 0.1:
+            # a block comment spanning several functions (and chunks)
+            parts.append("/*" + "".join(FUNCTION.format(-i) for _ in range(generator.randint(1, 6))) + "*/")
+
+    return "".join(parts) + "var last: u64 = 1 /* unterminated\n"
+
+def get_fields(tokens: list) -> list:
+    return [
+        ("ERROR", token.char, token.position, token.line, token.column) if isinstance(token, lexer.LexerError)
+        else (token.kind, token.value, token.position, token.line, token.column)
+        for token in tokens
+    ]
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("jobs", [2, 3])
+def test_parallel_lex(monkeypatch, seed, jobs):
+    monkeypatch.setattr(lexer, "PARALLEL_MIN_CHUNK_SIZE", 64)
+    monkeypatch.setattr(lexer, "PARALLEL_CHUNKS_PER_JOB", 50)
+    source = get_source(seed)
+
+    assert get_fields(lexer.lex_parallel(source, jobs)) == get_fields(lexer.lex(source))
+
+def test_small_input_is_lexed_serially():
+    source = FUNCTION.format(1)
+
+    assert get_fields(lexer.lex_parallel(source, 4)) == get_fields(lexer.lex(source))
+
+PROGRAM_HEADER = """
+var counter: u64 = 0
+"""
+
+FUNCTIONS = """
+func f{0}(n: u64) -> u64 {{
+    var acc: u64 = n << 1
+    while acc > 100 {{
+        acc /= 2
+        counter += 1
+    }}
+    if acc <= 1 {{
+        return g{0}(acc + 1) // defined further down
+    }}
+    return acc * 3 + n % 7
+}}
+
+var limit{0}: u64 = {0}
+
+func g{0}(n: u64) -> u64 {{
+    return f{1}(n) + counter + limit{0}
+}}
+"""
+
+def get_program(count: int) -> str:
+    return PROGRAM_HEADER + "".join(FUNCTIONS.format(i, max(i - 1, 0)) for i in range(count))
+
+def parse_source(tmp_path, source: str, jobs: int) -> parser.Program:
+    path = tmp_path / "program.impl"
+    path.write_text(source)
+
+    return parser.parse(str(path), lexer.lex_file(str(path)), jobs=jobs)
+
+@pytest.mark.parametrize("jobs", [2, 3])
+def test_parallel_parse(monkeypatch, tmp_path, jobs):
+    monkeypatch.setattr(parser, "PARALLEL_MIN_TOKENS", 0)
+    source = get_program(50)
+    serial = parser.dumps(parse_source(tmp_path, source, 1))
+
+    path = tmp_path / "program.impl"
+    tokens = lexer.lex_file(str(path))
+    program = parser.parse_parallel(str(path), tokens, [], {}, jobs)
+
+    assert program is not None # not parsed serially
+    assert parser.dumps(program) == serial
+
+def test_parallel_parse_error(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(parser, "PARALLEL_MIN_TOKENS", 0)
+    source = get_program(20).replace("return g7(acc + 1)", "return h7(acc + 1)")
+
+    with pytest.raises(SystemExit):
+        parse_source(tmp_path, source, 1)
+
+    serial = capsys.readouterr().err
+
+    with pytest.raises(SystemExit):
+        parse_source(tmp_path, source, 3)
+
+    assert capsys.readouterr().err == serial
+    assert "h7" in serial
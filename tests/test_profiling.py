@@ -0,0 +1,179 @@
+# Instrumentation profiles
+# A -fprofile-instr build appends its counts to the profile file at exit, 'impc profile-report' lists them and
+# rejects missing, truncated and foreign files with an error instead of a traceback. Functions running at the same
+# time in tasks and parallel loops count exactly.
+
+import os
+import re
+
+import pytest
+
+import profiling
+
+SOURCE = """
+func collatz(n: u64) -> u64 {
+    var steps: u64 = 0
+    while n != 1 {
+        if n % 2 == 0 {
+            n = n / 2
+        } else {
+            n = 3 * n + 1
+        }
+        steps += 1
+    }
+    return steps
+}
+
+func main() -> i8 {
+    return collatz(27)
+}
+"""
+
+# 256 tasks and 64 parallel iterations calling 'work', the argument keeps the calls from being evaluated at compile time
+TASKS_SOURCE = """
+@import_symbol atoi(str) -> i32
+
+func work(n: u64) -> u64 {
+    var total: u64 = 0
+    var i: u64 = 0
+    while i < n {
+        total += i % 7
+        i += 1
+    }
+    return total
+}
+
+func spread(depth: u64, n: u64) -> u64 {
+    if depth == 0 {
+        return work(n)
+    }
+    var a: u64 = 0
+    var b: u64 = 0
+    a = spawn spread(depth - 1, n)
+    b = spawn spread(depth - 1, n)
+    join
+    return a + b
+}
+
+func main(args: str) -> i8 {
+    var depth: u64 = atoi(args)
+    var total: u64 = spread(depth, depth * 125)
+    var j: u64 = 0
+    @parallel
+    while j < 64 {
+        total += work(depth * 12 + 4)
+        j += 1
+    }
+    return total % 256
+}
+"""
+
+def get_counts(profile_file: str) -> dict:
+    record, = profiling.read_profile(profile_file).values()
+
+    return {(profiling.SITE_KIND_NAMES[site.kind], site.function, site.line): count for site, count in zip(record.sites, record.counts)}
+
+@pytest.fixture
+def profile(tmp_path, compile_program, run_program):
+    """Runs an instrumented build twice, returns the path of its profile"""
+    binary = compile_program(SOURCE, ["-fprofile-instr"])
+    profile_file = str(tmp_path / "test.impprof")
+
+    for _ in range(2):
+        assert run_program(binary, env={**os.environ, profiling.PROFILE_FILE_ENV: profile_file}).returncode == 111
+
+    return profile_file
+
+def test_counts(tmp_path, profile):
+    record, = profiling.read_profile(profile).values()
+
+    assert record.file == str(tmp_path / "program.impl")
+    assert record.runs == 2
+
+    counts = get_counts(profile)
+
+    assert counts[("function", "main", 15)] == 2
+    assert counts[("function", "collatz", 2)] == 2
+    assert counts[("back edge", "collatz", 4)] == 2 * 111
+
+@pytest.mark.parametrize("flags", [[], ["-O2"]], ids=" ".join)
+def test_task_counts(tmp_path, compile_program, run_program, flags):
+    binary = compile_program(TASKS_SOURCE, ["-fprofile-instr"] + flags)
+    profile_file = str(tmp_path / "tasks.impprof")
+
+    result = run_program(binary, ["8"], env={**os.environ, profiling.PROFILE_FILE_ENV: profile_file, "IMPL_THREADS": "4"})
+    assert result.returncode == (256 * 2997 + 64 * 295) % 256
+
+    counts = get_counts(profile_file)
+
+    assert counts[("function", "spread", 14)] == 511
+    assert counts[("function", "work", 4)] == 256 + 64
+    assert counts[("back edge", "work", 7)] == 256 * 1000 + 64 * 100
+
+@pytest.mark.parametrize("source, atomic", [(TASKS_SOURCE, True), (SOURCE, False)], ids=["tasks", "no tasks"])
+def test_atomic_counters(tmp_path, impc, source, atomic):
+    # a single CPU rarely loses a count, the IR shows whether the counters are updated atomically
+    (tmp_path / "program.impl").write_text(source)
+    result = impc([str(tmp_path / "program.impl"), "-o", str(tmp_path / "program"), "-fprofile-instr", "-v"])
+
+    assert result.returncode == 0, result.stderr
+
+    # the function called by the tasks (or 'collatz'), the parallel loop body in 'main' is always atomic
+    function = re.search(r"^define i64 @(work|collatz)\(.*?^}", result.stderr, re.MULTILINE | re.DOTALL).group()
+
+    assert ("atomicrmw add" in function) == atomic
+
+def test_report(profile, impc):
+    result = impc(["profile-report", profile, "--annotate"])
+
+    assert result.returncode == 0, result.stderr
+    assert "(2 runs)" in result.stdout
+    assert "collatz (line 2)" in result.stdout
+
+def test_report_without_source(tmp_path, profile, impc):
+    os.remove(tmp_path / "program.impl")
+    result = impc(["profile-report", profile, "--annotate"])
+
+    assert result.returncode == 0, result.stderr
+    assert "collatz (line 2)" in result.stdout
+
+def test_missing_profile(tmp_path, impc):
+    result = impc(["profile-report", str(tmp_path / "missing.impprof")])
+
+    assert result.returncode == 1
+    assert "Cannot read profile" in result.stderr
+    assert "Traceback" not in result.stderr
+
+@pytest.mark.parametrize("keep", [1, profiling.PROFILE_HEADER.size - 1, profiling.PROFILE_HEADER.size + 3, -1])
+def test_truncated_profile(profile, impc, keep):
+    with open(profile, "rb") as f:
+        data = f.read()
+
+    # the two records have the same size, the second one is cut after 'keep' bytes (the first one if negative)
+    size = len(data) // 2 + keep
+
+    with open(profile, "wb") as f:
+        f.write(data[:size])
+
+    with pytest.raises(profiling.ProfileFormatError, match="truncated"):
+        profiling.read_profile(profile)
+
+    result = impc(["profile-report", profile])
+
+    assert result.returncode == 1
+    assert "Invalid profile" in result.stderr
+    assert "Traceback" not in result.stderr
+
+def test_other_version(profile):
+    with open(profile, "r+b") as f:
+        f.seek(len(profiling.PROFILE_MAGIC))
+        f.write(bytes([profiling.PROFILE_FORMAT_VERSION + 1]))
+
+    with pytest.raises(profiling.ProfileFormatError, match="version"):
+        profiling.read_profile(profile)
+
+def test_not_a_profile(tmp_path):
+    (tmp_path / "other.impprof").write_bytes(b"\0" * 64)
+
+    with pytest.raises(profiling.ProfileFormatError):
+        profiling.read_profile(str(tmp_path / "other.impprof"))
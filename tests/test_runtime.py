@@ -0,0 +1,55 @@
+# Float formatting of the standard runtime
+# print_f64 formats most floats through integer arithmetic and the others with snprintf's '%.*f', both have to print
+# the same digits, Python's '%.*f' rounds the exact value of the float like glibc does.
+
+import random
+
+import pytest
+
+import runtime
+
+FLAGS = [[], ["-O2"]]
+
+VALUES = [
+    # rounded down because the float is a little below the decimal tie
+    ("2.675", 2), ("1.115", 2), ("0.045", 2), ("-657.395", 2), ("1.005", 2),
+    # exact ties, rounded half to even
+    ("0.125", 2), ("0.375", 2), ("2.5", 0), ("3.5", 0), ("-0.5", 0), ("1.0625", 3),
+    # close to and above 2^53 after scaling
+    ("12345678901234.568", 5), ("98765432109.87654", 8), ("9007199254740991.0", 0), ("9007199254740993.0", 0),
+    ("4503599627370495.5", 0), ("4503599627370497.0", 1), ("123456789012345678901234567890.0", 2),
+    # small and signed zeros
+    ("0.0", 3), ("-0.0", 3), ("0.00000000000000000001", 17), ("0.000000000000000005", 17), ("-0.0000004", 6)
+]
+
+def get_values(seed: int, count: int) -> list:
+    generator = random.Random(seed)
+    values = []
+
+    for _ in range(count):
+        digits = generator.randint(0, 12)
+        text = f"{generator.randint(-10 ** 6, 10 ** 6)}.{generator.randint(0, 10 ** digits - 1):0{digits}}"
+        values.append((text, generator.randint(0, runtime.MAX_PRECISION)))
+
+    return values
+
+def get_program(values: list) -> str:
+    lines = ["func main() -> i8 {"]
+
+    for text, precision in values:
+        lines.append(f"    print_f64({text}, {precision})")
+        lines.append("    print(\"\\n\")")
+
+    lines.append("    return 0")
+    lines.append("}")
+
+    return "\n".join(lines) + "\n"
+
+@pytest.mark.parametrize("flags", FLAGS, ids=" ".join)
+def test_format_float(compile_program, run_program, flags):
+    values = VALUES + get_values(0, 300)
+    binary = compile_program(get_program(values), flags)
+
+    expected = "".join("%.*f\n" % (precision, float(text)) for text, precision in values)
+
+    assert run_program(binary).stdout == expected
@@ -0,0 +1,59 @@
+# SIMD vector types
+# Vectors are initialized from a list of lanes or a broadcast scalar, operators work lane by lane (with the scalar
+# operand broadcast), single lanes are read and written by index and 'reduce_*' folds the lanes into a scalar. Every
+# check sets one bit of the exit code, the program argument keeps the values from being folded.
+
+import pytest
+
+FLAGS = [[], ["-O2"], ["-O2", "-march=native"]]
+
+SOURCE = """
+@import_symbol atoi(str) -> i32
+
+func main(args: str) -> i8 {
+    var n: i32 = atoi(args)
+    var r: u64 = 0
+    var v: i32x4 = [n, 2, 3, 4]
+    var w: i32x4 = v * 3 + n
+    if w[0] == 4 && w[1] == 7 && w[2] == 10 && w[3] == 13 {
+        r += 1
+    }
+    if reduce_add(w) == 34 && reduce_mul(v) == 24 {
+        r += 2
+    }
+    var s: i64x2 = [n - 6, 7]
+    if reduce_min(s) == -5 && reduce_max(s) == 7 {
+        r += 4
+    }
+    var f: f64x4 = 1.5
+    if reduce_add(f * 2.0 + n) == 16.0 {
+        r += 8
+    }
+    var b: u8x16 = 250
+    b += 9 + n
+    if b[15] == 4 && reduce_add(b) == 64 && reduce_max(b) == 4 {
+        r += 16
+    }
+    v[0] = 100
+    if reduce_max(v) == 100 && v[0] == 100 && reduce_min(v) == 2 {
+        r += 32
+    }
+    var g: f32x8 = [1.0, 2.0, 3.0, 4.0, 1.0, 1.0, 1.0, 0.5]
+    if reduce_mul(g) == 12.0 && reduce_min(g) == 0.5 {
+        r += 64
+    }
+    var u: u32x8 = 6
+    var m: u32x8 = [1, 2, 3, 4, 5, 6, 7, 8]
+    u = m & u | n
+    if reduce_add(u) == 32 {
+        r += 128
+    }
+    return r
+}
+"""
+
+@pytest.mark.parametrize("flags", FLAGS, ids=" ".join)
+def test_lanes_and_reductions(compile_program, run_program, flags):
+    binary = compile_program(SOURCE, flags)
+
+    assert run_program(binary, ["1"]).returncode == 255